@@ -10,6 +10,7 @@ from corehq.apps.api.odata.views import (
     ODataCaseMetadataView,
     ODataFormMetadataView,
 )
+from corehq.apps.export.extraction import TableExtractionPlan
 from corehq.apps.export.models import CaseExportInstance, FormExportInstance
 from corehq.util.view_utils import absolute_reverse
 from corehq.apps.api.odata.utils import format_odata_error
@@ -45,16 +46,7 @@ class ODataBaseSerializer(Serializer):
 
         assert all([domain, config_id, api_path]), [domain, config_id, api_path]
 
-        context_urlname = self.metadata_url
-        context_url_args = [domain, config_id]
-        if table_id > 0:
-            context_urlname = self.table_metadata_url
-            context_url_args.append(table_id)
-
-        data['@odata.context'] = '{}#{}'.format(
-            absolute_reverse(context_urlname, args=context_url_args),
-            'feed'
-        )
+        data['@odata.context'] = self.get_context_url(domain, config_id, table_id)
 
         next_link = self.get_next_url(data.pop('meta'), api_path)
         if next_link:
@@ -68,6 +60,18 @@ class ODataBaseSerializer(Serializer):
         )
         return json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
 
+    def get_context_url(self, domain, config_id, table_id):
+        context_urlname = self.metadata_url
+        context_url_args = [domain, config_id]
+        if table_id > 0:
+            context_urlname = self.table_metadata_url
+            context_url_args.append(table_id)
+
+        return '{}#{}'.format(
+            absolute_reverse(context_urlname, args=context_url_args),
+            'feed'
+        )
+
     @staticmethod
     def get_next_url(meta, api_path):
         next_page = meta['next']
@@ -75,24 +79,32 @@ class ODataBaseSerializer(Serializer):
             return '{}{}{}'.format(get_url_base(), api_path, next_page)
 
     @staticmethod
-    def serialize_documents_using_config(documents, config, table_id):
+    def get_extraction_plan(config, table_id):
+        """The plan for the rows of the feed's table, or None if it has no rows"""
         if table_id + 1 > len(config.tables):
-            return []
+            return None
 
         table = config.tables[table_id]
         if not table.selected:
+            return None
+
+        return TableExtractionPlan(
+            table,
+            split_columns=config.split_multiselects,
+            transform_dates=config.transform_dates,
+            as_json=True,
+        )
+
+    @classmethod
+    def serialize_documents_using_config(cls, documents, config, table_id):
+        plan = cls.get_extraction_plan(config, table_id)
+        if plan is None:
             return []
 
         data = []
-        for row_number, document in enumerate(documents):
-            rows = table.get_rows(
-                document,
-                document.get('_id'),  # needed because of pagination
-                split_columns=config.split_multiselects,
-                transform_dates=config.transform_dates,
-                as_json=True,
-            )
-            data.extend(rows)
+        for document in documents:
+            # the document id is used as the row number because of pagination
+            data.extend(plan.get_rows(document, document.get('_id')))
         return data
 
 
@@ -0,0 +1,189 @@
+"""
+Streaming OData feeds
+
+A feed is normally rendered as a single JSON document by tastypie, which
+holds all of its rows in memory and pages through Elasticsearch with
+``from``/``size``, so deep pages get slower and rows can be skipped or
+repeated when documents are added while a client pages through the feed.
+
+A streamed feed is sorted by ``doc_id`` and fetched from Elasticsearch a
+page at a time with ``search_after``. Rows are written to the response as
+each page is serialized, so memory use doesn't depend on the size of the
+feed. The query parameters are:
+
+``$top``
+    the number of documents in the response (``limit`` is also accepted)
+``$skip``
+    the number of documents to skip (``offset`` is also accepted)
+``$skiptoken``
+    an opaque cursor to the last document of the previous response, set
+    by ``@odata.nextLink``
+
+``@odata.nextLink`` is written after the rows, when there are more
+documents to fetch.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from tastypie.exceptions import BadRequest
+
+from dimagi.utils.web import get_url_base
+
+from corehq.apps.api.odata.utils import record_feed_metrics_in_datadog
+from corehq.apps.es.es_query import ESQuerySet
+from corehq.util.timer import TimingContext
+
+# documents fetched from Elasticsearch per request
+ODATA_STREAMING_PAGE_SIZE = 1000
+ODATA_STREAMING_DEFAULT_TOP = 100000
+ODATA_STREAMING_MAX_TOP = 1000000
+# bytes of serialized rows to buffer before they are written to the response
+ODATA_STREAMING_CHUNK_SIZE = 64 * 1024
+
+
+class FeedParams(object):
+
+    def __init__(self, top=ODATA_STREAMING_DEFAULT_TOP, skip=0, after=None):
+        self.top = top
+        self.skip = skip
+        self.after = after
+
+    @classmethod
+    def from_request(cls, request):
+        top = _get_int_param(request.GET, ('$top', 'limit'), ODATA_STREAMING_DEFAULT_TOP)
+        skip = _get_int_param(request.GET, ('$skip', 'offset'), 0)
+        skiptoken = request.GET.get('$skiptoken')
+        if top < 1 or top > ODATA_STREAMING_MAX_TOP:
+            raise BadRequest("$top must be between 1 and {}".format(ODATA_STREAMING_MAX_TOP))
+        if skip < 0:
+            raise BadRequest("$skip must not be negative")
+        if skiptoken and skip:
+            raise BadRequest("$skip can't be used with $skiptoken")
+        return cls(top, skip, decode_skiptoken(skiptoken) if skiptoken else None)
+
+
+def _get_int_param(params, names, default):
+    for name in names:
+        if params.get(name):
+            try:
+                return int(params[name])
+            except ValueError:
+                raise BadRequest("{} must be an integer".format(name))
+    return default
+
+
+def encode_skiptoken(sort_values):
+    return urlsafe_b64encode(json.dumps(sort_values).encode('utf-8')).decode('ascii')
+
+
+def decode_skiptoken(skiptoken):
+    try:
+        sort_values = json.loads(urlsafe_b64decode(skiptoken.encode('ascii')))
+    except ValueError:
+        sort_values = None
+    if not isinstance(sort_values, list):
+        raise BadRequest("Invalid $skiptoken")
+    return sort_values
+
+
+class FeedPage(object):
+    """The documents of one response of a feed
+
+    Iterating yields at most ``params.top`` documents of ``query``, sorted by
+    ``doc_id``. Afterwards ``next_skiptoken`` is the cursor to the rest of the
+    documents, or None if there are no more.
+    """
+
+    def __init__(self, query, params):
+        self.query = query.sort('doc_id')
+        self.params = params
+        self.next_skiptoken = None
+
+    def __iter__(self):
+        remaining = self.params.top
+        start = None if self.params.after else self.params.skip
+        after = self.params.after
+        while True:
+            # fetch one more document than needed to tell if there are more
+            size = min(ODATA_STREAMING_PAGE_SIZE, remaining + 1)
+            raw_query = self.query.start(start).size(size).raw_query
+            if after is not None:
+                raw_query['search_after'] = after
+            hits = self.query.adapter.search(raw_query)['hits']['hits']
+            for hit in hits[:remaining]:
+                yield ESQuerySet.normalize_result(self.query, hit)
+
+            if len(hits) > remaining:
+                # the cursor is the last document that was yielded, which is
+                # from the previous request if all of this one's were extra
+                last_sort = hits[remaining - 1]['sort'] if remaining else after
+                self.next_skiptoken = encode_skiptoken(last_sort)
+                return
+            if len(hits) < size:
+                return
+            remaining -= len(hits)
+            start = None
+            after = hits[-1]['sort']
+
+
+def get_streaming_feed_response(request, query, serializer, config, config_id, table_id):
+    params = FeedParams.from_request(request)
+    rows = _iter_feed_json(request, query, serializer, config, config_id, table_id, params)
+    return StreamingHttpResponse(_chunked(rows), content_type='application/json')
+
+
+def _iter_feed_json(request, query, serializer, config, config_id, table_id, params):
+    with TimingContext() as timer:
+        row_count = column_count = size = 0
+
+        def _write(value):
+            nonlocal size
+            size += len(value)
+            return value
+
+        context_url = serializer.get_context_url(request.domain, config_id, table_id)
+        yield _write('{{"@odata.context": {}, "value": ['.format(json.dumps(context_url)))
+        plan = serializer.get_extraction_plan(config, table_id)
+        page = FeedPage(query, params)
+        if plan is not None:
+            for document in page:
+                # the document id is used as the row number because of pagination
+                for row in plan.get_rows(document, document.get('_id')):
+                    if row_count:
+                        yield _write(',')
+                    yield _write(json.dumps(row, cls=DjangoJSONEncoder))
+                    row_count += 1
+                    column_count = len(row)
+        yield _write(']')
+        if page.next_skiptoken:
+            next_link = _get_next_link(request, params, page.next_skiptoken)
+            yield _write(', "@odata.nextLink": {}'.format(json.dumps(next_link)))
+        yield _write('}')
+
+    record_feed_metrics_in_datadog(request, config_id, timer.duration, row_count, column_count, size)
+
+
+def _get_next_link(request, params, skiptoken):
+    query_params = request.GET.copy()
+    for name in ('$skip', 'offset', 'limit', '$skiptoken'):
+        query_params.pop(name, None)
+    query_params['$top'] = params.top
+    query_params['$skiptoken'] = skiptoken
+    return '{}{}?{}'.format(get_url_base(), request.path, query_params.urlencode(safe='$'))
+
+
+def _chunked(strings):
+    chunk = []
+    chunk_size = 0
+    for value in strings:
+        chunk.append(value)
+        chunk_size += len(value)
+        if chunk_size >= ODATA_STREAMING_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            chunk_size = 0
+    if chunk:
+        yield ''.join(chunk)
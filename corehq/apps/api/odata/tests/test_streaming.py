@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+from django.test import RequestFactory, SimpleTestCase
+
+from tastypie.exceptions import BadRequest
+
+from corehq.apps.api.odata.streaming import (
+    FeedPage,
+    FeedParams,
+    decode_skiptoken,
+    encode_skiptoken,
+)
+from corehq.apps.es.cases import CaseES
+
+
+class FeedParamsTest(SimpleTestCase):
+
+    def _get_params(self, **params):
+        return FeedParams.from_request(RequestFactory().get('/feed', params))
+
+    def test_defaults(self):
+        params = self._get_params()
+        self.assertEqual((params.skip, params.after), (0, None))
+
+    def test_top_and_skip(self):
+        params = self._get_params(**{'$top': '10', '$skip': '20'})
+        self.assertEqual((params.top, params.skip), (10, 20))
+
+    def test_limit_and_offset(self):
+        params = self._get_params(limit='10', offset='20')
+        self.assertEqual((params.top, params.skip), (10, 20))
+
+    def test_skiptoken(self):
+        params = self._get_params(**{'$skiptoken': encode_skiptoken(['abc'])})
+        self.assertEqual(params.after, ['abc'])
+
+    def test_invalid_params(self):
+        for params in [
+            {'$top': '0'},
+            {'$top': 'ten'},
+            {'$skip': '-1'},
+            {'$skip': '1', '$skiptoken': encode_skiptoken(['abc'])},
+            {'$skiptoken': 'not a token'},
+        ]:
+            with self.assertRaises(BadRequest):
+                self._get_params(**params)
+
+    def test_decode_skiptoken(self):
+        self.assertEqual(decode_skiptoken(encode_skiptoken(['abc', 1])), ['abc', 1])
+
+
+class FeedPageTest(SimpleTestCase):
+
+    def setUp(self):
+        self.doc_ids = ['doc{:02}'.format(i) for i in range(10)]
+        self.query = CaseES()
+        patcher = patch.object(self.query.adapter, 'search', side_effect=self._search)
+        self.search = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _search(self, raw_query):
+        self.assertEqual(raw_query['sort'], [{'doc_id': {'order': 'asc'}}])
+        doc_ids = self.doc_ids
+        if 'search_after' in raw_query:
+            self.assertNotIn('from', raw_query)
+            doc_ids = [doc_id for doc_id in doc_ids if doc_id > raw_query['search_after'][0]]
+        start = raw_query.get('from', 0)
+        return {'hits': {'hits': [
+            {'_id': doc_id, '_source': {'_id': doc_id}, 'sort': [doc_id]}
+            for doc_id in doc_ids[start:start + raw_query['size']]
+        ]}}
+
+    def _get_doc_ids(self, page):
+        return [doc['_id'] for doc in page]
+
+    @patch('corehq.apps.api.odata.streaming.ODATA_STREAMING_PAGE_SIZE', 3)
+    def test_follow_skiptokens(self):
+        page = FeedPage(self.query, FeedParams(top=4))
+        self.assertEqual(self._get_doc_ids(page), self.doc_ids[:4])
+
+        page = FeedPage(self.query, FeedParams(top=4, after=decode_skiptoken(page.next_skiptoken)))
+        self.assertEqual(self._get_doc_ids(page), self.doc_ids[4:8])
+
+        page = FeedPage(self.query, FeedParams(top=4, after=decode_skiptoken(page.next_skiptoken)))
+        self.assertEqual(self._get_doc_ids(page), self.doc_ids[8:])
+        self.assertIsNone(page.next_skiptoken)
+
+    @patch('corehq.apps.api.odata.streaming.ODATA_STREAMING_PAGE_SIZE', 3)
+    def test_top_multiple_of_page_size(self):
+        page = FeedPage(self.query, FeedParams(top=6))
+        self.assertEqual(self._get_doc_ids(page), self.doc_ids[:6])
+
+        page = FeedPage(self.query, FeedParams(top=6, after=decode_skiptoken(page.next_skiptoken)))
+        self.assertEqual(self._get_doc_ids(page), self.doc_ids[6:])
+        self.assertIsNone(page.next_skiptoken)
+
+    def test_skip(self):
+        page = FeedPage(self.query, FeedParams(top=5, skip=5))
+        self.assertEqual(self._get_doc_ids(page), self.doc_ids[5:])
+        self.assertIsNone(page.next_skiptoken)
+
+    def test_document_added_between_pages(self):
+        page = FeedPage(self.query, FeedParams(top=5))
+        self.assertEqual(self._get_doc_ids(page), self.doc_ids[:5])
+
+        self.doc_ids.insert(0, 'doc')
+        page = FeedPage(self.query, FeedParams(top=5, after=decode_skiptoken(page.next_skiptoken)))
+        self.assertEqual(self._get_doc_ids(page), self.doc_ids[6:])
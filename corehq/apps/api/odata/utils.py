@@ -54,8 +54,6 @@ def _get_odata_fields_from_columns(export_config, special_types, table_id):
 
 
 def record_feed_access_in_datadog(request, config_id, duration, response):
-    config = ExportInstance.get(config_id)
-    username = request.couch_user.username
     json_response = json.loads(response.content.decode('utf-8'))
     rows = json_response['value']
     row_count = len(rows)
@@ -63,6 +61,13 @@ def record_feed_access_in_datadog(request, config_id, duration, response):
         column_count = len(rows[0])
     except IndexError:
         column_count = 0
+    record_feed_metrics_in_datadog(request, config_id, duration, row_count, column_count,
+                                   len(response.content))
+
+
+def record_feed_metrics_in_datadog(request, config_id, duration, row_count, column_count, size):
+    config = ExportInstance.get(config_id)
+    username = request.couch_user.username
     metrics_histogram(
         'commcare.odata_feed.test_v3', duration,
         bucket_tag='duration_bucket', buckets=(1, 5, 20, 60, 120, 300, 600), bucket_unit='s',
@@ -73,7 +78,7 @@ def record_feed_access_in_datadog(request, config_id, duration, response):
             'username': username,
             'row_count': row_count,
             'column_count': column_count,
-            'size': len(response.content)
+            'size': size
         }
     )
 
@@ -48,6 +48,7 @@ from corehq.apps.api.odata.serializers import (
     ODataCaseSerializer,
     ODataFormSerializer,
 )
+from corehq.apps.api.odata.streaming import get_streaming_feed_response
 from corehq.apps.api.odata.utils import record_feed_access_in_datadog
 from corehq.apps.api.odata.views import (
     add_odata_headers,
@@ -1023,9 +1024,29 @@ class BaseODataResource(HqBaseResource, DomainSpecificResourceMixin):
             response = super(BaseODataResource, self).dispatch(
                 request_type, request, **kwargs
             )
-        record_feed_access_in_datadog(request, kwargs['config_id'], timer.duration, response)
+        if not response.streaming:
+            # streamed feeds record their metrics once they have been written
+            record_feed_access_in_datadog(request, kwargs['config_id'], timer.duration, response)
         return response
 
+    def get_list(self, request, **kwargs):
+        if not toggles.ODATA_STREAMING_FEEDS.enabled(request.domain):
+            return super(BaseODataResource, self).get_list(request, **kwargs)
+
+        base_bundle = self.build_bundle(request=request)
+        query = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+        config_id = kwargs['config_id']
+        serializer = self._meta.serializer
+        response = get_streaming_feed_response(
+            request,
+            query,
+            serializer,
+            serializer.get_config(config_id),
+            config_id,
+            int(kwargs.get('table_id', 0)),
+        )
+        return add_odata_headers(response)
+
     def create_response(self, request, data, response_class=HttpResponse,
                         **response_kwargs):
         data['domain'] = request.domain
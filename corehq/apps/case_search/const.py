@@ -26,6 +26,13 @@ EXCLUDE_RELATED_CASES_FILTER = "[not(commcare_is_related_case=true())]"
 # Added to each case on the index for debugging when a case was added to ES
 INDEXED_ON = '@indexed_on'
 
+# Added to each case on the index when CASE_SEARCH_SUBCASE_COUNTS is enabled,
+# as a property per index identifier with the number of subcases that use it,
+# e.g. '@subcase_count:parent'
+SUBCASE_COUNT_PREFIX = '@subcase_count:'
+# Set on case documents by the case search pillow to the subcase counts to index
+SUBCASE_COUNTS = '@subcase_counts'
+
 
 @dataclass(frozen=True)
 class _INDEXED_METADATA:
@@ -26,6 +26,7 @@ from corehq.apps.es.case_search import (
     case_property_query,
     case_property_starts_with,
     case_search_adapter,
+    subcase_count_property,
 )
 from corehq.apps.es.cases import case_name, is_closed
 from corehq.apps.es.tests.utils import ElasticTestMixin, es_test
@@ -255,6 +256,38 @@ class TestFilterDsl(ElasticTestMixin, SimpleTestCase):
         built_filter = build_filter_from_ast(parsed, SearchFilterContext("domain"))
         self.checkQuery(built_filter, expected_filter, is_raw_query=True)
 
+    @flag_enabled('CASE_SEARCH_SUBCASE_COUNTS')
+    @flag_enabled('CASE_SEARCH_SUBCASE_COUNT_QUERIES')
+    def test_subcase_exists_optimized(self):
+        parsed = parse_xpath("subcase-exists('parent')")
+        expected_filter = case_property_numeric_range(subcase_count_property('parent'), gt=0)
+        built_filter = build_filter_from_ast(parsed, SearchFilterContext("domain"))
+        self.checkQuery(built_filter, expected_filter, is_raw_query=True)
+
+    @flag_enabled('CASE_SEARCH_SUBCASE_COUNTS')
+    @patch('corehq.apps.case_search.xpath_functions.subcase_functions'
+           '._get_parent_case_ids_matching_subcase_query', return_value=['parent1'])
+    def test_subcase_counts_indexed_not_queried(self, get_parent_case_ids):
+        parsed = parse_xpath("subcase-exists('parent')")
+        built_filter = build_filter_from_ast(parsed, SearchFilterContext("domain"))
+        self.checkQuery(built_filter, filters.doc_id(['parent1']), is_raw_query=True)
+
+    @flag_enabled('CASE_SEARCH_SUBCASE_COUNTS')
+    @flag_enabled('CASE_SEARCH_SUBCASE_COUNT_QUERIES')
+    def test_subcase_count_optimized(self):
+        for query_string, expected_filter in [
+            ("subcase-count('host') >= 2",
+             case_property_numeric_range(subcase_count_property('host'), gt=1)),
+            ("subcase-count('host') < 2",
+             filters.NOT(case_property_numeric_range(subcase_count_property('host'), gt=1))),
+            ("subcase-count('host') = 2",
+             case_property_numeric_range(subcase_count_property('host'), gte=2, lte=2)),
+            ("subcase-count('host') != 2",
+             filters.NOT(case_property_numeric_range(subcase_count_property('host'), gte=2, lte=2))),
+        ]:
+            built_filter = build_filter_from_ast(parse_xpath(query_string), SearchFilterContext("domain"))
+            self.checkQuery(built_filter, expected_filter, is_raw_query=True)
+
 
 @es_test(requires=[case_search_adapter], setup_class=True)
 class TestFilterDslLookups(ElasticTestMixin, TestCase):
@@ -12,6 +12,14 @@ from eulxml.xpath.ast import (
 from corehq.apps.case_search.const import MAX_RELATED_CASES
 from corehq.apps.case_search.exceptions import XPathFunctionException
 from corehq.apps.es import filters, queries
+from corehq.apps.es.case_search import (
+    case_property_numeric_range,
+    subcase_count_property,
+)
+from corehq.toggles import (
+    CASE_SEARCH_SUBCASE_COUNT_QUERIES,
+    CASE_SEARCH_SUBCASE_COUNTS,
+)
 
 
 @dataclass
@@ -55,12 +63,45 @@ def subcase(node, context):
     - subcase-count('host', {subcase_filter} ) {=, !=, >, <, >=, <=} {integer value}
     """
     subcase_query = _parse_normalize_subcase_query(node)
+    if _can_use_subcase_counts(subcase_query, context):
+        return _subcase_count_filter(subcase_query)
     ids = _get_parent_case_ids_matching_subcase_query(subcase_query, context)
     if subcase_query.invert:
         return filters.NOT(filters.doc_id(ids)) if ids else filters.match_all()
     return filters.doc_id(ids) if ids else filters.match_none()
 
 
+def _can_use_subcase_counts(subcase_query, context):
+    """Subcase counts are indexed for all of a case's subcases, and only for
+    cases in domains with ``CASE_SEARCH_SUBCASE_COUNTS`` enabled. They are
+    used once ``CASE_SEARCH_SUBCASE_COUNT_QUERIES`` is enabled too, after the
+    domain's cases have been reindexed with them.
+    """
+    from corehq.apps.case_search.utils import RegistryQueryHelper
+
+    return (
+        subcase_query.subcase_filter is None
+        and not isinstance(context.helper, RegistryQueryHelper)
+        and CASE_SEARCH_SUBCASE_COUNTS.enabled(context.domain)
+        and CASE_SEARCH_SUBCASE_COUNT_QUERIES.enabled(context.domain)
+    )
+
+
+def _subcase_count_filter(subcase_query):
+    """Filter on the number of subcases indexed with each case
+
+    Cases without subcases don't have a count, so like the subcase query,
+    'subcase-count > N' only matches cases with subcases, even for N < 0.
+    """
+    count_property = subcase_count_property(subcase_query.index_identifier)
+    if subcase_query.op == '>':
+        count_filter = case_property_numeric_range(count_property, gt=subcase_query.count)
+    else:
+        count_filter = case_property_numeric_range(
+            count_property, gte=subcase_query.count, lte=subcase_query.count)
+    return filters.NOT(count_filter) if subcase_query.invert else count_filter
+
+
 def _get_parent_case_ids_matching_subcase_query(subcase_query, context):
     """Get a list of case IDs for cases that have a subcase with the given index identifier
     and matching the subcase predicate filter.
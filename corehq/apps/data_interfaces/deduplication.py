@@ -3,15 +3,19 @@ from datetime import datetime
 from django.utils.text import slugify
 
 from casexml.apps.case.const import CASE_UI_OWNER_ID
+from dimagi.utils.chunked import chunked
 
+from corehq import toggles
 from corehq.apps.case_search.const import INDEXED_METADATA_BY_KEY
 from corehq.apps.data_interfaces.utils import iter_cases_and_run_rules
 from corehq.apps.es import queries
 from corehq.apps.es.case_search import CaseSearchES, case_property_missing
 from corehq.apps.locations.dbaccessors import user_ids_at_locations
+from corehq.form_processor.models import CommCareCase
 from corehq.messaging.util import MessagingRuleProgressHelper
 
 DUPLICATE_LIMIT = 1000
+DEDUPLICATION_INDEX_BATCH_SIZE = 100
 DEDUPE_XMLNS = 'http://commcarehq.org/hq_case_deduplication_rule'
 
 
@@ -127,14 +131,29 @@ def find_duplicate_case_ids(
 
 
 def add_case_properties_to_query(es, case, case_properties, match_type):
+    clause = queries.MUST if match_type == "ALL" else queries.SHOULD
+
+    case_property_values = get_case_property_values(case, case_properties)
+    for case_property_name, case_property_value in case_property_values.items():
+        es = es.case_property_query(
+            case_property_name,
+            case_property_value,
+            clause
+        )
+
+    return (es, bool(case_property_values))
+
+
+def get_case_property_values(case, case_properties):
+    """Returns a dict of the values of ``case_properties`` that are not
+    empty, keyed by the name of the property in the case search index
+    """
     # HACK: due to inconsistencies in how case metadata properties are displayed
     # to users, we need to translate the display value to the backend value
     display_to_backend_properties_map = {CASE_UI_OWNER_ID: "@owner_id"}
 
-    clause = queries.MUST if match_type == "ALL" else queries.SHOULD
     _case_json = None
-
-    at_least_one_property_query = False
+    values = {}
 
     for case_property_name in case_properties:
         case_property_name = display_to_backend_properties_map.get(case_property_name, case_property_name)
@@ -145,18 +164,10 @@ def add_case_properties_to_query(es, case, case_properties, match_type):
         else:
             case_property_value = case.get_case_property(case_property_name)
 
-        if not case_property_value:
-            continue
+        if case_property_value:
+            values[case_property_name] = case_property_value
 
-        at_least_one_property_query = True
-
-        es = es.case_property_query(
-            case_property_name,
-            case_property_value,
-            clause
-        )
-
-    return (es, at_least_one_property_query)
+    return values
 
 
 def reset_and_backfill_deduplicate_rule(rule):
@@ -181,12 +192,14 @@ def reset_deduplicate_rule(rule):
     """
     from corehq.apps.data_interfaces.models import (
         CaseDeduplicationActionDefinition,
+        CaseDeduplicationPropertyValue,
         CaseDuplicate,
         CaseDuplicateNew,
     )
     deduplicate_action = CaseDeduplicationActionDefinition.from_rule(rule)
     CaseDuplicate.objects.filter(action=deduplicate_action).delete()
     CaseDuplicateNew.objects.filter(action=deduplicate_action).delete()
+    CaseDeduplicationPropertyValue.objects.filter(action=deduplicate_action).delete()
 
 
 def backfill_deduplicate_rule(domain, rule):
@@ -213,6 +226,8 @@ def backfill_deduplicate_rule(domain, rule):
         case_iterator = AutomaticUpdateRule.iter_cases(
             domain, rule.case_type, include_closed=action.include_closed
         )
+        if toggles.CASE_DEDUPE_INDEX.enabled(domain):
+            case_iterator = _index_cases(rule, action, case_iterator, now, progress_helper, total_cases_count)
         iter_cases_and_run_rules(
             domain,
             case_iterator,
@@ -229,6 +244,24 @@ def backfill_deduplicate_rule(domain, rule):
         rule.save(update_fields=['last_run', 'locked_for_editing'])
 
 
+def _index_cases(rule, action, case_iterator, now, progress_helper, total_cases_count):
+    """Adds the cases that match ``rule`` to the deduplication index, and
+    returns an iterator of the cases that share a value with another case.
+    Cases that don't can't be duplicates, so the rule doesn't need to run on them.
+    """
+    from corehq.apps.data_interfaces.models import CaseDeduplicationPropertyValue
+
+    for cases in chunked(case_iterator, DEDUPLICATION_INDEX_BATCH_SIZE, list):
+        matching_cases = [case for case in cases if rule.criteria_match(case, now)]
+        CaseDeduplicationPropertyValue.bulk_update_for_cases(matching_cases, action)
+        for __ in cases:
+            progress_helper.increment_current_case_count()
+
+    case_ids = CaseDeduplicationPropertyValue.get_case_ids_with_shared_values(action)
+    progress_helper.set_total_cases_to_be_processed(total_cases_count + len(case_ids))
+    return CommCareCase.objects.iter_cases(case_ids, rule.domain)
+
+
 def get_dedupe_xmlns(rule):
     name_slug = slugify(rule.name)
     return f"{DEDUPE_XMLNS}__{name_slug}-{rule.case_type}"
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_interfaces', '0038_alter_caseduplicate_potential_duplicates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseDeduplicationPropertyValue',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('case_id', models.CharField(max_length=126)),
+                ('property_name', models.CharField(max_length=255)),
+                ('value_hash', models.CharField(max_length=64)),
+                ('action', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_interfaces.casededuplicationactiondefinition')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='casededuplicationpropertyvalue',
+            index=models.Index(fields=['action', 'property_name', 'value_hash'], name='data_interf_action__eed31d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='casededuplicationpropertyvalue',
+            index=models.Index(fields=['action', 'case_id'], name='data_interf_action__72607d_idx'),
+        ),
+    ]
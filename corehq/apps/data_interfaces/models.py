@@ -4,11 +4,12 @@ import operator
 import re
 from collections import defaultdict
 from datetime import date, datetime, time, timedelta
+from functools import reduce
 
 from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.db import models, transaction
-from django.db.models import Q
+from django.db.models import Count, Exists, OuterRef, Q
 from django.utils.translation import gettext_lazy
 from django.utils.functional import cached_property
 
@@ -36,8 +37,10 @@ from corehq.apps.app_manager.dbaccessors import get_latest_released_app
 from corehq.apps.app_manager.exceptions import FormNotFoundException
 from corehq.apps.app_manager.models import AdvancedForm
 from corehq.apps.data_interfaces.deduplication import (
+    DUPLICATE_LIMIT,
     case_exists_in_es as _case_exists_in_es,
     find_duplicate_case_ids as _find_duplicate_case_ids,
+    get_case_property_values,
     get_dedupe_xmlns,
     reset_and_backfill_deduplicate_rule,
     reset_deduplicate_rule,
@@ -244,7 +247,31 @@ class AutomaticUpdateRule(models.Model):
         return now - timedelta(days=min_boundary)
 
     @classmethod
-    def iter_cases(cls, domain, case_type, db=None, modified_lte=None, include_closed=False):
+    def get_rules_case_filter(cls, rules, now):
+        """
+        :returns: a ``Q`` expression that matches every case that any of
+            ``rules`` could act on, or None if that can't be narrowed down
+            with a query
+        """
+        case_filters = []
+        for rule in rules:
+            for action in rule.memoized_actions:
+                # cases that don't match a rule can only be skipped if
+                # nothing happens to them
+                if not _is_default_method(action.definition, 'when_case_does_not_match'):
+                    return None
+
+            case_filter = rule.get_case_filter(now)
+            if case_filter is None:
+                return None
+            case_filters.append(case_filter)
+
+        if not case_filters:
+            return None
+        return reduce(operator.or_, case_filters)
+
+    @classmethod
+    def iter_cases(cls, domain, case_type, db=None, modified_lte=None, include_closed=False, case_filter=None):
         q_expression = Q(domain=domain, type=case_type, deleted=False)
 
         if not include_closed:
@@ -253,6 +280,9 @@ class AutomaticUpdateRule(models.Model):
         if modified_lte:
             q_expression = q_expression & Q(server_modified_on__lte=modified_lte)
 
+        if case_filter is not None:
+            q_expression = q_expression & case_filter
+
         if db:
             return paginate_query(db, CommCareCase, q_expression, load_source='auto_update_rule')
         else:
@@ -369,6 +399,41 @@ class AutomaticUpdateRule(models.Model):
         else:
             return all(results)
 
+    def get_case_filter(self, now):
+        """
+        :returns: a ``Q`` expression that matches every case that this
+            rule's criteria could match, or None if that can't be narrowed
+            down with a query. Criteria are still checked with
+            ``criteria_match()``.
+        """
+        case_filters = [criteria.definition.get_case_filter(now) for criteria in self.memoized_criteria]
+
+        if self.filter_on_server_modified:
+            case_filters.append(Q(server_modified_on__lt=now - timedelta(days=self.server_modified_boundary)))
+
+        if self.criteria_operator == 'ANY':
+            if not case_filters or None in case_filters:
+                return None
+            return reduce(operator.or_, case_filters)
+
+        case_filters = [case_filter for case_filter in case_filters if case_filter is not None]
+        if not case_filters:
+            return None
+        return reduce(operator.and_, case_filters)
+
+    @property
+    def can_run_in_bulk(self):
+        """
+        True if the rule's action can be applied to a batch of cases with
+        one form, which is the case if it only updates or closes the case
+        that matches.
+        """
+        if len(self.memoized_actions) != 1:
+            return False
+
+        definition = self.memoized_actions[0].definition
+        return isinstance(definition, UpdateCaseDefinition) and not definition.updates_related_cases
+
     def _run_method_on_action_definitions(self, case, method):
         aggregated_result = CaseRuleActionResult()
 
@@ -559,6 +624,13 @@ class CaseRuleCriteriaDefinition(models.Model):
     def matches(self, case, now):
         raise NotImplementedError()
 
+    def get_case_filter(self, now):
+        """
+        Returns a Q expression that matches every case that this
+        criteria could match, or None if it can't be expressed as a query.
+        """
+        return None
+
 
 class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
     MATCH_DAYS_LESS_THAN = 'DAYS_BEFORE'
@@ -686,6 +758,24 @@ class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
             self.MATCH_REGEX: self.check_regex,
         }.get(self.match_type)(case, now)
 
+    def get_case_filter(self, now):
+        # Only properties that are looked up in case_json can be filtered
+        # on. The names of other properties refer to related cases or to
+        # fields of CommCareCase.
+        if (
+            '/' in self.property_name
+            or self.property_name == '_id'
+            or self.property_name in {field.name for field in CommCareCase._meta.fields}
+        ):
+            return None
+
+        if self.match_type == self.MATCH_EQUAL and self.property_value is not None:
+            return Q(case_json__contains={self.property_name: self.property_value})
+        elif self.match_type == self.MATCH_HAS_VALUE:
+            return Q(case_json__has_key=self.property_name)
+
+        return None
+
     def to_dict(self):
         return {
             'property_name': self.property_name,
@@ -914,6 +1004,11 @@ class CaseRuleActionDefinition(models.Model):
         return CaseRuleActionResult()
 
 
+def _is_default_method(definition, method_name):
+    method = getattr(type(definition), method_name)
+    return method is getattr(CaseRuleActionDefinition, method_name)
+
+
 class BaseUpdateCaseDefinition(CaseRuleActionDefinition):
     class Meta(object):
         abstract = True
@@ -1053,6 +1148,29 @@ class UpdateCaseDefinition(BaseUpdateCaseDefinition):
             num_related_updates=num_related_updates,
         )
 
+    @property
+    def updates_related_cases(self):
+        return any(
+            prop.name.lower().startswith(('parent/', 'host/'))
+            for prop in self.get_properties_to_update()
+        )
+
+    def get_case_change(self, case):
+        """
+        Returns the ``(case_id, case_properties, close)`` change that
+        when_case_matches() would make to ``case``, for bulk_update_cases(),
+        or None if there is nothing to change. Definitions that update
+        related cases can't be applied this way.
+        """
+        if self.updates_related_cases:
+            raise ValueError("Expected a definition that only updates the case itself")
+
+        properties = self.get_case_and_ancestor_updates(case)[case.case_id]
+        if self.close_case or properties:
+            return case.case_id, properties, self.close_case
+
+        return None
+
     def to_dict(self):
         return {
             'properties_to_update': self.properties_to_update,
@@ -1119,6 +1237,42 @@ def find_matching_case_ids_in_es(case, rule, limit=0):
     )
 
 
+def find_matching_case_ids_in_index(case, rule, limit=0):
+    """Like ``find_matching_case_ids_in_es()``, but looks the case's values
+    up in the deduplication index
+    """
+    action = CaseDeduplicationActionDefinition.from_rule(rule)
+    case_ids = CaseDeduplicationPropertyValue.find_duplicate_case_ids(case, action)
+    matching_ids = [case.case_id] if case.case_id in case_ids else []
+    other_ids = [case_id for case_id in case_ids if case_id != case.case_id]
+
+    # A case's index entries are updated when the properties that the rule
+    # matches on change, which isn't always when the case stops matching
+    # the rule's criteria, so check that the other cases still match
+    now = datetime.utcnow()
+    stale_ids = []
+    for other_case in CommCareCase.objects.iter_cases(other_ids, case.domain):
+        if limit and len(matching_ids) >= limit:
+            break
+        if (
+            rule.criteria_match(other_case, now)
+            and CaseDeduplicationPropertyValue.get_value_hashes(other_case, action)
+        ):
+            matching_ids.append(other_case.case_id)
+        else:
+            stale_ids.append(other_case.case_id)
+
+    if stale_ids:
+        CaseDeduplicationPropertyValue.remove_for_case_ids(stale_ids, action=action)
+    return matching_ids
+
+
+def find_matching_case_ids(case, rule, limit=0):
+    if toggles.CASE_DEDUPE_INDEX.enabled(rule.domain):
+        return find_matching_case_ids_in_index(case, rule, limit=limit)
+    return find_matching_case_ids_in_es(case, rule, limit=limit)
+
+
 class CaseDeduplicationActionDefinition(BaseUpdateCaseDefinition):
     match_type = models.CharField(choices=CaseDeduplicationMatchTypeChoices.CHOICES, max_length=5)
     case_properties = ArrayField(models.TextField())
@@ -1159,11 +1313,20 @@ class CaseDeduplicationActionDefinition(BaseUpdateCaseDefinition):
     def when_case_matches(self, case, rule):
         return self._handle_case_duplicate(case, rule)
 
+    def when_case_does_not_match(self, case, rule):
+        if toggles.CASE_DEDUPE_INDEX.enabled(rule.domain):
+            CaseDeduplicationPropertyValue.remove_for_case_ids([case.case_id], action=self)
+        return CaseRuleActionResult()
+
     def _handle_case_duplicate(self, case, rule):
         if is_copied_case(case):
             return CaseRuleActionResult()
 
-        if not case_matching_rule_criteria_exists_in_es(case, rule):
+        if toggles.CASE_DEDUPE_INDEX.enabled(rule.domain):
+            # The index is updated as the case is processed, so unlike
+            # Elasticsearch it can't be behind the case
+            CaseDeduplicationPropertyValue.update_for_case(case, self)
+        elif not case_matching_rule_criteria_exists_in_es(case, rule):
             ALLOWED_ES_DELAY = timedelta(hours=1)
             if datetime.utcnow() - case.server_modified_on > ALLOWED_ES_DELAY:
                 # If old data was found that is not present in ElasticSearch, the data is unreliable.
@@ -1255,7 +1418,7 @@ class CaseDeduplicationActionDefinition(BaseUpdateCaseDefinition):
         # Pull 3 matching cases to answer whether this is a new duplicate, an existing duplicate,
         # or not a duplicate. When this is an existing duplicate, we'd expect to see at least
         # 2 other matching records plus the current case, hence needing to fetch at least 3 records
-        matching_ids = find_matching_case_ids_in_es(case, rule, limit=3)
+        matching_ids = find_matching_case_ids(case, rule, limit=3)
 
         other_duplicate_ids = {case_id for case_id in matching_ids if case_id != case.case_id}
         if not other_duplicate_ids:
@@ -1390,6 +1553,121 @@ class CaseDuplicateNew(models.Model):
         return hash_arguments(*current_values)
 
 
+class CaseDeduplicationPropertyValue(models.Model):
+    """An index of the values of the case properties that a
+    CaseDeduplicationActionDefinition matches cases on, so that finding
+    the duplicates of a case doesn't need a query to Elasticsearch.
+
+    A case that matches the action's rule has a row for each of the
+    properties that it has a value for. Values are matched exactly, as
+    they are by ``find_duplicate_case_ids()``, so only their hashes are
+    stored.
+    """
+    id = models.BigAutoField(primary_key=True)
+    action = models.ForeignKey("CaseDeduplicationActionDefinition", on_delete=models.CASCADE)
+    case_id = models.CharField(max_length=126)
+    property_name = models.CharField(max_length=255)
+    value_hash = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['action', 'property_name', 'value_hash']),
+            models.Index(fields=['action', 'case_id']),
+        ]
+
+    def __str__(self):
+        return (
+            f"CaseDeduplicationPropertyValue(case_id={self.case_id}, action_id={self.action_id}, "
+            f"property_name={self.property_name})"
+        )
+
+    @classmethod
+    def get_value_hashes(cls, case, action):
+        """Returns a dict of the hashes of the case's values, keyed by
+        property name, or an empty dict if the case shouldn't be indexed
+        """
+        if case.is_deleted or is_copied_case(case) or (case.closed and not action.include_closed):
+            return {}
+        values = get_case_property_values(case, action.case_properties)
+        return {
+            property_name: hash_arguments(value)
+            for property_name, value in values.items()
+        }
+
+    @classmethod
+    def update_for_case(cls, case, action):
+        value_hashes = cls.get_value_hashes(case, action)
+        current_value_hashes = dict(
+            cls.objects.filter(action=action, case_id=case.case_id).values_list('property_name', 'value_hash')
+        )
+        if value_hashes == current_value_hashes:
+            return
+
+        with transaction.atomic():
+            cls.objects.filter(action=action, case_id=case.case_id).delete()
+            cls.objects.bulk_create(cls._get_rows(case, action, value_hashes))
+
+    @classmethod
+    def bulk_update_for_cases(cls, cases, action):
+        rows = []
+        for case in cases:
+            rows.extend(cls._get_rows(case, action, cls.get_value_hashes(case, action)))
+
+        with transaction.atomic():
+            cls.objects.filter(action=action, case_id__in=[case.case_id for case in cases]).delete()
+            cls.objects.bulk_create(rows)
+
+    @classmethod
+    def _get_rows(cls, case, action, value_hashes):
+        return [
+            cls(action=action, case_id=case.case_id, property_name=property_name, value_hash=value_hash)
+            for property_name, value_hash in value_hashes.items()
+        ]
+
+    @classmethod
+    def find_duplicate_case_ids(cls, case, action, limit=DUPLICATE_LIMIT):
+        """Returns the ids of the indexed cases that have the same values as
+        ``case``, including ``case`` itself if it is indexed
+        """
+        value_hashes = cls.get_value_hashes(case, action)
+        if not value_hashes:
+            # Without any values, every case would match
+            return [case.case_id]
+
+        matches_value = reduce(operator.or_, [
+            Q(property_name=property_name, value_hash=value_hash)
+            for property_name, value_hash in value_hashes.items()
+        ])
+        query = cls.objects.filter(matches_value, action=action).values('case_id')
+        if action.match_type == CaseDeduplicationMatchTypeChoices.ALL:
+            query = query.annotate(num_values=Count('property_name')).filter(num_values=len(value_hashes))
+        else:
+            query = query.distinct()
+        return list(query.values_list('case_id', flat=True)[:limit])
+
+    @classmethod
+    def get_case_ids_with_shared_values(cls, action):
+        """Returns the ids of the indexed cases that have the same value as
+        another case for at least one property
+        """
+        shared_values = cls.objects.filter(
+            action=OuterRef('action'),
+            property_name=OuterRef('property_name'),
+            value_hash=OuterRef('value_hash'),
+        ).exclude(case_id=OuterRef('case_id'))
+        return list(
+            cls.objects.filter(Exists(shared_values), action=action)
+            .values_list('case_id', flat=True).distinct()
+        )
+
+    @classmethod
+    def remove_for_case_ids(cls, case_ids, action=None):
+        query = cls.objects.filter(case_id__in=case_ids)
+        if action is not None:
+            query = query.filter(action=action)
+        query.delete()
+
+
 def hash_arguments(*args):
     # mimic file-like object
     class Updater:
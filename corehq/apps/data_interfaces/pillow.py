@@ -26,6 +26,7 @@ class CaseDeduplicationProcessor(PillowProcessor):
     - Postgres (marking cases as duplicate)
     - Cases (through case updates)
     """
+    thread_safe = True
 
     def process_change(self, change):
         domain = change.metadata.domain
@@ -23,7 +23,10 @@ from corehq.apps.case_importer.do_import import SubmitCaseBlockHandler, RowAndCa
 from corehq.motech.repeaters.const import State
 from corehq.motech.repeaters.models import RepeatRecord
 from corehq.sql_db.util import get_db_aliases_for_partitioned_query
-from corehq.toggles import DISABLE_CASE_UPDATE_RULE_SCHEDULED_TASK
+from corehq.toggles import (
+    BULK_CASE_UPDATE_RULES,
+    DISABLE_CASE_UPDATE_RULE_SCHEDULED_TASK,
+)
 from corehq.util.celery_utils import no_result_task
 from corehq.util.decorators import serial_task
 from corehq.util.log import send_HTML_email
@@ -32,12 +35,14 @@ from .deduplication import backfill_deduplicate_rule, reset_deduplicate_rule
 from .interfaces import FormManagementMode
 from .models import (
     AutomaticUpdateRule,
+    CaseDeduplicationPropertyValue,
     CaseDuplicate,
     CaseDuplicateNew,
     CaseRuleSubmission,
     DomainCaseRuleRun,
 )
 from .utils import (
+    CASE_RULE_BATCH_SIZE,
     add_cases_to_case_group,
     archive_or_restore_forms,
     iter_cases_and_run_rules,
@@ -85,6 +90,7 @@ def delete_duplicates_for_cases(case_ids):
     CaseDuplicate.remove_duplicates_for_case_ids(case_ids)
 
     CaseDuplicateNew.remove_duplicates_for_case_ids(case_ids)
+    CaseDeduplicationPropertyValue.remove_for_case_ids(case_ids)
 
 
 @task(serializer='pickle', ignore_result=True)
@@ -168,8 +174,15 @@ def run_case_update_rules_for_domain_and_db(domain, now, run_id, case_type, db=N
     )
 
     modified_before = AutomaticUpdateRule.get_boundary_date(rules, now)
-    iterator = AutomaticUpdateRule.iter_cases(domain, case_type, db=db, modified_lte=modified_before)
-    run = iter_cases_and_run_rules(domain, iterator, rules, now, run_id, case_type, db)
+    if BULK_CASE_UPDATE_RULES.enabled(domain):
+        case_filter = AutomaticUpdateRule.get_rules_case_filter(rules, now)
+        batch_size = CASE_RULE_BATCH_SIZE
+    else:
+        case_filter = None
+        batch_size = None
+    iterator = AutomaticUpdateRule.iter_cases(domain, case_type, db=db, modified_lte=modified_before,
+                                              case_filter=case_filter)
+    run = iter_cases_and_run_rules(domain, iterator, rules, now, run_id, case_type, db, batch_size=batch_size)
 
     if run.status == DomainCaseRuleRun.STATUS_FINISHED:
         for rule in rules:
@@ -23,6 +23,7 @@ from corehq.apps.data_interfaces.models import (
     UpdateCaseDefinition,
 )
 from corehq.apps.data_interfaces.tasks import run_case_update_rules_for_domain
+from corehq.apps.data_interfaces.utils import run_rules_for_cases
 from corehq.apps.domain.models import Domain
 from corehq.form_processor.models import CommCareCase, XFormInstance
 from corehq.form_processor.signals import sql_case_post_save
@@ -1318,6 +1319,55 @@ class CaseRuleEndToEndTests(BaseCaseRuleTest):
             self.assertLastRuleRun(cases_checked=3, num_updates=2, num_errors=1)
 
 
+class BulkCaseRuleRunTests(BaseCaseRuleTest):
+
+    def _create_rule(self):
+        rule = _create_empty_rule(self.domain)
+        rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name='do_update',
+            property_value='Y',
+            match_type=MatchPropertyDefinition.MATCH_EQUAL,
+        )
+
+        _, definition = rule.add_action(UpdateCaseDefinition, close_case=False)
+        definition.set_properties_to_update([
+            UpdateCaseDefinition.PropertyDefinition(
+                name='result',
+                value_type=UpdateCaseDefinition.VALUE_TYPE_EXACT,
+                value='abc',
+            ),
+        ])
+        definition.save()
+        return rule
+
+    def test_run_rules_for_cases(self):
+        rule = self._create_rule()
+        self.assertTrue(rule.can_run_in_bulk)
+
+        with _with_case(self.domain, 'person', datetime.utcnow(), update={'do_update': 'Y'}) as case1, \
+                _with_case(self.domain, 'person', datetime.utcnow(), update={'do_update': 'Y'}) as case2, \
+                _with_case(self.domain, 'person', datetime.utcnow()) as case3:
+            result = run_rules_for_cases([case1, case2, case3], [rule], datetime.utcnow())
+            self.assertEqual(result, CaseRuleActionResult(num_updates=2))
+            # both updates were submitted in one form
+            self.assertEqual(CaseRuleSubmission.objects.filter(domain=self.domain).count(), 1)
+
+            for case, expected in [(case1, 'abc'), (case2, 'abc'), (case3, None)]:
+                case = CommCareCase.objects.get_case(case.case_id, self.domain)
+                self.assertEqual(case.get_case_property('result'), expected)
+
+    def test_case_filter(self):
+        rule = self._create_rule()
+        case_filter = AutomaticUpdateRule.get_rules_case_filter([rule], datetime.utcnow())
+
+        with _with_case(self.domain, 'person', datetime.utcnow(), update={'do_update': 'Y'}) as case1, \
+                _with_case(self.domain, 'person', datetime.utcnow(), update={'do_update': 'N'}), \
+                _with_case(self.domain, 'person', datetime.utcnow()):
+            cases = AutomaticUpdateRule.iter_cases(self.domain, 'person', case_filter=case_filter)
+            self.assertEqual([case.case_id for case in cases], [case1.case_id])
+
+
 class TestParentCaseReferences(BaseCaseRuleTest):
 
     def test_closed_parent_criteria(self):
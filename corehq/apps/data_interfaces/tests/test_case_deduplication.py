@@ -20,10 +20,12 @@ from corehq.apps.data_interfaces.models import (
     AutomaticUpdateRule,
     CaseDeduplicationActionDefinition,
     CaseDeduplicationMatchTypeChoices,
+    CaseDeduplicationPropertyValue,
     CaseDuplicateNew,
     CaseRuleCriteria,
     LocationFilterDefinition,
     MatchPropertyDefinition,
+    find_matching_case_ids_in_index,
 )
 from corehq.apps.data_interfaces.utils import run_rules_for_case
 from corehq.apps.domain.shortcuts import create_domain
@@ -1191,6 +1193,126 @@ class TestDeduplicationRuleRuns(TestCase):
         self.assertEqual(refreshed_fake_cases[1].get_case_property('age'), '14')
 
 
+@flag_enabled('CASE_DEDUPE_INDEX')
+class CaseDeduplicationIndexTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.domain = 'case-dedupe-index-test'
+        self.case_type = 'adult'
+
+    def _create_rule(self, match_type=CaseDeduplicationMatchTypeChoices.ALL, include_closed=False):
+        rule = AutomaticUpdateRule.objects.create(
+            domain=self.domain,
+            name='test',
+            case_type=self.case_type,
+            active=True,
+            deleted=False,
+            filter_on_server_modified=False,
+            server_modified_boundary=None,
+            workflow=AutomaticUpdateRule.WORKFLOW_DEDUPLICATE,
+        )
+        _, action = rule.add_action(
+            CaseDeduplicationActionDefinition,
+            match_type=match_type,
+            case_properties=['name', 'age'],
+            include_closed=include_closed
+        )
+        return rule, action
+
+    def _create_case(self, name='George Simon Esq.', age=12, closed=False):
+        return create_case(
+            domain=self.domain, name=name, case_type=self.case_type,
+            case_json={'age': str(age)}, closed=closed, save=True)
+
+    def _run_rule(self, rule, cases):
+        for case in cases:
+            rule.run_rule(case, datetime.utcnow())
+
+    def test_finds_cases_matching_all_properties(self):
+        rule, action = self._create_rule()
+        case1 = self._create_case()
+        case2 = self._create_case()
+        case3 = self._create_case(age=13)
+        self._run_rule(rule, [case1, case2, case3])
+
+        self.assertCountEqual(find_matching_case_ids_in_index(case1, rule), [case1.case_id, case2.case_id])
+        self.assertEqual(find_matching_case_ids_in_index(case3, rule), [case3.case_id])
+
+    def test_finds_cases_matching_any_property(self):
+        rule, action = self._create_rule(match_type=CaseDeduplicationMatchTypeChoices.ANY)
+        case1 = self._create_case()
+        case2 = self._create_case(age=13)
+        case3 = self._create_case(name='Someone Else', age=14)
+        self._run_rule(rule, [case1, case2, case3])
+
+        self.assertCountEqual(find_matching_case_ids_in_index(case1, rule), [case1.case_id, case2.case_id])
+        self.assertEqual(find_matching_case_ids_in_index(case3, rule), [case3.case_id])
+
+    def test_limit(self):
+        rule, action = self._create_rule()
+        cases = [self._create_case() for _ in range(4)]
+        self._run_rule(rule, cases)
+
+        self.assertEqual(len(find_matching_case_ids_in_index(cases[0], rule, limit=3)), 3)
+
+    def test_records_duplicates(self):
+        rule, action = self._create_rule()
+        case1 = self._create_case()
+        case2 = self._create_case()
+        self._run_rule(rule, [case1, case2])
+
+        self.assertCountEqual(
+            CaseDuplicateNew.objects.filter(action=action).values_list('case_id', flat=True),
+            [case1.case_id, case2.case_id]
+        )
+
+    def test_closed_cases_not_indexed(self):
+        rule, action = self._create_rule()
+        case1 = self._create_case()
+        case2 = self._create_case(closed=True)
+        self._run_rule(rule, [case1, case2])
+
+        self.assertEqual(
+            list(CaseDeduplicationPropertyValue.objects.filter(action=action).values_list('case_id', flat=True)),
+            [case1.case_id, case1.case_id]
+        )
+        self.assertEqual(find_matching_case_ids_in_index(case1, rule), [case1.case_id])
+
+    def test_updated_values(self):
+        rule, action = self._create_rule()
+        case1 = self._create_case()
+        case2 = self._create_case()
+        self._run_rule(rule, [case1, case2])
+
+        case2.case_json['age'] = '13'
+        self._run_rule(rule, [case2])
+
+        self.assertEqual(find_matching_case_ids_in_index(case1, rule), [case1.case_id])
+
+    def test_case_no_longer_matching_rule_is_removed(self):
+        rule, action = self._create_rule()
+        case1 = self._create_case()
+        case2 = self._create_case()
+        self._run_rule(rule, [case1, case2])
+
+        case2.type = 'child'
+        self._run_rule(rule, [case2])
+
+        self.assertFalse(CaseDeduplicationPropertyValue.objects.filter(case_id=case2.case_id).exists())
+
+    def test_get_case_ids_with_shared_values(self):
+        rule, action = self._create_rule()
+        case1 = self._create_case()
+        case2 = self._create_case(age=13)
+        case3 = self._create_case(name='Someone Else', age=14)
+        CaseDeduplicationPropertyValue.bulk_update_for_cases([case1, case2, case3], action)
+
+        self.assertCountEqual(
+            CaseDeduplicationPropertyValue.get_case_ids_with_shared_values(action),
+            [case1.case_id, case2.case_id]
+        )
+
+
 @flag_enabled('CASE_DEDUPE_UPDATES')
 @es_test(requires=[case_search_adapter], setup_class=True)
 class DeduplicationBackfillTest(TestCase):
@@ -1258,3 +1380,15 @@ class DeduplicationBackfillTest(TestCase):
         duplicate_case_ids = CaseDuplicateNew.objects.filter(action=self.action).values_list('case_id', flat=True)
         self.assertEqual(len(duplicate_case_ids), 2)
         self.assertNotIn(self.case4.case_id, duplicate_case_ids)
+
+    @flag_enabled('CASE_DEDUPE_INDEX')
+    def test_backfill_with_index(self):
+        self._set_up_rule(include_closed=True)
+
+        backfill_deduplicate_rule(self.domain, self.rule)
+
+        duplicate_case_ids = CaseDuplicateNew.objects.filter(action=self.action).values_list('case_id', flat=True)
+        self.assertCountEqual(duplicate_case_ids, [self.case1.case_id, self.case2.case_id, self.case3.case_id])
+        indexed_case_ids = CaseDeduplicationPropertyValue.objects.filter(
+            action=self.action).values_list('case_id', flat=True).distinct()
+        self.assertNotIn(self.case4.case_id, indexed_case_ids)
@@ -1,6 +1,8 @@
 from datetime import date, datetime
+from functools import partial
 from unittest.mock import MagicMock, patch
 
+from django.db.models import Q
 from django.test import SimpleTestCase, TestCase
 
 from corehq.apps.data_interfaces.models import (
@@ -158,6 +160,102 @@ class MatchPropertyDefinitionTests(SimpleTestCase):
         self.assertTrue(definition.matches(case, datetime(year=2024, month=10, day=1)))
 
 
+class MatchPropertyDefinitionCaseFilterTests(SimpleTestCase):
+    def test_equal(self):
+        definition = MatchPropertyDefinition(
+            property_name='status',
+            property_value='active',
+            match_type=MatchPropertyDefinition.MATCH_EQUAL,
+        )
+        self.assertEqual(
+            definition.get_case_filter(datetime.utcnow()),
+            Q(case_json__contains={'status': 'active'}),
+        )
+
+    def test_has_value(self):
+        definition = MatchPropertyDefinition(
+            property_name='status',
+            match_type=MatchPropertyDefinition.MATCH_HAS_VALUE,
+        )
+        self.assertEqual(definition.get_case_filter(datetime.utcnow()), Q(case_json__has_key='status'))
+
+    def test_not_filtered(self):
+        for property_name, match_type in [
+            ('status', MatchPropertyDefinition.MATCH_NOT_EQUAL),
+            ('status', MatchPropertyDefinition.MATCH_DAYS_GREATER_THAN),
+            ('parent/status', MatchPropertyDefinition.MATCH_EQUAL),
+            ('owner_id', MatchPropertyDefinition.MATCH_EQUAL),
+        ]:
+            definition = MatchPropertyDefinition(
+                property_name=property_name,
+                property_value='1',
+                match_type=match_type,
+            )
+            self.assertIsNone(definition.get_case_filter(datetime.utcnow()), property_name)
+
+
+class AutomaticUpdateRuleCaseFilterTests(SimpleTestCase):
+    now = datetime(2023, 7, 1)
+
+    def _get_rule(self, criteria_operator='ALL', filter_on_server_modified=False, criteria=()):
+        rule = MagicMock(
+            criteria_operator=criteria_operator,
+            filter_on_server_modified=filter_on_server_modified,
+            server_modified_boundary=30,
+            memoized_criteria=[MagicMock(definition=definition) for definition in criteria],
+            memoized_actions=[MagicMock(definition=UpdateCaseDefinition())],
+        )
+        rule.get_case_filter = partial(AutomaticUpdateRule.get_case_filter, rule)
+        return rule
+
+    def _get_criteria(self, property_name, match_type=MatchPropertyDefinition.MATCH_EQUAL):
+        return MatchPropertyDefinition(property_name=property_name, property_value='1', match_type=match_type)
+
+    def test_all(self):
+        rule = self._get_rule(criteria=[self._get_criteria('a'), ClosedParentDefinition()])
+        self.assertEqual(rule.get_case_filter(self.now), Q(case_json__contains={'a': '1'}))
+
+    def test_server_modified(self):
+        rule = self._get_rule(filter_on_server_modified=True, criteria=[self._get_criteria('a')])
+        self.assertEqual(
+            rule.get_case_filter(self.now),
+            Q(case_json__contains={'a': '1'}) & Q(server_modified_on__lt=datetime(2023, 6, 1)),
+        )
+
+    def test_any(self):
+        rule = self._get_rule('ANY', criteria=[self._get_criteria('a'), self._get_criteria('b')])
+        self.assertEqual(
+            rule.get_case_filter(self.now),
+            Q(case_json__contains={'a': '1'}) | Q(case_json__contains={'b': '1'}),
+        )
+
+    def test_any_with_criteria_that_cant_be_filtered(self):
+        rule = self._get_rule('ANY', criteria=[self._get_criteria('a'), ClosedParentDefinition()])
+        self.assertIsNone(rule.get_case_filter(self.now))
+
+    def test_rules(self):
+        rules = [
+            self._get_rule(criteria=[self._get_criteria('a')]),
+            self._get_rule(criteria=[self._get_criteria('b')]),
+        ]
+        self.assertEqual(
+            AutomaticUpdateRule.get_rules_case_filter(rules, self.now),
+            Q(case_json__contains={'a': '1'}) | Q(case_json__contains={'b': '1'}),
+        )
+
+    def test_rules_with_rule_that_cant_be_filtered(self):
+        rules = [
+            self._get_rule(criteria=[self._get_criteria('a')]),
+            self._get_rule(criteria=[ClosedParentDefinition()]),
+        ]
+        self.assertIsNone(AutomaticUpdateRule.get_rules_case_filter(rules, self.now))
+
+    def test_rules_with_action_when_case_does_not_match(self):
+        rule = self._get_rule(criteria=[self._get_criteria('a')])
+        rule.memoized_actions = [MagicMock(definition=CreateScheduleInstanceActionDefinition())]
+        self.assertIsNone(AutomaticUpdateRule.get_rules_case_filter([rule], self.now))
+
+
 class CustomMatchDefinitionTests(SimpleTestCase):
     def test_to_dict_includes_all_fields(self):
         definition = CustomMatchDefinition(name='test_name')
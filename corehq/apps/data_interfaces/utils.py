@@ -6,6 +6,7 @@ from django.utils.translation import gettext as _
 
 from couchdbkit import ResourceNotFound
 
+from dimagi.utils.chunked import chunked
 from dimagi.utils.logging import notify_error, notify_exception
 from soil import DownloadBase
 
@@ -14,6 +15,9 @@ from corehq.apps.domain.models import Domain
 from corehq.apps.domain_migration_flags.api import any_migrations_in_progress
 from corehq.form_processor.models import CommCareCase, XFormInstance
 
+# The number of cases that rules are run on together when rules are run in bulk
+CASE_RULE_BATCH_SIZE = 100
+
 
 def add_cases_to_case_group(domain, case_group_id, uploaded_data, progress_tracker):
     from corehq.apps.hqcase.utils import get_case_by_identifier
@@ -191,7 +195,12 @@ def _get_sql_repeat_record(domain, record_id):
         return None
 
 
-def iter_cases_and_run_rules(domain, case_iterator, rules, now, run_id, case_type, db=None, progress_helper=None):
+def iter_cases_and_run_rules(domain, case_iterator, rules, now, run_id, case_type, db=None, progress_helper=None,
+                             batch_size=None):
+    """
+    :param batch_size: if given, rules are run on batches of this many cases
+        with run_rules_for_cases(), otherwise they are run on each case
+    """
     from corehq.apps.data_interfaces.models import (
         CaseRuleActionResult,
         DomainCaseRuleRun,
@@ -206,7 +215,7 @@ def iter_cases_and_run_rules(domain, case_iterator, rules, now, run_id, case_typ
     cases_checked = 0
     last_migration_check_time = None
 
-    for case in case_iterator:
+    for cases in chunked(case_iterator, batch_size or 1, list):
         migration_in_progress, last_migration_check_time = _check_data_migration_in_progress(
             domain, last_migration_check_time
         )
@@ -222,10 +231,14 @@ def iter_cases_and_run_rules(domain, case_iterator, rules, now, run_id, case_typ
                 run_id, cases_checked, case_update_result, db=db, halted=True
             )
 
-        case_update_result.add_result(run_rules_for_case(case, rules, now))
+        if batch_size:
+            case_update_result.add_result(run_rules_for_cases(cases, rules, now))
+        else:
+            case_update_result.add_result(run_rules_for_case(cases[0], rules, now))
         if progress_helper is not None:
-            progress_helper.increment_current_case_count()
-        cases_checked += 1
+            for __ in cases:
+                progress_helper.increment_current_case_count()
+        cases_checked += len(cases)
     return DomainCaseRuleRun.done(run_id, cases_checked, case_update_result, db=db)
 
 
@@ -249,18 +262,117 @@ def run_rules_for_case(case, rules, now):
             ):
                 case = CommCareCase.objects.get_case(case.case_id, case.domain)
 
-        try:
-            last_result = rule.run_rule(case, now)
-        except Exception:
-            last_result = CaseRuleActionResult(num_errors=1)
-            notify_exception(None, "Error applying case update rule", {
-                'domain': case.domain,
-                'rule_pk': rule.pk,
-                'case_id': case.case_id,
-            })
-
+        last_result = _run_rule(rule, case, now)
         aggregated_result.add_result(last_result)
         if last_result.num_closes > 0:
             break
 
     return aggregated_result
+
+
+def run_rules_for_cases(cases, rules, now):
+    """
+    Runs ``rules`` on a batch of cases of the same domain, with the same
+    results as calling run_rules_for_case() for each case. Each rule is run
+    on the whole batch before the next one, so that rules that only update
+    or close the case that matches can be applied with one form per batch.
+    """
+    from corehq.apps.data_interfaces.models import CaseRuleActionResult
+    aggregated_result = CaseRuleActionResult()
+    for rule in rules:
+        if not cases:
+            break
+
+        if rule.can_run_in_bulk:
+            results = _run_rule_in_bulk(rule, cases, now)
+        else:
+            results = [_run_rule(rule, case, now) for case in cases]
+
+        remaining_cases = []
+        updated_case_ids = []
+        for case, result in zip(cases, results):
+            aggregated_result.add_result(result)
+            if result.num_closes > 0:
+                continue
+
+            remaining_cases.append(case)
+            if result.num_updates > 0 or result.num_related_updates > 0 or result.num_related_closes > 0:
+                updated_case_ids.append(case.case_id)
+
+        if updated_case_ids:
+            updated_cases = {
+                case.case_id: case
+                for case in CommCareCase.objects.get_cases(updated_case_ids, rule.domain)
+            }
+            remaining_cases = [updated_cases.get(case.case_id, case) for case in remaining_cases]
+        cases = remaining_cases
+
+    return aggregated_result
+
+
+def _run_rule(rule, case, now):
+    from corehq.apps.data_interfaces.models import CaseRuleActionResult
+    try:
+        return rule.run_rule(case, now)
+    except Exception:
+        _notify_rule_error(rule, case)
+        return CaseRuleActionResult(num_errors=1)
+
+
+def _run_rule_in_bulk(rule, cases, now):
+    """
+    Runs a rule whose action is an UpdateCaseDefinition that only updates
+    the case itself on ``cases``, submitting the changes to all of them
+    together.
+
+    :returns: a list of the CaseRuleActionResult of each case
+    """
+    from corehq.apps.data_interfaces.models import CaseRuleActionResult
+    from corehq.apps.hqcase.utils import AUTO_UPDATE_XMLNS, bulk_update_cases
+    from corehq.apps.users.util import SYSTEM_USER_ID
+
+    definition = rule.memoized_actions[0].definition
+    results = []
+    changes = []
+    for index, case in enumerate(cases):
+        try:
+            # UpdateCaseDefinition does nothing to cases that don't match
+            change = definition.get_case_change(case) if rule.criteria_match(case, now) else None
+        except Exception:
+            _notify_rule_error(rule, case)
+            results.append(CaseRuleActionResult(num_errors=1))
+            continue
+
+        if change is None:
+            results.append(CaseRuleActionResult())
+        else:
+            case_id, properties, close = change
+            changes.append((index, change))
+            results.append(CaseRuleActionResult(num_updates=int(bool(properties)), num_closes=int(close)))
+
+    for batch in chunked(changes, CASE_RULE_BATCH_SIZE, list):
+        try:
+            result = bulk_update_cases(
+                rule.domain,
+                [change for index, change in batch],
+                device_id=rule.id,
+                xmlns=AUTO_UPDATE_XMLNS,
+                user_id=SYSTEM_USER_ID,
+                form_name=rule.name,
+                max_wait=15,
+            )
+            rule.log_submission(result[0].form_id)
+        except Exception:
+            for index, change in batch:
+                _notify_rule_error(rule, cases[index])
+                results[index] = CaseRuleActionResult(num_errors=1)
+
+    return results
+
+
+def _notify_rule_error(rule, case):
+    notify_exception(None, "Error applying case update rule", {
+        'domain': case.domain,
+        'rule_pk': rule.pk,
+        'case_id': case.case_id,
+    })
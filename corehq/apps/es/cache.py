@@ -0,0 +1,126 @@
+"""
+Caching ESQuery results
+=======================
+
+Reports and dashboards often run the same aggregation many times within a
+few seconds. A query can opt in to caching its results for a domain:
+
+.. code-block:: python
+
+    query = FormES().domain(domain).submitted(gte=startdate).cache_results(domain)
+    query.run()
+
+Results are cached by index, domain and the query's ``raw_query``. Each
+index and domain has a generation counter that is part of the cache key, and
+the Elasticsearch pillows bump it whenever they write documents for that
+domain, so cached results are used until the domain's data in the index
+changes, or the cache entry times out. The generation is only bumped for
+domains that have one, i.e. that have had results cached, so writes to other
+domains don't touch the cache beyond checking that.
+
+Documents aren't searchable until the index is refreshed, so results aren't
+cached for ``ES_QUERY_CACHE_REFRESH_DELAY`` seconds after documents are
+written for the domain, or after its generation is first set: they could be
+cached under the new generation without the documents.
+
+Hits, misses and the size of the results that are cached are reported to
+``commcare.es.query_cache``.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import caches
+
+from corehq.apps.es.const import ES_QUERY_CACHE_REFRESH_DELAY
+from corehq.util.metrics import metrics_counter
+
+
+def cached_search(adapter, raw_query, domain, timeout):
+    """Return the result of ``adapter.search(raw_query)``, from the cache if
+    the domain's data in the index hasn't changed since it was cached
+    """
+    cache = _get_cache()
+    index = adapter.canonical_name
+    key = _get_result_key(index, domain, raw_query)
+    serialized = cache.get(key)
+    tags = {'index': index}
+    if serialized is not None:
+        metrics_counter('commcare.es.query_cache', tags={**tags, 'result': 'hit'})
+        return json.loads(serialized)
+
+    metrics_counter('commcare.es.query_cache', tags={**tags, 'result': 'miss'})
+    recently_written = cache.get(_get_written_key(index, domain)) is not None
+    result = adapter.search(raw_query)
+    if recently_written:
+        return result
+    serialized = json.dumps(result)
+    cache.set(key, serialized, timeout=timeout)
+    metrics_counter('commcare.es.query_cache.bytes', len(serialized), tags=tags)
+    return result
+
+
+def invalidate_cached_results(index, domains):
+    """Bump the generations of ``domains`` in ``index`` so results cached
+    for them are no longer used
+
+    :param index: canonical name of the index
+    """
+    cache = _get_cache()
+    for domain in domains:
+        key = _get_generation_key(index, domain)
+        if cache.get(key) is None:
+            # there are no results to invalidate
+            continue
+        # set before the generation is bumped, so results without the
+        # documents aren't cached under the new generation
+        _set_written(cache, index, domain)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # the generation was evicted, so there are no results to invalidate
+            pass
+
+
+def clear_cached_results():
+    """Delete all cached results and generations, e.g. when test indexes
+    are recreated without the pillows
+    """
+    _get_cache().delete_pattern('es-query-cache*')
+
+
+def _get_result_key(index, domain, raw_query):
+    query_hash = hashlib.md5(json.dumps(raw_query, sort_keys=True).encode('utf-8')).hexdigest()
+    return 'es-query-cache:{}:{}:{}:{}'.format(
+        index, domain, _get_generation(index, domain), query_hash)
+
+
+def _get_generation(index, domain):
+    cache = _get_cache()
+    key = _get_generation_key(index, domain)
+    generation = cache.get(key)
+    if generation is None:
+        # start from the time rather than zero so results cached before the
+        # generation was evicted aren't used again
+        if cache.add(key, int(time.time() * 1000), timeout=None):
+            # documents written before the generation was set didn't set
+            # the written marker
+            _set_written(cache, index, domain)
+        generation = cache.get(key)
+    return generation
+
+
+def _get_generation_key(index, domain):
+    return 'es-query-cache-generation:{}:{}'.format(index, domain)
+
+
+def _set_written(cache, index, domain):
+    cache.set(_get_written_key(index, domain), True, timeout=ES_QUERY_CACHE_REFRESH_DELAY)
+
+
+def _get_written_key(index, domain):
+    return 'es-query-cache-written:{}:{}'.format(index, domain)
+
+
+def _get_cache():
+    return caches['redis']
@@ -28,6 +28,7 @@ from corehq.apps.case_search.const import (
     REFERENCED_ID,
     RELEVANCE_SCORE,
     INDEXED_METADATA_BY_KEY,
+    SUBCASE_COUNT_PREFIX,
     VALUE,
 )
 from corehq.apps.es.cases import CaseES, owner
@@ -330,6 +331,13 @@ def case_property_numeric_range(case_property_name, gt=None, gte=None, lt=None,
     )
 
 
+def subcase_count_property(identifier):
+    """The name of the indexed property with the number of subcases of a case
+    that have an index with ``identifier``
+    """
+    return f'{SUBCASE_COUNT_PREFIX}{identifier}'
+
+
 def case_property_date_range(case_property_name, gt=None, gte=None, lt=None, lte=None):
     kwargs = {'gt': gt, 'gte': gte, 'lt': lt, 'lte': lte}
     return _base_property_query(
@@ -418,10 +426,10 @@ def wrap_case_search_hit(hit, include_score=False):
     `corehq.apps.es.case_search.ElasticCaseSearch._from_dict`.
 
     The "case_properties" list of key/value pairs is converted to a dict
-    and assigned to `case_json`. 'Special' case properties are excluded
-    from `case_json`, even if they were present in the original case's
-    dynamic properties, except of the COMMCARE_CASE_COPY_PROPERTY_NAME
-    property.
+    and assigned to `case_json`. 'Special' case properties and subcase
+    counts are excluded from `case_json`, even if they were present in the
+    original case's dynamic properties, except of the
+    COMMCARE_CASE_COPY_PROPERTY_NAME property.
 
     All fields excluding "case_properties" and its contents are assigned
     as attributes on the case object if `CommCareCase` has a field
@@ -443,6 +451,7 @@ def wrap_case_search_hit(hit, include_score=False):
             prop["key"]: prop[_VALUE]
             for prop in data.get(CASE_PROPERTIES_PATH, {})
             if prop["key"] not in INDEXED_METADATA_BY_KEY
+            and not prop["key"].startswith(SUBCASE_COUNT_PREFIX)
         },
         indices=data.get("indices", []),
     )
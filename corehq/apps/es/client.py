@@ -33,6 +33,8 @@ from .const import (
     HQ_CASE_SEARCH_INDEX_CANONICAL_NAME,
     INDEX_CONF_REINDEX,
     INDEX_CONF_STANDARD,
+    POINT_IN_TIME_KEEPALIVE,
+    POINT_IN_TIME_MIN_VERSION,
     SCROLL_KEEPALIVE,
     SCROLL_SIZE,
 )
@@ -768,6 +770,72 @@ class ElasticDocumentAdapter(BaseAdapter):
             if scroll_id:
                 self._es.clear_scroll(body={"scroll_id": [scroll_id]}, ignore=(404,))
 
+    def search_after(self, query, after=None, size=None, keep_alive=POINT_IN_TIME_KEEPALIVE):
+        """Page through a sorted search with ``search_after``, yielding each
+        hit until there are no more.
+
+        Unlike ``scroll()``, no search context is held open between requests
+        unless the cluster supports point in time searches, in which case one
+        is used to give the pages a consistent view of the index. The ``sort``
+        values of a hit can be passed as ``after`` to resume the search after
+        it, e.g. once a worker has been restarted.
+
+        :param query: ``dict`` raw search query. It must be sorted on a
+                      unique field (or end with one as a tiebreaker) for the
+                      results to be complete.
+        :param after: ``list`` sort values of the hit to resume after.
+        :param size: ``int`` number of hits per request (default:
+                     ``SCROLL_SIZE``). Conflicts with ``size`` in the query.
+        :param keep_alive: ``str`` duration to keep the point in time alive
+                           between requests.
+        :yields: ``dict`` hits
+        """
+        if not query.get("sort"):
+            raise ValueError("search_after queries must be sorted")
+        query = query.copy()
+        query.pop("from", None)
+        size_qy = query.get("size")
+        if size_qy is not None and size is not None:
+            raise ValueError(f"ambiguous search_after size (specified in both "
+                             f"query and arguments): query={size_qy}, arg={size}")
+        query["size"] = size or size_qy or SCROLL_SIZE
+        try:
+            pit_id = self._open_point_in_time(keep_alive)
+            try:
+                while True:
+                    if after is not None:
+                        query["search_after"] = after
+                    if pit_id is not None:
+                        query["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+                        result = self._es.search(body=query)
+                        pit_id = result.get("pit_id", pit_id)
+                    else:
+                        result = self._search(query)
+                    self._report_and_fail_on_shard_failures(result, {"index": self.canonical_name})
+                    self._fix_hits_in_result(result)
+                    hits = result["hits"]["hits"]
+                    yield from hits
+                    if len(hits) < query["size"]:
+                        break
+                    after = hits[-1]["sort"]
+            finally:
+                if pit_id is not None:
+                    self._es.transport.perform_request(
+                        "DELETE", "/_pit", body={"id": pit_id}, params={"ignore": 404})
+        except ElasticsearchException as e:
+            raise ESError(e)
+
+    def _open_point_in_time(self, keep_alive):
+        """Open a point in time on the index if the cluster supports them
+
+        :returns: the point in time id, or ``None``
+        """
+        if self.elastic_version < POINT_IN_TIME_MIN_VERSION:
+            return None
+        result = self._es.transport.perform_request(
+            "POST", f"/{self.index_name}/_pit", params={"keep_alive": keep_alive})
+        return result["id"]
+
     def index(self, doc, refresh=False):
         """Index (send) a new document in (to) Elasticsearch
 
@@ -1165,6 +1233,9 @@ class ElasticMultiplexAdapter(BaseAdapter):
     def scroll(self, *args, **kw):
         return self.primary.scroll(*args, **kw)
 
+    def search_after(self, *args, **kw):
+        return self.primary.search_after(*args, **kw)
+
     def search(self, *args, **kw):
         return self.primary.search(*args, **kw)
 
@@ -11,6 +11,20 @@ MAX_CLAUSE_COUNT = 1024
 SCROLL_KEEPALIVE = '5m'
 SCROLL_SIZE = 1000
 
+# seconds to cache the results of queries that opt in with `cache_results`
+ES_QUERY_CACHE_TIMEOUT = 5 * 60
+# seconds after documents are written for a domain that query results for
+# the domain aren't cached, because the index may not have been refreshed
+ES_QUERY_CACHE_REFRESH_DELAY = 10
+
+# hits buffered per slice of a sliced scroll
+SLICED_SCROLL_QUEUE_SIZE = SCROLL_SIZE
+
+# search_after parameters. Point in time searches need Elasticsearch 7.10
+SEARCH_AFTER_TIEBREAKER = 'doc_id'
+POINT_IN_TIME_KEEPALIVE = '5m'
+POINT_IN_TIME_MIN_VERSION = (7, 10)
+
 # index settings
 INDEX_CONF_REINDEX = {
     "index.refresh_interval": "1800s",
@@ -86,8 +86,11 @@ Language
     Add esquery.iter() method
 """
 import json
+import threading
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from queue import Full, Queue
 import textwrap
 
 from memoized import memoized
@@ -95,8 +98,16 @@ from memoized import memoized
 from corehq.util.files import TransientTempfile
 
 from . import aggregations, filters, queries
-from .const import SCROLL_SIZE, SIZE_LIMIT
+from .cache import cached_search
+from .const import (
+    ES_QUERY_CACHE_TIMEOUT,
+    SCROLL_SIZE,
+    SEARCH_AFTER_TIEBREAKER,
+    SIZE_LIMIT,
+    SLICED_SCROLL_QUEUE_SIZE,
+)
 from .exceptions import ESError
+from .index.settings import DEFAULT_SHARDS, IndexTuningKey, render_index_tuning_settings
 from .transient_util import doc_adapter_from_cname
 from .utils import flatten_field_dict, values_list
 
@@ -132,6 +143,8 @@ class ESQuery(object):
     _size = None
     _aggregations = None
     _source = None
+    _cache_domain = None
+    _cache_timeout = None
     default_filters = {
         "match_all": filters.match_all()
     }
@@ -206,7 +219,22 @@ class ESQuery(object):
 
     def run(self):
         """Actually run the query.  Returns an ESQuerySet object."""
-        return ESQuerySet(self.adapter.search(self.raw_query), self.clone())
+        if self._cache_domain is not None:
+            raw = cached_search(self.adapter, self.raw_query, self._cache_domain, self._cache_timeout)
+        else:
+            raw = self.adapter.search(self.raw_query)
+        return ESQuerySet(raw, self.clone())
+
+    def cache_results(self, domain, timeout=ES_QUERY_CACHE_TIMEOUT):
+        """
+        Cache the results of ``run()`` until documents of ``domain`` in the
+        index change. The query must only match documents of ``domain``.
+        See ``corehq.apps.es.cache``.
+        """
+        query = self.clone()
+        query._cache_domain = domain
+        query._cache_timeout = timeout
+        return query
 
     def scroll(self):
         """
@@ -226,6 +254,53 @@ class ESQuery(object):
         for result in self.adapter.scroll(raw_query):
             yield ESQuerySet.normalize_result(self, result)
 
+    def sliced_scroll(self, slices=None, ordered=False, completed_slices=()):
+        """
+        Like ``scroll()``, but splits the query into ``slices`` sliced scrolls
+        that are read concurrently by a pool of threads. Returns a
+        ``SlicedScrollResult``.
+
+        :param slices: the number of slices (default: the number of shards
+            configured for the index).
+        :param ordered: yield the documents of each slice in turn, instead of
+            as soon as any slice fetches them.
+        :param completed_slices: slices that have already been read, from
+            ``SlicedScrollResult.completed_slices`` of an earlier iteration.
+        """
+        if self.uses_aggregations():
+            raise InvalidQueryError("aggregation queries can't be scrolled")
+        if slices is None:
+            tuning_settings = render_index_tuning_settings(self.adapter.settings_key)
+            slices = tuning_settings.get(IndexTuningKey.SHARDS, DEFAULT_SHARDS)
+        return SlicedScrollResult(self, slices, ordered, completed_slices)
+
+    def search_after(self, after=None):
+        """
+        Like ``scroll()``, but pages through the results with ``search_after``
+        so no search context is held open on the cluster between requests.
+
+        The results are sorted by the query's sort, if any, then by
+        ``doc_id``. Returns a ``SearchAfterResult``, whose ``cursor`` can be
+        saved and passed as ``after`` to resume iterating after the last
+        document that was yielded.
+        """
+        if self.uses_aggregations():
+            raise InvalidQueryError("aggregation queries can't be paged with search_after")
+        query = self
+        if not any(
+            sort == SEARCH_AFTER_TIEBREAKER or (isinstance(sort, dict) and SEARCH_AFTER_TIEBREAKER in sort)
+            for sort in self.es_query.get('sort', [])
+        ):
+            query = self._sort({SEARCH_AFTER_TIEBREAKER: {'order': 'asc'}}, reset_sort=False)
+        raw_query = query.raw_query
+        raw_query["size"] = SCROLL_SIZE if self._size is None else self._size
+        hits = query.adapter.search_after(raw_query, after=after)
+        return SearchAfterResult(query, hits, after)
+
+    def search_after_ids(self, after=None):
+        """Like ``scroll_ids()``, using ``search_after``"""
+        return self.exclude_source().search_after(after)
+
     @property
     def _filters(self):
         return self.es_query['query']['bool']['filter']
@@ -475,15 +550,21 @@ class ESQuery(object):
         """Returns a generator of all matching ids"""
         return self.exclude_source().scroll()
 
-    def scroll_ids_to_disk_and_iter_docs(self):
+    def sliced_scroll_ids(self, slices=None, ordered=False, completed_slices=()):
+        """Like ``scroll_ids()``, using ``sliced_scroll()``"""
+        return self.exclude_source().sliced_scroll(slices, ordered, completed_slices)
+
+    def scroll_ids_to_disk_and_iter_docs(self, search_after=False, sliced=False):
         """Returns a ``ScanResult`` for all matched documents.
 
         Used for iterating docs for a very large query where consuming the docs
         via ``self.scroll()`` may exceed the amount of time that the scroll
         context can remain open. This is achieved by:
 
-        1. Fetching the IDs for all matched documents (via ``scroll_ids()``) and
-           caching them in a temporary file on disk, then
+        1. Fetching the IDs for all matched documents (via ``scroll_ids()``,
+           ``search_after_ids()`` if ``search_after`` is true, or
+           ``sliced_scroll_ids()`` if ``sliced`` is true) and caching them in
+           a temporary file on disk, then
         2. fetching the documents by (chunked blocks of) IDs streamed from the
            temporary file.
 
@@ -504,7 +585,13 @@ class ESQuery(object):
             with TransientTempfile() as temp_path:
                 # Write all ids to disk as quickly as ES scrolls them
                 with open(temp_path, 'w', encoding='utf-8') as stream:
-                    for doc_id in self.scroll_ids():
+                    if search_after:
+                        doc_ids = self.search_after_ids()
+                    elif sliced:
+                        doc_ids = self.sliced_scroll_ids()
+                    else:
+                        doc_ids = self.scroll_ids()
+                    for doc_id in doc_ids:
                         stream.write(doc_id + '\n')
                 # Stream doc ids from disk and fetch documents from ES in chunks
                 with open(temp_path, 'r', encoding='utf-8') as stream:
@@ -523,6 +610,123 @@ class ScanResult(object):
         yield from self._iterator
 
 
+class SlicedScrollResult(object):
+    """
+    The object returned from ``ESQuery.sliced_scroll``
+
+    Iterating yields each matching document. Each slice is scrolled by its
+    own thread, which puts its hits on a bounded queue, so a slow consumer
+    holds at most ``SLICED_SCROLL_QUEUE_SIZE`` hits per slice in memory.
+
+    ``progress`` is the number of documents yielded from each slice and
+    ``completed_slices`` are the slices that have been read completely.
+    A scroll can't be resumed part way through, so an iteration that is
+    resumed with ``completed_slices`` reads the other slices from the start.
+    """
+
+    def __init__(self, query, slices, ordered=False, completed_slices=()):
+        self.query = query
+        self.slices = slices
+        self.ordered = ordered
+        self.completed_slices = set(completed_slices)
+        self.progress = {slice_id: 0 for slice_id in range(slices)}
+
+    def __iter__(self):
+        pending = [slice_id for slice_id in range(self.slices) if slice_id not in self.completed_slices]
+        if not pending:
+            return
+        if self.ordered:
+            slice_queues = {slice_id: Queue(SLICED_SCROLL_QUEUE_SIZE) for slice_id in pending}
+        else:
+            shared_queue = Queue(SLICED_SCROLL_QUEUE_SIZE * len(pending))
+            slice_queues = {slice_id: shared_queue for slice_id in pending}
+        stopped = threading.Event()
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            for slice_id in pending:
+                # the query is assembled here because cloning it isn't thread safe
+                hits = self.query.adapter.scroll(self._get_slice_query(slice_id))
+                executor.submit(self._scroll_slice, slice_id, hits, slice_queues[slice_id], stopped)
+            try:
+                if self.ordered:
+                    for slice_id in pending:
+                        yield from self._iter_queue(slice_queues[slice_id], 1)
+                else:
+                    yield from self._iter_queue(shared_queue, len(pending))
+            finally:
+                stopped.set()
+
+    def _get_slice_query(self, slice_id):
+        raw_query = self.query.raw_query
+        raw_query["size"] = SCROLL_SIZE if self.query._size is None else self.query._size
+        if self.slices > 1:
+            raw_query["slice"] = {"id": slice_id, "max": self.slices}
+        return raw_query
+
+    def _scroll_slice(self, slice_id, hits, queue, stopped):
+        hits = iter(hits)
+        try:
+            for hit in hits:
+                if not self._put(queue, (slice_id, hit), stopped):
+                    return
+            self._put(queue, (slice_id, _SLICE_COMPLETE), stopped)
+        except Exception as e:
+            self._put(queue, (slice_id, _SliceError(e)), stopped)
+        finally:
+            if hasattr(hits, 'close'):
+                hits.close()  # clears the scroll context if the slice was abandoned
+
+    @staticmethod
+    def _put(queue, item, stopped):
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _iter_queue(self, queue, slice_count):
+        while slice_count:
+            slice_id, hit = queue.get()
+            if hit is _SLICE_COMPLETE:
+                self.completed_slices.add(slice_id)
+                slice_count -= 1
+            elif isinstance(hit, _SliceError):
+                raise hit.error
+            else:
+                self.progress[slice_id] += 1
+                yield ESQuerySet.normalize_result(self.query, hit)
+
+
+_SLICE_COMPLETE = object()
+
+
+class _SliceError(object):
+
+    def __init__(self, error):
+        self.error = error
+
+
+class SearchAfterResult(object):
+    """
+    The object returned from ``ESQuery.search_after``
+
+    Iterating yields each matching document. ``cursor`` is the sort values
+    of the last document yielded, or the cursor the iteration was resumed
+    from, and is JSON serializable.
+    """
+
+    def __init__(self, query, hits, cursor=None):
+        self.query = query
+        self._hits = hits
+        self.cursor = cursor
+
+    def __iter__(self):
+        for hit in self._hits:
+            self.cursor = hit['sort']
+            yield ESQuerySet.normalize_result(self.query, hit)
+
+
 class ESQuerySet(object):
     """
     The object returned from ``ESQuery.run``
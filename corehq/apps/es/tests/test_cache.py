@@ -0,0 +1,84 @@
+import uuid
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from corehq.apps.es.cache import (
+    _get_cache,
+    _get_generation,
+    _get_written_key,
+    invalidate_cached_results,
+)
+from corehq.apps.es.forms import FormES
+
+
+class TestCachedResults(SimpleTestCase):
+
+    def setUp(self):
+        # unique domains keep tests independent of results cached by other runs
+        self.domain = uuid.uuid4().hex
+        self.query = FormES().domain(self.domain).cache_results(self.domain)
+        patcher = patch.object(self.query.adapter, 'search', side_effect=self._search)
+        self.search = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = self.query.adapter.canonical_name
+        # results are cached once the refresh delay after the domain's
+        # generation was set has passed
+        _get_generation(self.index, self.domain)
+        _get_cache().delete(_get_written_key(self.index, self.domain))
+
+    @staticmethod
+    def _search(raw_query):
+        return {'hits': {'total': 1, 'hits': [{'_id': 'abc', '_source': {'_id': 'abc'}}]}}
+
+    def test_cached(self):
+        self.assertEqual(self.query.run().hits, [{'_id': 'abc'}])
+        self.assertEqual(self.query.run().hits, [{'_id': 'abc'}])
+        self.search.assert_called_once()
+
+    def test_query_changed(self):
+        self.query.run()
+        self.query.size(1).run()
+        self.assertEqual(self.search.call_count, 2)
+
+    def test_not_opted_in(self):
+        query = FormES().domain(self.domain)
+        query.run()
+        query.run()
+        self.assertEqual(self.search.call_count, 2)
+
+    def test_invalidated(self):
+        self.query.run()
+        invalidate_cached_results(self.query.adapter.canonical_name, [self.domain])
+        self.query.run()
+        self.assertEqual(self.search.call_count, 2)
+
+    def test_not_cached_until_refreshed(self):
+        invalidate_cached_results(self.index, [self.domain])
+        self.query.run()
+        self.query.run()
+        self.assertEqual(self.search.call_count, 2)
+
+        # the written documents are searchable once the index is refreshed
+        _get_cache().delete(_get_written_key(self.index, self.domain))
+        self.query.run()
+        self.query.run()
+        self.assertEqual(self.search.call_count, 3)
+
+    def test_new_generation_not_cached(self):
+        domain = uuid.uuid4().hex
+        query = FormES().domain(domain).cache_results(domain)
+        query.run()
+        query.run()
+        self.assertEqual(self.search.call_count, 2)
+
+    def test_invalidate_without_cached_results(self):
+        domain = uuid.uuid4().hex
+        invalidate_cached_results(self.index, [domain])
+        self.assertIsNone(_get_cache().get(_get_written_key(self.index, domain)))
+
+    def test_other_domain_invalidated(self):
+        self.query.run()
+        invalidate_cached_results(self.query.adapter.canonical_name, [uuid.uuid4().hex])
+        self.query.run()
+        self.search.assert_called_once()
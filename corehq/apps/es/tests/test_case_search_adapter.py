@@ -1,6 +1,6 @@
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
 from corehq.apps.es import const
 from corehq.apps.es.case_search import (
@@ -16,6 +16,10 @@ from corehq.apps.es.client import (
 from corehq.apps.es.migration_operations import CreateIndex
 from corehq.apps.es.tests.utils import es_test
 from corehq.form_processor.tests.utils import create_case
+from corehq.pillows.case_search import CaseSearchPillowProcessor
+from corehq.util.test_utils import flag_disabled
+from pillowtop.feed.interface import Change
+from pillowtop.utils import ErrorCollector
 
 
 @es_test(requires=[case_search_adapter], setup_class=True)
@@ -222,3 +226,55 @@ class TestCaseSearchAdapterAlsoWritesToAnotherIndex(TestCase):
         self.assertEqual(docs_in_bha, [])
         self.assertEqual(len(docs_in_case_search), 1)
         self.assertEqual(docs_in_secondary_case_search, docs_in_case_search)
+
+
+@flag_disabled('CASE_SEARCH_SUBCASE_COUNTS')
+class TestCaseSearchPillowProcessorDeletesFromSubIndex(SimpleTestCase):
+
+    def setUp(self):
+        self.processor = CaseSearchPillowProcessor(case_search_adapter)
+        self.sub_index_adapter = Mock(index_name='case-search-sub-index')
+        self.sub_index_adapter.bulk_delete.return_value = (1, [])
+        self.changes = [
+            self._get_deleted_change('case1', 'sub-index-domain'),
+            self._get_deleted_change('case2', 'other-domain'),
+        ]
+
+    @staticmethod
+    def _get_deleted_change(case_id, domain):
+        doc = {'_id': case_id, 'domain': domain, 'doc_type': 'CommCareCase-Deleted'}
+        return Change(case_id, 1, document=doc, deleted=True, metadata=Mock(domain=domain))
+
+    def _build_bulk_actions(self, error_collector):
+        def multiplex_to_adapter(domain):
+            return self.sub_index_adapter if domain == 'sub-index-domain' else None
+
+        with patch('corehq.pillows.case_search.multiplex_to_adapter', new=multiplex_to_adapter):
+            return self.processor._build_bulk_actions(self.changes, error_collector)
+
+    def test_delete_from_sub_index(self):
+        error_collector = ErrorCollector()
+        actions = self._build_bulk_actions(error_collector)
+        self.assertEqual(
+            [action for change, action in actions],
+            [BulkActionItem.delete_id('case1'), BulkActionItem.delete_id('case2')],
+        )
+        self.sub_index_adapter.bulk_delete.assert_called_once_with(['case1'], raise_errors=False)
+        self.assertEqual(error_collector.errors, [])
+
+    def test_sub_index_errors(self):
+        self.sub_index_adapter.bulk_delete.return_value = (0, [
+            {'delete': {'_id': 'case1', 'status': 500, 'error': 'unavailable'}},
+        ])
+        error_collector = ErrorCollector()
+        self._build_bulk_actions(error_collector)
+        (change, error), = error_collector.errors
+        self.assertIs(change, self.changes[0])
+
+    def test_sub_index_document_missing(self):
+        self.sub_index_adapter.bulk_delete.return_value = (0, [
+            {'delete': {'_id': 'case1', 'status': 404}},
+        ])
+        error_collector = ErrorCollector()
+        self._build_bulk_actions(error_collector)
+        self.assertEqual(error_collector.errors, [])
@@ -356,6 +356,7 @@ class TestCaseSearchHitConversions(SimpleTestCase):
                     {'key': 'domain', 'value': 'batter'},
                     {'key': 'foo', 'value': 'bar'},
                     {'key': 'baz', 'value': 'buzz'},
+                    {'key': '@subcase_count:parent', 'value': '2'},
                 ],
             },
         }
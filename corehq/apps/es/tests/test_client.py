@@ -1168,6 +1168,19 @@ class TestElasticDocumentAdapter(AdapterWithIndexTestCase, ESTestHelpers):
             patched_scl.assert_called_once()
             patched_clr.assert_called_once()
 
+    def test_search_after(self):
+        docs = self._index_many_new_docs(5)
+        query = {"sort": [{"value": "asc"}]}
+        hits = list(self.adapter.search_after(query, size=2))
+        self.assertEqual([hit["_source"] for hit in hits], docs)
+
+        resumed = list(self.adapter.search_after(query, after=hits[2]["sort"], size=2))
+        self.assertEqual([hit["_source"] for hit in resumed], docs[3:])
+
+    def test_search_after_requires_sort(self):
+        with self.assertRaises(ValueError):
+            list(self.adapter.search_after({}))
+
     def test__scroll(self):
         docs = self._index_many_new_docs(5)
         top_level = {"_scroll_id", "took", "timed_out", "_shards", "hits"}
@@ -325,6 +325,88 @@ class TestESQuery(ElasticTestMixin, SimpleTestCase):
         with self.assertRaises(InvalidQueryError):
             list(query.scroll())
 
+    def test_sliced_scroll(self):
+        query = HQESQuery('forms')
+        with patch.object(query.adapter, "scroll", self._sliced_scroll_mock(slices=3)):
+            result = query.sliced_scroll_ids(3)
+            self.assertEqual(sorted(result), ['0-0', '0-1', '1-0', '1-1', '2-0', '2-1'])
+        self.assertEqual(result.progress, {0: 2, 1: 2, 2: 2})
+        self.assertEqual(result.completed_slices, {0, 1, 2})
+
+    def test_sliced_scroll_ordered(self):
+        query = HQESQuery('forms')
+        with patch.object(query.adapter, "scroll", self._sliced_scroll_mock(slices=3)):
+            self.assertEqual(
+                list(query.sliced_scroll_ids(3, ordered=True)),
+                ['0-0', '0-1', '1-0', '1-1', '2-0', '2-1'],
+            )
+
+    def test_sliced_scroll_resume(self):
+        query = HQESQuery('forms')
+        with patch.object(query.adapter, "scroll", self._sliced_scroll_mock(slices=3)):
+            result = query.sliced_scroll_ids(3, completed_slices=[0, 2])
+            self.assertEqual(list(result), ['1-0', '1-1'])
+        self.assertEqual(result.completed_slices, {0, 1, 2})
+
+    def test_sliced_scroll_error(self):
+        def scroll(raw_query):
+            raise ValueError(raw_query['slice']['id'])
+            yield
+
+        query = HQESQuery('forms')
+        with patch.object(query.adapter, "scroll", scroll):
+            with self.assertRaises(ValueError):
+                list(query.sliced_scroll_ids(2))
+
+    def _sliced_scroll_mock(self, slices):
+        def scroll(raw_query):
+            self.assertEqual(raw_query['slice']['max'], slices)
+            self.assertEqual(raw_query['size'], SCROLL_SIZE)
+            slice_id = raw_query['slice']['id']
+            for i in range(2):
+                yield {'_id': f'{slice_id}-{i}'}
+        return scroll
+
+    def test_search_after_sorts_by_tiebreaker(self):
+        query = HQESQuery('forms').sort('received_on')
+        search_after_testfunc = self._search_after_mock_assert(sort=[
+            {'received_on': {'order': 'asc'}},
+            {'doc_id': {'order': 'asc'}},
+        ], size=SCROLL_SIZE)
+        with patch.object(query.adapter, "search_after", search_after_testfunc):
+            list(query.search_after())
+
+    def test_search_after_does_not_repeat_tiebreaker(self):
+        query = HQESQuery('forms').sort('doc_id').size(1)
+        search_after_testfunc = self._search_after_mock_assert(sort=[{'doc_id': {'order': 'asc'}}], size=1)
+        with patch.object(query.adapter, "search_after", search_after_testfunc):
+            list(query.search_after())
+
+    def test_search_after_cursor(self):
+        query = HQESQuery('forms')
+        hits = [
+            {'_id': 'a', '_source': {'_id': 'a'}, 'sort': ['a']},
+            {'_id': 'b', '_source': {'_id': 'b'}, 'sort': ['b']},
+        ]
+        with patch.object(query.adapter, "search_after", return_value=iter(hits)) as search_after:
+            result = query.search_after_ids(after=['0'])
+            self.assertEqual(result.cursor, ['0'])
+            self.assertEqual(next(iter(result)), 'a')
+            self.assertEqual(result.cursor, ['a'])
+        self.assertEqual(search_after.call_args.kwargs['after'], ['0'])
+
+    def test_search_after_with_aggregations_raises(self):
+        query = HQESQuery('forms').terms_aggregation('domain.exact', 'domain')
+        with self.assertRaises(InvalidQueryError):
+            query.search_after()
+
+    def _search_after_mock_assert(self, **raw_query_assertions):
+        def search_after_tester(raw_query, **kw):
+            for key, value in raw_query_assertions.items():
+                self.assertEqual(value, raw_query[key])
+            return []
+        return search_after_tester
+
     def _scroll_query_mock_assert(self, **raw_query_assertions):
         def scroll_query_tester(raw_query, **kw):
             for key, value in raw_query_assertions.items():
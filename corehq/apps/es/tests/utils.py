@@ -9,6 +9,7 @@ import pytest
 from pillowtop.es_utils import initialize_index_and_mapping
 from pillowtop.tests.utils import get_pillow_doc_adapter
 
+from corehq.apps.es.cache import clear_cached_results
 from corehq.apps.es.client import ElasticMultiplexAdapter
 from corehq.apps.es.migration_operations import CreateIndex
 from corehq.tests.tools import nottest
@@ -234,6 +235,8 @@ def _run_create_index_operation(index_name, operation):
         pass
     # --------------------------------------------------------------------------
     operation.run()
+    # results cached for the previous index aren't invalidated by the pillows
+    clear_cached_results()
 
 
 @contextmanager
@@ -2,6 +2,8 @@
 Some of these constants correspond to constants set in corehq/apps/export/static/export/js/const.js
 so if changing a value, ensure that both places reflect the change
 """
+from datetime import timedelta
+
 from couchexport.deid import deid_date, deid_ID
 
 from corehq.apps.export.transforms import (
@@ -102,6 +104,22 @@ MAX_NORMAL_EXPORT_SIZE = 100000
 MAX_DAILY_EXPORT_SIZE = 1000000
 CASE_SCROLL_SIZE = 10000
 
+# Incremental refreshes of daily saved exports re-export documents modified
+# since this long before the previous refresh, to allow for indexing delays
+INCREMENTAL_EXPORT_OVERLAP = timedelta(hours=1)
+# Daily saved exports that are refreshed incrementally are still rebuilt
+# from scratch this often, to pick up changes that don't modify the exported
+# documents (e.g. renamed users or locations)
+INCREMENTAL_EXPORT_MAX_AGE = timedelta(days=7)
+
+# Exports of more documents than this are written by a pool of processes,
+# in pages of PARALLEL_EXPORT_PAGE_SIZE documents (see export/multiprocess.py)
+PARALLEL_EXPORT_THRESHOLD = MAX_NORMAL_EXPORT_SIZE
+PARALLEL_EXPORT_PAGE_SIZE = 10000
+PARALLEL_EXPORT_MAX_PROCESSES = 8
+# How long the completed pages of an interrupted parallel export are kept to resume it
+PARALLEL_EXPORT_CHECKPOINT_TTL = timedelta(days=1)
+
 # When a question is missing completely from a form/case this should be the value
 MISSING_VALUE = '---'
 # When a question has been answered, but is blank, this should be the value
@@ -11,22 +11,33 @@ from corehq.apps.export.filters import ExportFilter
 from corehq.util.metrics import metrics_counter, metrics_track_errors
 from couchexport.export import FormattedRow, get_writer
 from couchexport.models import Format
+from dimagi.utils.chunked import chunked
 from dimagi.utils.logging import notify_exception
 from soil import DownloadBase
 
 from corehq.apps.export.const import MAX_NORMAL_EXPORT_SIZE, MAX_DAILY_EXPORT_SIZE
 from corehq.apps.export.dbaccessors import get_properly_wrapped_export_instance
+from corehq.apps.export.extraction import TableExtractionPlan
 from corehq.apps.export.models.new import (
     CaseExportInstance,
     FormExportInstance,
     SMSExportInstance,
     ALL_CASE_TYPE_TABLE
 )
-from corehq.toggles import PAGINATED_EXPORTS
+from corehq.toggles import (
+    INCREMENTAL_DAILY_SAVED_EXPORTS,
+    PAGINATED_EXPORTS,
+    PARALLEL_EXPORTS,
+    SEARCH_AFTER_EXPORTS,
+    SLICED_SCROLL_EXPORTS,
+)
 from corehq.util.metrics.load_counters import load_counter
 from corehq.util.files import TransientTempfile, safe_filename
 from soil.progress import TaskProgressManager
 
+# Number of documents extracted together for writers that support columns
+COLUMN_BATCH_SIZE = 1000
+
 
 class ExportFile(object):
     # This is essentially coppied from couchexport.files.ExportFiles
@@ -76,11 +87,16 @@ class _ExportWriter(object):
             # open the ExportWriter
             headers = []
             table_titles = {}
+            column_datatypes = {}
             for instance_index, instance in enumerate(export_instances):
                 headers += [
                     (t, (t.get_headers(split_columns=instance.split_multiselects),))
                     for t in instance.selected_tables
                 ]
+                column_datatypes.update({
+                    t: t.get_header_datatypes(split_columns=instance.split_multiselects)
+                    for t in instance.selected_tables
+                })
                 for table_index, table in enumerate(instance.selected_tables):
                     sheet_name = table.label or "Sheet{}".format(table_index + 1)
                     # If it's a bulk export and the sheet has the same name as another sheet,
@@ -91,7 +107,8 @@ class _ExportWriter(object):
                             sheet_name
                         )
                     table_titles[table] = sheet_name
-            self.writer.open(headers, file, table_titles=table_titles, archive_basepath=name)
+            self.writer.open(headers, file, table_titles=table_titles, archive_basepath=name,
+                             column_datatypes=column_datatypes)
             try:
                 yield
             finally:
@@ -113,11 +130,23 @@ class _ExportWriter(object):
             )])
         ])
 
+    @property
+    def supports_columns(self):
+        return self.writer.supports_columns
+
+    def write_columns(self, table, columns):
+        """
+        Write rows given as a list of value lists, one per header, to the given
+        table of the export. Only available if the writer supports_columns.
+        """
+        self.writer.write_columns(table, columns)
+
     def get_preview(self):
         return self.writer.get_preview()
 
 
 class _PaginatedExportWriter(object):
+    supports_columns = False
 
     def __init__(self, writer, temp_path):
         self.format = writer.format
@@ -137,6 +166,7 @@ class _PaginatedExportWriter(object):
 
         self.name = self._get_name(export_instances)
         self.headers = self._get_headers(export_instances)
+        self.datatypes = self._get_datatypes(export_instances)
         self.table_names = self._get_table_names(export_instances)
 
         with open(self.path, 'wb') as file_handle:
@@ -144,7 +174,10 @@ class _PaginatedExportWriter(object):
                 self._get_paginated_headers().items(),
                 file_handle,
                 table_titles=self._get_paginated_table_titles(),
-                archive_basepath=self.name
+                archive_basepath=self.name,
+                column_datatypes={
+                    self._paged_table_index(table): datatypes for table, datatypes in self.datatypes.items()
+                },
             )
             try:
                 yield
@@ -178,6 +211,19 @@ class _PaginatedExportWriter(object):
 
         return headers
 
+    def _get_datatypes(self, export_instances):
+        '''
+        Returns a dictionary that maps all TableConfigurations in the list of ExportInstances to the
+        datatypes of their columns
+        '''
+        datatypes = {}
+        for instance in export_instances:
+            for table in instance.selected_tables:
+                datatypes[table] = table.get_header_datatypes(
+                    split_columns=instance.split_multiselects
+                )
+        return datatypes
+
     def _get_table_names(self, export_instances):
         '''
         Returns a dictionary that maps all TableConfigurations in the list of ExportInstances to a
@@ -259,6 +305,7 @@ class _PaginatedExportWriter(object):
                 self._paged_table_index(table),
                 self._get_paginated_headers()[self._paged_table_index(table)][0],
                 table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
+                datatypes=self.datatypes[table],
             )
 
         self.writer.write([(self._paged_table_index(table), [FormattedRow(data=row.data)])])
@@ -308,6 +355,12 @@ def get_export_file(export_instances, es_filters, temp_path,
     """
     Return an export file for the given ExportInstance and list of filters
     """
+    if len(export_instances) == 1 and PARALLEL_EXPORTS.enabled(export_instances[0].domain):
+        from corehq.apps.export.multiprocess import get_parallel_export_file
+        export_file = get_parallel_export_file(export_instances[0], es_filters, temp_path, progress_tracker)
+        if export_file is not None:
+            return export_file
+
     writer = get_export_writer(export_instances, temp_path)
 
     with writer.open(export_instances):
@@ -323,7 +376,11 @@ def get_export_file(export_instances, es_filters, temp_path,
 def get_export_documents(export_instance, filters):
     # Pull doc ids from elasticsearch and stream to disk
     query = get_export_query(export_instance, filters)
-    return query.scroll_ids_to_disk_and_iter_docs()
+    domain = export_instance.domain
+    return query.scroll_ids_to_disk_and_iter_docs(
+        search_after=SEARCH_AFTER_EXPORTS.enabled(domain),
+        sliced=SLICED_SCROLL_EXPORTS.enabled(domain),
+    )
 
 
 def get_export_query(export_instance, filters):
@@ -344,7 +401,8 @@ def get_export_size(export_instance, filters):
 
 
 def write_export_instance(writer, export_instance, documents,
-                          progress_tracker=None, include_hyperlinks=True):
+                          progress_tracker=None, include_hyperlinks=True,
+                          first_row_number=0, row_store=None):
     """
     Write rows to the given open _Writer.
     Rows will be written to each table in the export instance for each of
@@ -355,54 +413,84 @@ def write_export_instance(writer, export_instance, documents,
     :param progress_tracker: A task for soil to track progress against
     :param include_hyperlinks: if True will generate hyperlinks in export
             This is disabled for larger exports due to time to run constraints
+    :param first_row_number: The row number of the first document, when rows
+            have already been written for other documents
+    :param row_store: Optional ``incremental.RowStoreWriter`` that the rows
+            of each document are also written to
     :return: None
     """
     with TaskProgressManager(progress_tracker, src="export") as progress_manager:
         if progress_tracker:
-            progress_manager.set_progress(0, documents.count)
+            progress_manager.set_progress(first_row_number, documents.count)
 
         start = _time_in_milliseconds()
         total_bytes = 0
         total_rows = 0
         track_load = load_counter(export_instance.type, "export", export_instance.domain)
-
-        for row_number, doc in enumerate(documents):
-            total_bytes += sys.getsizeof(doc)
-            for table in export_instance.selected_tables:
-                # This is for bulk exports on all case types.
-                # Skip over the tables that this doc shouldn't go into.
-                path_names = [path.name for path in table.path]
-                if ALL_CASE_TYPE_TABLE in table.path and doc['type'] not in path_names:
-                    continue
-
-                try:
-                    rows = table.get_rows(
-                        doc,
-                        row_number,
-                        split_columns=export_instance.split_multiselects,
-                        transform_dates=export_instance.transform_dates,
-                        include_hyperlinks=include_hyperlinks,
-                    )
-                except Exception as e:
-                    notify_exception(None, "Error exporting doc", details={
-                        'domain': export_instance.domain,
-                        'export_instance_id': export_instance.get_id,
-                        'export_table': table.label,
-                        'doc_id': doc.get('_id'),
-                    })
-                    e.sentry_capture = False
-                    raise
-
-                for row in rows:
-                    # It might be bad to write one row at a time from a performance perspective.
-                    # Regardless, we should handle the batching of rows in the _Writer class, not here.
-                    writer.write(table, row)
-
-                total_rows += len(rows)
-
-            track_load()
-            if progress_tracker:
-                progress_manager.set_progress(row_number + 1, documents.count)
+        plans = [
+            (
+                table,
+                {path.name for path in table.path} if ALL_CASE_TYPE_TABLE in table.path else None,
+                TableExtractionPlan(
+                    table,
+                    split_columns=export_instance.split_multiselects,
+                    transform_dates=export_instance.transform_dates,
+                    include_hyperlinks=include_hyperlinks,
+                ),
+            )
+            for table in export_instance.selected_tables
+        ]
+
+        if row_store is None and writer.supports_columns:
+            # extract a column at a time for a batch of documents, rather than a row at a time
+            numbered_documents = enumerate(documents, first_row_number)
+            for batch in chunked(numbered_documents, COLUMN_BATCH_SIZE, list):
+                total_bytes += sum(sys.getsizeof(doc) for row_number, doc in batch)
+                for table, case_type_path_names, plan in plans:
+                    table_batch = [
+                        (row_number, doc) for row_number, doc in batch
+                        if case_type_path_names is None or doc['type'] in case_type_path_names
+                    ]
+                    try:
+                        columns = plan.get_column_values(table_batch)
+                    except Exception:
+                        # get the rows of each document to report the one that fails
+                        for row_number, doc in table_batch:
+                            _get_rows(export_instance, table, plan, doc, row_number)
+                        raise
+
+                    writer.write_columns(table, columns)
+                    total_rows += len(columns[0]) if columns else 0
+
+                track_load(len(batch))
+                if progress_tracker:
+                    progress_manager.set_progress(batch[-1][0] + 1, documents.count)
+        else:
+            for row_number, doc in enumerate(documents, first_row_number):
+                total_bytes += sys.getsizeof(doc)
+                doc_rows = []
+                for table_index, (table, case_type_path_names, plan) in enumerate(plans):
+                    # This is for bulk exports on all case types.
+                    # Skip over the tables that this doc shouldn't go into.
+                    if case_type_path_names is not None and doc['type'] not in case_type_path_names:
+                        continue
+
+                    rows = _get_rows(export_instance, table, plan, doc, row_number)
+                    for row in rows:
+                        # It might be bad to write one row at a time from a performance perspective.
+                        # Regardless, we should handle the batching of rows in the _Writer class, not here.
+                        writer.write(table, row)
+
+                    total_rows += len(rows)
+                    if row_store is not None:
+                        doc_rows.extend((table_index, row) for row in rows)
+
+                if row_store is not None:
+                    row_store.write_doc(doc['_id'], doc_rows)
+
+                track_load()
+                if progress_tracker:
+                    progress_manager.set_progress(row_number + 1, documents.count)
 
     end = _time_in_milliseconds()
     tags = {'format': writer.format}
@@ -410,6 +498,20 @@ def write_export_instance(writer, export_instance, documents,
     _record_export_duration(end - start, export_instance)
 
 
+def _get_rows(export_instance, table, plan, doc, row_number):
+    try:
+        return plan.get_rows(doc, row_number)
+    except Exception as e:
+        notify_exception(None, "Error exporting doc", details={
+            'domain': export_instance.domain,
+            'export_instance_id': export_instance.get_id,
+            'export_table': table.label,
+            'doc_id': doc.get('_id'),
+        })
+        e.sentry_capture = False
+        raise
+
+
 def _time_in_milliseconds():
     return int(time.time() * 1000)
 
@@ -458,6 +560,16 @@ def rebuild_export(export_instance, progress_tracker):
             f"{export_instance.name} is {export_size} rows. Exceeds the limit "
             f"of {MAX_DAILY_EXPORT_SIZE} rows.")
     es_filters = [f.to_es_filter() for f in filters]
+    if INCREMENTAL_DAILY_SAVED_EXPORTS.enabled(export_instance.domain):
+        from corehq.apps.export.incremental import (
+            rebuild_export_incrementally,
+            supports_incremental_rebuild,
+        )
+        if supports_incremental_rebuild(export_instance):
+            rebuild_export_incrementally(export_instance, es_filters, progress_tracker,
+                                         include_hyperlinks=include_hyperlinks)
+            return
+
     with TransientTempfile() as temp_path:
         export_file = get_export_file([export_instance], es_filters, temp_path,
                                       progress_tracker,
@@ -466,9 +578,12 @@ def rebuild_export(export_instance, progress_tracker):
             save_export_payload(export_instance, payload)
 
 
-def save_export_payload(export, payload):
+def save_export_payload(export, payload, incremental_rows=None):
     """
     Save the contents of an export file to disk for later retrieval.
+
+    :param incremental_rows: Optional file with the rows of the export by
+        document, for the next incremental rebuild
     """
     if export.last_accessed is None:
         export.last_accessed = datetime.datetime.utcnow()
@@ -477,6 +592,8 @@ def save_export_payload(export, payload):
     try:
         with export.atomic_blobs():
             export.set_payload(payload)
+            if incremental_rows is not None:
+                export.set_incremental_rows(incremental_rows)
     except ResourceConflict:
         # task was executed concurrently, so let first to finish win and abort the rest
         pass
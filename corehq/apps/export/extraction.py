@@ -0,0 +1,181 @@
+"""
+Precompiled row extraction for export tables
+
+``TableConfiguration.get_rows`` works out the selected columns, the path of
+each column relative to the table and the repeat groups to explode for
+every document it is given. ``TableExtractionPlan`` does that once for an
+export run and then only walks the documents, producing the same rows.
+"""
+from corehq.apps.export.models import (
+    ALL_CASE_TYPE_TABLE,
+    ExportColumn,
+    ExportRow,
+    RowNumberColumn,
+)
+from corehq.apps.userreports.expressions.getters import safe_recursive_lookup
+
+
+class TableExtractionPlan(object):
+    """
+    Extracts the rows of one export table from documents
+
+    :param table: A TableConfiguration. Changes made to the table after the
+        plan is created are not reflected in the plan.
+    :param split_columns: see ``TableConfiguration.get_rows``
+    :param transform_dates: see ``TableConfiguration.get_rows``
+    :param as_json: see ``TableConfiguration.get_rows``
+    :param include_hyperlinks: see ``TableConfiguration.get_rows``
+    """
+
+    def __init__(self, table, split_columns=False, transform_dates=False, as_json=False,
+                 include_hyperlinks=True):
+        self.table = table
+        self.as_json = as_json
+
+        if ALL_CASE_TYPE_TABLE in table.path:
+            # bulk case exports have a table per case type, but each case is the table's only row
+            base_path = []
+            self.repeat_steps = []
+        else:
+            base_path = table.path
+            self.repeat_steps = [(node.name, node.is_repeat) for node in table.path]
+
+        columns = table.selected_columns
+        self.extractors = [
+            _get_extractor(column, base_path, split_columns, transform_dates)
+            for column in columns
+        ]
+        self.is_row_number = [isinstance(column, RowNumberColumn) for column in columns]
+        self.column_headers = [column.get_headers(split_column=split_columns) for column in columns]
+        self.headers = [header for headers in self.column_headers for header in headers]
+        self.hyperlink_column_indices = (
+            table.get_hyperlink_column_indices(split_columns) if include_hyperlinks else []
+        )
+
+    def get_rows(self, document, row_number):
+        """Same as ``TableConfiguration.get_rows`` for the options of the plan"""
+        document_id = document.get('_id')
+        domain = document.get('domain')
+
+        assert domain is not None, 'Form or Case must be associated with domain'
+        assert document_id is not None, 'Form or Case must have an id'
+
+        get_row = self._get_json_row if self.as_json else self._get_export_row
+        return [
+            get_row(domain, document_id, doc, row_index)
+            for row_index, doc in self._get_sub_documents(document, row_number)
+        ]
+
+    def get_column_values(self, numbered_documents):
+        """
+        The values ``get_rows`` would return for several documents, as a
+        list with the values of each header rather than a list of rows
+
+        :param numbered_documents: list of ``(row_number, document)``
+        """
+        assert not self.as_json, "Column values can't be returned as JSON"
+        sub_documents = []
+        for row_number, document in numbered_documents:
+            document_id = document.get('_id')
+            domain = document.get('domain')
+
+            assert domain is not None, 'Form or Case must be associated with domain'
+            assert document_id is not None, 'Form or Case must have an id'
+
+            sub_documents.extend(
+                (domain, document_id, doc, row_index)
+                for row_index, doc in self._get_sub_documents(document, row_number)
+            )
+
+        columns = []
+        for extract, headers in zip(self.extractors, self.column_headers):
+            values = [extract(*sub_document) for sub_document in sub_documents]
+            for index in range(len(headers)):
+                columns.append([
+                    value[index] if isinstance(value, list) else value
+                    for value in values
+                ])
+        return columns
+
+    def _get_sub_documents(self, document, row_number):
+        # see TableConfiguration._get_sub_documents_helper
+        row_docs = [((row_number,), document)]
+        for name, is_repeat in self.repeat_steps:
+            next_row_docs = []
+            for row_index, doc in row_docs:
+                next_doc = doc.get(name, {}) if isinstance(doc, dict) else {}
+                if is_repeat:
+                    if not isinstance(next_doc, list):
+                        # This happens when a repeat group has a single repeat iteration
+                        next_doc = [next_doc]
+                    next_row_docs.extend(
+                        (row_index + (index,), repeat_doc)
+                        for index, repeat_doc in enumerate(next_doc)
+                    )
+                elif next_doc:
+                    next_row_docs.append((row_index, next_doc))
+            row_docs = next_row_docs
+        return row_docs
+
+    def _get_export_row(self, domain, document_id, doc, row_index):
+        data = []
+        skip_excel_formatting = []
+        for extract, is_row_number in zip(self.extractors, self.is_row_number):
+            value = extract(domain, document_id, doc, row_index)
+            if isinstance(value, list):
+                if is_row_number:
+                    # we never want to auto-format RowNumberColumn (always treat as text)
+                    skip_excel_formatting.extend(range(len(data), len(data) + len(value)))
+                data.extend(value)
+            else:
+                if is_row_number:
+                    skip_excel_formatting.append(len(data))
+                data.append(value)
+        return ExportRow(
+            data=data,
+            hyperlink_column_indices=self.hyperlink_column_indices,
+            skip_excel_formatting=skip_excel_formatting,
+        )
+
+    def _get_json_row(self, domain, document_id, doc, row_index):
+        row = {}
+        for extract, headers in zip(self.extractors, self.column_headers):
+            value = extract(domain, document_id, doc, row_index)
+            for index, header in enumerate(headers):
+                if isinstance(value, list):
+                    row[header] = "{}".format(value[index])
+                else:
+                    row[header] = "{}".format(value)
+        return row
+
+
+def _get_extractor(column, base_path, split_column, transform_dates):
+    """
+    :returns: function taking ``(domain, doc_id, doc, row_index)`` that
+        returns the same value as ``column.get_value``
+    """
+    if type(column).get_value is not ExportColumn.get_value:
+        def extract(domain, doc_id, doc, row_index):
+            return column.get_value(
+                domain,
+                doc_id,
+                doc,
+                base_path,
+                row_index=row_index,
+                split_column=split_column,
+                transform_dates=transform_dates,
+            )
+        return extract
+
+    if base_path != column.item.path[:len(base_path)]:
+        # fail for each document, as ``column.get_value`` would
+        def extract(domain, doc_id, doc, row_index):
+            raise AssertionError("ExportItem's path doesn't start with the base_path")
+        return extract
+
+    path = [node.name for node in column.item.path[len(base_path):]]
+    transform = column._transform
+
+    def extract(domain, doc_id, doc, row_index):
+        return transform(safe_recursive_lookup(doc, path), doc, transform_dates)
+    return extract
@@ -0,0 +1,260 @@
+"""
+Incremental rebuilds of daily saved exports
+
+A daily saved export is normally rebuilt from every document it matches.
+When it is rebuilt incrementally, the rows of each document are also saved
+with the export, as gzipped JSON lines headed by the time of the rebuild.
+The next rebuild:
+
+1. gets the ids of all the documents the export matches now, and of those
+   modified since the previous rebuild;
+2. copies the saved rows of documents that still match and haven't been
+   modified, renumbering them;
+3. exports the documents that were modified or that weren't exported by
+   the previous rebuild.
+
+The rows of documents that no longer match the export are dropped. The
+export is rebuilt from scratch if its tables have changed since the rows
+were saved, or if it hasn't been rebuilt from scratch in
+``INCREMENTAL_EXPORT_MAX_AGE``.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import shutil
+
+from couchdbkit.exceptions import ResourceNotFound
+
+from corehq.apps.es import filters
+from corehq.apps.es.es_query import ScanResult
+from corehq.apps.export.const import (
+    INCREMENTAL_EXPORT_MAX_AGE,
+    INCREMENTAL_EXPORT_OVERLAP,
+)
+from corehq.apps.export.export import (
+    ExportFile,
+    get_export_query,
+    get_export_writer,
+    save_export_payload,
+    write_export_instance,
+)
+from corehq.apps.export.models import (
+    CaseExportInstance,
+    ExportRow,
+    FormExportInstance,
+)
+from corehq.util.files import TransientTempfile
+from corehq.util.metrics import metrics_counter
+
+ROW_STORE_VERSION = 1
+
+
+def supports_incremental_rebuild(export_instance):
+    return isinstance(export_instance, (CaseExportInstance, FormExportInstance))
+
+
+def rebuild_export_incrementally(export_instance, es_filters, progress_tracker=None,
+                                 include_hyperlinks=True):
+    started_on = datetime.datetime.utcnow()
+    config_hash = get_config_hash(export_instance)
+    query = get_export_query(export_instance, es_filters)
+    with TransientTempfile() as previous_path, \
+            TransientTempfile() as rows_path, \
+            TransientTempfile() as export_path:
+        previous_header = _get_previous_rows(export_instance, previous_path)
+        full_rebuild = not _can_reuse_rows(previous_header, config_hash, started_on)
+        header = {
+            'version': ROW_STORE_VERSION,
+            'config_hash': config_hash,
+            'rebuilt_on': started_on.isoformat(),
+            'full_rebuild_on': (
+                started_on.isoformat() if full_rebuild else previous_header['full_rebuild_on']
+            ),
+        }
+
+        writer = get_export_writer([export_instance], export_path)
+        with writer.open([export_instance]), RowStoreWriter(rows_path, header) as row_store:
+            if full_rebuild:
+                docs = query.scroll_ids_to_disk_and_iter_docs()
+                write_export_instance(writer, export_instance, docs, progress_tracker,
+                                      include_hyperlinks=include_hyperlinks, row_store=row_store)
+            else:
+                modified_since = (
+                    datetime.datetime.fromisoformat(previous_header['rebuilt_on'])
+                    - INCREMENTAL_EXPORT_OVERLAP
+                )
+                _write_changes(writer, row_store, export_instance, query, previous_path,
+                               modified_since, progress_tracker, include_hyperlinks)
+
+        with ExportFile(writer.path, writer.format) as payload, open(rows_path, 'rb') as rows:
+            save_export_payload(export_instance, payload, incremental_rows=rows)
+
+    metrics_counter('commcare.export.incremental_rebuild', tags={
+        'domain': export_instance.domain,
+        'full_rebuild': str(full_rebuild),
+    })
+
+
+def _write_changes(writer, row_store, export_instance, query, previous_path, modified_since,
+                   progress_tracker, include_hyperlinks):
+    # the ids of daily saved exports fit in memory, see MAX_DAILY_EXPORT_SIZE
+    current_ids = set(query.scroll_ids())
+    modified_ids = set(
+        query.filter(filters.date_range('server_modified_on', gte=modified_since)).scroll_ids()
+    )
+
+    # write the rows of unmodified documents; current_ids is left with the
+    # documents that need to be exported
+    tables = export_instance.selected_tables
+    hyperlink_column_indices = [
+        table.get_hyperlink_column_indices(export_instance.split_multiselects) if include_hyperlinks else []
+        for table in tables
+    ]
+    row_number = 0
+    for doc_id, rows in iter_row_store(previous_path):
+        if doc_id not in current_ids or doc_id in modified_ids:
+            continue
+        current_ids.remove(doc_id)
+        rows = [
+            (table_index, ExportRow(
+                data=_renumber(row.data, row.skip_excel_formatting, row_number),
+                hyperlink_column_indices=hyperlink_column_indices[table_index],
+                skip_excel_formatting=row.skip_excel_formatting,
+            ))
+            for table_index, row in rows
+        ]
+        for table_index, row in rows:
+            writer.write(tables[table_index], row)
+        row_store.write_doc(doc_id, rows)
+        row_number += 1
+
+    metrics_counter('commcare.export.incremental_rebuild.docs', row_number, tags={
+        'domain': export_instance.domain,
+        'result': 'reused',
+    })
+    metrics_counter('commcare.export.incremental_rebuild.docs', len(current_ids), tags={
+        'domain': export_instance.domain,
+        'result': 'exported',
+    })
+    # the export has the reused documents followed by the exported ones
+    docs = ScanResult(row_number + len(current_ids), query.adapter.iter_docs(current_ids))
+    write_export_instance(writer, export_instance, docs, progress_tracker,
+                          include_hyperlinks=include_hyperlinks,
+                          first_row_number=row_number, row_store=row_store)
+
+
+def _renumber(data, row_number_indices, row_number):
+    """Update the values of the row number column for the new position of the document
+
+    ``row_number_indices`` are the indices of the row number column's values,
+    i.e. ``ExportRow.skip_excel_formatting``: the row number of the document
+    followed by the indices of any repeat groups, joined with dots, and then
+    the same numbers separately for rows of repeat groups.
+    """
+    if row_number_indices:
+        data = list(data)
+        index = row_number_indices[0]
+        data[index] = ".".join([str(row_number)] + str(data[index]).split(".")[1:])
+        if len(row_number_indices) > 1:
+            data[row_number_indices[1]] = row_number
+    return data
+
+
+def get_config_hash(export_instance):
+    """Hash of the export's configuration that determines its rows"""
+    config = {
+        'tables': [table.to_json() for table in export_instance.selected_tables],
+        'split_multiselects': export_instance.split_multiselects,
+        'transform_dates': export_instance.transform_dates,
+    }
+    return hashlib.md5(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _get_previous_rows(export_instance, path):
+    """Download the rows saved by the previous rebuild to ``path``
+
+    :returns: the header of the saved rows, or None if there are none
+    """
+    try:
+        with export_instance.get_incremental_rows(stream=True) as rows, open(path, 'wb') as f:
+            shutil.copyfileobj(rows, f)
+    except ResourceNotFound:
+        return None
+    return get_row_store_header(path)
+
+
+def _can_reuse_rows(header, config_hash, now):
+    return (
+        header is not None
+        and header.get('version') == ROW_STORE_VERSION
+        and header.get('config_hash') == config_hash
+        and now - datetime.datetime.fromisoformat(header['full_rebuild_on']) < INCREMENTAL_EXPORT_MAX_AGE
+    )
+
+
+class RowStoreWriter(object):
+    """Write the rows of an export by document to a gzipped JSON lines file"""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+
+    def __enter__(self):
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        self._write(self.header)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._file.close()
+
+    def write_doc(self, doc_id, rows):
+        """
+        :param rows: list of ``(table_index, ExportRow)``, where ``table_index``
+            is the index of the table in the export's selected tables
+        """
+        self._write([doc_id, [
+            [table_index, row.data, list(row.skip_excel_formatting)]
+            for table_index, row in rows
+        ]])
+
+    def _write(self, value):
+        self._file.write(json.dumps(value, default=_encode_value))
+        self._file.write('\n')
+
+
+def get_row_store_header(path):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def iter_row_store(path):
+    """Yield ``(doc_id, [(table_index, ExportRow), ...])`` for each document in the file"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        f.readline()  # header
+        for line in f:
+            doc_id, rows = json.loads(line, object_hook=_decode_value)
+            yield doc_id, [
+                (table_index, ExportRow(data=data, skip_excel_formatting=skip_excel_formatting))
+                for table_index, data, skip_excel_formatting in rows
+            ]
+
+
+def _encode_value(value):
+    # transform_dates turns date strings into datetimes
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'__date__': value.isoformat()}
+    return str(value)
+
+
+def _decode_value(value):
+    if '__datetime__' in value:
+        return datetime.datetime.fromisoformat(value['__datetime__'])
+    if '__date__' in value:
+        return datetime.date.fromisoformat(value['__date__'])
+    return value
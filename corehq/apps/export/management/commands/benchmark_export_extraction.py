@@ -0,0 +1,64 @@
+import timeit
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from corehq.apps.export.extraction import TableExtractionPlan
+from corehq.apps.export.models import (
+    ExportColumn,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    TableConfiguration,
+)
+
+
+class Command(BaseCommand):
+    help = ("Compare extracting export rows from synthetic cases with "
+            "TableConfiguration.get_rows and with a TableExtractionPlan")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', type=int, default=10000)
+        parser.add_argument('--columns', type=int, default=200)
+
+    def handle(self, docs, columns, **options):
+        table = _get_table(columns)
+        documents = [_get_case(columns) for i in range(docs)]
+
+        def get_rows():
+            for row_number, document in enumerate(documents):
+                table.get_rows(document, row_number, transform_dates=True)
+
+        def get_planned_rows():
+            plan = TableExtractionPlan(table, transform_dates=True)
+            for row_number, document in enumerate(documents):
+                plan.get_rows(document, row_number)
+
+        for name, function in (('get_rows', get_rows), ('plan', get_planned_rows)):
+            elapsed = timeit.timeit(function, number=1)
+            self.stdout.write("{:<10} {} docs x {} columns: {:8.2f}ms ({:.0f} docs/s)".format(
+                name, docs, columns, elapsed * 1000, docs / elapsed))
+
+
+def _get_table(column_count):
+    return TableConfiguration(
+        path=[],
+        columns=[RowNumberColumn(selected=True)] + [
+            ExportColumn(
+                label='property_{}'.format(i),
+                item=ScalarItem(path=[PathNode(name='property_{}'.format(i))]),
+                selected=True,
+            )
+            for i in range(column_count)
+        ],
+    )
+
+
+def _get_case(column_count):
+    case = {
+        '_id': uuid.uuid4().hex,
+        'domain': 'benchmark',
+        'doc_type': 'CommCareCase',
+    }
+    case.update({'property_{}'.format(i): 'value {}'.format(i) for i in range(column_count)})
+    return case
@@ -3,7 +3,10 @@ import multiprocessing
 
 from django.core.management.base import BaseCommand, CommandError
 
-from corehq.apps.export.multiprocess import rebuild_export_mutiprocess
+from corehq.apps.export.multiprocess import (
+    rebuild_export_mutiprocess,
+    rebuild_export_parallel,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +29,12 @@ class Command(BaseCommand):
             default=multiprocessing.cpu_count() - 1,
             help='Number of parallel processes to run.'
         )
+        parser.add_argument(
+            '--resumable',
+            action='store_true',
+            help='Checkpoint completed pages so that the rebuild resumes if it is interrupted. '
+                 'Only for exports to zip files, e.g. CSV.'
+        )
 
     def handle(self, **options):
         if __debug__:
@@ -35,6 +44,9 @@ class Command(BaseCommand):
         page_size = options.pop('page_size')
         processes = options.pop('processes')
 
-        rebuild_export_mutiprocess(export_id, processes, page_size)
+        if options['resumable']:
+            rebuild_export_parallel(export_id, processes, page_size)
+        else:
+            rebuild_export_mutiprocess(export_id, processes, page_size)
 
         self.stdout.write(self.style.SUCCESS('Rebuild Complete'))
@@ -128,6 +128,7 @@ from corehq.apps.userreports.util import get_indicator_adapter
 
 
 DAILY_SAVED_EXPORT_ATTACHMENT_NAME = "payload"
+INCREMENTAL_EXPORT_ROWS_ATTACHMENT_NAME = "incremental_rows"
 
 
 ExcelFormatValue = namedtuple('ExcelFormatValue', 'format value')
@@ -511,6 +512,22 @@ class TableConfiguration(DocumentSchema, ReadablePathMixin):
             headers.extend(column.get_headers(split_column=split_columns))
         return headers
 
+    def get_header_datatypes(self, split_columns=False):
+        """
+        Return the datatype of the export item behind each column header,
+        or None where the column's values aren't the item's value (e.g.
+        transformed or split columns)
+        """
+        datatypes = []
+        for column in self.selected_columns:
+            headers = column.get_headers(split_column=split_columns)
+            if (type(column) is ExportColumn and len(headers) == 1
+                    and not column.item.transform and not column.is_deidentifed):
+                datatypes.append(column.item.datatype)
+            else:
+                datatypes.extend([None] * len(headers))
+        return datatypes
+
     def get_rows(self, document, row_number, split_columns=False,
                  transform_dates=False, as_json=False, include_hyperlinks=True):
         """
@@ -1159,6 +1176,16 @@ class ExportInstance(BlobMixin, Document):
         """
         return self.fetch_attachment(DAILY_SAVED_EXPORT_ATTACHMENT_NAME, stream=stream)
 
+    def set_incremental_rows(self, rows):
+        """
+        Set the rows of the pre-computed export by document, used to rebuild
+        the export incrementally.
+        """
+        self.put_attachment(rows, INCREMENTAL_EXPORT_ROWS_ATTACHMENT_NAME)
+
+    def get_incremental_rows(self, stream=False):
+        return self.fetch_attachment(INCREMENTAL_EXPORT_ROWS_ATTACHMENT_NAME, stream=stream)
+
     def copy_export(self):
         export_json = self.to_json()
         del export_json['_id']
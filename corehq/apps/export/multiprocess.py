@@ -17,32 +17,65 @@ The export works as follows:
     * Unsuccessful results can be retried
   * Add successful pages to final ZIP archive
   * Add raw data dumps for unsuccessful pages to final ZIP archive
+
+``run_parallel_export`` is used by exports of zip formats that are too large
+to be written by a single process (see ``get_export_file``). It works as follows:
+  * The ids of the docs to export are scrolled from ES into pages of N ids
+  * Each page is queued for a pool of X processes as soon as it is read,
+    so processes start while ids are still being scrolled and each takes
+    the next page when it finishes one
+  * Each process fetches the docs of its page and writes them to a file
+  * The ids of each page and the file of each completed page are saved in
+    blob storage, so an export that is interrupted resumes from the pages
+    that weren't completed when it is run again
+  * The files of all pages are merged into the final ZIP archive
 """
 import gzip
+import hashlib
+import io
 import json
 import logging
 import multiprocessing
 import os
+import shutil
 import tempfile
 import time
 import zipfile
 from collections import namedtuple
+from contextlib import closing
 from datetime import timedelta
 from queue import Empty
 
+from django.db import connections
+
+import billiard
+
 from couchexport.export import get_writer
 from couchexport.writers import ZippedExportWriter
+from dimagi.utils.chunked import chunked
+from dimagi.utils.couch import get_redis_client
+from soil.progress import TaskProgressManager
 
 from corehq.apps.es.es_query import ScanResult
+from corehq.apps.export.const import (
+    PARALLEL_EXPORT_CHECKPOINT_TTL,
+    PARALLEL_EXPORT_MAX_PROCESSES,
+    PARALLEL_EXPORT_PAGE_SIZE,
+    PARALLEL_EXPORT_THRESHOLD,
+)
 from corehq.apps.export.dbaccessors import get_properly_wrapped_export_instance
 from corehq.apps.export.export import (
+    ExportFile,
     get_export_documents,
+    get_export_query,
     get_export_size,
     get_export_writer,
     save_export_payload,
     write_export_instance,
 )
-from corehq.util.files import safe_filename
+from corehq.apps.export.incremental import get_config_hash
+from corehq.blobs import CODES, get_blob_db
+from corehq.util.files import TransientTempfile, safe_filename
 
 TEMP_FILE_PREFIX = 'cchq_export_dump_'
 
@@ -186,7 +219,7 @@ def _get_export_documents_from_file(dump_path, doc_count):
     return ScanResult(doc_count, _doc_iter())
 
 
-def _get_export_file_path(export_instance, docs, progress_tracker=None):
+def _get_export_file_path(export_instance, docs, progress_tracker=None, include_hyperlinks=True):
     export_instances = [export_instance]
     # Multiprocess exports sometimes intentionally keep the tempfile,
     # so TransientTempfile isn't appropriate here
@@ -194,7 +227,8 @@ def _get_export_file_path(export_instance, docs, progress_tracker=None):
     os.close(fd)
     writer = get_export_writer(export_instances, temp_path, allow_pagination=False)
     with writer.open(export_instances):
-        write_export_instance(writer, export_instance, docs, progress_tracker)
+        write_export_instance(writer, export_instance, docs, progress_tracker,
+                              include_hyperlinks=include_hyperlinks)
         return writer.path
 
 
@@ -419,3 +453,253 @@ def _output_progress(queue, total_docs):
                     remaining=time_remaining,
                     rate=int(docs_per_second)
                 ))
+
+
+def rebuild_export_parallel(export_id, num_processes, page_size=PARALLEL_EXPORT_PAGE_SIZE):
+    export_instance = get_properly_wrapped_export_instance(export_id)
+    es_filters = [f.to_es_filter() for f in export_instance.get_filters()]
+    with TransientTempfile() as temp_path:
+        run_parallel_export(export_instance, es_filters, temp_path, num_processes, page_size)
+        with open(temp_path, 'rb') as payload:
+            save_export_payload(export_instance, payload)
+
+
+def can_run_parallel_export(export_instance):
+    """Parallel exports merge the zip files of their pages, so need a zip format"""
+    return isinstance(get_writer(export_instance.export_format), ZippedExportWriter)
+
+
+def get_parallel_export_file(export_instance, es_filters, temp_path, progress_tracker=None):
+    """
+    Write the export with ``run_parallel_export`` if it is large enough
+
+    :returns: an ``ExportFile``, or None if the export should be written by
+        a single process
+    """
+    if not can_run_parallel_export(export_instance):
+        return None
+    total_docs = get_export_query(export_instance, es_filters).count()
+    if total_docs <= PARALLEL_EXPORT_THRESHOLD:
+        return None
+    run_parallel_export(export_instance, es_filters, temp_path, progress_tracker=progress_tracker)
+    return ExportFile(temp_path, export_instance.export_format)
+
+
+def run_parallel_export(export_instance, es_filters, output_path, num_processes=None,
+                        page_size=PARALLEL_EXPORT_PAGE_SIZE, progress_tracker=None):
+    """Write the export to a zip file at ``output_path`` using a pool of processes
+
+    If a previous run of the same export with the same filters was interrupted,
+    only the pages it didn't complete are exported.
+    """
+    assert can_run_parallel_export(export_instance), export_instance.export_format
+    num_processes = num_processes or min(PARALLEL_EXPORT_MAX_PROCESSES, multiprocessing.cpu_count())
+    checkpoint = PageCheckpoint(export_instance, es_filters)
+    query = get_export_query(export_instance, es_filters)
+    total_docs = query.count()
+
+    # the pool's processes must not share the database connections of this one
+    connections.close_all()
+    with PageScheduler(export_instance, checkpoint, num_processes, total_docs, progress_tracker) as scheduler:
+        page_count = checkpoint.page_count
+        if page_count is None:
+            checkpoint.clear()
+            page_count = 0
+            # search_after doesn't hold a scroll context open, which could
+            # expire while submit() waits for the pool to take more pages
+            for page, doc_ids in enumerate(chunked(query.search_after_ids(), page_size, list)):
+                checkpoint.save_page_ids(page, doc_ids)
+                scheduler.submit(page, doc_ids)
+                page_count = page + 1
+            checkpoint.set_page_count(page_count)
+        else:
+            logger.info('Resuming export %s from %s pages', export_instance.get_id, page_count)
+            for page in range(page_count):
+                if checkpoint.is_complete(page):
+                    scheduler.add_progress(checkpoint.get_doc_count(page))
+                else:
+                    scheduler.submit(page, checkpoint.get_page_ids(page))
+        scheduler.wait()
+
+    with zipfile.ZipFile(output_path, mode='w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as final_zip:
+        for page in range(page_count):
+            if page in scheduler.page_paths:
+                _add_compressed_page_to_zip(final_zip, page, scheduler.page_paths[page])
+            else:
+                with TransientTempfile() as page_path:
+                    checkpoint.download_page_file(page, page_path)
+                    _add_compressed_page_to_zip(final_zip, page, page_path)
+
+    for path in scheduler.page_paths.values():
+        os.remove(path)
+    checkpoint.clear()
+
+
+def _export_page(export_instance, page, doc_ids):
+    """Write a page of documents to a file in the pool's process"""
+    logger.info('    Processing page %s started', page)
+    docs = ScanResult(len(doc_ids), export_instance.get_query().adapter.iter_docs(doc_ids))
+    # hyperlinks take too long for exports this large, see rebuild_export
+    path = _get_export_file_path(export_instance, docs, include_hyperlinks=False)
+    logger.info('    Processing page %s complete', page)
+    return path
+
+
+class PageScheduler(object):
+    """
+    Queues pages of document ids for a pool of processes and collects the
+    files they write, recording each in the checkpoint
+
+    At most twice as many pages as processes are queued at once, so that the
+    pages aren't all held in memory while the ids are scrolled.
+    """
+    retries_per_page = 3
+
+    def __init__(self, export_instance, checkpoint, num_processes, total_docs, progress_tracker=None):
+        self.export_instance = export_instance
+        self.checkpoint = checkpoint
+        self.num_processes = num_processes
+        self.max_queued = num_processes * 2
+        self.total_docs = total_docs
+        self.docs_done = 0
+        self.progress_manager = TaskProgressManager(progress_tracker, src="export")
+        self.queued = {}  # page -> (AsyncResult, doc_ids, attempt)
+        self.page_paths = {}
+
+    def __enter__(self):
+        # billiard allows the pool to be created in a celery worker process
+        self.pool = billiard.Pool(processes=self.num_processes)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.pool.terminate()
+        self.pool.join()
+        self.progress_manager.flush()
+
+    def submit(self, page, doc_ids, attempt=1):
+        while len(self.queued) >= self.max_queued:
+            self._collect(block=True)
+        result = self.pool.apply_async(_export_page, (self.export_instance, page, doc_ids))
+        self.queued[page] = (result, doc_ids, attempt)
+        self._collect(block=False)
+
+    def wait(self):
+        while self.queued:
+            self._collect(block=True)
+
+    def add_progress(self, doc_count):
+        self.docs_done += doc_count
+        self.progress_manager.set_progress(self.docs_done, self.total_docs)
+
+    def _collect(self, block):
+        if block:
+            # wait for the page that has been queued the longest
+            result, _, _ = next(iter(self.queued.values()))
+            result.wait(timeout=5)
+        retries = []
+        for page, (result, doc_ids, attempt) in list(self.queued.items()):
+            if not result.ready():
+                continue
+            del self.queued[page]
+            try:
+                path = result.get()
+            except Exception:
+                logger.exception("Error processing page %s (attempt %s)", page, attempt)
+                if attempt > self.retries_per_page:
+                    raise
+                retries.append((page, doc_ids, attempt + 1))
+                continue
+            self.checkpoint.save_page_file(page, path, len(doc_ids))
+            self.page_paths[page] = path
+            self.add_progress(len(doc_ids))
+        # submitting collects pages too, so it must not be called while
+        # iterating over the queued pages
+        for page, doc_ids, attempt in retries:
+            self.submit(page, doc_ids, attempt)
+
+
+class PageCheckpoint(object):
+    """
+    Records the pages of a parallel export so that it can be resumed
+
+    The ids of each page and the file of each completed page are saved in
+    blob storage, and their keys in a redis hash, which is keyed on the
+    export's configuration and filters.
+    """
+
+    def __init__(self, export_instance, es_filters):
+        self.domain = export_instance.domain
+        self.parent_id = export_instance.get_id
+        run = json.dumps([
+            export_instance.get_id,
+            export_instance.export_format,
+            get_config_hash(export_instance),
+            es_filters,
+        ], sort_keys=True, default=str)
+        self._key = 'parallel_export_checkpoint-{}'.format(hashlib.md5(run.encode('utf-8')).hexdigest())
+        self._client = get_redis_client().client.get_client()
+        self._db = get_blob_db()
+
+    @property
+    def page_count(self):
+        """The number of pages, if the ids of all the pages have been saved"""
+        value = self._get('page_count')
+        return int(value) if value is not None else None
+
+    def set_page_count(self, page_count):
+        self._set('page_count', page_count)
+
+    def save_page_ids(self, page, doc_ids):
+        content = io.BytesIO(gzip.compress('\n'.join(doc_ids).encode('utf-8')))
+        self._set('ids:{}'.format(page), self._put(content))
+
+    def get_page_ids(self, page):
+        with closing(self._db.get(key=self._get('ids:{}'.format(page)), type_code=CODES.data_export)) as blob:
+            return gzip.decompress(blob.read()).decode('utf-8').split('\n')
+
+    def save_page_file(self, page, path, doc_count):
+        with open(path, 'rb') as f:
+            key = self._put(f)
+        self._set('file:{}'.format(page), json.dumps({'key': key, 'doc_count': doc_count}))
+
+    def is_complete(self, page):
+        return self._get('file:{}'.format(page)) is not None
+
+    def get_doc_count(self, page):
+        return json.loads(self._get('file:{}'.format(page)))['doc_count']
+
+    def download_page_file(self, page, path):
+        key = json.loads(self._get('file:{}'.format(page)))['key']
+        with closing(self._db.get(key=key, type_code=CODES.data_export)) as blob, open(path, 'wb') as f:
+            shutil.copyfileobj(blob, f)
+
+    def clear(self):
+        for field, value in self._client.hgetall(self._key).items():
+            field = field.decode('utf-8') if isinstance(field, bytes) else field
+            if field.startswith('ids:'):
+                self._db.delete(key=_decode(value))
+            elif field.startswith('file:'):
+                self._db.delete(key=json.loads(value)['key'])
+        self._client.delete(self._key)
+
+    def _put(self, content):
+        meta = self._db.put(
+            content,
+            domain=self.domain,
+            parent_id=self.parent_id,
+            type_code=CODES.data_export,
+            timeout=int(PARALLEL_EXPORT_CHECKPOINT_TTL.total_seconds() // 60),
+        )
+        return meta.key
+
+    def _get(self, field):
+        value = self._client.hget(self._key, field)
+        return _decode(value) if value is not None else None
+
+    def _set(self, field, value):
+        self._client.hset(self._key, field, value)
+        self._client.expire(self._key, PARALLEL_EXPORT_CHECKPOINT_TTL)
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
@@ -328,6 +328,10 @@ hqDefine('export/js/bootstrap3/models', [
             return gettext('Excel 2007+');
         } else if (format === constants.EXPORT_FORMATS.GEOJSON) {
             return gettext('GeoJSON');
+        } else if (format === constants.EXPORT_FORMATS.PARQUET) {
+            return gettext('Parquet (Zip file)');
+        } else if (format === constants.EXPORT_FORMATS.ARROW) {
+            return gettext('Arrow IPC stream (Zip file)');
         }
     };
 
@@ -23,6 +23,8 @@ hqDefine('export/js/const', [], function () {
         XLS: 'xls',
         XLSX: 'xlsx',
         GEOJSON: 'geojson',
+        PARQUET: 'parquet',
+        ARROW: 'arrow',
     };
     var SHARING_OPTIONS = {
         PRIVATE: 'private',
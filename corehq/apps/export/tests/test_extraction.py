@@ -0,0 +1,114 @@
+from django.test import SimpleTestCase
+
+from corehq.apps.export.extraction import TableExtractionPlan
+from corehq.apps.export.models import (
+    ExportColumn,
+    MultipleChoiceItem,
+    Option,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    SplitExportColumn,
+    TableConfiguration,
+)
+
+REPEAT_PATH = [
+    PathNode(name="form"),
+    PathNode(name="repeat1", is_repeat=True),
+]
+
+
+class TableExtractionPlanTest(SimpleTestCase):
+
+    def setUp(self):
+        self.table = TableConfiguration(
+            path=REPEAT_PATH,
+            columns=[
+                RowNumberColumn(selected=True, repeat=1),
+                ExportColumn(
+                    label='q1',
+                    item=ScalarItem(path=REPEAT_PATH + [PathNode(name='q1')]),
+                    selected=True,
+                ),
+                ExportColumn(
+                    label='q2',
+                    item=ScalarItem(path=REPEAT_PATH + [PathNode(name='q2')]),
+                    selected=False,
+                ),
+                SplitExportColumn(
+                    label='choice',
+                    item=MultipleChoiceItem(
+                        path=REPEAT_PATH + [PathNode(name='choice')],
+                        options=[Option(value='a'), Option(value='b')],
+                    ),
+                    selected=True,
+                ),
+            ]
+        )
+        self.documents = [
+            {
+                'domain': 'my-domain',
+                '_id': 'form1',
+                'form': {'repeat1': [
+                    {'q1': 'foo', 'q2': 'x', 'choice': 'a c'},
+                    {'q1': {'#text': 'bar', 'id': '1'}},
+                ]},
+            },
+            {
+                'domain': 'my-domain',
+                '_id': 'form2',
+                # a single repeat iteration isn't a list
+                'form': {'repeat1': {'q1': 'baz', 'choice': 'b'}},
+            },
+            {'domain': 'my-domain', '_id': 'form3', 'form': {}},
+        ]
+
+    def _assert_same_rows(self, **options):
+        plan = TableExtractionPlan(self.table, **options)
+        for row_number, document in enumerate(self.documents):
+            expected = self.table.get_rows(document, row_number, **options)
+            actual = plan.get_rows(document, row_number)
+            if options.get('as_json'):
+                self.assertEqual(actual, expected)
+            else:
+                self.assertEqual(
+                    [(row.data, row.skip_excel_formatting, row.hyperlink_column_indices) for row in actual],
+                    [(row.data, row.skip_excel_formatting, row.hyperlink_column_indices) for row in expected],
+                )
+
+    def test_rows(self):
+        self._assert_same_rows()
+
+    def test_split_columns(self):
+        self._assert_same_rows(split_columns=True)
+
+    def test_json_rows(self):
+        self._assert_same_rows(as_json=True)
+        self._assert_same_rows(as_json=True, split_columns=True)
+
+    def _assert_same_columns(self, **options):
+        plan = TableExtractionPlan(self.table, **options)
+        numbered_documents = list(enumerate(self.documents, 5))
+        rows = [
+            row.data
+            for row_number, document in numbered_documents
+            for row in self.table.get_rows(document, row_number, **options)
+        ]
+        columns = plan.get_column_values(numbered_documents)
+        self.assertEqual(len(columns), len(plan.headers))
+        self.assertEqual([list(row) for row in zip(*columns)], rows)
+
+    def test_column_values(self):
+        self._assert_same_columns()
+        self._assert_same_columns(split_columns=True)
+
+    def test_table_path_mismatch(self):
+        self.table.columns.append(ExportColumn(
+            item=ScalarItem(path=[PathNode(name='form'), PathNode(name='q3')]),
+            selected=True,
+        ))
+        # a misconfigured column fails the documents with rows, like TableConfiguration.get_rows
+        plan = TableExtractionPlan(self.table)
+        self.assertEqual(plan.get_rows(self.documents[2], 2), [])
+        with self.assertRaises(AssertionError):
+            plan.get_rows(self.documents[0], 0)
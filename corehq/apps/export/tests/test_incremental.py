@@ -0,0 +1,190 @@
+import datetime
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase
+
+from corehq.apps.export.const import INCREMENTAL_EXPORT_MAX_AGE
+from corehq.apps.export.incremental import (
+    ROW_STORE_VERSION,
+    RowStoreWriter,
+    _can_reuse_rows,
+    _renumber,
+    _write_changes,
+    get_config_hash,
+    get_row_store_header,
+    iter_row_store,
+)
+from corehq.apps.export.models import (
+    ExportColumn,
+    ExportRow,
+    FormExportInstance,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    TableConfiguration,
+)
+from corehq.util.files import TransientTempfile
+
+
+class RowStoreTest(SimpleTestCase):
+
+    def test_round_trip(self):
+        header = {'version': ROW_STORE_VERSION, 'config_hash': 'abc'}
+        rows = [
+            (0, ExportRow(data=['0', 'foo', datetime.datetime(2024, 1, 2, 3, 4, 5)], skip_excel_formatting=[0])),
+            (1, ExportRow(data=['0.1', 0, 1, datetime.date(2024, 1, 2)], skip_excel_formatting=[0, 1, 2])),
+        ]
+        with TransientTempfile() as path:
+            with RowStoreWriter(path, header) as row_store:
+                row_store.write_doc('doc1', rows)
+                row_store.write_doc('doc2', [])
+
+            self.assertEqual(get_row_store_header(path), header)
+            stored = [
+                (doc_id, [(table_index, row.data, row.skip_excel_formatting) for table_index, row in doc_rows])
+                for doc_id, doc_rows in iter_row_store(path)
+            ]
+        self.assertEqual(stored, [
+            ('doc1', [
+                (0, ['0', 'foo', datetime.datetime(2024, 1, 2, 3, 4, 5)], [0]),
+                (1, ['0.1', 0, 1, datetime.date(2024, 1, 2)], [0, 1, 2]),
+            ]),
+            ('doc2', []),
+        ])
+
+    def test_invalid_file(self):
+        with TransientTempfile() as path:
+            with open(path, 'wb') as f:
+                f.write(b'not gzip')
+            self.assertIsNone(get_row_store_header(path))
+
+
+class RenumberTest(SimpleTestCase):
+
+    def test_no_row_number_column(self):
+        self.assertEqual(_renumber(['foo', 'bar'], [], 5), ['foo', 'bar'])
+
+    def test_row_number(self):
+        self.assertEqual(_renumber(['0', 'foo'], [0], 5), ['5', 'foo'])
+
+    def test_repeat_row_number(self):
+        self.assertEqual(
+            _renumber(['foo', '0.2.1', 0, 2, 1], [1, 2, 3, 4], 5),
+            ['foo', '5.2.1', 5, 2, 1],
+        )
+
+
+class CanReuseRowsTest(SimpleTestCase):
+
+    def setUp(self):
+        self.now = datetime.datetime(2024, 1, 10)
+        self.header = {
+            'version': ROW_STORE_VERSION,
+            'config_hash': 'abc',
+            'rebuilt_on': (self.now - datetime.timedelta(days=1)).isoformat(),
+            'full_rebuild_on': (self.now - datetime.timedelta(days=2)).isoformat(),
+        }
+
+    def test_reuse(self):
+        self.assertTrue(_can_reuse_rows(self.header, 'abc', self.now))
+
+    def test_no_rows(self):
+        self.assertFalse(_can_reuse_rows(None, 'abc', self.now))
+
+    def test_config_changed(self):
+        self.assertFalse(_can_reuse_rows(self.header, 'def', self.now))
+
+    def test_old_version(self):
+        self.header['version'] = ROW_STORE_VERSION - 1
+        self.assertFalse(_can_reuse_rows(self.header, 'abc', self.now))
+
+    def test_full_rebuild_too_old(self):
+        self.header['full_rebuild_on'] = (self.now - INCREMENTAL_EXPORT_MAX_AGE).isoformat()
+        self.assertFalse(_can_reuse_rows(self.header, 'abc', self.now))
+
+
+@patch('corehq.apps.export.incremental.write_export_instance')
+class WriteChangesTest(SimpleTestCase):
+
+    def setUp(self):
+        self.export_instance = FormExportInstance(
+            domain='test-domain',
+            tables=[TableConfiguration(
+                label='My table',
+                selected=True,
+                path=[],
+                columns=[
+                    RowNumberColumn(label='number', selected=True),
+                    ExportColumn(
+                        label='q1',
+                        item=ScalarItem(path=[PathNode(name='form'), PathNode(name='q1')]),
+                        selected=True,
+                    ),
+                ],
+            )],
+        )
+        self.query = Mock()
+        self.query.scroll_ids.return_value = ['unmodified', 'modified', 'new']
+        self.query.filter.return_value.scroll_ids.return_value = ['modified']
+        self.writer = Mock()
+
+    def _write_changes(self, previous_path, rows_path):
+        with RowStoreWriter(previous_path, {'version': ROW_STORE_VERSION}) as previous:
+            previous.write_doc('removed', [(0, ExportRow(data=['0', 'a'], skip_excel_formatting=[0]))])
+            previous.write_doc('modified', [(0, ExportRow(data=['1', 'b'], skip_excel_formatting=[0]))])
+            previous.write_doc('unmodified', [(0, ExportRow(data=['2', 'c'], skip_excel_formatting=[0]))])
+
+        with RowStoreWriter(rows_path, {'version': ROW_STORE_VERSION}) as row_store:
+            _write_changes(self.writer, row_store, self.export_instance, self.query, previous_path,
+                           datetime.datetime(2024, 1, 1), None, include_hyperlinks=False)
+        return row_store
+
+    def test_write_changes(self, write_export_instance):
+        with TransientTempfile() as previous_path, TransientTempfile() as rows_path:
+            row_store = self._write_changes(previous_path, rows_path)
+            stored = [
+                (doc_id, [row.data for table_index, row in rows])
+                for doc_id, rows in iter_row_store(rows_path)
+            ]
+
+        # only the rows of the unmodified document are reused, as the first row
+        self.assertEqual(stored, [('unmodified', [['0', 'c']])])
+        (table, row), = [call.args for call in self.writer.write.call_args_list]
+        self.assertEqual(table, self.export_instance.selected_tables[0])
+        self.assertEqual(row.data, ['0', 'c'])
+
+        # the modified and new documents are exported after it
+        self.query.adapter.iter_docs.assert_called_once_with({'modified', 'new'})
+        writer, export_instance, docs, progress_tracker = write_export_instance.call_args.args
+        self.assertEqual(docs.count, 3)
+        self.assertEqual(write_export_instance.call_args.kwargs, {
+            'include_hyperlinks': False,
+            'first_row_number': 1,
+            'row_store': row_store,
+        })
+
+
+class ConfigHashTest(SimpleTestCase):
+
+    def _get_export(self, selected=True, split_multiselects=False):
+        return FormExportInstance(
+            split_multiselects=split_multiselects,
+            tables=[TableConfiguration(
+                label='My table',
+                selected=True,
+                path=[],
+                columns=[
+                    ExportColumn(
+                        label='q1',
+                        item=ScalarItem(path=[PathNode(name='form'), PathNode(name='q1')]),
+                        selected=selected,
+                    ),
+                ],
+            )],
+        )
+
+    def test_config_hash(self):
+        config_hash = get_config_hash(self._get_export())
+        self.assertEqual(config_hash, get_config_hash(self._get_export()))
+        self.assertNotEqual(config_hash, get_config_hash(self._get_export(selected=False)))
+        self.assertNotEqual(config_hash, get_config_hash(self._get_export(split_multiselects=True)))
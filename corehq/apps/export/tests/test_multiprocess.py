@@ -0,0 +1,90 @@
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase
+
+from couchexport.models import Format
+
+from corehq.apps.export.const import PARALLEL_EXPORT_THRESHOLD
+from corehq.apps.export.models import CaseExportInstance
+from corehq.apps.export.multiprocess import (
+    PageScheduler,
+    can_run_parallel_export,
+    get_parallel_export_file,
+)
+
+
+@patch('corehq.apps.export.multiprocess.run_parallel_export')
+@patch('corehq.apps.export.multiprocess.get_export_query')
+class GetParallelExportFileTest(SimpleTestCase):
+
+    def test_large_export(self, get_export_query, run_parallel_export):
+        get_export_query.return_value.count.return_value = PARALLEL_EXPORT_THRESHOLD + 1
+        export_instance = CaseExportInstance(domain='test', export_format=Format.CSV)
+        export_file = get_parallel_export_file(export_instance, [], 'path')
+        self.assertEqual(export_file.path, 'path')
+        self.assertEqual(export_file.format, Format.CSV)
+        run_parallel_export.assert_called_once_with(export_instance, [], 'path', progress_tracker=None)
+
+    def test_small_export(self, get_export_query, run_parallel_export):
+        get_export_query.return_value.count.return_value = PARALLEL_EXPORT_THRESHOLD
+        export_instance = CaseExportInstance(domain='test', export_format=Format.CSV)
+        self.assertIsNone(get_parallel_export_file(export_instance, [], 'path'))
+        run_parallel_export.assert_not_called()
+
+    def test_excel_export(self, get_export_query, run_parallel_export):
+        get_export_query.return_value.count.return_value = PARALLEL_EXPORT_THRESHOLD + 1
+        export_instance = CaseExportInstance(domain='test', export_format=Format.XLS_2007)
+        self.assertFalse(can_run_parallel_export(export_instance))
+        self.assertIsNone(get_parallel_export_file(export_instance, [], 'path'))
+        run_parallel_export.assert_not_called()
+
+
+class FakeResult(object):
+
+    def __init__(self, path=None, error=None):
+        self.path = path
+        self.error = error
+
+    def ready(self):
+        return True
+
+    def wait(self, timeout=None):
+        pass
+
+    def get(self):
+        if self.error:
+            raise self.error
+        return self.path
+
+
+class PageSchedulerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.checkpoint = Mock()
+        self.scheduler = PageScheduler(CaseExportInstance(domain='test'), self.checkpoint,
+                                       num_processes=1, total_docs=4)
+        self.scheduler.pool = Mock()
+
+    def _set_results(self, results):
+        self.scheduler.pool.apply_async.side_effect = results
+
+    def test_pages(self):
+        self._set_results([FakeResult('path0'), FakeResult('path1')])
+        self.scheduler.submit(0, ['a', 'b'])
+        self.scheduler.submit(1, ['c', 'd'])
+        self.scheduler.wait()
+        self.assertEqual(self.scheduler.page_paths, {0: 'path0', 1: 'path1'})
+        self.assertEqual(self.scheduler.docs_done, 4)
+
+    def test_retry_failed_page(self):
+        self._set_results([FakeResult(error=ValueError()), FakeResult('path0')])
+        self.scheduler.submit(0, ['a', 'b'])
+        self.scheduler.wait()
+        self.assertEqual(self.scheduler.page_paths, {0: 'path0'})
+        self.assertEqual(self.scheduler.pool.apply_async.call_count, 2)
+        self.checkpoint.save_page_file.assert_called_once_with(0, 'path0', 2)
+
+    def test_too_many_failures(self):
+        self._set_results([FakeResult(error=ValueError())] * (PageScheduler.retries_per_page + 1))
+        with self.assertRaises(ValueError):
+            self.scheduler.submit(0, ['a', 'b'])
@@ -106,6 +106,35 @@ class TableConfigurationTest(SimpleTestCase):
         self.assertIsNotNone(column)
         self.assertEqual(index, 1)
 
+    def test_get_header_datatypes(self):
+        table_configuration = TableConfiguration(
+            path=[],
+            columns=[
+                RowNumberColumn(selected=True),
+                ExportColumn(
+                    item=ScalarItem(path=[PathNode(name='form'), PathNode(name='age')], datatype='integer'),
+                    selected=True,
+                ),
+                ExportColumn(
+                    item=ScalarItem(path=[PathNode(name='form'), PathNode(name='name')]),
+                    selected=True,
+                ),
+                ExportColumn(
+                    item=ScalarItem(path=[PathNode(name='form'), PathNode(name='dob')], datatype='date'),
+                    selected=False,
+                ),
+                ExportColumn(
+                    item=ScalarItem(
+                        path=[PathNode(name='form'), PathNode(name='user_id')],
+                        datatype='string',
+                        transform=USERNAME_TRANSFORM,
+                    ),
+                    selected=True,
+                ),
+            ]
+        )
+        self.assertEqual(table_configuration.get_header_datatypes(), [None, 'integer', None, None])
+
 
 class TableConfigurationGetSubDocumentsTest(SimpleTestCase):
 
@@ -212,6 +212,9 @@ class BaseExportView(BaseProjectDataView):
         if should_support_geojson:
             format_options.append("geojson")
 
+        if toggles.COLUMNAR_EXPORT_FORMATS.enabled(self.domain):
+            format_options += ["parquet", "arrow"]
+
         return format_options
 
     @property
@@ -229,6 +232,8 @@ class BaseExportView(BaseProjectDataView):
                 or (export.export_format == "html" and not domain_has_privilege(self.domain, EXCEL_DASHBOARD))
                 or (export.is_daily_saved_export and not domain_has_privilege(self.domain, DAILY_SAVED_EXPORT))
                 or (export.export_format == "geojson" and not toggles.SUPPORT_GEO_JSON_EXPORT.enabled(self.domain))
+                or (export.export_format in ("parquet", "arrow")
+                    and not toggles.COLUMNAR_EXPORT_FORMATS.enabled(self.domain))
         ):
             raise BadExportConfiguration()
 
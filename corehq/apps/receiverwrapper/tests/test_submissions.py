@@ -19,7 +19,7 @@ from corehq.apps.users.models import CommCareUser
 from corehq.form_processor.models import CommCareCase, XFormInstance
 from corehq.form_processor.tests.utils import FormProcessorTestUtils, sharded
 from corehq.util.json import CommCareJSONEncoder
-from corehq.util.test_utils import TestFileMixin, softer_assert
+from corehq.util.test_utils import TestFileMixin, flag_enabled, softer_assert
 
 from couchforms.exceptions import (
     InvalidAttachmentFileError,
@@ -359,6 +359,45 @@ class NormalModeSubmissionTest(BaseSubmissionTest):
         self.assertTrue(notification.called)
 
 
+@sharded
+class BatchSubmissionTest(BaseSubmissionTest):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("receiver_batch_post", args=[self.domain])
+
+    def _submit_batch(self, *formnames):
+        data_path = os.path.join(os.path.dirname(__file__), "data")
+        files = []
+        for formname in formnames:
+            with open(os.path.join(data_path, formname), "rb") as f:
+                files.append(SimpleUploadedFile(formname, f.read(), content_type="text/xml"))
+        return self.client.post(self.url, {"xml_submission_file": files})
+
+    def test_toggle_required(self):
+        response = self._submit_batch('simple_form.xml')
+        self.assertEqual(response.status_code, 404)
+
+    @flag_enabled('BATCH_FORM_SUBMISSIONS')
+    def test_submit_batch(self):
+        response = self._submit_batch('simple_form.xml', 'form_with_case.xml')
+        self.assertEqual(response.status_code, 200)
+        responses = response.json()['responses']
+        self.assertEqual([r['status_code'] for r in responses], [201, 201])
+        forms = XFormInstance.objects.get_forms([r['form_id'] for r in responses], self.domain.name)
+        self.assertEqual(len(forms), 2)
+
+    @flag_enabled('BATCH_FORM_SUBMISSIONS')
+    def test_batch_with_attachments(self):
+        file_path = os.path.join(os.path.dirname(__file__), "data", 'simple_form.xml')
+        with open(file_path, "rb") as f:
+            response = self.client.post(self.url, {
+                "xml_submission_file": f,
+                "image": SimpleUploadedFile("image.png", b"fake image", content_type="image/png"),
+            })
+        self.assertEqual(response.status_code, 422)
+
+
 class SubmissionSQLTransactionsTest(TestCase, TestFileMixin):
     root = os.path.dirname(__file__)
     file_path = ('data',)
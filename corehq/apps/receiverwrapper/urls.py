@@ -1,12 +1,14 @@
 from django.urls import re_path as url
 
-from corehq.apps.receiverwrapper.views import post, post_api, secure_post
+from corehq.apps.receiverwrapper.views import post, post_api, secure_post, secure_post_batch
 
 urlpatterns = [
     url(r'^$', post, name='receiver_post'),
     url(r'^api/$', post_api, name='receiver_post_api'),
     url(r'^secure/(?P<app_id>[\w-]+)/$', secure_post, name='receiver_secure_post_with_app_id'),
     url(r'^secure/$', secure_post, name='receiver_secure_post'),
+    url(r'^batch/(?P<app_id>[\w-]+)/$', secure_post_batch, name='receiver_batch_post_with_app_id'),
+    url(r'^batch/$', secure_post_batch, name='receiver_batch_post'),
 
     # odk urls
     url(r'^submission/?$', post, name="receiver_odk_post"),
@@ -1,7 +1,7 @@
 import os
 import logging
 
-from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.core.cache import cache
@@ -37,7 +37,7 @@ from corehq.apps.domain.decorators import (
     two_factor_exempt,
 )
 from corehq.apps.locations.permissions import location_safe
-from corehq.apps.ota.decorators import is_from_formplayer
+from corehq.apps.ota.decorators import is_from_formplayer, mobile_auth
 from corehq.apps.ota.utils import handle_401_response
 from corehq.apps.receiverwrapper.auth import (
     AuthContext,
@@ -53,7 +53,7 @@ from corehq.apps.receiverwrapper.util import (
 )
 from corehq.form_processor.exceptions import XFormLockError
 from corehq.form_processor.models import CommCareCase
-from corehq.form_processor.submission_post import SubmissionPost
+from corehq.form_processor.submission_post import BatchSubmissionPost, SubmissionPost
 from corehq.form_processor.utils import convert_xform_to_json
 from corehq.util.metrics import metrics_counter, metrics_histogram
 from corehq.util.timer import TimingContext, set_request_duration_reporting_threshold
@@ -178,6 +178,94 @@ def _process_form(request, domain, app_id, user_id, authenticated,
     return response
 
 
+def _process_form_batch(request, domain, app_id, user_id):
+    _verify_access(domain, user_id, request)
+
+    if rate_limit_submission(domain):
+        return HttpTooManyRequests()
+
+    metric_tags = {
+        'backend': 'sql',
+        'domain': domain
+    }
+
+    try:
+        instances = couchforms.get_instances(request)
+    except UnprocessableFormSubmission as e:
+        return openrosa_response.OpenRosaResponse(
+            message=e.message, nature=openrosa_response.ResponseNature.PROCESSING_FAILURE, status=e.status_code,
+        ).response()
+    except BadSubmissionRequest as e:
+        response = HttpResponse(e.message, status=e.status_code)
+        _record_metrics(metric_tags, 'known_failures', response)
+        return response
+
+    if toggles.FORM_SUBMISSION_BLACKLIST.enabled(domain):
+        response = openrosa_response.BLACKLISTED_RESPONSE
+        _record_metrics(metric_tags, 'blacklisted', response)
+        return response
+
+    responses = [None] * len(instances)
+    batched = []
+    for index, instance in enumerate(instances):
+        if should_ignore_submission(request, instance):
+            responses[index] = openrosa_response.SUBMISSION_IGNORED_RESPONSE
+            _record_metrics(dict(metric_tags), 'ignored', responses[index])
+        else:
+            batched.append(index)
+
+    with TimingContext() as timer:
+        app_id, build_id = get_app_and_build_ids(domain, app_id)
+        batch = BatchSubmissionPost(
+            [(instances[index], {}) for index in batched],
+            domain=domain,
+            app_id=app_id,
+            build_id=build_id,
+            auth_context=AuthContext(
+                domain=domain,
+                user_id=user_id,
+                authenticated=True,
+            ),
+            location=couchforms.get_location(request),
+            received_on=couchforms.get_received_on(request),
+            date_header=couchforms.get_date_header(request),
+            path=couchforms.get_path(request),
+            submit_ip=couchforms.get_submit_ip(request),
+            last_sync_token=couchforms.get_last_sync_token(request),
+            openrosa_headers=couchforms.get_openrosa_headers(request),
+            force_logs=request.GET.get('force_logs', 'false') == 'true',
+            timing_context=timer
+        )
+
+        try:
+            results = batch.run()
+        except XFormLockError as err:
+            logging.warning('Unable to get lock for form %s', err)
+            metrics_counter('commcare.xformlocked.count', tags={
+                'domain': domain, 'authenticated': True
+            })
+            return _submission_error(
+                request, "XFormLockError: %s" % err,
+                metric_tags, domain, app_id, user_id, True, status=423,
+                notify=False,
+            )
+
+    for index, result in zip(batched, results):
+        responses[index] = result.response
+        _record_metrics(dict(metric_tags), result.submission_type, result.response, xform=result.xform)
+
+    response = JsonResponse({'responses': [
+        {
+            'form_id': response.get('X-CommCareHQ-FormID'),
+            'status_code': response.status_code,
+            'content': response.content.decode('utf-8'),
+        }
+        for response in responses
+    ]})
+    response.request_timer = timer  # logged as Sentry breadcrumbs in LogLongRequestMiddleware
+    return response
+
+
 def _submission_error(request, message, metric_tags,
         domain, app_id, user_id, authenticated, meta=None, status=400,
         notify=True):
@@ -247,6 +335,29 @@ def post_api(request, domain):
     )
 
 
+@waf_allow('XSS_BODY')
+@location_safe
+@csrf_exempt
+@require_POST
+@mobile_auth
+@check_domain_mobile_access
+@toggles.BATCH_FORM_SUBMISSIONS.required_decorator()
+@set_request_duration_reporting_threshold(60)
+def secure_post_batch(request, domain, app_id=None):
+    """Submit the forms queued on a device in one request
+
+    Each form is a separate xml_submission_file part of a multipart request.
+    The forms are processed in the order they were submitted and the response
+    lists the OpenRosa response for each of them, in the same order.
+    """
+    return _process_form_batch(
+        request=request,
+        domain=domain,
+        app_id=app_id,
+        user_id=request.couch_user.get_id,
+    )
+
+
 @waf_allow('XSS_BODY')
 @location_safe
 @csrf_exempt
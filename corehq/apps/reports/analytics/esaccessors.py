@@ -266,7 +266,8 @@ def _get_form_counts_by_user(domain, datespan, is_submission_time, user_ids=None
 
     form_query = (form_query
         .user_aggregation()
-        .size(0))
+        .size(0)
+        .cache_results(domain))
     return form_query.run().aggregations.user.counts_by_bucket()
 
 
@@ -291,6 +292,7 @@ def _get_form_counts_by_date(domain, user_ids, datespan, timezone, is_submission
                 DateHistogram.Interval.DAY,
                 timezone=timezone.zone,
             ))
+            .cache_results(domain)
             .run().aggregations.date_histogram.counts_by_bucket())
 
 
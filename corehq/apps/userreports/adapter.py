@@ -92,6 +92,10 @@ class IndicatorAdapter(object):
         "Gets all the values from a document to save"
         return self.config.get_all_values(doc, eval_context)
 
+    def bulk_get_all_values(self, docs, eval_contexts=None):
+        "Gets the values to save from each of several documents"
+        return self.config.bulk_get_all_values(docs, eval_contexts)
+
     def bulk_delete(self, docs, use_shard_col=True):
         for doc in docs:
             self.delete(doc, use_shard_col)
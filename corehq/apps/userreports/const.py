@@ -58,8 +58,17 @@ ASYNC_INDICATOR_QUEUE_TIME = timedelta(minutes=5)
 ASYNC_INDICATOR_CHUNK_SIZE = getattr(settings, 'ASYNC_INDICATOR_CHUNK_SIZE', 100)
 ASYNC_INDICATOR_MAX_RETRIES = 20
 
+SHARDED_REBUILD_ROW_BATCH_SIZE = 5000
+
 XFORM_CACHE_KEY_PREFIX = 'xform_to_json_cache'
 
+RELATED_DOC_CACHE_SIZE = 10000
+# kinds of lookup cached by RelatedDocumentCache
+RELATED_DOC = 'related_doc'
+RELATED_CASE = 'related_case'
+SUBCASES = 'subcases'
+CASE_FORMS = 'case_forms'
+
 NAMED_EXPRESSION_PREFIX = 'NamedExpression'
 NAMED_FILTER_PREFIX = 'NamedFilter'
 
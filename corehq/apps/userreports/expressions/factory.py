@@ -1,6 +1,9 @@
 import datetime
 import functools
+import hashlib
 import json
+import threading
+from collections import OrderedDict
 
 from django.utils.translation import gettext as _
 
@@ -55,6 +58,55 @@ from corehq.apps.userreports.expressions.specs import (
 )
 from corehq.apps.userreports.specs import FactoryContext
 
+# expression types whose value depends on the factory context they were built with
+CONTEXT_DEPENDENT_EXPRESSION_TYPES = frozenset(['named', 'evaluator'])
+EXPRESSION_CACHE_SIZE = 10000
+
+
+class ExpressionCache(object):
+    """
+    Process wide LRU cache of expressions keyed by a hash of their spec.
+
+    Only expressions that do not depend on the factory context are cached,
+    so the same expression object can be shared by every data source,
+    pillow and rebuild task in the process that uses the same spec.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._expressions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._expressions:
+                self.hits += 1
+                self._expressions.move_to_end(key)
+                return self._expressions[key]
+            self.misses += 1
+
+        # build outside the lock since building an expression builds its sub-expressions
+        expression = build()
+        with self._lock:
+            self._expressions[key] = expression
+            if len(self._expressions) > self.maxsize:
+                self._expressions.popitem(last=False)
+        return expression
+
+    def clear(self):
+        with self._lock:
+            self._expressions.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._expressions)
+
+
+expression_cache = ExpressionCache(EXPRESSION_CACHE_SIZE)
+
 
 def _make_filter(spec, factory_context):
     # just pulled out here to keep the inline imports to a minimum
@@ -389,6 +441,8 @@ class ExpressionFactory(object):
         'utcnow': _utcnow,
     }
     # Additional items are added to the spec_map by use of the `register` method.
+    registered_types = set()
+    use_cache = True
 
     @classmethod
     def register(cls, type_name, factory_func):
@@ -403,12 +457,20 @@ class ExpressionFactory(object):
             )
 
         cls.spec_map[type_name] = factory_func
+        cls.registered_types.add(type_name)
 
     @classmethod
     def from_spec(cls, spec, factory_context=None):
         factory_context = factory_context or FactoryContext.empty()
         if _is_literal(spec):
             return cls.from_spec(_convert_constant_to_expression_spec(spec), factory_context)
+        cache_key = cls._get_cache_key(spec) if cls.use_cache else None
+        if cache_key is None:
+            return cls._from_spec(spec, factory_context)
+        return expression_cache.get_or_build(cache_key, lambda: cls._from_spec(spec, factory_context))
+
+    @classmethod
+    def _from_spec(cls, spec, factory_context):
         try:
             return cls.spec_map[spec['type']](spec, factory_context)
         except KeyError:
@@ -424,6 +486,37 @@ class ExpressionFactory(object):
                 str(e),
             ))
 
+    @classmethod
+    def _get_cache_key(cls, spec):
+        """
+        :returns: hash of the spec or ``None`` if the expression built from it
+        may depend on the factory context.
+        """
+        uncacheable_types = CONTEXT_DEPENDENT_EXPRESSION_TYPES | cls.registered_types
+        if _contains_types(spec, uncacheable_types):
+            return None
+        try:
+            spec_json = json.dumps(spec, sort_keys=True, default=_typed_json_value)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha1(spec_json.encode('utf-8')).hexdigest()
+
+
+def _contains_types(spec, types):
+    if isinstance(spec, dict):
+        spec_type = spec.get('type')
+        if isinstance(spec_type, str) and spec_type in types:
+            return True
+        return any(_contains_types(value, types) for value in spec.values())
+    if isinstance(spec, list):
+        return any(_contains_types(value, types) for value in spec)
+    return False
+
+
+def _typed_json_value(value):
+    # keep the type so that e.g. a date and its ISO string don't share a key
+    return [type(value).__name__, str(value)]
+
 
 def _is_literal(value):
     return not isinstance(value, dict)
@@ -0,0 +1,254 @@
+"""Related document cache shared by the evaluation contexts of a chunk of documents
+
+Expressions such as ``related_doc``, ``related_case``, ``get_subcases`` and
+``get_case_forms`` look up other documents. ``ucr_context_cache`` only
+caches those lookups for a single document, so the UCR pillow and rebuild
+tasks fetch the same parent case or location once for every document that
+refers to it.
+
+A ``RelatedDocumentCache`` is created for each chunk of documents and
+passed to their evaluation contexts, which makes the lookups shared across
+the chunk. Before a chunk is evaluated, ``prefetch_related_docs`` evaluates
+the id expressions of the data source's ``related_doc`` and ``get_subcases``
+expressions against each document and resolves the ids in bulk, so that
+evaluation finds them in the cache. Only expressions whose id expressions
+are evaluated against the document itself are prefetched. Those that are
+evaluated against something else (e.g. a related document or a repeat item)
+are still looked up one at a time.
+"""
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from dimagi.utils.logging import notify_exception
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.const import (
+    RELATED_DOC,
+    RELATED_DOC_CACHE_SIZE,
+    SUBCASES,
+)
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.specs import EvaluationContext
+from corehq.form_processor.models import CommCareCase
+from corehq.util.metrics import metrics_counter
+
+# related document types that are prefetched with their document store
+PREFETCH_RELATED_DOC_TYPES = ('XFormInstance', 'CommCareCase', 'Group', 'Location')
+# properties of expressions that are evaluated against something other than
+# the item the expression is evaluated against, e.g. a related document or
+# the items of a list
+NESTED_CONTEXT_KEYS = ('value_expression', 'filter_expression', 'map_expression', 'sort_expression')
+
+
+class RelatedDocumentCache(object):
+    """
+    LRU cache of related documents, with hit and query counts per data source.
+
+    Keys are tuples that start with the kind of lookup and the domain, e.g.
+    ``(RELATED_DOC, domain, 'CommCareCase', case_id)``. Lookups that find
+    nothing are cached as ``None``.
+    """
+
+    def __init__(self, maxsize=RELATED_DOC_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.data_source_id = None
+        self.stats = defaultdict(Counter)
+        self._values = OrderedDict()
+
+    @contextmanager
+    def for_data_source(self, data_source_id):
+        """Count the lookups made inside the block against the data source"""
+        previous = self.data_source_id
+        self.data_source_id = data_source_id
+        try:
+            yield self
+        finally:
+            self.data_source_id = previous
+
+    def get(self, key, fetch):
+        if key in self._values:
+            self._values.move_to_end(key)
+            self._count('hits')
+            return self._values[key]
+
+        self._count('misses')
+        self._count('queries')
+        value = fetch()
+        self._set(key, value)
+        return value
+
+    def prefetch(self, keys, bulk_fetch):
+        """Resolve the keys that are not cached with a single call to ``bulk_fetch``
+
+        :param bulk_fetch: function that takes a list of keys and returns
+        a dict of values by key. Keys missing from the dict are cached as
+        ``None``.
+        """
+        missing = [key for key in dict.fromkeys(keys) if key not in self._values]
+        if not missing:
+            return
+        self._count('queries')
+        values = bulk_fetch(missing)
+        for key in missing[-self.maxsize:]:
+            self._set(key, values.get(key))
+
+    def record_metrics(self, domain):
+        for data_source_id, stats in self.stats.items():
+            tags = {'domain': domain}
+            if settings.ENTERPRISE_MODE:
+                tags['config_id'] = data_source_id
+            for result in ('hits', 'misses'):
+                if stats[result]:
+                    metrics_counter('commcare.ucr.related_doc_cache.lookups', stats[result], tags=dict(
+                        tags, result=result))
+            saved_queries = stats['hits'] + stats['misses'] - stats['queries']
+            if saved_queries > 0:
+                metrics_counter('commcare.ucr.related_doc_cache.saved_queries', saved_queries, tags=tags)
+        self.stats.clear()
+
+    def _count(self, stat):
+        self.stats[self.data_source_id][stat] += 1
+
+    def _set(self, key, value):
+        self._values[key] = value
+        self._values.move_to_end(key)
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def __len__(self):
+        return len(self._values)
+
+
+def prefetch_related_docs(config, docs, related_docs):
+    """Resolve in bulk the related documents that the data source looks up from ``docs``"""
+    for prefetcher in config.related_doc_prefetchers:
+        keys = []
+        for doc in docs:
+            doc_id = prefetcher.get_doc_id(doc, related_docs)
+            if doc_id and doc.get('domain'):
+                keys.append(prefetcher.get_key(doc['domain'], doc_id))
+        try:
+            related_docs.prefetch(keys, prefetcher.bulk_fetch)
+        except Exception:
+            # leave the documents to be looked up individually during evaluation
+            notify_exception(None, "Error prefetching UCR related documents", details={
+                'data_source_id': config._id,
+                'spec': prefetcher.spec,
+            })
+
+
+def get_related_doc_prefetchers(config):
+    factory_context = config.get_factory_context()
+    prefetchers = []
+    for spec in _iter_root_lookup_specs(config.to_json()):
+        if spec['type'] == 'related_doc' and spec.get('related_doc_type') in PREFETCH_RELATED_DOC_TYPES:
+            prefetcher_class = RelatedDocPrefetcher
+            id_expression_spec = spec.get('doc_id_expression')
+        elif spec['type'] == 'get_subcases':
+            prefetcher_class = SubcasesPrefetcher
+            id_expression_spec = spec.get('case_id_expression')
+        else:
+            continue
+        doc_id_expression = ExpressionFactory.from_spec(id_expression_spec, factory_context)
+        prefetchers.append(prefetcher_class(spec, doc_id_expression))
+    return prefetchers
+
+
+def _iter_root_lookup_specs(config_json):
+    """Yield the ``related_doc`` and ``get_subcases`` specs of a data source
+    whose id expressions are evaluated against the document itself
+    """
+    named_specs = {
+        **config_json.get('named_filters', {}),
+        **config_json.get('named_expressions', {}),
+    }
+    # the data source's indicators are evaluated against the base item, if it has one
+    root_specs = [config_json.get('configured_filter'), config_json.get('base_item_expression')]
+    if not config_json.get('base_item_expression'):
+        root_specs.append(config_json.get('configured_indicators'))
+
+    visited_names = set()
+
+    def iter_specs(spec):
+        if isinstance(spec, dict):
+            name = spec.get('name')
+            if spec.get('type') == 'named' and name in named_specs and name not in visited_names:
+                visited_names.add(name)
+                yield from iter_specs(named_specs[name])
+            if spec.get('type') in ('related_doc', 'get_subcases'):
+                yield spec
+            for key, value in spec.items():
+                if key not in NESTED_CONTEXT_KEYS:
+                    yield from iter_specs(value)
+        elif isinstance(spec, list):
+            for value in spec:
+                yield from iter_specs(value)
+
+    yield from iter_specs(root_specs)
+
+
+class _Prefetcher(object):
+
+    def __init__(self, spec, doc_id_expression):
+        self.spec = spec
+        self.doc_id_expression = doc_id_expression
+
+    def get_doc_id(self, doc, related_docs):
+        try:
+            doc_id = self.doc_id_expression(doc, EvaluationContext(doc, related_docs=related_docs))
+        except Exception:
+            # the expression may only apply to items within the document;
+            # it will fail again (and be reported) when the document is evaluated
+            return None
+        return doc_id if isinstance(doc_id, str) else None
+
+    def get_key(self, domain, doc_id):
+        raise NotImplementedError
+
+    def bulk_fetch(self, keys):
+        values = {}
+        doc_ids_by_domain = defaultdict(list)
+        for key in keys:
+            doc_ids_by_domain[key[1]].append(key[-1])
+        for domain, doc_ids in doc_ids_by_domain.items():
+            values.update(self._bulk_fetch(domain, doc_ids))
+        return values
+
+    def _bulk_fetch(self, domain, doc_ids):
+        raise NotImplementedError
+
+
+class RelatedDocPrefetcher(_Prefetcher):
+
+    def get_key(self, domain, doc_id):
+        return (RELATED_DOC, domain, self.spec['related_doc_type'], doc_id)
+
+    def _bulk_fetch(self, domain, doc_ids):
+        doc_type = self.spec['related_doc_type']
+        document_store = get_document_store_for_doc_type(
+            domain, doc_type, load_source="related_doc_expression")
+        return {
+            self.get_key(domain, doc['_id']): doc
+            for doc in document_store.iter_documents(doc_ids)
+            if doc.get('domain') == domain
+        }
+
+
+class SubcasesPrefetcher(_Prefetcher):
+
+    def get_key(self, domain, case_id):
+        return (SUBCASES, domain, case_id)
+
+    def _bulk_fetch(self, domain, case_ids):
+        subcases_by_case_id = {self.get_key(domain, case_id): [] for case_id in case_ids}
+        for case in CommCareCase.objects.get_reverse_indexed_cases(domain, case_ids):
+            case_json = case.to_json()
+            for referenced_id in {index.referenced_id for index in case.indices}:
+                key = self.get_key(domain, referenced_id)
+                if key in subcases_by_case_id:
+                    subcases_by_case_id[key].append(case_json)
+        return subcases_by_case_id
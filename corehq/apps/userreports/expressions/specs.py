@@ -18,7 +18,11 @@ from corehq.apps.change_feed.data_sources import (
 )
 from corehq.apps.locations.document_store import LOCATION_DOC_TYPE
 from corehq.apps.userreports.const import (
+    CASE_FORMS,
     NAMED_EXPRESSION_PREFIX,
+    RELATED_CASE,
+    RELATED_DOC,
+    SUBCASES,
     XFORM_CACHE_KEY_PREFIX,
 )
 from corehq.apps.userreports.datatypes import DataTypeProperty
@@ -620,12 +624,15 @@ class RelatedDocExpressionSpec(JsonObject):
             'Group': partial(_get_doc, domain, 'Group'),
             'Location': partial(_get_doc, domain, 'Location'),
         }[related_doc_type]
-        return func(doc_id)
+        return evaluation_context.get_related_doc(
+            (RELATED_DOC, domain, related_doc_type, doc_id),
+            partial(func, doc_id),
+        )
 
     def get_value(self, doc_id, evaluation_context):
         doc = self._get_document(self.related_doc_type, doc_id, evaluation_context)
         # explicitly use a new evaluation context since this is a new document
-        return self._value_expression(doc, EvaluationContext(doc, 0))
+        return self._value_expression(doc, EvaluationContext(doc, 0, evaluation_context.related_docs))
 
     def __str__(self):
         return "{}[{}]/{}".format(self.related_doc_type,
@@ -792,14 +799,20 @@ class RelatedCaseExpressionSpec(JsonObject):
     def get_value(self, case_id, external_id, evaluation_context):
         case = self._get_document(case_id, external_id, evaluation_context)
         # Use a new evaluation context since this is a new document
-        return self._value_expression(case, EvaluationContext(case, 0))
+        return self._value_expression(case, EvaluationContext(case, 0, evaluation_context.related_docs))
 
     @staticmethod
     @ucr_context_cache(vary_on=('case_id', 'external_id',))
     def _get_document(case_id, external_id, evaluation_context):
         domain = evaluation_context.root_doc['domain']
         assert domain
+        return evaluation_context.get_related_doc(
+            (RELATED_CASE, domain, case_id, external_id),
+            partial(RelatedCaseExpressionSpec._fetch_document, domain, case_id, external_id),
+        )
 
+    @staticmethod
+    def _fetch_document(domain, case_id, external_id):
         # Call get_document_store_for_doc_type() so that load counter tracks load.
         case_document_store = get_document_store_for_doc_type(
             domain,
@@ -1063,7 +1076,10 @@ class FormsExpressionSpec(JsonObject):
     @ucr_context_cache(vary_on=('case_id',))
     def _get_case_forms(self, case_id, evaluation_context):
         domain = evaluation_context.root_doc['domain']
-        return FormProcessorInterface(domain).get_case_forms(case_id)
+        return evaluation_context.get_related_doc(
+            (CASE_FORMS, domain, case_id),
+            partial(FormProcessorInterface(domain).get_case_forms, case_id),
+        )
 
     def _get_form_json(self, form, evaluation_context):
         cache_key = (XFORM_CACHE_KEY_PREFIX, form.get_id)
@@ -1101,7 +1117,10 @@ class SubcasesExpressionSpec(JsonObject):
     @ucr_context_cache(vary_on=('case_id',))
     def _get_subcases(self, case_id, evaluation_context):
         domain = evaluation_context.root_doc['domain']
-        return [c.to_json() for c in CommCareCase.objects.get_reverse_indexed_cases(domain, [case_id])]
+        return evaluation_context.get_related_doc(
+            (SUBCASES, domain, case_id),
+            lambda: [c.to_json() for c in CommCareCase.objects.get_reverse_indexed_cases(domain, [case_id])],
+        )
 
     def __str__(self):
         return "get subcases for {}".format(str(self._case_id_expression))
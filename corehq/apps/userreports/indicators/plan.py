@@ -0,0 +1,142 @@
+import json
+
+from corehq.apps.userreports.filters import SinglePropertyValueFilter
+from corehq.apps.userreports.indicators import (
+    BooleanIndicator,
+    ColumnValue,
+    CompoundIndicator,
+    RawIndicator,
+)
+from corehq.apps.userreports.indicators.specs import (
+    ChoiceListIndicatorSpec,
+    ExpressionIndicatorSpec,
+    RawIndicatorSpec,
+)
+
+# spec properties that determine the value of raw and expression indicators
+VALUE_SPEC_PROPERTIES = ('type', 'datatype', 'property_name', 'property_path', 'expression', 'transform')
+
+
+class IndicatorEvaluationPlan(object):
+    """
+    Evaluates the indicators of a data source, computing values that are
+    shared by several indicators only once per item.
+
+    Indicators share a value when their specs produce it the same way, e.g.
+    all the columns of a choice list indicator, or two expression indicators
+    with the same expression and datatype. Indicators that can't be matched
+    this way are evaluated as usual.
+    """
+
+    def __init__(self, indicator):
+        self.evaluators = list(_get_evaluators(indicator))
+
+    def get_values(self, item, evaluation_context=None):
+        shared_values = {}
+        return [
+            value
+            for evaluator in self.evaluators
+            for value in evaluator(item, evaluation_context, shared_values)
+        ]
+
+    def get_values_for_items(self, items):
+        """Evaluate the indicators for a batch of items, one evaluator at a time
+
+        :param items: list of ``(item, evaluation_context)``. Each item needs
+            its own context (see ``EvaluationContext.for_iteration``), since
+            the items are not evaluated one after the other.
+        :returns: the values of each item, as returned by ``get_values``
+        """
+        shared_values = [{} for item in items]
+        values = [[] for item in items]
+        for evaluator in self.evaluators:
+            for (item, evaluation_context), item_shared_values, item_values in zip(items, shared_values, values):
+                item_values.extend(evaluator(item, evaluation_context, item_shared_values))
+        return values
+
+    @property
+    def shared_value_count(self):
+        """Number of values computed once per item and shared between indicators"""
+        return len({
+            evaluator.key for evaluator in self.evaluators
+            if isinstance(evaluator, SharedValueEvaluator)
+        })
+
+
+class IndicatorEvaluator(object):
+
+    def __init__(self, indicator):
+        self.indicator = indicator
+
+    def __call__(self, item, evaluation_context, shared_values):
+        return self.indicator.get_values(item, evaluation_context)
+
+
+class SharedValueEvaluator(object):
+
+    def __init__(self, key, getter):
+        self.key = key
+        self.getter = getter
+
+    def get_value(self, item, evaluation_context, shared_values):
+        try:
+            return shared_values[self.key]
+        except KeyError:
+            value = shared_values[self.key] = self.getter(item, evaluation_context)
+            return value
+
+
+class RawValueEvaluator(SharedValueEvaluator):
+
+    def __init__(self, key, indicator):
+        super(RawValueEvaluator, self).__init__(key, indicator.getter)
+        self.column = indicator.column
+
+    def __call__(self, item, evaluation_context, shared_values):
+        return [ColumnValue(self.column, self.get_value(item, evaluation_context, shared_values))]
+
+
+class ChoiceValueEvaluator(SharedValueEvaluator):
+
+    def __init__(self, key, indicator):
+        super(ChoiceValueEvaluator, self).__init__(key, indicator.filter.expression)
+        self.column = indicator.column
+        self.operator = indicator.filter.operator
+        self.reference_expression = indicator.filter.reference_expression
+
+    def __call__(self, item, evaluation_context, shared_values):
+        matches = self.operator(
+            self.get_value(item, evaluation_context, shared_values),
+            self.reference_expression(item, evaluation_context),
+        )
+        return [ColumnValue(self.column, 1 if matches else 0)]
+
+
+def _get_evaluators(indicator):
+    if isinstance(indicator, CompoundIndicator):
+        if isinstance(indicator.wrapped_spec, ChoiceListIndicatorSpec):
+            yield from _get_choice_list_evaluators(indicator)
+        else:
+            for child in indicator.indicators:
+                yield from _get_evaluators(child)
+    elif (isinstance(indicator, RawIndicator)
+            and isinstance(indicator.wrapped_spec, (ExpressionIndicatorSpec, RawIndicatorSpec))):
+        spec = indicator.wrapped_spec.to_json()
+        key = _get_key('value', {name: spec.get(name) for name in VALUE_SPEC_PROPERTIES})
+        yield RawValueEvaluator(key, indicator)
+    else:
+        yield IndicatorEvaluator(indicator)
+
+
+def _get_choice_list_evaluators(indicator):
+    spec = indicator.wrapped_spec
+    key = _get_key('property', [spec.property_name, spec.property_path])
+    for child in indicator.indicators:
+        if isinstance(child, BooleanIndicator) and isinstance(child.filter, SinglePropertyValueFilter):
+            yield ChoiceValueEvaluator(key, child)
+        else:
+            yield IndicatorEvaluator(child)
+
+
+def _get_key(kind, value):
+    return json.dumps([kind, value], sort_keys=True, default=str)
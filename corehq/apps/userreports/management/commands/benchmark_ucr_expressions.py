@@ -0,0 +1,78 @@
+import glob
+import json
+import os
+import timeit
+import uuid
+from copy import deepcopy
+
+from django.core.management.base import BaseCommand
+
+from corehq.apps.userreports.expressions.factory import (
+    ExpressionFactory,
+    expression_cache,
+)
+from corehq.apps.userreports.models import DataSourceConfiguration
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'examples')
+
+
+class Command(BaseCommand):
+    help = ("Compare building and evaluating the example data sources "
+            "with and without the expression cache")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--docs', type=int, default=1000)
+
+    def handle(self, iterations, docs, **options):
+        for path in sorted(glob.glob(os.path.join(EXAMPLES_DIR, '*', '*-data-source.json'))):
+            with open(path, encoding='utf-8') as f:
+                spec = json.load(f)
+            self.stdout.write(os.path.basename(path))
+            self._benchmark(spec, iterations, docs)
+
+    def _benchmark(self, spec, iterations, doc_count):
+        docs = [_get_doc(spec) for i in range(doc_count)]
+
+        def build():
+            config = DataSourceConfiguration.wrap(deepcopy(spec))
+            config.get_columns()
+            config.parsed_expression
+            config.filter({})
+            return config
+
+        def evaluate(config):
+            for doc in docs:
+                config.get_all_values(doc)
+
+        for use_cache in (False, True):
+            ExpressionFactory.use_cache = use_cache
+            expression_cache.clear()
+            try:
+                build()  # warm up
+                build_time = timeit.timeit(build, number=iterations)
+                config = build()
+                evaluate_time = timeit.timeit(lambda: evaluate(config), number=1)
+            finally:
+                ExpressionFactory.use_cache = True
+            self.stdout.write("  {:<12} build: {:8.2f}ms  evaluate {} docs: {:8.2f}ms  cache hits: {}".format(
+                'cached' if use_cache else 'uncached',
+                build_time * 1000 / iterations,
+                doc_count,
+                evaluate_time * 1000,
+                expression_cache.hits,
+            ))
+
+
+def _get_doc(spec):
+    """Get a document that passes the data source's filter"""
+    doc = {
+        '_id': uuid.uuid4().hex,
+        'domain': spec['domain'],
+        'doc_type': spec['referenced_doc_type'],
+        'form': {},
+    }
+    doc_filter = spec.get('configured_filter', {})
+    if doc_filter.get('type') == 'boolean_expression' and doc_filter['expression'].get('property_name'):
+        doc[doc_filter['expression']['property_name']] = doc_filter['property_value']
+    return doc
@@ -12,9 +12,25 @@ class Command(BaseCommand):
                             help='Rebuild table in place (preserve existing data)')
         parser.add_argument('--initiated-by', action='store', required=True, dest='initiated',
                             help='Who initiated the rebuild (for sending email notifications)')
+        parser.add_argument('--sharded', action='store_true', default=False,
+                            help='Rebuild in parallel, with one celery task per shard of the documents')
+        parser.add_argument('--ranges-per-db', type=int, default=1,
+                            help='Number of primary key ranges to split each partition db into '
+                                 'when rebuilding in shards')
+        parser.add_argument('--resume', action='store_true', default=False,
+                            help='Resume the shards of a sharded rebuild that did not finish')
 
     def handle(self, indicator_config_id, **options):
-        if options['in_place']:
+        if options['resume']:
+            tasks.resume_sharded_rebuild(indicator_config_id, options['initiated'])
+        elif options['sharded']:
+            tasks.rebuild_indicators_sharded(
+                indicator_config_id,
+                initiated_by=options['initiated'],
+                source='rebuild_indicator_table',
+                ranges_per_db=options['ranges_per_db'],
+            )
+        elif options['in_place']:
             tasks.rebuild_indicators_in_place(
                 indicator_config_id, options['initiated'], source='rebuild_indicator_table'
             )
@@ -85,6 +85,9 @@ from corehq.apps.userreports.exceptions import (
     ValidationError,
 )
 from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.expressions.related_docs import (
+    get_related_doc_prefetchers,
+)
 from corehq.apps.userreports.extension_points import (
     static_ucr_data_source_paths,
     static_ucr_report_paths,
@@ -92,6 +95,7 @@ from corehq.apps.userreports.extension_points import (
 from corehq.apps.userreports.filters.factory import FilterFactory
 from corehq.apps.userreports.indicators import CompoundIndicator
 from corehq.apps.userreports.indicators.factory import IndicatorFactory
+from corehq.apps.userreports.indicators.plan import IndicatorEvaluationPlan
 from corehq.apps.userreports.reports.factory import (
     ChartFactory,
     ReportColumnFactory,
@@ -533,6 +537,16 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
             None,
         )
 
+    @property
+    @memoized
+    def indicator_plan(self):
+        return IndicatorEvaluationPlan(self.indicators)
+
+    @property
+    @memoized
+    def related_doc_prefetchers(self):
+        return get_related_doc_prefetchers(self)
+
     @property
     @memoized
     def parsed_expression(self):
@@ -570,7 +584,55 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
     def get_all_values(self, doc, eval_context=None):
         if not eval_context:
             eval_context = EvaluationContext(doc)
+        else:
+            # the context may already have been used for another data source or mirrored table
+            eval_context.reset_iteration()
+
+        if not self._is_valid_document(doc, eval_context):
+            return []
+
+        rows = []
+        for item in self.get_items(doc, eval_context):
+            values = self.indicator_plan.get_values(item, eval_context)
+            rows.append(values)
+            eval_context.increment_iteration()
+
+        return rows
 
+    def bulk_get_all_values(self, docs, eval_contexts=None):
+        """Get the rows of several documents, evaluating each indicator for
+        all of their items together
+
+        :param eval_contexts: the ``EvaluationContext`` of each document
+        :returns: the rows of each document, as returned by ``get_all_values``
+        """
+        if eval_contexts is None:
+            eval_contexts = [EvaluationContext(doc) for doc in docs]
+
+        items = []
+        item_counts = []
+        for doc, eval_context in zip(docs, eval_contexts):
+            # the context may already have been used for another data source or mirrored table
+            eval_context.reset_iteration()
+            if self._is_valid_document(doc, eval_context):
+                doc_items = self.get_items(doc, eval_context)
+            else:
+                doc_items = []
+            items.extend(
+                (item, eval_context.for_iteration(iteration))
+                for iteration, item in enumerate(doc_items)
+            )
+            item_counts.append(len(doc_items))
+
+        values = self.indicator_plan.get_values_for_items(items)
+        rows = []
+        start = 0
+        for count in item_counts:
+            rows.append(values[start:start + count])
+            start += count
+        return rows
+
+    def _is_valid_document(self, doc, eval_context):
         if self.has_validations:
             try:
                 self.validate_document(doc, eval_context)
@@ -586,15 +648,8 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
                             'validation_text': error[1],
                         }
                     )
-                return []
-
-        rows = []
-        for item in self.get_items(doc, eval_context):
-            values = self.indicators.get_values(item, eval_context)
-            rows.append(values)
-            eval_context.increment_iteration()
-
-        return rows
+                return False
+        return True
 
     def get_report_count(self):
         """
@@ -1,5 +1,6 @@
 import hashlib
 import signal
+import threading
 from abc import ABC, abstractmethod
 from collections import Counter, defaultdict
 from datetime import datetime, timedelta
@@ -21,6 +22,10 @@ from corehq.apps.userreports.data_source_providers import (
 from corehq.apps.userreports.exceptions import (
     UserReportsWarning,
 )
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocumentCache,
+    prefetch_related_docs,
+)
 from corehq.apps.userreports.models import AsyncIndicator
 from corehq.apps.userreports.pillow_utils import rebuild_sql_tables
 from corehq.apps.userreports.specs import EvaluationContext
@@ -46,9 +51,15 @@ class WarmShutdown(object):
     shutting_down = False
 
     def __enter__(self):
-        self.current_handler = signal.signal(signal.SIGTERM, self.handler)
+        # signal handlers can only be set in the main thread. The worker
+        # threads of a concurrent pillow leave SIGTERM to the main thread.
+        self.in_main_thread = threading.current_thread() is threading.main_thread()
+        if self.in_main_thread:
+            self.current_handler = signal.signal(signal.SIGTERM, self.handler)
 
     def __exit__(self, exc_type, exc_value, traceback):
+        if not self.in_main_thread:
+            return
         if self.shutting_down and exc_type is None:
             exit(0)
         signal.signal(signal.SIGTERM, self.current_handler)
@@ -123,6 +134,9 @@ class UcrTableManager(ABC):
         """
         self.bootstrapped = False
         self.last_bootstrapped = self.last_imported = datetime.utcnow()
+        # held to bootstrap, update or read the adapters when the manager is
+        # shared by the threads of a concurrent pillow
+        self.lock = threading.RLock()
         self.bootstrap_interval = bootstrap_interval or REBUILD_CHECK_INTERVAL
         self.run_migrations = run_migrations
 
@@ -395,11 +409,13 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
     Writes to:
       - UCR database
     """
+    thread_safe = True
 
     def __init__(self, table_manager):
         self.table_manager = table_manager
 
     domain_timing_context = Counter()
+    domain_timing_lock = threading.Lock()
 
     @time_ucr_process_change
     def _save_doc_to_table(self, domain, table, doc, eval_context):
@@ -408,7 +424,20 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
             table.best_effort_save(doc, eval_context)
         except UserReportsWarning:
             # remove it until the next bootstrap call
-            self.table_manager.remove_adapter(domain, table)
+            with self.table_manager.lock:
+                self.table_manager.remove_adapter(domain, table)
+
+    def _get_adapters_by_domain(self, domains):
+        """Bootstrap the table manager if needed and get the adapters for the
+        domains that have UCR tables
+        """
+        with self.table_manager.lock:
+            self.bootstrap_if_needed()
+            relevant_domains = self.table_manager.relevant_domains
+            return {
+                domain: self.table_manager.get_adapters(domain)
+                for domain in domains if domain in relevant_domains
+            }
 
     def process_changes_chunk(self, changes):
         """
@@ -416,28 +445,27 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
             If an exception is raised in bulk operations of a set of changes,
             those changes are returned to pillow for serial reprocessing.
         """
-        self.bootstrap_if_needed()
+        changes = [change for change in changes if not is_couch_change_for_sql_domain(change)]
+        adapters_by_domain = self._get_adapters_by_domain({change.metadata.domain for change in changes})
         # break up changes by domain
         changes_by_domain = defaultdict(list)
         for change in changes:
-            if is_couch_change_for_sql_domain(change):
-                continue
             # skip if no domain or no UCR tables in the domain
-            if change.metadata.domain and change.metadata.domain in self.table_manager.relevant_domains:
+            if change.metadata.domain in adapters_by_domain:
                 changes_by_domain[change.metadata.domain].append(change)
 
         retry_changes = set()
         change_exceptions = []
         for domain, changes_chunk in changes_by_domain.items():
             with WarmShutdown():
-                failed, exceptions = self._process_chunk_for_domain(domain, changes_chunk)
+                failed, exceptions = self._process_chunk_for_domain(
+                    domain, adapters_by_domain[domain], changes_chunk)
             retry_changes.update(failed)
             change_exceptions.extend(exceptions)
 
         return retry_changes, change_exceptions
 
-    def _process_chunk_for_domain(self, domain, changes_chunk):
-        adapters = self.table_manager.get_adapters(domain)
+    def _process_chunk_for_domain(self, domain, adapters, changes_chunk):
         changes_by_id = {change.id: change for change in changes_chunk}
         to_delete_by_adapter = defaultdict(list)
         rows_to_save_by_adapter = defaultdict(list)
@@ -446,30 +474,44 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
         with self._metrics_timer('extract'):
             retry_changes, docs = bulk_fetch_changes_docs(to_update, domain)
         change_exceptions = []
+        related_docs = RelatedDocumentCache()
+
+        with self._metrics_timer('prefetch_related_docs'):
+            for adapter in adapters:
+                if not adapter.run_asynchronous:
+                    with related_docs.for_data_source(adapter.config._id):
+                        prefetch_related_docs(adapter.config, docs, related_docs)
 
         with self._metrics_timer('single_batch_transform'):
+            eval_contexts = {}
+            docs_to_save_by_adapter = defaultdict(list)
             for doc in docs:
                 change = changes_by_id[doc['_id']]
                 doc_subtype = change.metadata.document_subtype
-                eval_context = EvaluationContext(doc)
+                eval_context = eval_contexts[doc['_id']] = EvaluationContext(doc, related_docs=related_docs)
                 with self._metrics_timer('single_doc_transform'):
                     for adapter in adapters:
-                        with self._per_config_metrics_timer('transform', adapter.config._id):
+                        with self._per_config_metrics_timer('transform', adapter.config._id), \
+                                related_docs.for_data_source(adapter.config._id):
                             if adapter.config.filter(doc, eval_context):
                                 if adapter.run_asynchronous:
                                     async_configs_by_doc_id[doc['_id']].append(adapter.config._id)
                                 else:
-                                    try:
-                                        rows_to_save_by_adapter[adapter].extend(adapter.get_all_values(doc, eval_context))
-                                    except Exception as e:
-                                        change_exceptions.append((change, e))
-                                    eval_context.reset_iteration()
+                                    docs_to_save_by_adapter[adapter].append(doc)
                             elif (not doc_subtype
                                     or doc_subtype in adapter.config.get_case_type_or_xmlns_filter()):
                                 # Delete if the subtype is unknown or
                                 # if the subtype matches our filters, but the full filter no longer applies
                                 to_delete_by_adapter[adapter].append(doc)
 
+            for adapter, docs_to_save in docs_to_save_by_adapter.items():
+                with self._per_config_metrics_timer('transform', adapter.config._id), \
+                        related_docs.for_data_source(adapter.config._id):
+                    rows, exceptions = self._get_rows_for_docs(adapter, docs_to_save, eval_contexts, changes_by_id)
+                rows_to_save_by_adapter[adapter].extend(rows)
+                change_exceptions.extend(exceptions)
+        related_docs.record_metrics(domain)
+
         with self._metrics_timer('single_batch_delete'):
             # bulk delete by adapter
             to_delete = [{'_id': c.id} for c in changes_chunk if c.deleted]
@@ -503,6 +545,33 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
 
         return retry_changes, change_exceptions
 
+    @staticmethod
+    def _get_rows_for_docs(adapter, docs, eval_contexts, changes_by_id):
+        """Get the rows of ``docs`` for ``adapter``, evaluating its indicators for
+        all of the documents together
+
+        If that fails, the documents are evaluated one at a time so that only
+        the changes of the documents that fail are reported.
+
+        :returns: tuple of ``(rows, change_exceptions)``
+        """
+        doc_eval_contexts = [eval_contexts[doc['_id']] for doc in docs]
+        try:
+            rows_by_doc = adapter.bulk_get_all_values(docs, doc_eval_contexts)
+        except Exception:
+            pass
+        else:
+            return [row for doc_rows in rows_by_doc for row in doc_rows], []
+
+        rows = []
+        change_exceptions = []
+        for doc, eval_context in zip(docs, doc_eval_contexts):
+            try:
+                rows.extend(adapter.get_all_values(doc, eval_context))
+            except Exception as e:
+                change_exceptions.append((changes_by_id[doc['_id']], e))
+        return rows, change_exceptions
+
     def _metrics_timer(self, step, config_id=None):
         tags = {
             'action': step,
@@ -527,15 +596,13 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
         )
 
     def process_change(self, change):
-        self.bootstrap_if_needed()
-
         domain = change.metadata.domain
-        if not domain or domain not in self.table_manager.relevant_domains:
+        adapters = self._get_adapters_by_domain([domain]).get(domain)
+        if adapters is None:
             # if no domain we won't save to any UCR table
             return
 
         if change.deleted:
-            adapters = self.table_manager.get_adapters(domain)
             for table in adapters:
                 table.delete({'_id': change.metadata.document_id})
 
@@ -549,8 +616,6 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
 
         with TimingContext() as timer:
             eval_context = EvaluationContext(doc)
-            # make copy to avoid modifying list during iteration
-            adapters = self.table_manager.get_adapters(domain)
             doc_subtype = change.metadata.document_subtype
             for table in adapters:
                 if table.config.filter(doc, eval_context):
@@ -566,11 +631,16 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
             if async_tables:
                 AsyncIndicator.update_from_kafka_change(change, async_tables)
 
-        self.domain_timing_context.update(**{
-            domain: timer.duration
-        })
+        with self.domain_timing_lock:
+            self.domain_timing_context.update(**{
+                domain: timer.duration
+            })
 
     def checkpoint_updated(self):
+        with self.domain_timing_lock:
+            self._record_slow_domains()
+
+    def _record_slow_domains(self):
         total_duration = sum(self.domain_timing_context.values())
         duration_seen = 0
         top_half_domains = {}
@@ -587,7 +657,8 @@ class ConfigurableReportPillowProcessor(BulkPillowProcessor):
         self.domain_timing_context.clear()
 
     def bootstrap_if_needed(self):
-        self.table_manager.bootstrap_if_needed()
+        with self.table_manager.lock:
+            self.table_manager.bootstrap_if_needed()
 
 
 class ConfigurableReportKafkaPillow(ConstructedPillow):
@@ -1,12 +1,22 @@
+import json
 import logging
 from collections import defaultdict
 
+from django.db.models import Max, Min, Q
+
 import attr
 from alembic.autogenerate import compare_metadata
 from alembic.operations import Operations
 
 from dimagi.utils.couch import get_redis_client
 
+from corehq.apps.change_feed.document_types import CASE_DOC_TYPES
+from corehq.form_processor.backends.sql.dbaccessors import (
+    CaseReindexAccessor,
+    FormReindexAccessor,
+)
+from corehq.form_processor.models import XFormInstance
+
 from .alembic_diffs import (
     DiffTypes,
     get_migration_context,
@@ -51,6 +61,171 @@ class DataSourceResumeHelper(object):
         return self._client.exists(self._key)
 
 
+@attr.s(frozen=True)
+class RebuildShard(object):
+    """Documents of one domain and case type or xmlns in one partition db
+
+    Only documents with a primary key greater than ``start_pk`` and at most
+    ``end_pk`` belong to the shard; ``None`` leaves that end unbounded.
+    """
+    domain = attr.ib()
+    case_type_or_xmlns = attr.ib()
+    db_alias = attr.ib()
+    start_pk = attr.ib(default=None)
+    end_pk = attr.ib(default=None)
+
+    @property
+    def key(self):
+        return ':'.join(str(value) for value in attr.astuple(self))
+
+    def to_json(self):
+        return attr.asdict(self)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(**data)
+
+    def iter_doc_id_chunks(self, accessor, last_pk=None, chunk_size=1000):
+        """
+        :param last_pk: primary key of the last document already processed
+        :returns: generator of ``(doc_ids, last_pk)`` tuples
+        """
+        if last_pk is None or (self.start_pk is not None and last_pk < self.start_pk):
+            last_pk = self.start_pk
+        while True:
+            docs = list(accessor.get_doc_ids(self.db_alias, last_doc_pk=last_pk, limit=chunk_size))
+            if self.end_pk is not None:
+                docs = [doc for doc in docs if doc.primary_key <= self.end_pk]
+            if not docs:
+                return
+            last_pk = docs[-1].primary_key
+            yield [doc.doc_id for doc in docs], last_pk
+            if len(docs) < chunk_size:
+                return
+
+
+def can_rebuild_sharded(config):
+    return (
+        not config.asynchronous
+        and (config.referenced_doc_type in CASE_DOC_TYPES
+             or config.referenced_doc_type in XFormInstance.ALL_DOC_TYPES)
+    )
+
+
+def get_reindex_accessor(config, domain, case_type_or_xmlns, db_alias=None):
+    limit_db_aliases = [db_alias] if db_alias else None
+    if config.referenced_doc_type in CASE_DOC_TYPES:
+        return CaseReindexAccessor(domain, case_type=case_type_or_xmlns, limit_db_aliases=limit_db_aliases)
+    return _FormByXmlnsReindexAccessor(domain, xmlns=case_type_or_xmlns, limit_db_aliases=limit_db_aliases)
+
+
+class _FormByXmlnsReindexAccessor(FormReindexAccessor):
+    """Normal forms of a domain, optionally limited to one xmlns"""
+
+    def __init__(self, domain, xmlns=None, limit_db_aliases=None):
+        super().__init__(domain, include_attachments=False, limit_db_aliases=limit_db_aliases)
+        self.xmlns = xmlns
+
+    def extra_filters(self, for_count=False):
+        filters = super().extra_filters(for_count=for_count)
+        filters.append(Q(state=XFormInstance.NORMAL))
+        if self.xmlns:
+            filters.append(Q(xmlns=self.xmlns))
+        return filters
+
+
+def get_rebuild_shards(config, ranges_per_db=1):
+    """Split the documents of a data source into shards
+
+    There is one shard per domain, case type or xmlns and partition db, and
+    each of those is split into ``ranges_per_db`` primary key ranges of
+    similar width.
+    """
+    shards = []
+    for domain in config.data_domains:
+        for case_type_or_xmlns in config.get_case_type_or_xmlns_filter():
+            accessor = get_reindex_accessor(config, domain, case_type_or_xmlns)
+            for db_alias in accessor.sql_db_aliases:
+                for start_pk, end_pk in _get_pk_ranges(accessor, db_alias, ranges_per_db):
+                    shards.append(RebuildShard(domain, case_type_or_xmlns, db_alias, start_pk, end_pk))
+    return shards
+
+
+def _get_pk_ranges(accessor, db_alias, ranges_per_db):
+    if ranges_per_db <= 1:
+        return [(None, None)]
+    bounds = accessor.query(db_alias, for_count=True).aggregate(
+        min_pk=Min(accessor.primary_key_field_name),
+        max_pk=Max(accessor.primary_key_field_name),
+    )
+    if bounds['min_pk'] is None:
+        return [(None, None)]
+    min_pk, max_pk = bounds['min_pk'], bounds['max_pk']
+    width = -(-(max_pk - min_pk + 1) // ranges_per_db)
+    ranges = []
+    start_pk = None
+    end_pk = min_pk - 1
+    while end_pk + width < max_pk:
+        end_pk += width
+        ranges.append((start_pk, end_pk))
+        start_pk = end_pk
+    ranges.append((start_pk, None))
+    return ranges
+
+
+class ShardedRebuildHelper(object):
+    """Tracks the shards of a sharded rebuild and the progress of each
+
+    The progress of a shard is the primary key of the last document whose
+    rows have been saved, so a shard that is interrupted carries on from
+    there when it is run again.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._client = get_redis_client().client.get_client()
+        # not keyed on the revision since the rebuild itself saves the config
+        self._key = 'ucr_sharded_rebuild-{}'.format(config._id)
+
+    def set_shards(self, shards):
+        self.clear_resume_info()
+        if shards:
+            self._client.hset(self._key, mapping={
+                shard.key: json.dumps({'shard': shard.to_json(), 'last_pk': None, 'complete': False})
+                for shard in shards
+            })
+
+    def _get_progress(self):
+        return [json.loads(value) for value in self._client.hvals(self._key)]
+
+    def get_pending_shards(self):
+        return [
+            RebuildShard.from_json(progress['shard'])
+            for progress in self._get_progress()
+            if not progress['complete']
+        ]
+
+    def get_last_pk(self, shard):
+        value = self._client.hget(self._key, shard.key)
+        return json.loads(value)['last_pk'] if value else None
+
+    def set_last_pk(self, shard, last_pk, complete=False):
+        self._client.hset(self._key, shard.key, json.dumps({
+            'shard': shard.to_json(),
+            'last_pk': last_pk,
+            'complete': complete,
+        }))
+
+    def mark_complete(self, shard):
+        self.set_last_pk(shard, self.get_last_pk(shard), complete=True)
+
+    def clear_resume_info(self):
+        self._client.delete(self._key)
+
+    def has_resume_info(self):
+        return self._client.exists(self._key)
+
+
 @attr.s
 class MigrateRebuildTables(object):
     migrate = attr.ib()
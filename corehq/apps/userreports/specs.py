@@ -113,15 +113,25 @@ class EvaluationContext(object):
     """
     An evaluation context. Necessary for repeats to pass both the row of the repeat as well
     as the root document and the iteration number.
+
+    ``related_docs`` is an optional ``RelatedDocumentCache`` shared by the
+    contexts of a chunk of documents.
     """
 
-    def __init__(self, root_doc, iteration=0):
+    def __init__(self, root_doc, iteration=0, related_docs=None):
         self.root_doc = root_doc
         self.iteration = iteration
+        self.related_docs = related_docs
         self.inserted_timestamp = datetime.utcnow()
         self.cache = {}
         self.iteration_cache = {}
 
+    def get_related_doc(self, key, fetch):
+        """Look up a related document, sharing it with the rest of the chunk if possible"""
+        if self.related_docs is None:
+            return fetch()
+        return self.related_docs.get(key, fetch)
+
     def exists_in_cache(self, key):
         return key in self.cache or key in self.iteration_cache
 
@@ -148,6 +158,18 @@ class EvaluationContext(object):
         self.iteration_cache = {}
         self.iteration = 0
 
+    def for_iteration(self, iteration):
+        """Get a context for the item of the document at ``iteration``
+
+        It shares the document cache of this context but has its own
+        iteration cache, so the items of a document can be evaluated in any
+        order.
+        """
+        context = EvaluationContext(self.root_doc, iteration, self.related_docs)
+        context.inserted_timestamp = self.inserted_timestamp
+        context.cache = self.cache
+        return context
+
     @staticmethod
     def empty():
         return EvaluationContext({})
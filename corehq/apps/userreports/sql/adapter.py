@@ -202,9 +202,7 @@ class IndicatorSqlAdapter(IndicatorAdapter):
         )
 
     def bulk_save(self, docs):
-        rows = []
-        for doc in docs:
-            rows.extend(self.get_all_values(doc))
+        rows = [row for doc_rows in self.bulk_get_all_values(docs) for row in doc_rows]
         self.save_rows(rows)
 
     def bulk_delete(self, docs, use_shard_col=True):
@@ -287,6 +285,9 @@ class MultiDBSqlAdapter(object):
     def get_all_values(self, doc, eval_context=None):
         return self.config.get_all_values(doc, eval_context)
 
+    def bulk_get_all_values(self, docs, eval_contexts=None):
+        return self.config.bulk_get_all_values(docs, eval_contexts)
+
     @property
     def run_asynchronous(self):
         return self.config.asynchronous
@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.db import DatabaseError, InternalError, transaction
+from django.db import InterfaceError as DjangoInterfaceError
+from django.db import OperationalError as DjangoOperationalError
 from django.db.models import Count, Min
 from django.utils.translation import gettext as _
 
@@ -12,10 +14,12 @@ from botocore.vendored.requests.exceptions import ReadTimeout
 from botocore.vendored.requests.packages.urllib3.exceptions import (
     ProtocolError,
 )
+from celery import chord
 from celery.schedules import crontab
 from couchdbkit import ResourceConflict, ResourceNotFound
 
 from couchexport.models import Format
+from sqlalchemy.exc import InterfaceError, OperationalError
 from dimagi.utils.chunked import chunked
 from dimagi.utils.couch import CriticalSection
 from dimagi.utils.logging import notify_exception
@@ -31,17 +35,29 @@ from corehq.apps.userreports.const import (
     ASYNC_INDICATOR_CHUNK_SIZE,
     ASYNC_INDICATOR_MAX_RETRIES,
     ASYNC_INDICATOR_QUEUE_TIME,
+    SHARDED_REBUILD_ROW_BATCH_SIZE,
     UCR_CELERY_QUEUE,
     UCR_INDICATOR_CELERY_QUEUE,
 )
 from corehq.apps.userreports.exceptions import (
     DataSourceConfigurationNotFoundError,
 )
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocumentCache,
+    prefetch_related_docs,
+)
 from corehq.apps.userreports.models import (
     AsyncIndicator,
     id_is_static,
 )
-from corehq.apps.userreports.rebuild import DataSourceResumeHelper
+from corehq.apps.userreports.rebuild import (
+    DataSourceResumeHelper,
+    RebuildShard,
+    ShardedRebuildHelper,
+    can_rebuild_sharded,
+    get_rebuild_shards,
+    get_reindex_accessor,
+)
 from corehq.apps.userreports.specs import EvaluationContext
 from corehq.apps.userreports.util import (
     get_async_indicator_modify_lock_key,
@@ -68,14 +84,21 @@ celery_task_logger = logging.getLogger('celery.task')
 def _build_indicators(config, document_store, relevant_ids):
     adapter = get_indicator_adapter(config, raise_errors=True, load_source='build_indicators')
 
-    for doc in document_store.iter_documents(relevant_ids):
-        if config.asynchronous:
+    docs = list(document_store.iter_documents(relevant_ids))
+    if config.asynchronous:
+        for doc in docs:
             AsyncIndicator.update_record(
                 doc.get('_id'), config.referenced_doc_type, config.domain, [config._id]
             )
-        else:
+        return
+
+    related_docs = RelatedDocumentCache()
+    with related_docs.for_data_source(config._id):
+        prefetch_related_docs(config, docs, related_docs)
+        for doc in docs:
             # save is a noop if the filter doesn't match
-            adapter.best_effort_save(doc)
+            adapter.best_effort_save(doc, EvaluationContext(doc, related_docs=related_docs))
+    related_docs.record_metrics(config.domain)
 
 
 @serial_task('{indicator_config_id}', default_retry_delay=60 * 10, timeout=3 * 60 * 60, max_retries=20,
@@ -159,7 +182,6 @@ def resume_building_indicators(indicator_config_id, initiated_by=None):
 
 def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-1):
     resume_helper = resume_helper or DataSourceResumeHelper(config)
-    indicator_config_id = config._id
     case_type_or_xmlns_list = config.get_case_type_or_xmlns_filter()
     domains = config.data_domains
 
@@ -190,7 +212,11 @@ def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-
         resume_helper.add_completed_iteration(domain, case_type_or_xmlns)
 
     resume_helper.clear_resume_info()
-    if not id_is_static(indicator_config_id):
+    _mark_build_finished(config, in_place)
+
+
+def _mark_build_finished(config, in_place=False):
+    if not id_is_static(config._id):
         if in_place:
             config.meta.build.finished_in_place = True
         else:
@@ -209,6 +235,133 @@ def _iteratively_build_table(config, resume_helper=None, in_place=False, limit=-
             current_config.save()
 
 
+@serial_task('{indicator_config_id}', default_retry_delay=60 * 10, timeout=60 * 60, max_retries=20,
+             queue=UCR_CELERY_QUEUE, ignore_result=True, serializer='pickle')
+def rebuild_indicators_sharded(indicator_config_id, initiated_by=None, source=None, ranges_per_db=1):
+    """Rebuild a data source table with one task per shard of its documents
+
+    The shards run in parallel on the UCR queue workers. Use
+    ``resume_sharded_rebuild`` to run the shards that did not finish.
+    """
+    config = get_ucr_datasource_config_by_id(indicator_config_id)
+    assert can_rebuild_sharded(config), "Data source can't be rebuilt in shards"
+    adapter = get_indicator_adapter(config)
+    if not id_is_static(indicator_config_id):
+        config.meta.build.initiated = datetime.utcnow()
+        config.meta.build.finished = False
+        config.meta.build.rebuilt_asynchronously = False
+        config.save()
+
+    adapter.rebuild_table(initiated_by=initiated_by, source=source)
+    shards = get_rebuild_shards(config, ranges_per_db)
+    ShardedRebuildHelper(config).set_shards(shards)
+    _run_rebuild_shards(indicator_config_id, shards, initiated_by)
+
+
+@task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True)
+def resume_sharded_rebuild(indicator_config_id, initiated_by=None):
+    config = get_ucr_datasource_config_by_id(indicator_config_id)
+    shards = ShardedRebuildHelper(config).get_pending_shards()
+    _run_rebuild_shards(indicator_config_id, shards, initiated_by)
+
+
+def _run_rebuild_shards(indicator_config_id, shards, initiated_by):
+    callback = finish_sharded_rebuild.si(indicator_config_id, initiated_by)
+    if not shards:
+        callback.delay()
+        return
+    header = [build_indicators_for_shard.si(indicator_config_id, shard.to_json()) for shard in shards]
+    chord(header)(callback)
+
+
+# Errors that a shard is retried for, because they are likely to go away
+TRANSIENT_REBUILD_ERRORS = (
+    OperationalError,
+    InterfaceError,
+    DjangoOperationalError,
+    DjangoInterfaceError,
+)
+
+
+@task(bind=True, serializer='pickle', queue=UCR_CELERY_QUEUE, acks_late=True,
+      default_retry_delay=5 * 60, max_retries=5)
+def build_indicators_for_shard(self, indicator_config_id, shard_json):
+    config = get_ucr_datasource_config_by_id(indicator_config_id)
+    shard = RebuildShard.from_json(shard_json)
+    try:
+        _build_indicators_for_shard(config, shard, ShardedRebuildHelper(config))
+    except TRANSIENT_REBUILD_ERRORS as e:
+        # acks_late also redelivers the task if the worker dies; either way
+        # the shard continues from the last saved batch. Shards that fail
+        # for any other reason are left for resume_sharded_rebuild.
+        raise self.retry(exc=e)
+
+
+def _build_indicators_for_shard(config, shard, progress):
+    adapter = get_indicator_adapter(config, raise_errors=True, load_source='build_indicators_for_shard')
+    document_store = get_document_store_for_doc_type(
+        shard.domain, config.referenced_doc_type,
+        case_type_or_xmlns=shard.case_type_or_xmlns,
+        load_source="build_indicators_for_shard",
+    )
+    accessor = get_reindex_accessor(config, shard.domain, shard.case_type_or_xmlns, shard.db_alias)
+
+    rows_by_doc = []
+    num_rows = 0
+    for doc_ids, last_pk in shard.iter_doc_id_chunks(accessor, progress.get_last_pk(shard)):
+        docs = list(document_store.iter_documents(doc_ids))
+        related_docs = RelatedDocumentCache()
+        with related_docs.for_data_source(config._id):
+            prefetch_related_docs(config, docs, related_docs)
+            for doc in docs:
+                try:
+                    rows = adapter.get_all_values(doc, EvaluationContext(doc, related_docs=related_docs))
+                except Exception as e:
+                    adapter.handle_exception(doc, e)
+                else:
+                    if rows:
+                        rows_by_doc.append((doc, rows))
+                        num_rows += len(rows)
+        related_docs.record_metrics(shard.domain)
+
+        if num_rows >= SHARDED_REBUILD_ROW_BATCH_SIZE:
+            _save_rows_for_shard(adapter, rows_by_doc)
+            rows_by_doc = []
+            num_rows = 0
+            progress.set_last_pk(shard, last_pk)
+
+    _save_rows_for_shard(adapter, rows_by_doc)
+    progress.mark_complete(shard)
+
+
+def _save_rows_for_shard(adapter, rows_by_doc):
+    """Save the rows of a batch of documents, falling back to saving the
+    rows of each document on its own if the batch fails, so that one bad
+    row only fails its own document, as it would for a normal rebuild
+    """
+    try:
+        adapter.save_rows([row for doc, rows in rows_by_doc for row in rows])
+    except TRANSIENT_REBUILD_ERRORS:
+        raise
+    except Exception:
+        for table_adapter in getattr(adapter, 'all_adapters', [adapter]):
+            for doc, rows in rows_by_doc:
+                table_adapter._best_effort_save_rows(rows, doc)
+
+
+@task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True)
+def finish_sharded_rebuild(indicator_config_id, initiated_by=None):
+    config = get_ucr_datasource_config_by_id(indicator_config_id)
+    progress = ShardedRebuildHelper(config)
+    if progress.get_pending_shards():
+        # a new rebuild has started since the shards were queued
+        return
+    progress.clear_resume_info()
+    success = _('Your UCR table {} has finished rebuilding in {}').format(config.table_id, config.domain)
+    with notify_someone(initiated_by, success_message=success):
+        _mark_build_finished(config)
+
+
 @task(serializer='pickle', queue=UCR_CELERY_QUEUE, ignore_result=True)
 def delete_data_source_task(domain, config_id):
     from corehq.apps.userreports.views import delete_data_source_shared
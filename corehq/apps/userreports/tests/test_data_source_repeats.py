@@ -69,6 +69,27 @@ class RepeatDataSourceConfigurationTest(RepeatDataSourceTestMixin, SimpleTestCas
             self.assertEqual(logs[i]['person'], person_ind.value)
             self.assertEqual(DAY_OF_WEEK, created_base_ind.value)
 
+    def test_bulk_get_all_values(self):
+        now = datetime.datetime.utcnow()
+        one_hour = datetime.timedelta(hours=1)
+        docs = [
+            _test_doc(form={"time_logs": [
+                {"start_time": now, "end_time": now + one_hour, "person": "al"},
+                {"start_time": now + one_hour, "end_time": now + (one_hour * 2), "person": "chris"},
+            ]}),
+            _test_doc(form={}),
+            _test_doc(form={"time_logs": {"start_time": now, "end_time": now + one_hour, "person": "katie"}}),
+        ]
+
+        def values(rows):
+            # skip the inserted_at column
+            return [[value.value for i, value in enumerate(row) if i != 1] for row in rows]
+
+        self.assertEqual(
+            [values(rows) for rows in self.config.bulk_get_all_values(docs)],
+            [values(self.config.get_all_values(doc)) for doc in docs],
+        )
+
 
 class RepeatDataSourceBuildTest(RepeatDataSourceTestMixin, TestCase):
 
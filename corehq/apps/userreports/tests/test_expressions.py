@@ -16,7 +16,16 @@ from corehq.apps.domain.models import Domain
 from corehq.apps.groups.models import Group
 from corehq.apps.userreports.decorators import ucr_context_cache
 from corehq.apps.userreports.exceptions import BadSpecError
-from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.expressions.factory import (
+    ExpressionCache,
+    ExpressionFactory,
+    expression_cache,
+)
+from corehq.apps.userreports.expressions.related_docs import (
+    RelatedDocumentCache,
+    get_related_doc_prefetchers,
+    prefetch_related_docs,
+)
 from corehq.apps.userreports.expressions.specs import (
     PropertyNameGetterSpec,
     PropertyPathGetterSpec,
@@ -209,6 +218,58 @@ class ExpressionFromSpecTest(SimpleTestCase):
                 })
 
 
+class ExpressionCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        expression_cache.clear()
+        self.addCleanup(expression_cache.clear)
+
+    def test_same_spec_reused(self):
+        first = ExpressionFactory.from_spec({'type': 'property_name', 'property_name': 'foo'})
+        second = ExpressionFactory.from_spec({'property_name': 'foo', 'type': 'property_name'})
+        self.assertIs(first, second)
+        self.assertEqual(expression_cache.hits, 1)
+
+    def test_different_specs(self):
+        first = ExpressionFactory.from_spec({'type': 'property_name', 'property_name': 'foo'})
+        second = ExpressionFactory.from_spec({'type': 'property_name', 'property_name': 'bar'})
+        self.assertIsNot(first, second)
+        self.assertEqual(second({'bar': 1}), 1)
+
+    def test_typed_constants(self):
+        as_date = ExpressionFactory.from_spec({'type': 'constant', 'constant': date(2020, 1, 1)})
+        as_string = ExpressionFactory.from_spec({'type': 'constant', 'constant': '2020-01-01'})
+        self.assertIsNot(as_date, as_string)
+
+    def test_named_expression_not_cached(self):
+        factory_context = FactoryContext({
+            'foo': ExpressionFactory.from_spec({'type': 'property_name', 'property_name': 'foo'}),
+        }, {})
+        spec = {'type': 'nested', 'argument_expression': {'type': 'named', 'name': 'foo'},
+                'value_expression': {'type': 'identity'}}
+        first = ExpressionFactory.from_spec(spec, factory_context)
+        second = ExpressionFactory.from_spec(spec, factory_context)
+        self.assertIsNot(first, second)
+
+    def test_cache_disabled(self):
+        spec = {'type': 'property_name', 'property_name': 'foo'}
+        with patch.object(ExpressionFactory, 'use_cache', False):
+            first = ExpressionFactory.from_spec(spec)
+            second = ExpressionFactory.from_spec(spec)
+        self.assertIsNot(first, second)
+        self.assertEqual(len(expression_cache), 0)
+
+    def test_eviction(self):
+        cache = ExpressionCache(maxsize=2)
+        cache.get_or_build('a', lambda: 'A')
+        cache.get_or_build('b', lambda: 'B')
+        cache.get_or_build('a', lambda: 'A2')
+        cache.get_or_build('c', lambda: 'C')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get_or_build('a', lambda: 'A3'), 'A')
+        self.assertEqual(cache.get_or_build('b', lambda: 'B2'), 'B2')
+
+
 class PropertyNameExpressionTest(SimpleTestCase):
     def test_basic(self):
         wrapped_expression = ExpressionFactory.from_spec({
@@ -1013,6 +1074,113 @@ class RelatedDocExpressionTest(SimpleTestCase):
         self.assertEqual('foo', self.expression(my_doc, context))
 
 
+class RelatedDocumentCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.related_docs = RelatedDocumentCache()
+        self.expression = ExpressionFactory.from_spec({
+            "type": "related_doc",
+            "related_doc_type": "CommCareCase",
+            "doc_id_expression": {"type": "property_name", "property_name": "parent_id"},
+            "value_expression": {"type": "property_name", "property_name": "related_property"},
+        })
+        self.database = {
+            'parent': {'_id': 'parent', 'domain': 'test-domain', 'related_property': 'foo'},
+        }
+
+    def _get_case(self, case_id, domain):
+        doc = self.database.get(case_id)
+        if doc is None:
+            raise CaseNotFound
+        return Config(to_json=lambda: doc)
+
+    def _evaluate(self, doc):
+        return self.expression(doc, EvaluationContext(doc, related_docs=self.related_docs))
+
+    def test_lookup_shared_between_documents(self):
+        docs = [{'domain': 'test-domain', 'parent_id': 'parent'} for i in range(3)]
+        with patch.object(CommCareCase.objects, 'get_case', side_effect=self._get_case) as get_case, \
+                self.related_docs.for_data_source('data-source'):
+            self.assertEqual([self._evaluate(doc) for doc in docs], ['foo'] * 3)
+        get_case.assert_called_once()
+        self.assertEqual(self.related_docs.stats['data-source'], {'hits': 2, 'misses': 1, 'queries': 1})
+
+    def test_prefetch(self):
+        spec = {'configured_indicators': [{'type': 'expression', 'expression': self.expression.to_json()}]}
+        config = Config(_id='data-source', related_doc_prefetchers=get_related_doc_prefetchers(
+            Config(to_json=lambda: spec, get_factory_context=FactoryContext.empty)
+        ))
+        docs = [
+            {'domain': 'test-domain', 'parent_id': 'parent'},
+            {'domain': 'test-domain', 'parent_id': 'parent'},
+            {'domain': 'test-domain', 'parent_id': 'missing'},
+            {'domain': 'test-domain'},
+        ]
+        document_store = MagicMock()
+        document_store.iter_documents.side_effect = lambda ids: [
+            self.database[doc_id] for doc_id in ids if doc_id in self.database
+        ]
+        with patch('corehq.apps.userreports.expressions.related_docs.get_document_store_for_doc_type',
+                   return_value=document_store):
+            prefetch_related_docs(config, docs, self.related_docs)
+        document_store.iter_documents.assert_called_once_with(['parent', 'missing'])
+
+        with patch.object(CommCareCase.objects, 'get_case') as get_case:
+            self.assertEqual([self._evaluate(doc) for doc in docs], ['foo', 'foo', None, None])
+        get_case.assert_not_called()
+        self.assertEqual(self.related_docs.stats[None], {'hits': 3, 'queries': 1})
+
+    def test_prefetch_only_root_lookups(self):
+        def related_doc_spec(id_property, value_expression=None):
+            return {
+                "type": "related_doc",
+                "related_doc_type": "CommCareCase",
+                "doc_id_expression": {"type": "property_name", "property_name": id_property},
+                "value_expression": value_expression or {
+                    "type": "property_name", "property_name": "related_property"
+                },
+            }
+
+        spec = {
+            'configured_indicators': [
+                {'type': 'expression', 'expression': related_doc_spec(
+                    'parent_id', value_expression=related_doc_spec('grandparent_id')
+                )},
+                {'type': 'expression', 'expression': {"type": "named", "name": "host"}},
+            ],
+            'named_expressions': {
+                'host': related_doc_spec('host_id'),
+                'unused': related_doc_spec('unused_id'),
+            },
+        }
+        prefetchers = get_related_doc_prefetchers(
+            Config(to_json=lambda: spec, get_factory_context=FactoryContext.empty)
+        )
+        self.assertEqual(
+            [prefetcher.spec['doc_id_expression']['property_name'] for prefetcher in prefetchers],
+            ['parent_id', 'host_id']
+        )
+
+    def test_base_item_expression(self):
+        spec = {
+            'base_item_expression': {"type": "property_path", "property_path": ["form", "items"]},
+            'configured_indicators': [{'type': 'expression', 'expression': self.expression.to_json()}],
+        }
+        prefetchers = get_related_doc_prefetchers(
+            Config(to_json=lambda: spec, get_factory_context=FactoryContext.empty)
+        )
+        self.assertEqual(prefetchers, [])
+
+    def test_size_eviction(self):
+        related_docs = RelatedDocumentCache(maxsize=2)
+        related_docs.get('a', lambda: 'A')
+        related_docs.prefetch(['b', 'c'], lambda keys: {'b': 'B'})
+        self.assertEqual(len(related_docs), 2)
+        self.assertEqual(related_docs.get('b', lambda: 'B2'), 'B')
+        self.assertEqual(related_docs.get('c', lambda: 'C'), None)
+        self.assertEqual(related_docs.get('a', lambda: 'A2'), 'A2')
+
+
 class RelatedDocExpressionDbTest(TestCase):
     domain = 'related-doc-db-test-domain'
 
@@ -14,7 +14,9 @@ from corehq.apps.commtrack.processing import StockProcessingResult
 from corehq.apps.domain.shortcuts import create_domain
 from corehq.apps.products.models import SQLProduct
 from corehq.apps.userreports.exceptions import BadSpecError
+from corehq.apps.userreports.indicators import CompoundIndicator
 from corehq.apps.userreports.indicators.factory import IndicatorFactory
+from corehq.apps.userreports.indicators.plan import IndicatorEvaluationPlan
 from corehq.apps.userreports.indicators.utils import get_values_by_product
 from corehq.apps.userreports.specs import EvaluationContext
 from corehq.form_processor.interfaces.processor import FormProcessorInterface
@@ -519,6 +521,91 @@ class ChoiceListIndicatorTest(SimpleTestCase):
         self._check_vals(indicator, dict(category='bug nomatch'), [1, 0, 0, 0])
 
 
+class IndicatorEvaluationPlanTest(SimpleTestCase):
+
+    def setUp(self):
+        specs = [
+            {
+                "type": "choice_list",
+                "column_id": "category",
+                "property_name": "category",
+                "choices": ["bug", "feature", "app"],
+                "select_style": "multiple",
+            },
+            {
+                "type": "expression",
+                "column_id": "age",
+                "datatype": "integer",
+                "expression": {"type": "property_name", "property_name": "age"},
+            },
+            {
+                "type": "expression",
+                "column_id": "age_copy",
+                "datatype": "integer",
+                "expression": {"type": "property_name", "property_name": "age"},
+            },
+            {
+                "type": "expression",
+                "column_id": "age_text",
+                "datatype": "string",
+                "expression": {"type": "property_name", "property_name": "age"},
+            },
+            {
+                "type": "raw",
+                "column_id": "name",
+                "datatype": "string",
+                "property_name": "name",
+            },
+            {
+                "type": "boolean",
+                "column_id": "is_bug",
+                "filter": {"type": "property_match", "property_name": "category", "property_value": "bug"},
+            },
+        ]
+        self.indicator = CompoundIndicator('test', [IndicatorFactory.from_spec(spec) for spec in specs], None)
+        self.plan = IndicatorEvaluationPlan(self.indicator)
+
+    def _values(self, values):
+        return [(value.column.id, value.value) for value in values]
+
+    def test_shared_values(self):
+        # category, age as integer, age as string and name
+        self.assertEqual(self.plan.shared_value_count, 4)
+
+    def test_values_for_items_match_values(self):
+        docs = [
+            {},
+            {"category": "bug", "age": "12", "name": "Tom"},
+            {"category": "app feature", "age": 3},
+        ]
+        items = [(doc, EvaluationContext(doc)) for doc in docs]
+        self.assertEqual(
+            [self._values(values) for values in self.plan.get_values_for_items(items)],
+            [self._values(self.plan.get_values(doc, EvaluationContext(doc))) for doc in docs],
+        )
+
+    def test_values_match_indicators(self):
+        for doc in [
+            {},
+            {"category": "bug", "age": "12", "name": "Tom"},
+            {"category": "app feature", "age": 3},
+        ]:
+            self.assertEqual(
+                self._values(self.plan.get_values(doc, EvaluationContext(doc))),
+                self._values(self.indicator.get_values(doc, EvaluationContext(doc))),
+            )
+
+    def test_values_are_not_shared_between_items(self):
+        bug = {"category": "bug"}
+        app = {"category": "app"}
+        self.assertEqual(self._values(self.plan.get_values(bug))[:3], [
+            ("category_bug", 1), ("category_feature", 0), ("category_app", 0)
+        ])
+        self.assertEqual(self._values(self.plan.get_values(app))[:3], [
+            ("category_bug", 0), ("category_feature", 0), ("category_app", 1)
+        ])
+
+
 class IndicatorDatatypeTest(SingleIndicatorTestBase):
 
     def testDecimal(self):
@@ -61,8 +61,9 @@ def teardown_module():
     skip_domain_filter_patch.stop()
 
 
-def _get_pillow(configs, processor_chunk_size=0):
-    pillow = get_case_pillow(processor_chunk_size=processor_chunk_size)
+def _get_pillow(configs, processor_chunk_size=0, processor_concurrency=1):
+    pillow = get_case_pillow(
+        processor_chunk_size=processor_chunk_size, processor_concurrency=processor_concurrency)
     # overwrite processors since we're only concerned with UCR here
     table_manager = ConfigurableReportTableManager(data_source_providers=[])
     ucr_processor = ConfigurableReportPillowProcessor(
@@ -245,6 +246,14 @@ class ChunkedUCRProcessorTest(TestCase):
         # processor.process_change should not get called but processor.process_changes_chunk
         self.assertFalse(processor_patch.called)
 
+    def test_concurrent_processing(self):
+        cases = self._create_and_process_changes(processor_concurrency=3)
+        rows = self.adapter.get_query_object().all()
+        self.assertEqual(
+            set([case.case_id for case in cases]),
+            set([row.doc_id for row in rows])
+        )
+
     @mock.patch('corehq.apps.userreports.specs.datetime')
     def _create_cases(self, datetime_mock, docs=[]):
         datetime_mock.utcnow.return_value = self.fake_time_now
@@ -260,8 +269,9 @@ class ChunkedUCRProcessorTest(TestCase):
         ]
         return cases
 
-    def _create_and_process_changes(self, docs=[]):
-        self.pillow = _get_pillow([self.config], processor_chunk_size=100)
+    def _create_and_process_changes(self, docs=[], processor_concurrency=1):
+        self.pillow = _get_pillow(
+            [self.config], processor_chunk_size=100, processor_concurrency=processor_concurrency)
         since = self.pillow.get_change_feed().get_latest_offsets()
         cases = self._create_cases(docs=docs)
         # run pillow and check changes
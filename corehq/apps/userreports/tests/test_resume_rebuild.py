@@ -1,6 +1,16 @@
+from unittest.mock import MagicMock
+
 from django.test import SimpleTestCase
+from sqlalchemy.exc import IntegrityError, OperationalError
 
-from corehq.apps.userreports.rebuild import DataSourceResumeHelper
+from corehq.apps.userreports.rebuild import (
+    DataSourceResumeHelper,
+    RebuildShard,
+    ShardedRebuildHelper,
+    _get_pk_ranges,
+)
+from corehq.apps.userreports.tasks import _save_rows_for_shard
+from corehq.form_processor.backends.sql.dbaccessors import DocIds
 from corehq.apps.userreports.tests.utils import get_sample_data_source
 from corehq.tests.locks import real_redis_client
 
@@ -43,3 +53,106 @@ class DataSourceResumeBuildTest(SimpleTestCase):
     def test_has_resume_info_true(self):
         self._resume_helper.add_completed_iteration("domain1", 'type1')
         self.assertEqual(True, self._resume_helper.has_resume_info())
+
+
+class ShardedRebuildHelperTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.shards = [
+            RebuildShard('domain1', 'type1', 'p1'),
+            RebuildShard('domain1', 'type1', 'p2', 100, None),
+        ]
+        with real_redis_client():
+            cls.progress = ShardedRebuildHelper(get_sample_data_source())
+
+    def setUp(self):
+        super().setUp()
+        self.progress.set_shards(self.shards)
+        self.addCleanup(self.progress.clear_resume_info)
+
+    def test_pending_shards(self):
+        self.assertEqual(set(self.progress.get_pending_shards()), set(self.shards))
+        self.progress.mark_complete(self.shards[0])
+        self.assertEqual(self.progress.get_pending_shards(), [self.shards[1]])
+
+    def test_last_pk(self):
+        self.assertIsNone(self.progress.get_last_pk(self.shards[1]))
+        self.progress.set_last_pk(self.shards[1], 150)
+        self.assertEqual(self.progress.get_last_pk(self.shards[1]), 150)
+        self.assertEqual(len(self.progress.get_pending_shards()), 2)
+
+    def test_new_rebuild_clears_progress(self):
+        self.progress.set_last_pk(self.shards[0], 10, complete=True)
+        self.progress.set_shards(self.shards[:1])
+        self.assertEqual(self.progress.get_pending_shards(), self.shards[:1])
+        self.assertIsNone(self.progress.get_last_pk(self.shards[0]))
+
+
+class FakeAccessor(object):
+    primary_key_field_name = 'id'
+
+    def __init__(self, pks):
+        self.pks = pks
+
+    def get_doc_ids(self, from_db, last_doc_pk=None, limit=500):
+        pks = [pk for pk in self.pks if last_doc_pk is None or pk > last_doc_pk]
+        return [DocIds('doc{}'.format(pk), pk) for pk in pks[:limit]]
+
+    def query(self, from_db, for_count=False):
+        return self
+
+    def aggregate(self, min_pk, max_pk):
+        return {'min_pk': min(self.pks, default=None), 'max_pk': max(self.pks, default=None)}
+
+
+class RebuildShardTest(SimpleTestCase):
+
+    def test_iter_doc_id_chunks(self):
+        shard = RebuildShard('domain1', None, 'p1', start_pk=2, end_pk=7)
+        chunks = list(shard.iter_doc_id_chunks(FakeAccessor(list(range(1, 11))), chunk_size=3))
+        self.assertEqual(chunks, [
+            (['doc3', 'doc4', 'doc5'], 5),
+            (['doc6', 'doc7'], 7),
+        ])
+
+    def test_iter_doc_id_chunks_resumed(self):
+        shard = RebuildShard('domain1', None, 'p1', start_pk=2, end_pk=None)
+        chunks = list(shard.iter_doc_id_chunks(FakeAccessor(list(range(1, 11))), last_pk=8, chunk_size=3))
+        self.assertEqual(chunks, [(['doc9', 'doc10'], 10)])
+
+    def test_pk_ranges(self):
+        self.assertEqual(_get_pk_ranges(FakeAccessor(list(range(1, 11))), 'p1', 3), [
+            (None, 4), (4, 8), (8, None),
+        ])
+
+    def test_single_range(self):
+        self.assertEqual(_get_pk_ranges(FakeAccessor([1, 2]), 'p1', 1), [(None, None)])
+        self.assertEqual(_get_pk_ranges(FakeAccessor([]), 'p1', 4), [(None, None)])
+
+
+class SaveRowsForShardTest(SimpleTestCase):
+
+    def setUp(self):
+        self.adapter = MagicMock(spec=['save_rows', '_best_effort_save_rows'])
+        self.rows_by_doc = [({'_id': 'doc1'}, ['row1', 'row2']), ({'_id': 'doc2'}, ['row3'])]
+
+    def test_batch_saved(self):
+        _save_rows_for_shard(self.adapter, self.rows_by_doc)
+        self.adapter.save_rows.assert_called_once_with(['row1', 'row2', 'row3'])
+        self.adapter._best_effort_save_rows.assert_not_called()
+
+    def test_failed_batch_saved_per_doc(self):
+        self.adapter.save_rows.side_effect = IntegrityError('insert', {}, Exception('null value'))
+        _save_rows_for_shard(self.adapter, self.rows_by_doc)
+        self.assertEqual(
+            [call.args for call in self.adapter._best_effort_save_rows.call_args_list],
+            [(['row1', 'row2'], {'_id': 'doc1'}), (['row3'], {'_id': 'doc2'})]
+        )
+
+    def test_transient_error_raised(self):
+        self.adapter.save_rows.side_effect = OperationalError('insert', {}, Exception('connection lost'))
+        with self.assertRaises(OperationalError):
+            _save_rows_for_shard(self.adapter, self.rows_by_doc)
+        self.adapter._best_effort_save_rows.assert_not_called()
@@ -128,7 +128,11 @@ from corehq.apps.userreports.models import (
     is_data_registry_report,
     report_config_id_is_static,
 )
-from corehq.apps.userreports.rebuild import DataSourceResumeHelper
+from corehq.apps.userreports.rebuild import (
+    DataSourceResumeHelper,
+    ShardedRebuildHelper,
+    can_rebuild_sharded,
+)
 from corehq.apps.userreports.reports.builder.forms import (
     ConfigureListReportForm,
     ConfigureMapReportForm,
@@ -151,7 +155,9 @@ from corehq.apps.userreports.specs import EvaluationContext, FactoryContext
 from corehq.apps.userreports.tasks import (
     rebuild_indicators,
     rebuild_indicators_in_place,
+    rebuild_indicators_sharded,
     resume_building_indicators,
+    resume_sharded_rebuild,
 )
 from corehq.apps.userreports.ui.forms import (
     ConfigurableDataSourceEditForm,
@@ -1344,7 +1350,10 @@ def rebuild_data_source(request, domain, config_id):
         )
     )
 
-    rebuild_indicators.delay(config_id, request.user.username, domain=domain)
+    if toggles.SHARDED_UCR_REBUILD.enabled(domain) and can_rebuild_sharded(config):
+        rebuild_indicators_sharded.delay(config_id, request.user.username, source='rebuild_data_source')
+    else:
+        rebuild_indicators.delay(config_id, request.user.username, domain=domain)
     return HttpResponseRedirect(reverse(
         EditDataSourceView.urlname, args=[domain, config._id]
     ))
@@ -1403,6 +1412,12 @@ def resume_building_data_source(request, domain, config_id):
                 config.display_name
             )
         )
+    elif ShardedRebuildHelper(config).has_resume_info():
+        messages.success(
+            request,
+            _('Resuming rebuilding table "{}".').format(config.display_name)
+        )
+        resume_sharded_rebuild.delay(config_id, request.user.username)
     elif not DataSourceResumeHelper(config).has_resume_info():
         messages.warning(
             request,
@@ -32,11 +32,16 @@ from casexml.apps.phone.tasks import ASYNC_RESTORE_SENT
 
 from corehq.form_processor.models import CommCareCase, CommCareCaseIndex
 from corehq.sql_db.routers import read_from_plproxy_standbys
-from corehq.toggles import LIVEQUERY_READ_FROM_STANDBYS, NAMESPACE_USER
+from corehq.toggles import (
+    LIVEQUERY_CASE_SET_CACHE,
+    LIVEQUERY_READ_FROM_STANDBYS,
+    NAMESPACE_USER,
+)
 from corehq.util.metrics import metrics_counter, metrics_histogram
 from corehq.util.metrics.load_counters import case_load_counter
 from corehq.util.timer import TimingContext
 
+from .livequery_cache import LiveCaseSetCache
 from .load_testing import get_xml_for_response
 from .stock import get_stock_payload
 from .utils import get_case_sync_updates
@@ -74,9 +79,14 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
                 domain, owner_ids, closed=False)
             debug("owned: %r", owned_ids)
 
-        live_ids, indices = get_live_case_ids_and_indices(domain, owned_ids, timing_context)
+        live_ids, indices = _get_live_case_ids_and_indices(domain, owner_ids, owned_ids, timing_context)
 
-        if restore_state.last_sync_log:
+        if restore_state.is_state_repair:
+            # The phone's cases don't match the last sync log. Send every
+            # live case and every case it may hold in full, without wiping
+            # the phone as a fresh restore would.
+            sync_ids = live_ids | restore_state.last_sync_log.case_ids_on_phone
+        elif restore_state.last_sync_log:
             with timing_context("discard_already_synced_cases"):
                 debug('last sync: %s', restore_state.last_sync_log._id)
                 sync_ids = discard_already_synced_cases(live_ids, restore_state)
@@ -90,7 +100,10 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
 
         total_cases = len(sync_ids)
         with timing_context("compile_response(%s cases)" % total_cases):
-            iaccessor = PrefetchIndexCaseAccessor(domain, indices)
+            if indices is None:
+                iaccessor = FetchIndexCaseAccessor(domain)
+            else:
+                iaccessor = PrefetchIndexCaseAccessor(domain, indices)
             metrics_histogram(
                 'commcare.restore.case_load',
                 len(sync_ids),
@@ -112,6 +125,26 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
             )
 
 
+def _get_live_case_ids_and_indices(domain, owner_ids, owned_ids, timing_context):
+    """Get live case ids, from the live case set cache if possible
+
+    :returns: tuple of ``(live_ids, indices)``. ``indices`` is ``None``
+    if the live case ids were found in the cache.
+    """
+    if not LIVEQUERY_CASE_SET_CACHE.enabled(domain):
+        return get_live_case_ids_and_indices(domain, owned_ids, timing_context)
+
+    live_case_set_cache = LiveCaseSetCache(domain, owner_ids)
+    with timing_context("get_cached_live_case_ids"):
+        live_ids = live_case_set_cache.get(owned_ids)
+    if live_ids is not None:
+        return live_ids, None
+
+    live_ids, indices = get_live_case_ids_and_indices(domain, owned_ids, timing_context)
+    live_case_set_cache.set(owned_ids, live_ids)
+    return live_ids, indices
+
+
 def get_case_hierarchy(domain, cases):
     """Get the combined case hierarchy for the input cases"""
     domains = {case.domain for case in cases}
@@ -356,6 +389,22 @@ class PrefetchIndexCaseAccessor:
         return CommCareCase.objects.get_cases(case_ids, self.domain, **kw)
 
 
+class FetchIndexCaseAccessor:
+    """Case accessor that fetches the indices of each batch of cases in one query"""
+
+    def __init__(self, domain):
+        self.domain = domain
+
+    def get_cases(self, case_ids, **kw):
+        assert 'prefetched_indices' not in kw
+        case_id_set = set(case_ids)
+        kw['prefetched_indices'] = [
+            ix for ix in CommCareCaseIndex.objects.get_related_indices(self.domain, case_ids, [])
+            if ix.case_id in case_id_set
+        ]
+        return CommCareCase.objects.get_cases(case_ids, self.domain, **kw)
+
+
 def batch_cases(accessor, case_ids):
     def take(n, iterable):
         # https://docs.python.org/2/library/itertools.html#recipes
@@ -407,8 +456,9 @@ def compile_response(
             ))
 
         with timing_context("get_case_sync_updates (%s cases)" % len(cases)):
-            updates = get_case_sync_updates(
-                restore_state.domain, cases, restore_state.last_sync_log)
+            # on a state repair, send cases as if the phone doesn't have them
+            last_sync_log = None if restore_state.is_state_repair else restore_state.last_sync_log
+            updates = get_case_sync_updates(restore_state.domain, cases, last_sync_log)
 
         with timing_context("get_xml_for_response (%s updates)" % len(updates)):
             response.extend(
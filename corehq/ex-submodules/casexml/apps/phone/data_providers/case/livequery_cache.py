@@ -0,0 +1,170 @@
+"""Cache of live case sets for livequery restores
+
+Walking the case index graph (see ``get_live_case_ids_and_indices``)
+dominates restore time for users with deep case hierarchies. The live case
+set for a set of owners can only change when
+
+- the set of open cases owned by those owners changes, or
+- a case in the set, or a case indexing one, is closed, deleted or has its
+  indices changed.
+
+The live set is therefore cached per set of owners and is valid for as long
+as the restore finds the same owned case ids and none of the live cases has
+had a graph change since the set was cached. ``LiveCaseGraphProcessor``
+records graph changes per case from the case change feed. Newly owned cases
+that have no indices in either direction are merged into the cached set;
+anything else falls back to a full walk.
+"""
+import hashlib
+import time
+
+from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
+from pillowtop.processors.interface import PillowProcessor
+
+from corehq.form_processor.models import CommCareCaseIndex
+from corehq.toggles import LIVEQUERY_CASE_SET_CACHE
+from corehq.util.metrics import metrics_counter
+
+LIVE_CASE_SET_TIMEOUT = 12 * 60 * 60
+
+
+def _graph_state_key(domain, case_id):
+    return 'livequery-case-graph-state-{}-{}'.format(domain, case_id)
+
+
+def _graph_change_key(domain, case_id):
+    return 'livequery-case-graph-change-{}-{}'.format(domain, case_id)
+
+
+def record_case_graph_change(domain, change):
+    """Record a change to the case graph, if the case change is one
+
+    The change is recorded for the changed case and for the cases it
+    indexes, before and after the change, so that cached live sets that
+    include any of them are no longer used.
+    """
+    cache = get_redis_default_cache()
+    state_key = _graph_state_key(domain, change.id)
+    previous = cache.get(state_key)
+    state = _get_graph_state(change)
+    if state is None:
+        changed = True
+    elif previous is None:
+        # unknown previous state: only a close or an index can affect the graph
+        changed = state['closed'] or bool(state['indices'])
+    else:
+        changed = state != previous
+
+    if state is None:
+        cache.delete(state_key)
+    elif state != previous:
+        cache.set(state_key, state, timeout=LIVE_CASE_SET_TIMEOUT)
+
+    if changed:
+        case_ids = {change.id}
+        for graph_state in (previous, state):
+            if graph_state is not None:
+                case_ids.update(referenced_id for referenced_id, relationship in graph_state['indices'])
+        changed_on = time.time()
+        cache.set_many({
+            _graph_change_key(domain, case_id): changed_on
+            for case_id in case_ids if case_id
+        }, timeout=LIVE_CASE_SET_TIMEOUT)
+
+
+def _get_graph_state(change):
+    """:returns: the closed status and indices of the changed case or
+    ``None`` if it has been deleted"""
+    doc = None if change.deleted else change.get_document()
+    if doc is None or doc.get('deleted'):
+        return None
+    return {
+        'closed': bool(doc.get('closed')),
+        'indices': sorted([index['referenced_id'], index['relationship']] for index in doc.get('indices', [])),
+    }
+
+
+def _graph_changed_since(domain, case_ids, timestamp):
+    changed_on = get_redis_default_cache().get_many([_graph_change_key(domain, case_id) for case_id in case_ids])
+    return any(when >= timestamp for when in changed_on.values())
+
+
+class LiveCaseSetCache(object):
+    """Live case set cache for one set of owners
+
+    ``get`` must be called before walking the case graph so that the set
+    saved by ``set`` is checked against the graph changes recorded since
+    the start of the walk. Changes made during the walk then invalidate it.
+    """
+
+    def __init__(self, domain, owner_ids):
+        self.domain = domain
+        hashable_key = ','.join([domain] + sorted(owner_ids))
+        self.cache_key = 'livequery-live-case-set-{}'.format(
+            hashlib.md5(hashable_key.encode('utf-8')).hexdigest())
+        self.cached_on = None
+
+    def get(self, owned_ids):
+        """Get the cached live case ids
+
+        :param owned_ids: ids of open cases currently owned by the owners.
+        :returns: set of live case ids or ``None`` if not cached or invalid.
+        """
+        self.cached_on = time.time()
+        cached = get_redis_default_cache().get(self.cache_key)
+        if cached is None:
+            self._record('cold')
+            return None
+
+        owned_ids = set(owned_ids)
+        cached_owned_ids = set(cached['owned_ids'])
+        live_ids = set(cached['live_ids'])
+        if (not cached_owned_ids <= owned_ids
+                or _graph_changed_since(self.domain, live_ids, cached['cached_on'])):
+            self._record('miss')
+            return None
+
+        new_ids = owned_ids - cached_owned_ids
+        if new_ids:
+            if CommCareCaseIndex.objects.get_related_indices(self.domain, list(new_ids), []):
+                self._record('miss')
+                return None
+            live_ids |= new_ids
+            self.set(owned_ids, live_ids)
+            self._record('incremental_hit')
+        else:
+            self._record('hit')
+        return live_ids
+
+    def set(self, owned_ids, live_ids):
+        assert self.cached_on is not None, "call get() before set()"
+        get_redis_default_cache().set(self.cache_key, {
+            'cached_on': self.cached_on,
+            'owned_ids': list(owned_ids),
+            'live_ids': list(live_ids),
+        }, timeout=LIVE_CASE_SET_TIMEOUT)
+
+    def _record(self, result):
+        metrics_counter('commcare.restore.live_case_set_cache', tags={
+            'domain': self.domain,
+            'result': result,
+        })
+
+
+class LiveCaseGraphProcessor(PillowProcessor):
+    """Records the case graph changes that invalidate cached live case sets
+
+    Reads from:
+    - Redis (closed status and indices of recently changed cases)
+
+    Writes to:
+    - Redis (per-case graph changes)
+    """
+    thread_safe = True
+
+    def process_change(self, change):
+        domain = change.metadata.domain if change.metadata else None
+        if not domain or not LIVEQUERY_CASE_SET_CACHE.enabled(domain):
+            return
+
+        record_case_graph_change(domain, change)
@@ -273,6 +273,8 @@ class AbstractSyncLog(SafeSaveDocument):
     had_state_error = BooleanProperty(default=False)
     error_date = DateTimeProperty()
     error_hash = StringProperty()
+    # all cases re-sent to repair a state hash mismatch
+    state_repair = BooleanProperty(default=False)
     cache_payload_paths = DictProperty()
 
     last_ucr_sync_times = SchemaListProperty(UCRSyncLog)
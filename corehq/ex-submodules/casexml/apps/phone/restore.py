@@ -30,8 +30,12 @@ from corehq.apps.app_manager.exceptions import CannotRestoreException
 from corehq.apps.domain.models import Domain
 from corehq.blobs import CODES, get_blob_db
 from corehq.blobs.exceptions import NotFound
+from corehq.blobs.models import BlobMeta
 from corehq.const import LOADTEST_HARD_LIMIT
-from corehq.toggles import EXTENSION_CASES_SYNC_ENABLED
+from corehq.toggles import (
+    DELTA_RESTORE_ON_STATE_MISMATCH,
+    EXTENSION_CASES_SYNC_ENABLED,
+)
 from corehq.util.metrics import metrics_counter, metrics_histogram
 from corehq.util.timer import TimingContext
 from dimagi.utils.logging import notify_error
@@ -100,39 +104,53 @@ class StockSettings(object):
 
 
 class RestoreContent(object):
+    """Serialise restore elements to a temporary file as they are appended
+
+    Elements are written out one at a time so memory use is bounded by the
+    size of the largest single element rather than the size of the restore.
+    When the item count is not required the payload is written in a single
+    pass; otherwise the body is written first and copied after the start tag
+    once the count is known.
+    """
     start_tag_template = (
         b'<OpenRosaResponse xmlns="http://openrosa.org/http/response"%(items)s>'
         b'<message nature="%(nature)s">Successfully restored account %(username)s!</message>'
     )
     items_template = b' items="%s"'
     closing_tag = b'</OpenRosaResponse>'
+    write_buffer_size = 64 * 1024
 
     def __init__(self, username=None, items=False):
         self.username = username
         self.items = items
         self.num_items = 0
+        self.peak_buffered_bytes = 0
 
     def __enter__(self):
-        self.response_body = tempfile.TemporaryFile('w+b')
+        self.response_body = tempfile.TemporaryFile('w+b', buffering=self.write_buffer_size)
+        if not self.items:
+            self._write_start_tag(self.response_body)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.response_body.close()
+        if self.response_body is not None:
+            self.response_body.close()
 
     def append(self, xml_element):
         self.num_items += 1
         if isinstance(xml_element, bytes):
             xml_element, num = get_cached_items_with_count(xml_element)
             self.num_items += num - 1
-            self.response_body.write(xml_element)
         else:
-            self.response_body.write(ElementTree.tostring(xml_element, encoding='utf-8'))
+            xml_element = ElementTree.tostring(xml_element, encoding='utf-8')
+        self.peak_buffered_bytes = max(self.peak_buffered_bytes, len(xml_element))
+        self.response_body.write(xml_element)
 
     def extend(self, iterable):
         for element in iterable:
             self.append(element)
 
-    def _write_to_file(self, fileobj):
+    def _write_start_tag(self, fileobj):
         # Add 1 to num_items to account for message element
         items = (self.items_template % ('%s' % (self.num_items + 1)).encode('utf-8')) if self.items else b''
         fileobj.write(self.start_tag_template % {
@@ -141,13 +159,31 @@ class RestoreContent(object):
             b"nature": ResponseNature.OTA_RESTORE_SUCCESS.encode("utf8"),
         })
 
+    def _write_to_file(self, fileobj):
+        self._write_start_tag(fileobj)
+
         self.response_body.seek(0)
-        shutil.copyfileobj(self.response_body, fileobj)
+        shutil.copyfileobj(self.response_body, fileobj, self.write_buffer_size)
 
         fileobj.write(self.closing_tag)
 
     def get_fileobj(self):
-        fileobj = tempfile.TemporaryFile('w+b')
+        """Get the complete payload
+
+        The returned file is owned by the caller and is not closed on exit
+        from the context.
+        """
+        if not self.items:
+            fileobj, self.response_body = self.response_body, None
+            try:
+                fileobj.write(self.closing_tag)
+                fileobj.seek(0)
+                return fileobj
+            except:  # noqa
+                fileobj.close()
+                raise
+
+        fileobj = tempfile.TemporaryFile('w+b', buffering=self.write_buffer_size)
         try:
             self._write_to_file(fileobj)
             fileobj.seek(0)
@@ -217,6 +253,7 @@ class AsyncRestoreResponse(object):
 
 
 class CachedResponse(object):
+    compressed_name_prefix = "restore-gz/"
 
     def __init__(self, name):
         if name and name.startswith("restore-response-"):
@@ -232,11 +269,15 @@ class CachedResponse(object):
     def save_for_later(cls, fileobj, timeout, domain, restore_user_id):
         """Save restore response for later
 
+        The content is gzip-compressed in chunks as it is written to the
+        blob db. The restore user ID is part of the name so the blob
+        metadata (which is needed to decompress it) can be found again.
+
         :param fileobj: A file-like object.
         :param timeout: Minimum content expiration in seconds.
         :returns: A new `CachedResponse` pointing to the saved content.
         """
-        name = 'restore-{}.xml'.format(uuid4().hex)
+        name = '{}{}/{}.xml'.format(cls.compressed_name_prefix, restore_user_id, uuid4().hex)
         get_blob_db().put(
             NoClose(fileobj),
             domain=domain,
@@ -244,6 +285,7 @@ class CachedResponse(object):
             type_code=CODES.restore,
             key=name,
             timeout=max(timeout // 60, 60),
+            compressed_length=-1,
         )
         return cls(name)
 
@@ -263,10 +305,21 @@ class CachedResponse(object):
         try:
             value = self._fileobj
         except AttributeError:
-            value = get_blob_db().get(key=self.name, type_code=CODES.restore) if self.name else None
+            value = self._get_blob() if self.name else None
             self._fileobj = value
         return value
 
+    def _get_blob(self):
+        db = get_blob_db()
+        if not self.name.startswith(self.compressed_name_prefix):
+            return db.get(key=self.name, type_code=CODES.restore)
+        parent_id = self.name[len(self.compressed_name_prefix):].split("/", 1)[0]
+        try:
+            meta = db.metadb.get(parent_id=parent_id, key=self.name)
+        except BlobMeta.DoesNotExist:
+            raise NotFound(self.name)
+        return db.get(meta=meta)
+
     def get_http_response(self):
         file = self.as_file()
         headers = {'Content-Length': file.content_length}
@@ -379,6 +432,7 @@ class RestoreState:
         self.is_async = is_async
         self.overwrite_cache = overwrite_cache
         self.auth_type = auth_type
+        self.is_state_repair = False
         self._last_sync_log = Ellipsis
 
     def validate_state(self):
@@ -403,13 +457,32 @@ class RestoreState:
                         'request_user_id': self.restore_user.request_user_id,
                         'domain': self.domain,
                     })
+                elif self._can_repair_state():
+                    # Re-send every case the phone should have (see do_livequery).
+                    # If the phone is still out of sync after applying them, the
+                    # hash will not match on the next sync and we force a full restore.
+                    self.is_state_repair = True
+                    metrics_counter('commcare.restores.state_mismatch', tags={
+                        'domain': self.domain,
+                        'result': 'repair',
+                    })
                 else:
+                    metrics_counter('commcare.restores.state_mismatch', tags={
+                        'domain': self.domain,
+                        'result': 'full',
+                    })
                     raise BadStateException(
                         server_hash=computed_hash,
                         phone_hash=parsed_hash,
                         case_ids=self.last_sync_log.get_footprint_of_cases_on_phone()
                     )
 
+    def _can_repair_state(self):
+        return (
+            DELTA_RESTORE_ON_STATE_MISMATCH.enabled(self.domain)
+            and not self.last_sync_log.state_repair
+        )
+
     @property
     def last_sync_log(self):
         if self._last_sync_log is Ellipsis:
@@ -480,7 +553,8 @@ class RestoreState:
             extensions_checked=True,
             device_id=self.params.device_id,
             request_user_id=self.restore_user.request_user_id,
-            auth_type=self.auth_type
+            auth_type=self.auth_type,
+            state_repair=self.is_state_repair,
         )
         if self.params.app:
             new_synclog.app_id = self.params.app.copy_of or self.params.app_id
@@ -727,6 +801,11 @@ class RestoreConfig(object):
                 with self.timing_context(provider.__class__.__name__):
                     provider.extend_response(self.restore_state, content)
 
+            metrics_histogram(
+                'commcare.restores.peak_buffered_bytes', content.peak_buffered_bytes,
+                bucket_tag='size', buckets=RESTORE_BUFFER_SIZE_BUCKETS, bucket_unit='b',
+                tags={'domain': self.domain},
+            )
             return content.get_fileobj()
 
     def set_cached_payload_if_necessary(self, fileobj, duration, is_async):
@@ -848,6 +927,8 @@ class RestoreConfig(object):
             )
 
 
+RESTORE_BUFFER_SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
 RESTORE_SEGMENTS = {
     "wait_for_task_to_start": "waiting",
     "FixtureElementProvider": "fixtures",
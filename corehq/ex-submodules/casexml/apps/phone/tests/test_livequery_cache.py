@@ -0,0 +1,141 @@
+from unittest.mock import patch
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from pillowtop.feed.interface import Change, ChangeMeta
+
+from casexml.apps.phone.data_providers.case.livequery_cache import (
+    LiveCaseSetCache,
+    _graph_change_key,
+    record_case_graph_change,
+)
+from corehq.form_processor.models import CommCareCaseIndex
+
+DOMAIN = 'livequery-cache'
+MODULE = 'casexml.apps.phone.data_providers.case.livequery_cache'
+
+
+class LiveCaseSetCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = LocMemCache('livequery-cache-test', {})
+        patcher = patch(f'{MODULE}.get_redis_default_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache.clear)
+
+    def _cache_live_ids(self, owned_ids, live_ids):
+        live_case_set_cache = LiveCaseSetCache(DOMAIN, ['owner1', 'owner2'])
+        self.assertIsNone(live_case_set_cache.get(owned_ids))
+        live_case_set_cache.set(owned_ids, live_ids)
+
+    def _get(self, owned_ids):
+        # owner order doesn't matter
+        return LiveCaseSetCache(DOMAIN, ['owner2', 'owner1']).get(owned_ids)
+
+    def test_hit(self):
+        self._cache_live_ids(['a', 'b'], {'a', 'b', 'parent'})
+        self.assertEqual(self._get(['b', 'a']), {'a', 'b', 'parent'})
+
+    def test_other_owners(self):
+        self._cache_live_ids(['a'], {'a'})
+        self.assertIsNone(LiveCaseSetCache(DOMAIN, ['owner1']).get(['a']))
+
+    def test_graph_change(self):
+        self._cache_live_ids(['a'], {'a', 'parent'})
+        record_case_graph_change(DOMAIN, _change('parent', closed=True))
+        self.assertIsNone(self._get(['a']))
+
+    def test_graph_change_of_other_case(self):
+        self._cache_live_ids(['a'], {'a', 'parent'})
+        record_case_graph_change(DOMAIN, _change('other', closed=True))
+        self.assertEqual(self._get(['a']), {'a', 'parent'})
+
+    def test_change_during_walk(self):
+        live_case_set_cache = LiveCaseSetCache(DOMAIN, ['owner1', 'owner2'])
+        live_case_set_cache.get(['a'])
+        record_case_graph_change(DOMAIN, _change('a', closed=True))
+        live_case_set_cache.set(['a'], {'a'})
+        self.assertIsNone(self._get(['a']))
+
+    def test_owned_case_removed(self):
+        self._cache_live_ids(['a', 'b'], {'a', 'b'})
+        self.assertIsNone(self._get(['a']))
+
+    @patch.object(CommCareCaseIndex.objects, 'get_related_indices', return_value=[])
+    def test_new_owned_case_without_indices(self, get_related_indices):
+        self._cache_live_ids(['a'], {'a', 'parent'})
+        self.assertEqual(self._get(['a', 'b']), {'a', 'b', 'parent'})
+        get_related_indices.assert_called_once_with(DOMAIN, ['b'], [])
+        # the merged set is cached
+        self.assertEqual(self._get(['a', 'b']), {'a', 'b', 'parent'})
+        get_related_indices.assert_called_once()
+
+    @patch.object(CommCareCaseIndex.objects, 'get_related_indices', return_value=['index'])
+    def test_new_owned_case_with_indices(self, get_related_indices):
+        self._cache_live_ids(['a'], {'a'})
+        self.assertIsNone(self._get(['a', 'b']))
+
+
+class RecordCaseGraphChangeTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = LocMemCache('livequery-graph-test', {})
+        patcher = patch(f'{MODULE}.get_redis_default_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache.clear)
+
+    def _changed_case_ids(self, change):
+        self.cache.delete_many([_graph_change_key(DOMAIN, case_id) for case_id in ['case1', 'host', 'parent']])
+        record_case_graph_change(DOMAIN, change)
+        return {
+            case_id for case_id in ['case1', 'host', 'parent']
+            if self.cache.get(_graph_change_key(DOMAIN, case_id)) is not None
+        }
+
+    def test_update(self):
+        self.assertEqual(self._changed_case_ids(_change('case1')), set())
+        self.assertEqual(self._changed_case_ids(_change('case1')), set())
+
+    def test_close(self):
+        self.assertEqual(self._changed_case_ids(_change('case1', closed=True)), {'case1'})
+
+    def test_deleted(self):
+        self.assertEqual(self._changed_case_ids(_change('case1', deleted=True)), {'case1'})
+
+    def test_new_index(self):
+        self.assertEqual(self._changed_case_ids(_change('case1', indices=['parent'])), {'case1', 'parent'})
+
+    def test_update_with_indices(self):
+        self._changed_case_ids(_change('case1', indices=['parent']))
+        self.assertEqual(self._changed_case_ids(_change('case1', indices=['parent'])), set())
+
+    def test_index_changed(self):
+        self._changed_case_ids(_change('case1', indices=['parent']))
+        self.assertEqual(self._changed_case_ids(_change('case1', indices=['host'])), {'case1', 'parent', 'host'})
+
+    def test_index_removed(self):
+        self._changed_case_ids(_change('case1', indices=['parent']))
+        self.assertEqual(self._changed_case_ids(_change('case1')), {'case1', 'parent'})
+
+
+def _change(case_id, closed=False, indices=(), deleted=False):
+    metadata = ChangeMeta(
+        document_id=case_id,
+        data_source_type='sql',
+        data_source_name='case-sql',
+        domain=DOMAIN,
+        is_deletion=deleted,
+    )
+    document = None if deleted else {
+        '_id': case_id,
+        'domain': DOMAIN,
+        'closed': closed,
+        'indices': [
+            {'case_id': case_id, 'referenced_id': referenced_id, 'relationship': 'child'}
+            for referenced_id in indices
+        ],
+    }
+    return Change(case_id, None, document=document, deleted=deleted, metadata=metadata)
@@ -1,3 +1,5 @@
+from xml.etree import ElementTree
+
 from django.test import TestCase
 from django.test.testcases import SimpleTestCase
 from corehq.apps.users.dbaccessors import delete_all_users
@@ -73,3 +75,20 @@ class TestRestoreContent(SimpleTestCase):
             response.append(body.encode('utf-8'))
             with response.get_fileobj() as fileobj:
                 self.assertEqual(expected, fileobj.read().decode('utf-8'))
+
+    def test_fileobj_outlives_context(self):
+        user = 'user1'
+        body = '<elem>data0</elem>'
+        expected = self._expected(user, body, items=None)
+        with RestoreContent(user, False) as response:
+            response.append(body.encode('utf-8'))
+            fileobj = response.get_fileobj()
+        with fileobj:
+            self.assertEqual(expected, fileobj.read().decode('utf-8'))
+
+    def test_peak_buffered_bytes(self):
+        with RestoreContent('user1', False) as response:
+            response.append(b'<elem>data0</elem>')
+            response.append(ElementTree.fromstring('<elem>longer data</elem>'))
+            response.append(b'<elem/>')
+            self.assertEqual(response.peak_buffered_bytes, len(b'<elem>longer data</elem>'))
@@ -9,6 +9,7 @@ from casexml.apps.phone.utils import MockDevice
 from corehq.apps.domain.models import Domain
 from corehq.apps.users.dbaccessors import delete_all_users
 from corehq.form_processor.tests.utils import sharded
+from corehq.util.test_utils import flag_enabled
 
 
 @sharded
@@ -92,3 +93,29 @@ class StateHashTest(TestCase):
         self.device.id = 'WebAppsLogin'
         self.device.sync(state_hash=str(bad_hash))
         self.assertEqual(set(self.device.last_sync.cases), {"abc123", "123abc"})
+
+    @flag_enabled('DELTA_RESTORE_ON_STATE_MISMATCH')
+    def testMismatchRepairedByResendingCases(self):
+        c1 = CaseBlock(case_id="abc123", create=True, owner_id=self.user.user_id)
+        c2 = CaseBlock(case_id="closed", create=True, owner_id=self.user.user_id)
+        self.device.post_changes([c1, c2])
+        self.device.sync()
+
+        c2 = CaseBlock(case_id="closed", close=True).as_text()
+        c3 = CaseBlock(case_id="123abc", create=True, owner_id=self.user.user_id).as_text()
+        self.device.case_factory.post_case_blocks([c2, c3])
+
+        bad_hash = CaseStateHash("thisisntright")
+        sync = self.device.sync(state_hash=str(bad_hash))
+        self.assertTrue(sync.log.state_repair)
+        # unchanged cases are re-sent along with the changes since the last sync
+        self.assertEqual(set(sync.cases), {"abc123", "123abc", "closed"})
+        self.assertTrue(sync.cases["closed"].close)
+        self.assertEqual(sync.log.case_ids_on_phone, {"abc123", "123abc"})
+
+        with self.assertRaises(BadStateException):
+            self.device.sync(state_hash=str(bad_hash))
+
+        # a matching hash clears the repair state
+        sync = self.device.sync(state_hash=str(sync.log.get_state_hash()))
+        self.assertFalse(sync.log.state_repair)
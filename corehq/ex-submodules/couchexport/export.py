@@ -22,6 +22,8 @@ def get_writer(format, use_formatted_cells=False):
             Format.UNZIPPED_CSV: writers.UnzippedCsvExportWriter,
             Format.PYTHON_DICT: writers.PythonDictWriter,
             Format.GEOJSON: writers.GeoJSONWriter,
+            Format.PARQUET: writers.ParquetExportWriter,
+            Format.ARROW: writers.ArrowExportWriter,
         }[format]()
     except KeyError:
         raise UnsupportedExportFormat("Unsupported export format: %s!" % format)
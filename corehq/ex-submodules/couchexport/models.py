@@ -15,6 +15,8 @@ class Format(object):
     PYTHON_DICT = "dict"
     UNZIPPED_CSV = 'unzipped-csv'
     GEOJSON = 'geojson'
+    PARQUET = 'parquet'
+    ARROW = 'arrow'
 
     FORMAT_DICT = {CSV: {"mimetype": "application/zip",
                          "extension": "zip",
@@ -46,6 +48,12 @@ class Format(object):
                    GEOJSON: {"mimetype": "application/geo+json",
                           "extension": "geojson",
                           "download": True},
+                   PARQUET: {"mimetype": "application/zip",
+                             "extension": "zip",
+                             "download": True},
+                   ARROW: {"mimetype": "application/zip",
+                           "extension": "zip",
+                           "download": True},
                    }
 
     VALID_FORMATS = list(FORMAT_DICT)
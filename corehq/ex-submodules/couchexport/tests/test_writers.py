@@ -1,17 +1,25 @@
 from codecs import BOM_UTF8
 from contextlib import closing
+import datetime
 import io
 import os
+import zipfile
 
 from django.test import SimpleTestCase
 from lxml import html, etree
 from unittest.mock import patch, Mock
+import pyarrow
+import pyarrow.parquet
+import pyarrow.ipc
 
 from couchexport.export import export_from_tables
 from couchexport.models import Format
 from couchexport.writers import (
     MAX_XLS_COLUMNS,
+    ArrowExportWriter,
     CsvFileWriter,
+    ParquetExportWriter,
+    ParquetFileWriter,
     PythonDictWriter,
     XlsLengthException,
     ZippedExportWriter,
@@ -146,6 +154,85 @@ class Excel2003ExportWriterTests(SimpleTestCase):
         export_from_tables(tables, file_, format_)
 
 
+class ColumnarExportWriterTests(SimpleTestCase):
+    headers = ['name', 'age', 'dob', 'weight']
+    datatypes = [None, 'integer', 'date', 'decimal']
+    rows = [
+        ['Ada', '36', '1815-12-10', '50.5'],
+        ['Alan', 41, datetime.date(1912, 6, 23), '---'],
+        [None, '', '', ''],
+    ]
+
+    def _export(self, writer):
+        file_ = io.BytesIO()
+        writer.open(
+            [('people', [self.headers])], file_,
+            archive_basepath='export',
+            column_datatypes={'people': self.datatypes},
+        )
+        writer.write([('people', self.rows)])
+        writer.close()
+        return zipfile.ZipFile(file_)
+
+    def test_parquet(self):
+        archive = self._export(ParquetExportWriter())
+        self.assertEqual(archive.namelist(), ['export/people.parquet'])
+        table = pyarrow.parquet.read_table(io.BytesIO(archive.read('export/people.parquet')))
+        self.assertEqual(table.schema.types, [
+            pyarrow.string(), pyarrow.int64(), pyarrow.date32(), pyarrow.float64()
+        ])
+        self.assertEqual(table.to_pydict(), {
+            'name': ['Ada', 'Alan', None],
+            'age': [36, 41, None],
+            'dob': [datetime.date(1815, 12, 10), datetime.date(1912, 6, 23), None],
+            'weight': [50.5, None, None],
+        })
+
+    def test_arrow(self):
+        archive = self._export(ArrowExportWriter())
+        self.assertEqual(archive.namelist(), ['export/people.arrows'])
+        table = pyarrow.ipc.open_stream(archive.read('export/people.arrows')).read_all()
+        self.assertEqual(table.column('age').to_pylist(), [36, 41, None])
+
+    def test_row_groups(self):
+        with patch.object(ParquetFileWriter, 'row_group_size', 2):
+            archive = self._export(ParquetExportWriter())
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(archive.read('export/people.parquet')))
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        self.assertEqual(parquet_file.metadata.num_rows, 3)
+
+    def test_write_columns(self):
+        file_ = io.BytesIO()
+        writer = ParquetExportWriter()
+        writer.open(
+            [('people', [self.headers])], file_,
+            archive_basepath='export',
+            column_datatypes={'people': self.datatypes},
+        )
+        with patch.object(ParquetFileWriter, 'row_group_size', 2):
+            writer.write_columns('people', [list(column) for column in zip(*self.rows)])
+            writer.close()
+        archive = zipfile.ZipFile(file_)
+        parquet_file = pyarrow.parquet.ParquetFile(io.BytesIO(archive.read('export/people.parquet')))
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        self.assertEqual(parquet_file.read().to_pydict(), {
+            'name': ['Ada', 'Alan', None],
+            'age': [36, 41, None],
+            'dob': [datetime.date(1815, 12, 10), datetime.date(1912, 6, 23), None],
+            'weight': [50.5, None, None],
+        })
+
+    def test_no_rows(self):
+        file_ = io.BytesIO()
+        writer = ParquetExportWriter()
+        writer.open([('people', [self.headers])], file_, archive_basepath='export')
+        writer.close()
+        archive = zipfile.ZipFile(file_)
+        table = pyarrow.parquet.read_table(io.BytesIO(archive.read('export/people.parquet')))
+        self.assertEqual(table.num_rows, 0)
+        self.assertEqual(table.column_names, self.headers)
+
+
 class HeaderNameTest(SimpleTestCase):
 
     def test_names_matching_case(self):
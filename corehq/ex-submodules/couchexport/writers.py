@@ -1,5 +1,6 @@
 import io
 from codecs import BOM_UTF8
+import datetime
 import os
 import re
 import tempfile
@@ -7,6 +8,7 @@ import zipfile
 import csv
 import json
 from collections import OrderedDict
+import iso8601
 import openpyxl
 import math
 
@@ -21,6 +23,7 @@ from openpyxl.cell import WriteOnlyCell
 from couchexport.util import get_excel_format_value, get_legacy_excel_safe_value
 
 MAX_XLS_COLUMNS = 256
+COLUMNAR_ROW_GROUP_SIZE = 10000
 
 
 class XlsLengthException(Exception):
@@ -157,16 +160,214 @@ class HtmlFileWriter(PartialHtmlFileWriter):
         self._write_from_template({"section": "doc_end"})
 
 
+class ColumnarFileWriter(ExportFileWriter):
+    """
+    Writes a table as typed columns, buffering at most ``row_group_size``
+    rows in memory. The first row written is the header row.
+
+    :param datatypes: list with the datatype of each column
+        ('integer', 'decimal', 'date', 'datetime' or 'string'). Columns
+        without a known datatype are written as strings. Values that can't
+        be converted to the column's datatype are written as nulls.
+    """
+    compression = 'zstd'
+    row_group_size = COLUMNAR_ROW_GROUP_SIZE
+
+    def __init__(self, datatypes=None):
+        super(ColumnarFileWriter, self).__init__()
+        self.datatypes = datatypes or []
+
+    def _open(self):
+        self._schema = None
+        self._converters = None
+        self._columns = None
+        self._buffered_rows = 0
+        self._writer = None
+
+    def write_row(self, row):
+        if self._schema is None:
+            self._set_schema(row)
+            return
+
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        self._buffered_rows += 1
+        if self._buffered_rows >= self.row_group_size:
+            self._write_row_group()
+
+    def write_columns(self, columns):
+        """
+        Write rows given as a list of value lists, one per column, in the
+        order of the header row, which must already have been written.
+        """
+        assert self._schema is not None, "The header row must be written first"
+        n_rows = len(columns[0]) if columns else 0
+        start = 0
+        while start < n_rows:
+            end = min(n_rows, start + self.row_group_size - self._buffered_rows)
+            for column, values in zip(self._columns, columns):
+                column.extend(values[start:end])
+            self._buffered_rows += end - start
+            start = end
+            if self._buffered_rows >= self.row_group_size:
+                self._write_row_group()
+
+    def _set_schema(self, headers):
+        import pyarrow
+        fields = []
+        self._converters = []
+        for index, header in enumerate(headers):
+            datatype = self.datatypes[index] if index < len(self.datatypes) else None
+            if datatype not in COLUMNAR_CONVERTERS:
+                datatype = 'string'
+            if isinstance(header, bytes):
+                header = header.decode('utf-8')
+            fields.append(pyarrow.field(str(header), _get_arrow_type(datatype)))
+            self._converters.append(COLUMNAR_CONVERTERS[datatype])
+        self._schema = pyarrow.schema(fields)
+        self._columns = [[] for field in fields]
+
+    def _write_row_group(self):
+        import pyarrow
+        if self._writer is None:
+            self._writer = self._get_writer(self._schema)
+        if self._buffered_rows:
+            batch = pyarrow.record_batch([
+                pyarrow.array([convert(value) for value in column], type=field.type)
+                for column, convert, field in zip(self._columns, self._converters, self._schema)
+            ], schema=self._schema)
+            self._write_batch(batch)
+        self._columns = [[] for field in self._schema]
+        self._buffered_rows = 0
+
+    def _end_file(self):
+        if self._schema is None:
+            self._set_schema([])
+        self._write_row_group()
+        self._writer.close()
+
+    def _get_writer(self, schema):
+        raise NotImplementedError
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+
+class ParquetFileWriter(ColumnarFileWriter):
+    """Writes each buffered batch of rows as a Parquet row group"""
+
+    def _get_writer(self, schema):
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self._file, schema, compression=self.compression)
+
+    def _write_batch(self, batch):
+        import pyarrow
+        self._writer.write_table(pyarrow.Table.from_batches([batch]))
+
+
+class ArrowStreamFileWriter(ColumnarFileWriter):
+    """Writes each buffered batch of rows as a record batch of an Arrow IPC stream"""
+
+    def _get_writer(self, schema):
+        import pyarrow.ipc
+        options = pyarrow.ipc.IpcWriteOptions(compression=self.compression)
+        return pyarrow.ipc.new_stream(self._file, schema, options=options)
+
+    def _write_batch(self, batch):
+        self._writer.write_batch(batch)
+
+
+def _to_string(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _to_integer(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_decimal(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_datetime(value):
+    if isinstance(value, str):
+        try:
+            value = iso8601.parse_date(value)
+        except iso8601.ParseError:
+            return None
+    elif isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    elif not isinstance(value, datetime.datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return None
+
+
+# datatype -> converter
+COLUMNAR_CONVERTERS = {
+    'string': _to_string,
+    'integer': _to_integer,
+    'decimal': _to_decimal,
+    'date': _to_date,
+    'datetime': _to_datetime,
+}
+
+
+def _get_arrow_type(datatype):
+    # pyarrow is imported here rather than at module level so that the
+    # other export formats don't depend on it
+    import pyarrow
+    return {
+        'string': pyarrow.string,
+        'integer': pyarrow.int64,
+        'decimal': pyarrow.float64,
+        'date': pyarrow.date32,
+        'datetime': lambda: pyarrow.timestamp('ms'),
+    }[datatype]()
+
+
 class ExportWriter(object):
     max_table_name_size = 500
     target_app = 'Excel'  # Where does this writer export to? Export button to say "Export to Excel"
+    supports_columns = False  # Whether the writer implements write_columns
 
-    def open(self, header_table, file, max_column_size=2000, table_titles=None, archive_basepath=''):
+    def open(self, header_table, file, max_column_size=2000, table_titles=None, archive_basepath='',
+             column_datatypes=None):
         """
         Create any initial files, headings, etc necessary.
         :param header_table: tuple of one of the following formats
             tuple(sheet_name, [['col1header', 'col2header', ....]])
             tuple(sheet_name, [FormattedRow])
+        :param column_datatypes: optional dict mapping a table index to the
+            datatype of each of its columns. Only used by writers of typed columns.
         """
         table_titles = table_titles or {}
 
@@ -175,6 +376,7 @@ class ExportWriter(object):
         self._current_primary_id = 0
         self.file = file
         self.archive_basepath = archive_basepath
+        self.column_datatypes = dict(column_datatypes or {})
 
         self._init()
         self.table_name_generator = UniqueHeaderGenerator(
@@ -187,7 +389,7 @@ class ExportWriter(object):
                 table_title=table_titles.get(table_index)
             )
 
-    def add_table(self, table_index, headers, table_title=None):
+    def add_table(self, table_index, headers, table_title=None, datatypes=None):
         def _clean_name(name):
             if isinstance(name, bytes):
                 name = name.decode('utf8')
@@ -207,6 +409,8 @@ class ExportWriter(object):
             except AttributeError:
                 headers = [g.next_unique(header) for header in headers]
 
+        if datatypes is not None:
+            self.column_datatypes[table_index] = datatypes
         self._init_table(table_index, table_title_truncated)
         self.write_row(table_index, headers)
 
@@ -321,9 +525,10 @@ class ZippedExportWriter(OnDiskExportWriter):
     Writer that creates a zip file containing a csv for each table.
     """
     table_file_extension = ".csv"
+    zip_compression = zipfile.ZIP_DEFLATED
 
     def _write_final_result(self):
-        archive = zipfile.ZipFile(self.file, 'w', zipfile.ZIP_DEFLATED)
+        archive = zipfile.ZipFile(self.file, 'w', self.zip_compression)
         for index, name in self.table_names.items():
             if isinstance(name, bytes):
                 name = name.decode('utf-8')
@@ -344,6 +549,47 @@ class CsvExportWriter(ZippedExportWriter):
     format = Format.CSV
 
 
+class ColumnarExportWriter(ZippedExportWriter):
+    """
+    Writer that creates a zip file containing a file of typed columns for
+    each table. The tables are already compressed, so the zip file isn't.
+    """
+    zip_compression = zipfile.ZIP_STORED
+    supports_columns = True
+
+    def _init_table(self, table_index, table_title):
+        writer = self.writer_class(datatypes=self.column_datatypes.get(table_index))
+        self.tables[table_index] = writer
+        writer.open(table_title)
+        self.table_names[table_index] = table_title
+
+    def _write_row(self, sheet_index, row):
+        self.tables[sheet_index].write_row(list(row))
+
+    def write_columns(self, table_index, columns):
+        """
+        Write rows given as a list of value lists, one per column, without
+        building the rows first.
+        """
+        assert self._isopen
+        self.tables[table_index].write_columns(columns)
+
+
+class ParquetExportWriter(ColumnarExportWriter):
+    format = Format.PARQUET
+    writer_class = ParquetFileWriter
+    table_file_extension = ".parquet"
+
+
+class ArrowExportWriter(ColumnarExportWriter):
+    """
+    Writes each table as an Arrow IPC stream
+    """
+    format = Format.ARROW
+    writer_class = ArrowStreamFileWriter
+    table_file_extension = ".arrows"
+
+
 class UnzippedCsvExportWriter(OnDiskExportWriter):
     """
     Serve the first table as a csv
@@ -61,6 +61,15 @@ class UnprocessableFormSubmission(BadSubmissionRequest):
     pass
 
 
+class BatchAttachmentsError(UnprocessableFormSubmission):
+    def __init__(self):
+        super().__init__(
+            "A batch submission may only contain %s files. Forms with "
+            "attachments must be submitted individually\n" % MAGIC_PROPERTY,
+            422
+        )
+
+
 class InvalidSubmissionFileExtensionError(UnprocessableFormSubmission):
     def __init__(self):
         super().__init__(
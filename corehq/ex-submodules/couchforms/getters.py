@@ -12,12 +12,13 @@ from couchforms.exceptions import (
     InvalidAttachmentFileError,
     InvalidSubmissionFileExtensionError,
     AttachmentSizeTooLarge,
+    BatchAttachmentsError,
 )
 from dimagi.utils.parsing import string_to_utc_datetime
 from dimagi.utils.web import get_ip, get_site_domain, IP_RE
 
 
-__all__ = ['get_path', 'get_instance_and_attachment',
+__all__ = ['get_path', 'get_instance_and_attachment', 'get_instances',
            'get_location', 'get_received_on', 'get_date_header',
            'get_submit_ip', 'get_last_sync_token', 'get_openrosa_headers']
 
@@ -74,6 +75,34 @@ def get_instance_and_attachment(request):
     return instance, attachments
 
 
+def get_instances(request):
+    """Get the XML instances of a batch submission
+
+    Each form in the batch is a separate xml_submission_file part of a
+    multipart request. Forms with attachments can't be batched and must be
+    submitted on their own.
+    """
+    if not request.META['CONTENT_TYPE'].startswith('multipart/form-data'):
+        raise MultipartFilenameError()
+    if list(request.POST) or set(request.FILES) - {MAGIC_PROPERTY}:
+        raise BatchAttachmentsError()
+
+    instance_files = request.FILES.getlist(MAGIC_PROPERTY)
+    if not instance_files:
+        raise MultipartFilenameError()
+    instances = []
+    for instance_file in instance_files:
+        if instance_file.size > settings.MAX_UPLOAD_SIZE:
+            raise PayloadTooLarge()
+        if not _valid_instance_file_extension(instance_file):
+            raise InvalidSubmissionFileExtensionError()
+        instance = instance_file.read()
+        if not instance:
+            raise MultipartEmptyPayload()
+        instances.append(instance)
+    return instances
+
+
 def _valid_instance_file_extension(file):
     return _valid_file_extension(file.name, ['xml'])
 
@@ -1,6 +1,10 @@
+import threading
 import time
+import zlib
 from abc import ABCMeta, abstractproperty, abstractmethod
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import nullcontext
 from datetime import datetime
 
 from django.conf import settings
@@ -8,14 +12,18 @@ from memoized import memoized
 
 from sentry_sdk import Scope
 
-from corehq.util.metrics import metrics_counter, metrics_gauge
+from corehq.util.metrics import (
+    metrics_counter,
+    metrics_gauge,
+    metrics_histogram_timer,
+)
 from corehq.util.metrics.const import MPM_MAX
 from corehq.util.timer import TimingContext
 from dimagi.utils.logging import notify_exception
 from kafka.common import TopicPartition
 from pillowtop.const import CHECKPOINT_MIN_WAIT
 from pillowtop.dao.exceptions import DocumentMissingError
-from pillowtop.utils import force_seq_int
+from pillowtop.utils import force_seq_int, prefetch_changes_docs
 from pillowtop.exceptions import PillowtopCheckpointReset
 from pillowtop.logger import pillow_logging
 
@@ -53,6 +61,13 @@ class PillowBase(metaclass=ABCMeta):
     retry_errors = True
     # this will be the batch size for processors that support batch processing
     processor_chunk_size = 0
+    # number of threads each chunk is processed with. Changes are split between
+    # threads by document ID so that changes to a document are processed in order.
+    # Processors that are not thread safe are only called by one thread at a time.
+    processor_concurrency = 1
+    # set to true to fetch the documents for each chunk of changes in bulk
+    # before any processor runs
+    prefetch_documents = False
 
     @abstractproperty
     def pillow_id(self):
@@ -121,6 +136,30 @@ class PillowBase(metaclass=ABCMeta):
         if updated:
             self._record_checkpoint_in_datadog()
 
+    @property
+    def is_concurrent(self):
+        return bool(self.processor_chunk_size) and self.processor_concurrency > 1
+
+    @property
+    @memoized
+    def _executor(self):
+        return ThreadPoolExecutor(self.processor_concurrency, thread_name_prefix=self.get_name())
+
+    @property
+    @memoized
+    def _processor_locks(self):
+        return {
+            id(processor): threading.Lock()
+            for processor in self.processors if not processor.thread_safe
+        }
+
+    def _lock_processor(self, processor):
+        """Context manager that stops more than one thread calling a processor
+        that is not thread safe
+        """
+        lock = self._processor_locks.get(id(processor)) if self.is_concurrent else None
+        return nullcontext() if lock is None else lock
+
     @property
     @memoized
     def batch_processors(self):
@@ -144,6 +183,9 @@ class PillowBase(metaclass=ABCMeta):
             Processes changes serially on serial processors, and in batches on
             batch processors. If there are batch processors, checkpoint is updated
             at the end of the batch, otherwise is updated for every change.
+
+            If ``processor_concurrency`` is more than 1, changes are processed
+            in chunks even if there are no batch processors.
         """
         context = PillowRuntimeContext(changes_seen=0)
         min_wait_seconds = 30
@@ -162,7 +204,7 @@ class PillowBase(metaclass=ABCMeta):
             for change in self.get_change_feed().iter_changes(since=since or None, forever=forever):
                 context.changes_seen += 1
                 if change:
-                    if self.batch_processors:
+                    if self.batch_processors or self.is_concurrent:
                         # Queue and process in chunks for both batch
                         #   and serial processors
                         changes_chunk.append(change)
@@ -191,6 +233,48 @@ class PillowBase(metaclass=ABCMeta):
                 self._update_checkpoint(change, context)
 
     def _batch_process_with_error_handling(self, changes_chunk):
+        """
+        Process given chunk, split between ``processor_concurrency`` threads
+            if the pillow is concurrent.
+
+            All threads are waited on before returning so that the checkpoint,
+            which is updated after this, is never ahead of an unprocessed
+            change in any partition.
+        """
+        if self.prefetch_documents:
+            self._prefetch_documents(changes_chunk)
+
+        if not self.is_concurrent:
+            self._process_chunk_with_error_handling(changes_chunk)
+            return
+
+        futures = [
+            self._executor.submit(self._process_chunk_with_error_handling, chunk)
+            for chunk in self._split_changes_by_document(changes_chunk)
+        ]
+        wait(futures)
+        for future in futures:
+            # re-raise errors that could not be handled
+            future.result()
+
+    def _prefetch_documents(self, changes_chunk):
+        tags = {'pillow_name': self.get_name()}
+        with metrics_histogram_timer(
+            'commcare.change_feed.prefetch.timing',
+            timing_buckets=(.03, .1, .3, 1, 3, 10),
+            tags=tags,
+        ):
+            fetched = prefetch_changes_docs(changes_chunk)
+        metrics_counter('commcare.change_feed.prefetch.docs', fetched, tags=tags)
+
+    def _split_changes_by_document(self, changes_chunk):
+        chunks = [[] for i in range(self.processor_concurrency)]
+        for change in changes_chunk:
+            doc_hash = zlib.crc32(str(change.id).encode('utf-8'))
+            chunks[doc_hash % self.processor_concurrency].append(change)
+        return [chunk for chunk in chunks if chunk]
+
+    def _process_chunk_with_error_handling(self, changes_chunk):
         """
         Process given chunk in batch mode first on batch-processors
             and only latter on serial processors one by one, so that
@@ -216,7 +300,8 @@ class PillowBase(metaclass=ABCMeta):
             timer = TimingContext()
             with timer:
                 try:
-                    retry_changes, change_exceptions = processor.process_changes_chunk(changes_chunk)
+                    with self._lock_processor(processor):
+                        retry_changes, change_exceptions = processor.process_changes_chunk(changes_chunk)
                 except Exception as ex:
                     notify_exception(
                         None,
@@ -249,7 +334,8 @@ class PillowBase(metaclass=ABCMeta):
         try:
             with timer:
                 if processor:
-                    processor.process_change(change)
+                    with self._lock_processor(processor):
+                        processor.process_change(change)
                 else:
                     # process on serial processors
                     self.process_change(change, serial_only=True)
@@ -440,11 +526,14 @@ class ConstructedPillow(PillowBase):
 
     def __init__(self, name, checkpoint, change_feed, processor, process_num=0,
                  change_processed_event_handler=None, processor_chunk_size=0,
-                 is_dedicated_migration_process=False):
+                 is_dedicated_migration_process=False, processor_concurrency=1,
+                 prefetch_documents=False):
         self._name = name
         self._checkpoint = checkpoint
         self._change_feed = change_feed
         self.processor_chunk_size = processor_chunk_size
+        self.processor_concurrency = processor_concurrency
+        self.prefetch_documents = prefetch_documents
         if isinstance(processor, list):
             self.processors = processor
         else:
@@ -477,7 +566,8 @@ class ConstructedPillow(PillowBase):
     def process_change(self, change, serial_only=False):
         processors = self.serial_processors if serial_only else self.processors
         for processor in processors:
-            processor.process_change(change)
+            with self._lock_processor(processor):
+                processor.process_change(change)
 
     def update_checkpoint(self, change, context):
         if self._change_processed_event_handler is not None:
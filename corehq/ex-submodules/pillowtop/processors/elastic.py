@@ -1,11 +1,14 @@
+import json
 import logging
 import math
+import threading
 import time
 
 from django.conf import settings
 
 from dimagi.utils.logging import notify_error
 
+from corehq.apps.es.cache import invalidate_cached_results
 from corehq.apps.es.case_search import multiplex_to_adapter
 from corehq.apps.es.const import HQ_CASE_SEARCH_INDEX_CANONICAL_NAME
 from pillowtop.exceptions import BulkDocException, PillowtopIndexingError
@@ -25,7 +28,7 @@ from corehq.util.es.elasticsearch import (
     NotFoundError,
     RequestError,
 )
-from corehq.util.metrics import metrics_histogram_timer
+from corehq.util.metrics import metrics_counter, metrics_histogram_timer
 
 from .interface import BulkPillowProcessor, PillowProcessor
 
@@ -43,6 +46,19 @@ def noop_filter(x):
 RETRY_INTERVAL = 2  # seconds, exponentially increasing
 MAX_RETRIES = 4  # exponential factor threshold for alerts
 
+# bulk request sizing, see AdaptiveBulkSizer
+BULK_MIN_ACTIONS = 10
+BULK_MAX_ACTIONS = 1000
+BULK_INITIAL_ACTIONS = 500
+BULK_ACTIONS_STEP = 50
+BULK_MAX_BYTES = 10 * 1024 * 1024
+BULK_TARGET_SECONDS = 2
+BULK_MIN_BACKOFF = 0.5  # seconds, doubling while requests are rejected
+BULK_MAX_BACKOFF = 30
+BULK_REJECTION_RETRIES = 3
+BULK_DELETE_ACTION_BYTES = 100
+ES_REJECTED_STATUS = 429
+
 
 class ElasticProcessor(PillowProcessor):
     """Generic processor to transform documents and insert into ES.
@@ -56,6 +72,7 @@ class ElasticProcessor(PillowProcessor):
     Writes to:
       - ES
     """
+    thread_safe = True
 
     def __init__(self, adapter, doc_filter_fn=None, change_filter_fn=None):
         self.adapter = adapter
@@ -116,6 +133,7 @@ class ElasticProcessor(PillowProcessor):
                 name='ElasticProcessor',
                 data=doc,
             )
+        self._invalidate_cached_results([doc.get('domain')])
 
     def _delete_doc_if_exists(self, doc_id, domain=None):
         if self.adapter.canonical_name == HQ_CASE_SEARCH_INDEX_CANONICAL_NAME:
@@ -135,6 +153,13 @@ class ElasticProcessor(PillowProcessor):
             name='ElasticProcessor',
             delete=True
         )
+        self._invalidate_cached_results([domain])
+
+    def _invalidate_cached_results(self, domains):
+        """Stop using ESQuery results cached for the domains of documents that were written"""
+        domains = {domain for domain in domains if domain}
+        if domains:
+            invalidate_cached_results(self.adapter.canonical_name, domains)
 
     def _datadog_timing(self, step):
         return metrics_histogram_timer(
@@ -150,6 +175,10 @@ class BulkElasticProcessor(ElasticProcessor, BulkPillowProcessor):
     """Generic processor to transform documents and insert into ES.
 
     Processes one "chunk" of changes at a time (chunk size specified by pillow).
+    Each chunk is sent in one or more bulk requests sized by an
+    ``AdaptiveBulkSizer``. Actions that Elasticsearch rejects because its
+    write queue is full are sent again in smaller requests, and returned to
+    be reprocessed serially if they are still rejected.
 
     Reads from:
       - Usually Couch
@@ -158,6 +187,24 @@ class BulkElasticProcessor(ElasticProcessor, BulkPillowProcessor):
     Writes to:
       - ES
     """
+    thread_safe = True
+
+    def __init__(self, adapter, doc_filter_fn=None, change_filter_fn=None):
+        super().__init__(adapter, doc_filter_fn, change_filter_fn)
+        self._thread_local = threading.local()
+
+    @property
+    def bulk_sizer(self):
+        """The ``AdaptiveBulkSizer`` of the current thread
+
+        The sizer adapts to the results of every bulk request, so each thread
+        of a concurrent pillow sizes its own requests.
+        """
+        try:
+            return self._thread_local.bulk_sizer
+        except AttributeError:
+            self._thread_local.bulk_sizer = AdaptiveBulkSizer()
+            return self._thread_local.bulk_sizer
 
     def process_changes_chunk(self, changes_chunk):
         logger.info('Processing chunk of changes in BulkElasticProcessor')
@@ -178,27 +225,130 @@ class BulkElasticProcessor(ElasticProcessor, BulkPillowProcessor):
             retry_changes = list(bad_changes)
 
             error_collector = ErrorCollector()
-            es_actions = build_bulk_payload(
-                list(changes_to_process.values()),
-                error_collector,
-            )
+            pending = self._build_bulk_actions(changes_to_process.values(), error_collector)
             error_changes = error_collector.errors
 
+        with self._datadog_timing('bulk_load'):
+            for attempt in range(BULK_REJECTION_RETRIES + 1):
+                rejected = []
+                for batch in self.bulk_sizer.split(pending):
+                    rejected.extend(self._send_bulk(batch, error_changes))
+                pending = rejected
+                if not pending:
+                    break
+            retry_changes.extend(change for change, action in pending)
+
+        self._invalidate_cached_results(
+            change.document.get('domain') for change in changes_to_process.values()
+        )
+        return retry_changes, error_changes
+
+    def _build_bulk_actions(self, changes, error_collector):
+        """
+        :returns: a list of ``(change, action)`` for the bulk requests. Each
+        action is sent again with the change, or the change is reprocessed,
+        if the action fails.
+        """
+        return [
+            (change, action)
+            for change in changes
+            for action in build_bulk_payload([change], error_collector)
+        ]
+
+    def _send_bulk(self, batch, error_changes):
+        """Send a bulk request for ``batch``, a list of ``(change, action)``
+
+        :returns: the items of ``batch`` that were rejected
+        """
+        self.bulk_sizer.wait()
+        start = time.monotonic()
         try:
-            with self._datadog_timing('bulk_load'):
-                _, errors = self.adapter.bulk(
-                    es_actions,
-                    raise_errors=False,
-                )
+            _, errors = self.adapter.bulk(
+                [action for change, action in batch],
+                raise_errors=False,
+            )
         except Exception as e:
             pillow_logging.exception("Elastic bulk error: %s", e)
-            error_changes.extend([
-                (change, e) for change in changes_to_process.values()
-            ])
-        else:
-            for change_id, error_msg in get_errors_with_ids(errors):
-                error_changes.append((changes_to_process[change_id], BulkDocException(error_msg)))
-        return retry_changes, error_changes
+            error_changes.extend([(change, e) for change, action in batch])
+            return []
+
+        rejected_ids = set()
+        other_errors = []
+        for error in errors:
+            if any(item.get('status') == ES_REJECTED_STATUS for item in error.values()):
+                rejected_ids.update(item['_id'] for item in error.values())
+            else:
+                other_errors.append(error)
+        changes_by_doc_id = {_get_action_doc_id(action): change for change, action in batch}
+        for doc_id, error_msg in get_errors_with_ids(other_errors):
+            error_changes.append((changes_by_doc_id[doc_id], BulkDocException(error_msg)))
+
+        self.bulk_sizer.record(len(batch), time.monotonic() - start, len(rejected_ids))
+        if rejected_ids:
+            metrics_counter('commcare.change_feed.bulk_rejections', len(rejected_ids), tags={
+                'index': self.adapter.index_name,
+            })
+        return [(change, action) for change, action in batch if _get_action_doc_id(action) in rejected_ids]
+
+
+class AdaptiveBulkSizer(object):
+    """Size bulk requests by how quickly Elasticsearch handles them
+
+    The number of actions per request grows by ``BULK_ACTIONS_STEP`` after
+    each full request that takes less than ``BULK_TARGET_SECONDS``. It is
+    reduced by a quarter after slower requests, and halved when actions are
+    rejected because the cluster's write queue is full. Requests are also
+    limited to ``BULK_MAX_BYTES`` of documents.
+
+    After rejections, ``wait()`` sleeps before the next request, for longer
+    each time they continue. This holds up the pillow, so fewer changes are
+    read from the feed until Elasticsearch catches up.
+    """
+
+    def __init__(self, max_actions=BULK_INITIAL_ACTIONS):
+        self.max_actions = max_actions
+        self.backoff = 0
+
+    def split(self, items):
+        """Split a list of ``(change, action)`` into batches for bulk requests"""
+        batch = []
+        batch_bytes = 0
+        for change, action in items:
+            action_bytes = _get_action_bytes(action)
+            if batch and (len(batch) >= self.max_actions or batch_bytes + action_bytes > BULK_MAX_BYTES):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append((change, action))
+            batch_bytes += action_bytes
+        if batch:
+            yield batch
+
+    def wait(self):
+        if self.backoff:
+            time.sleep(self.backoff)
+
+    def record(self, action_count, seconds, rejected_count):
+        if rejected_count:
+            self.max_actions = max(BULK_MIN_ACTIONS, self.max_actions // 2)
+            self.backoff = min(BULK_MAX_BACKOFF, max(BULK_MIN_BACKOFF, self.backoff * 2))
+            return
+
+        self.backoff = 0
+        if seconds > BULK_TARGET_SECONDS:
+            self.max_actions = max(BULK_MIN_ACTIONS, self.max_actions * 3 // 4)
+        elif action_count >= self.max_actions:
+            self.max_actions = min(BULK_MAX_ACTIONS, self.max_actions + BULK_ACTIONS_STEP)
+
+
+def _get_action_doc_id(action):
+    return action.doc_id if action.doc is None else action.doc['_id']
+
+
+def _get_action_bytes(action):
+    if action.doc is None:
+        return BULK_DELETE_ACTION_BYTES
+    return len(json.dumps(action.doc, default=str))
 
 
 def send_to_elasticsearch(adapter, doc_id, name,
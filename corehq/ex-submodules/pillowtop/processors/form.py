@@ -44,6 +44,7 @@ class FormSubmissionMetadataTrackerProcessor(PillowProcessor):
       - CouchDB (user) (when batch processing disabled) (default)
       - UserReportingMetadataStaging (SQL)  (when batch processing enabled)
     """
+    thread_safe = True
 
     def process_change(self, change):
         if change.deleted or change.metadata is None:
@@ -3,6 +3,9 @@ from abc import ABCMeta, abstractmethod
 
 class PillowProcessor(metaclass=ABCMeta):
     supports_batch_processing = False
+    # Set to True if the processor keeps no state between changes, so
+    #   that it can be called by more than one thread at a time.
+    thread_safe = False
 
     @abstractmethod
     def process_change(self, change):
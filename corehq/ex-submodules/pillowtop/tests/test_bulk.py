@@ -1,15 +1,28 @@
+import threading
+import time
 import uuid
 from unittest.mock import patch
 
 from django.test import SimpleTestCase, TestCase
 
 from pillowtop.feed.interface import Change, ChangeMeta
-from pillowtop.pillow.interface import PillowBase
-from pillowtop.processors.elastic import BulkElasticProcessor
-from pillowtop.utils import bulk_fetch_changes_docs, get_errors_with_ids
+from pillowtop.pillow.interface import ConstructedPillow, PillowBase
+from pillowtop.processors.elastic import (
+    BULK_MIN_ACTIONS,
+    BULK_REJECTION_RETRIES,
+    AdaptiveBulkSizer,
+    BulkElasticProcessor,
+)
+from pillowtop.processors.sample import TestProcessor
+from pillowtop.utils import (
+    bulk_fetch_changes_docs,
+    get_errors_with_ids,
+    prefetch_changes_docs,
+)
 
 from corehq.apps.change_feed.data_sources import SOURCE_COUCH
 from corehq.apps.es.cases import case_adapter
+from corehq.apps.es.client import BulkActionItem
 from corehq.apps.es.tests.utils import es_test, test_adapter
 from corehq.form_processor.document_stores import CaseDocumentStore
 from corehq.form_processor.signals import sql_case_post_save
@@ -48,6 +61,125 @@ class BulkTest(SimpleTestCase):
         self.assertEqual([(1, 'e1'), (2, 'e2')], errors)
 
 
+class AdaptiveBulkSizerTest(SimpleTestCase):
+
+    def _items(self, count, doc=None):
+        return [(Change(str(i), i), BulkActionItem.index(doc or {'_id': str(i)})) for i in range(count)]
+
+    def test_split_by_actions(self):
+        sizer = AdaptiveBulkSizer(max_actions=4)
+        self.assertEqual([len(batch) for batch in sizer.split(self._items(10))], [4, 4, 2])
+
+    @patch('pillowtop.processors.elastic.BULK_MAX_BYTES', 120)
+    def test_split_by_bytes(self):
+        sizer = AdaptiveBulkSizer(max_actions=10)
+        items = self._items(4, doc={'value': 'x' * 40})
+        self.assertEqual([len(batch) for batch in sizer.split(items)], [2, 2])
+
+    def test_grow_when_fast(self):
+        sizer = AdaptiveBulkSizer(max_actions=100)
+        sizer.record(100, 0.1, 0)
+        self.assertGreater(sizer.max_actions, 100)
+
+    def test_no_growth_when_not_full(self):
+        sizer = AdaptiveBulkSizer(max_actions=100)
+        sizer.record(10, 0.1, 0)
+        self.assertEqual(sizer.max_actions, 100)
+
+    def test_shrink_when_slow(self):
+        sizer = AdaptiveBulkSizer(max_actions=100)
+        sizer.record(100, 60, 0)
+        self.assertEqual(sizer.max_actions, 75)
+        self.assertEqual(sizer.backoff, 0)
+
+    def test_rejections(self):
+        sizer = AdaptiveBulkSizer(max_actions=BULK_MIN_ACTIONS * 2)
+        sizer.record(BULK_MIN_ACTIONS * 2, 0.1, 1)
+        self.assertEqual(sizer.max_actions, BULK_MIN_ACTIONS)
+        backoff = sizer.backoff
+        self.assertGreater(backoff, 0)
+        sizer.record(BULK_MIN_ACTIONS, 0.1, 1)
+        self.assertEqual(sizer.max_actions, BULK_MIN_ACTIONS)
+        self.assertEqual(sizer.backoff, backoff * 2)
+        sizer.record(BULK_MIN_ACTIONS, 0.1, 0)
+        self.assertEqual(sizer.backoff, 0)
+
+    def test_bulk_sizer_per_thread(self):
+        processor = BulkElasticProcessor(case_adapter)
+        sizer = processor.bulk_sizer
+        self.assertIs(processor.bulk_sizer, sizer)
+        other_sizers = []
+        thread = threading.Thread(target=lambda: other_sizers.append(processor.bulk_sizer))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other_sizers[0], sizer)
+
+
+class ConcurrentPillowTest(SimpleTestCase):
+
+    def _change(self, doc_id, sequence_id):
+        return Change(doc_id, sequence_id, metadata=ChangeMeta(
+            document_id=doc_id, data_source_type='sql', data_source_name='case-sql'
+        ))
+
+    def _pillow(self, processor):
+        return ConstructedPillow(
+            name='concurrent-pillow',
+            checkpoint=None,
+            change_feed=None,
+            processor=processor,
+            processor_chunk_size=4,
+            processor_concurrency=3,
+        )
+
+    def test_split_changes_by_document(self):
+        changes = [self._change(doc_id, seq) for seq, doc_id in enumerate('abcabcdda')]
+        pillow = self._pillow(TestProcessor())
+        chunks = pillow._split_changes_by_document(changes)
+        self.assertLessEqual(len(chunks), 3)
+        self.assertEqual(
+            sorted(change.sequence_id for chunk in chunks for change in chunk),
+            list(range(9))
+        )
+        for chunk in chunks:
+            sequence_ids = [change.sequence_id for change in chunk]
+            self.assertEqual(sequence_ids, sorted(sequence_ids))
+        chunk_by_doc_id = {change.id: i for i, chunk in enumerate(chunks) for change in chunk}
+        for i, chunk in enumerate(chunks):
+            self.assertTrue(all(chunk_by_doc_id[change.id] == i for change in chunk))
+
+    def test_process_chunk(self):
+        changes = [self._change(doc_id, seq) for seq, doc_id in enumerate('abcdefghij')]
+        processor = TestProcessor()
+        self._pillow(processor)._batch_process_with_error_handling(changes)
+        self.assertEqual(
+            sorted(change.sequence_id for change in processor.changes_seen),
+            list(range(10))
+        )
+
+    def test_processor_not_thread_safe(self):
+        class Processor(TestProcessor):
+            thread_safe = False
+            active = 0
+            max_active = 0
+            active_lock = threading.Lock()
+
+            def process_change(self, change):
+                with self.active_lock:
+                    self.active += 1
+                    self.max_active = max(self.max_active, self.active)
+                time.sleep(0.01)
+                with self.active_lock:
+                    self.active -= 1
+                super().process_change(change)
+
+        changes = [self._change(doc_id, seq) for seq, doc_id in enumerate('abcdefghij')]
+        processor = Processor()
+        self._pillow(processor)._batch_process_with_error_handling(changes)
+        self.assertEqual(len(processor.changes_seen), 10)
+        self.assertEqual(processor.max_active, 1)
+
+
 @sharded
 @es_test(requires=[case_adapter], setup_class=True)
 class TestBulkDocOperations(TestCase):
@@ -93,6 +225,18 @@ class TestBulkDocOperations(TestCase):
             set([change.id for change in bad_changes])
         )
 
+    def test_prefetch_docs(self):
+        missing_case_ids = [uuid.uuid4().hex]
+        changes = self._changes_from_ids(self.case_ids + missing_case_ids)
+        with patch.object(CaseDocumentStore, 'get_document') as get_document:
+            self.assertEqual(prefetch_changes_docs(changes), len(self.case_ids))
+            self.assertEqual(
+                [change.get_document()['_id'] for change in changes[:-1]],
+                self.case_ids
+            )
+        get_document.assert_not_called()
+        self.assertTrue(changes[-1].should_fetch_document())
+
     def test_process_changes_chunk(self):
         processor = BulkElasticProcessor(case_adapter)
 
@@ -126,6 +270,31 @@ class TestBulkDocOperations(TestCase):
             [error[0].id for error in errors]
         )
 
+    @patch('pillowtop.processors.elastic.time.sleep')
+    def test_process_changes_chunk_with_rejections(self, sleep):
+        rejection = (3, [{'index': {'_id': self.case_ids[0], 'status': 429, 'error': 'rejected'}}])
+        processor = BulkElasticProcessor(case_adapter)
+        changes = self._changes_from_ids(self.case_ids)
+
+        with patch.object(case_adapter, 'bulk', side_effect=[rejection, (1, [])]) as bulk:
+            retry, errors = processor.process_changes_chunk(changes)
+        self.assertEqual([], retry)
+        self.assertEqual([], errors)
+        self.assertEqual(len(bulk.call_args_list[1].args[0]), 1)
+        sleep.assert_called_once()
+
+    @patch('pillowtop.processors.elastic.time.sleep')
+    def test_process_changes_chunk_rejected_until_retry(self, sleep):
+        rejection = (3, [{'index': {'_id': self.case_ids[0], 'status': 429, 'error': 'rejected'}}])
+        processor = BulkElasticProcessor(case_adapter)
+        changes = self._changes_from_ids(self.case_ids)
+
+        with patch.object(case_adapter, 'bulk', return_value=rejection):
+            retry, errors = processor.process_changes_chunk(changes)
+        self.assertEqual([self.case_ids[0]], [change.id for change in retry])
+        self.assertEqual([], errors)
+        self.assertEqual(sleep.call_count, BULK_REJECTION_RETRIES)
+
 
 @es_test(requires=[test_adapter])
 class TestBulkOperationsCaseToSQL(TestCase):
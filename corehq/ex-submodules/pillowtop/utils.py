@@ -354,6 +354,38 @@ def bulk_fetch_changes_docs(changes, domain=None):
     return bad_changes, docs
 
 
+def prefetch_changes_docs(changes):
+    """Fetch the documents for a chunk of changes with one bulk query per
+    document store and set them on the changes.
+
+    Changes whose documents are not found are left untouched so that
+    ``change.get_document()`` raises the usual errors for them later.
+
+    :returns: number of documents fetched
+    """
+    changes_by_store = defaultdict(list)
+    for change in changes:
+        if change.metadata is not None and change.should_fetch_document():
+            data_source = (change.metadata.data_source_type, change.metadata.data_source_name)
+            changes_by_store[data_source].append(change)
+
+    fetched = 0
+    for data_source, store_changes in changes_by_store.items():
+        doc_store = store_changes[0].document_store
+        doc_ids = list({change.id for change in store_changes})
+        try:
+            docs_by_id = {doc['_id']: doc for doc in doc_store.iter_documents(doc_ids)}
+        except Exception:
+            # processors will fetch the documents themselves
+            pillow_logging.exception("Error prefetching documents from %r", doc_store)
+            continue
+        for change in store_changes:
+            if change.id in docs_by_id:
+                change.set_document(docs_by_id[change.id])
+        fetched += len(docs_by_id)
+    return fetched
+
+
 def get_errors_with_ids(es_action_errors):
     return [
         (item['_id'], item.get('error'))
@@ -140,6 +140,52 @@ class FormProcessorSQL(object):
         except Exception as e:
             raise KafkaPublishingError(e)
 
+    @classmethod
+    def bulk_save_processed_models(cls, forms, cases, associated_form_ids):
+        """Save a batch of new forms and the cases they touched in one transaction per database
+
+        Forms that are edits or that update ledgers are not supported.
+
+        :param associated_form_ids: dict mapping case ID to the ID of the last form that touched it
+        """
+        db_names = {form.db for form in forms} | {case.db for case in cases}
+        all_models = list(chain(forms, cases))
+        try:
+            with ExitStack() as stack:
+                for db_name in db_names:
+                    stack.enter_context(transaction.atomic(db_name))
+
+                for form in forms:
+                    XFormInstance.objects.save_new_form(form)
+                for case in cases:
+                    case.save(with_tracked_models=True)
+
+            if cases:
+                sort_submissions = toggles.SORT_OUT_OF_ORDER_FORM_SUBMISSIONS_SQL.enabled(
+                    forms[0].domain, toggles.NAMESPACE_DOMAIN)
+                if sort_submissions:
+                    for case in cases:
+                        if SqlCaseUpdateStrategy(case).reconcile_transactions_if_necessary():
+                            case.save(with_tracked_models=True)
+        except DatabaseError:
+            for model in all_models:
+                setattr(model, model._meta.pk.attname, None)
+                for tracked in model.create_models:
+                    setattr(tracked, tracked._meta.pk.attname, None)
+            raise
+
+        try:
+            for form in forms:
+                publish_form_saved(form)
+            for case in cases:
+                publish_case_saved(
+                    case,
+                    associated_form_id=associated_form_ids.get(case.case_id),
+                    send_post_save_signal=False
+                )
+        except Exception as e:
+            raise KafkaPublishingError(e)
+
     @staticmethod
     def publish_changes_to_kafka(processed_forms, cases, stock_result):
         publish_form_saved(processed_forms.submitted)
@@ -338,3 +384,15 @@ class FormProcessorSQL(object):
             return None, None
 
         return case, None
+
+    @staticmethod
+    def acquire_case_locks(case_ids):
+        """Acquire locks for the given case IDs in order, blocking until each is available
+
+        Locking degrades gracefully: ``None`` is returned in place of any lock
+        that could not be acquired due to a Redis error.
+        """
+        return [
+            acquire_lock(CommCareCase.get_obj_lock_by_id(case_id), degrade_gracefully=True, blocking=True)
+            for case_id in case_ids
+        ]
@@ -51,6 +51,8 @@ class AbstractCaseDbCache(metaclass=ABCMeta):
         if self.lock and not self.wrap:
             raise ValueError('Currently locking only supports explicitly wrapping cases!')
         self.locks = []
+        # IDs of cases locked up front by ``lock_and_populate`` (including cases that don't exist yet)
+        self.locked_case_ids = set()
         self._changed = set()
         # this is used to allow casedb to be re-entrant. Each new context pushes the parent context locks
         # onto this stack and restores them when the context exits
@@ -65,9 +67,10 @@ class AbstractCaseDbCache(metaclass=ABCMeta):
             self.cache = {}
 
     def __enter__(self):
-        if self.locks:
-            self.lock_stack.append(self.locks)
+        if self.locks or self.locked_case_ids:
+            self.lock_stack.append((self.locks, self.locked_case_ids))
             self.locks = []
+            self.locked_case_ids = set()
 
         return self
 
@@ -76,9 +79,10 @@ class AbstractCaseDbCache(metaclass=ABCMeta):
             if lock is not None:
                 release_lock(lock, True)
         self.locks = []
+        self.locked_case_ids = set()
 
         if self.lock_stack:
-            self.locks = self.lock_stack.pop()
+            self.locks, self.locked_case_ids = self.lock_stack.pop()
 
     @abstractmethod
     def _validate_case(self, case):
@@ -92,7 +96,8 @@ class AbstractCaseDbCache(metaclass=ABCMeta):
         if case_id in self.cache:
             return self.cache[case_id]
 
-        case, lock = self.processor_interface.get_case_with_lock(case_id, self.lock, self.wrap)
+        lock = self.lock and not self._is_locked(case_id)
+        case, lock = self.processor_interface.get_case_with_lock(case_id, lock, self.wrap)
         if lock:
             self.locks.append(lock)
 
@@ -120,6 +125,36 @@ class AbstractCaseDbCache(metaclass=ABCMeta):
         for case in self._iter_cases(case_ids):
             self.set(_get_id_for_case(case), case)
 
+    def lock_and_populate(self, case_ids):
+        """
+        Lock (if this cache is locking) and load a set of cases in bulk.
+
+        Locks are acquired in a consistent order and held until the current context exits.
+        IDs of cases that don't exist yet are locked too, so that cases created later on
+        in the same context are protected without being locked a second time.
+        """
+        case_ids = sorted(set(case_ids) - set(self.cache.keys()))
+        if self.lock:
+            case_ids = [case_id for case_id in case_ids if not self._is_locked(case_id)]
+            self.locks.extend(self.processor_interface.acquire_case_locks(case_ids))
+            self.locked_case_ids.update(case_ids)
+        self.populate(case_ids)
+
+    def reload(self, case_ids):
+        """
+        Discard any in-memory changes to the given cases and load them again from the database.
+        Locks that are already held for the cases are kept.
+        """
+        for case_id in case_ids:
+            self.cache.pop(case_id, None)
+            self._changed.discard(case_id)
+        self.populate(case_ids)
+
+    def _is_locked(self, case_id):
+        return case_id in self.locked_case_ids or any(
+            case_id in locked_case_ids for _, locked_case_ids in self.lock_stack
+        )
+
     @abstractmethod
     def _iter_cases(self, case_ids):
         pass
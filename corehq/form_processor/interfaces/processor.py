@@ -168,6 +168,20 @@ class FormProcessorInterface(object):
             e.sentry_capture = False  # we've already notified
             raise
 
+    def bulk_save_processed_models(self, forms, cases, associated_form_ids):
+        """
+        Save a batch of new forms along with the cases they touched. Unlike
+        ``save_processed_models`` this does not handle unexpected errors: callers
+        are expected to fall back to saving the forms individually.
+        """
+        try:
+            return self.processor.bulk_save_processed_models(forms, cases, associated_form_ids)
+        except KafkaPublishingError as e:
+            from corehq.form_processor.submission_post import notify_submission_error
+            for form in forms:
+                notify_submission_error(form, 'Error publishing to Kafka')
+            raise PostSaveError(e)
+
     def hard_delete_case_and_forms(self, case, xforms):
         assert case.domain == self.domain, (case.domain, self.domain)
         args = [case, xforms]
@@ -217,6 +231,14 @@ class FormProcessorInterface(object):
         """
         return self.processor.get_case_with_lock(case_id, lock, wrap)
 
+    def acquire_case_locks(self, case_ids):
+        """
+        Lock a set of cases (whether or not they exist yet).
+
+        :return: list of acquired locks. Release with ``dimagi.utils.couch.release_lock``.
+        """
+        return self.processor.acquire_case_locks(case_ids)
+
 
 def _list_to_processed_forms_tuple(forms):
     """
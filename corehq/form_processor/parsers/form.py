@@ -16,10 +16,11 @@ from dimagi.utils.couch import release_lock
 
 
 @contextmanager
-def locked_form(xform, interface):
+def locked_form(xform, interface, acquire_lock=True):
     """Context manager that locks a form and checks/prepares for duplicates
 
     The lock is acquired on context manager enter and released on exit.
+    Pass ``acquire_lock=False`` if the caller already holds the lock.
 
     Historically this locked both the new (possibly duplicate) form ID
     as well as any new ID generated in the process of handling a
@@ -27,7 +28,7 @@ def locked_form(xform, interface):
     newly generated ID is not since it should be globally unique.
     """
     context = [xform]
-    lock = interface.acquire_lock_for_xform(xform.form_id)
+    lock = interface.acquire_lock_for_xform(xform.form_id) if acquire_lock else None
     try:
         if interface.is_duplicate(xform.form_id):
             new_form, dup_form = _handle_id_conflict(xform, xform.domain)
@@ -47,14 +48,14 @@ class FormProcessingResult(object):
         self.submitted_form = submitted_form
         self.interface = FormProcessorInterface(self.submitted_form.domain)
 
-    def get_locked_forms(self):
+    def get_locked_forms(self, acquire_lock=True):
         """Get a context manager whose context is a list of forms
 
         The first form in the list is the newly submitted form, and will
         always be present. The second is a form with a duplicate form ID
         (if one exists); it will be omitted if there is no duplicate.
         """
-        return locked_form(self.submitted_form, self.interface)
+        return locked_form(self.submitted_form, self.interface, acquire_lock)
 
 
 @tracer.wrap(name='submission.process_form_xml')
@@ -1,5 +1,6 @@
 import logging
 from collections import namedtuple
+from contextlib import ExitStack
 
 from ddtrace import tracer
 from django.db import IntegrityError
@@ -13,7 +14,11 @@ from django.urls import reverse
 from django.utils.translation import gettext as _
 import sys
 
-from casexml.apps.case.xform import close_extension_cases
+from casexml.apps.case.xform import (
+    close_extension_cases,
+    get_case_ids_from_form,
+    process_cases_with_casedb,
+)
 from casexml.apps.phone.restore_caching import AsyncRestoreTaskIdCache, RestorePayloadPathCache
 import couchforms
 from casexml.apps.case.exceptions import PhoneDateValueError, IllegalCaseId, UsesReferrals, InvalidCaseIndex, \
@@ -35,7 +40,7 @@ from corehq.form_processor.models import XFormInstance
 from corehq.form_processor.parsers.form import process_xform_xml
 from corehq.form_processor.system_action import SYSTEM_ACTION_XMLNS, handle_system_action
 from corehq.form_processor.utils.metadata import scrub_meta
-from corehq.form_processor.submission_process_tracker import unfinished_submission
+from corehq.form_processor.submission_process_tracker import unfinished_submission, unfinished_submissions
 from corehq.util.metrics import metrics_counter
 from corehq.util.metrics.load_counters import form_load_counter
 from corehq.util.global_request import get_request
@@ -253,32 +258,10 @@ class SubmissionPost(object):
             if failure_response:
                 return FormProcessingResult(failure_response, None, [], [], 'known_failures')
 
-            result = process_xform_xml(self.domain, self.instance, self.attachments, self.auth_context.to_json())
+            result = self._process_xml()
             submitted_form = result.submitted_form
-
-            self._post_process_form(submitted_form)
-            self._invalidate_caches(submitted_form)
-
             if submitted_form.is_submission_error_log:
-                logging.info('Processing form %s as a submission error', submitted_form.form_id)
-                XFormInstance.objects.save_new_form(submitted_form)
-
-                response = None
-                try:
-                    xml = self.instance.decode()
-                except UnicodeDecodeError:
-                    pass
-                else:
-                    if 'log_subreport' in xml:
-                        response = self.get_exception_response_and_log(
-                            'Badly formed device log', submitted_form, self.path
-                        )
-
-                if not response:
-                    response = self.get_exception_response_and_log(
-                        'Problem receiving submission', submitted_form, self.path
-                    )
-                return FormProcessingResult(response, None, [], [], 'submission_error_log')
+                return self._handle_submission_error_log(submitted_form)
 
         if submitted_form.xmlns == SYSTEM_ACTION_XMLNS:
             logging.info('Processing form %s as a system action', submitted_form.form_id)
@@ -293,10 +276,6 @@ class SubmissionPost(object):
         # Begin Normal Form Processing
         self._log_form_details(submitted_form)
 
-        cases = []
-        ledgers = []
-        submission_type = 'unknown'
-        openrosa_kwargs = {}
         with result.get_locked_forms() as xforms:
             if len(xforms) > 1:
                 self.track_load(len(xforms) - 1)
@@ -310,66 +289,111 @@ class SubmissionPost(object):
                 )
 
             with case_db_cache as case_db:
-                instance = xforms[0]
-
-                if instance.is_duplicate:
-                    with self.timing_context("process_duplicate"), tracer.trace('submission.process_duplicate'):
-                        submission_type = 'duplicate'
-                        existing_form = xforms[1]
-                        stub = UnfinishedSubmissionStub.objects.filter(
-                            domain=instance.domain,
-                            xform_id=existing_form.form_id
-                        ).first()
-
-                        result = None
-                        if stub:
-                            from corehq.form_processor.reprocess import reprocess_unfinished_stub_with_form
-                            result = reprocess_unfinished_stub_with_form(stub, existing_form, lock=False)
-                        elif existing_form.is_error:
-                            from corehq.form_processor.reprocess import reprocess_form
-                            result = reprocess_form(existing_form, lock_form=False)
-                        if result and result.error:
-                            submission_type = 'error'
-                            openrosa_kwargs['error_message'] = result.error
-                            if existing_form.is_error:
-                                openrosa_kwargs['error_nature'] = ResponseNature.PROCESSING_FAILURE
-                            else:
-                                openrosa_kwargs['error_nature'] = ResponseNature.POST_PROCESSING_FAILURE
-                        else:
-                            self.interface.save_processed_models([instance])
-                elif not instance.is_error:
-                    submission_type = 'normal'
-                    try:
-                        case_stock_result = self.process_xforms_for_cases(xforms, case_db, self.timing_context)
-                    except (IllegalCaseId, UsesReferrals, MissingProductId,
-                            PhoneDateValueError, InvalidCaseIndex, CaseValueError) as e:
-                        self._handle_known_error(e, instance, xforms)
-                        submission_type = 'error'
-                        openrosa_kwargs['error_nature'] = ResponseNature.PROCESSING_FAILURE
-                    except Exception as e:
-                        # handle / log the error and reraise so the phone knows to resubmit
-                        # note that in the case of edit submissions this won't flag the previous
-                        # submission as having been edited. this is intentional, since we should treat
-                        # this use case as if the edit "failed"
-                        handle_unexpected_error(self.interface, instance, e)
-                        raise
-                    else:
-                        instance.initial_processing_complete = True
-                        report_case_usage(self.domain, len(case_stock_result.case_models))
-                        openrosa_kwargs['error_message'] = self.save_processed_models(case_db, xforms,
-                                                                                      case_stock_result)
-                        if openrosa_kwargs['error_message']:
-                            openrosa_kwargs['error_nature'] = ResponseNature.POST_PROCESSING_FAILURE
-                        cases = case_stock_result.case_models
-                        ledgers = case_stock_result.stock_result.models_to_save
-                        openrosa_kwargs['success_message'] = self._get_success_message(instance, cases=cases)
-                elif instance.is_error:
-                    submission_type = 'error'
+                processed = self._process_locked_xforms(xforms, case_db)
+
+            return self._get_processing_result(*processed)
+
+    def _process_xml(self):
+        result = process_xform_xml(self.domain, self.instance, self.attachments, self.auth_context.to_json())
+        submitted_form = result.submitted_form
+
+        self._post_process_form(submitted_form)
+        self._invalidate_caches(submitted_form)
+        return result
 
-            self._log_form_completion(instance, submission_type)
+    def _handle_submission_error_log(self, submitted_form):
+        logging.info('Processing form %s as a submission error', submitted_form.form_id)
+        XFormInstance.objects.save_new_form(submitted_form)
+
+        response = None
+        try:
+            xml = self.instance.decode()
+        except UnicodeDecodeError:
+            pass
+        else:
+            if 'log_subreport' in xml:
+                response = self.get_exception_response_and_log(
+                    'Badly formed device log', submitted_form, self.path
+                )
+
+        if not response:
+            response = self.get_exception_response_and_log(
+                'Problem receiving submission', submitted_form, self.path
+            )
+        return FormProcessingResult(response, None, [], [], 'submission_error_log')
+
+    def _process_locked_xforms(self, xforms, case_db):
+        """Process and save a locked form (and the form it duplicates, if any) using ``case_db``
+
+        :returns: tuple of ``(instance, cases, ledgers, submission_type, openrosa_kwargs)``
+        """
+        cases = []
+        ledgers = []
+        submission_type = 'unknown'
+        openrosa_kwargs = {}
+        instance = xforms[0]
 
-            response = self._get_open_rosa_response(instance, **openrosa_kwargs)
-            return FormProcessingResult(response, instance, cases, ledgers, submission_type)
+        if instance.is_duplicate:
+            with self.timing_context("process_duplicate"), tracer.trace('submission.process_duplicate'):
+                submission_type = 'duplicate'
+                existing_form = xforms[1]
+                stub = UnfinishedSubmissionStub.objects.filter(
+                    domain=instance.domain,
+                    xform_id=existing_form.form_id
+                ).first()
+
+                result = None
+                if stub:
+                    from corehq.form_processor.reprocess import reprocess_unfinished_stub_with_form
+                    result = reprocess_unfinished_stub_with_form(stub, existing_form, lock=False)
+                elif existing_form.is_error:
+                    from corehq.form_processor.reprocess import reprocess_form
+                    result = reprocess_form(existing_form, lock_form=False)
+                if result and result.error:
+                    submission_type = 'error'
+                    openrosa_kwargs['error_message'] = result.error
+                    if existing_form.is_error:
+                        openrosa_kwargs['error_nature'] = ResponseNature.PROCESSING_FAILURE
+                    else:
+                        openrosa_kwargs['error_nature'] = ResponseNature.POST_PROCESSING_FAILURE
+                else:
+                    self.interface.save_processed_models([instance])
+        elif not instance.is_error:
+            submission_type = 'normal'
+            try:
+                case_stock_result = self.process_xforms_for_cases(xforms, case_db, self.timing_context)
+            except (IllegalCaseId, UsesReferrals, MissingProductId,
+                    PhoneDateValueError, InvalidCaseIndex, CaseValueError) as e:
+                self._handle_known_error(e, instance, xforms)
+                submission_type = 'error'
+                openrosa_kwargs['error_nature'] = ResponseNature.PROCESSING_FAILURE
+            except Exception as e:
+                # handle / log the error and reraise so the phone knows to resubmit
+                # note that in the case of edit submissions this won't flag the previous
+                # submission as having been edited. this is intentional, since we should treat
+                # this use case as if the edit "failed"
+                handle_unexpected_error(self.interface, instance, e)
+                raise
+            else:
+                instance.initial_processing_complete = True
+                report_case_usage(self.domain, len(case_stock_result.case_models))
+                openrosa_kwargs['error_message'] = self.save_processed_models(case_db, xforms,
+                                                                              case_stock_result)
+                if openrosa_kwargs['error_message']:
+                    openrosa_kwargs['error_nature'] = ResponseNature.POST_PROCESSING_FAILURE
+                cases = case_stock_result.case_models
+                ledgers = case_stock_result.stock_result.models_to_save
+                openrosa_kwargs['success_message'] = self._get_success_message(instance, cases=cases)
+        elif instance.is_error:
+            submission_type = 'error'
+
+        return instance, cases, ledgers, submission_type, openrosa_kwargs
+
+    def _get_processing_result(self, instance, cases, ledgers, submission_type, openrosa_kwargs):
+        self._log_form_completion(instance, submission_type)
+
+        response = self._get_open_rosa_response(instance, **openrosa_kwargs)
+        return FormProcessingResult(response, instance, cases, ledgers, submission_type)
 
     def _log_form_details(self, form):
         attachments = form.attachments if hasattr(form, 'attachments') else {}
@@ -513,7 +537,6 @@ class SubmissionPost(object):
     @staticmethod
     @tracer.wrap(name='submission.process_cases_and_stock')
     def process_xforms_for_cases(xforms, case_db, timing_context=None):
-        from casexml.apps.case.xform import process_cases_with_casedb
         from corehq.apps.commtrack.processing import process_stock
 
         timing_context = timing_context or TimingContext()
@@ -639,6 +662,253 @@ class SubmissionPost(object):
         return FormProcessingResult(response, device_log_form, [], [], 'device-log')
 
 
+class BatchSubmissionPost(object):
+    """
+    Process a batch of form submissions queued on one device in a single pass.
+
+    Locks for the union of cases touched by the batch are acquired once and the
+    cases are loaded into a single ``casedb_cache``. New forms that only touch
+    cases are saved together with their cases in one transaction per database
+    and share a single round of post save actions.
+
+    Anything else (duplicates, edits, ledger forms, system actions and device
+    logs) is processed as an individual submission using the shared case DB.
+    If a batched form fails case processing, the forms pending in the batch
+    are reprocessed individually so errors are handled exactly as they would
+    be for a single submission.
+    """
+
+    def __init__(self, instances, domain, **kwargs):
+        """
+        :param instances: list of ``(instance, attachments)`` tuples in submission order
+        :param kwargs: passed to ``SubmissionPost`` for every instance
+        """
+        assert 'case_db' not in kwargs, "'case_db' is managed by the batch"
+        self.domain = domain
+        self.interface = FormProcessorInterface(domain)
+        self.posts = [
+            SubmissionPost(instance=instance, attachments=attachments, domain=domain, **kwargs)
+            for instance, attachments in instances
+        ]
+
+    def run(self):
+        """
+        :returns: list of ``FormProcessingResult``, one per instance, in submission order
+        """
+        if not self.posts:
+            return []
+
+        results = [None] * len(self.posts)
+        parsed = []
+        for index, post in enumerate(self.posts):
+            failure_response = post._handle_basic_failure_modes()
+            if failure_response:
+                results[index] = FormProcessingResult(failure_response, None, [], [], 'known_failures')
+                continue
+
+            post.track_load()
+            with post.timing_context("process_xml"):
+                report_submission_usage(self.domain)
+                result = post._process_xml()
+            if result.submitted_form.is_submission_error_log:
+                results[index] = post._handle_submission_error_log(result.submitted_form)
+            else:
+                parsed.append((index, post, result))
+
+        case_ids = set()
+        for index, post, result in parsed:
+            case_ids.update(get_case_ids_from_form(result.submitted_form))
+
+        case_db = self.interface.casedb_cache(
+            domain=self.domain, lock=True, deleted_ok=True, load_src="form_submission_batch",
+        )
+        with case_db, ExitStack() as form_locks:
+            case_db.lock_and_populate(case_ids)
+            pending = []
+            locked_form_ids = set()
+            for index, post, result in parsed:
+                submitted_form = result.submitted_form
+                if submitted_form.xmlns in (SYSTEM_ACTION_XMLNS, DEVICE_LOG_XMLNS):
+                    self._flush(pending, case_db, results)
+                    results[index] = self._process_special_form(post, submitted_form)
+                    continue
+
+                post._log_form_details(submitted_form)
+                if submitted_form.form_id in locked_form_ids:
+                    # The batch already holds the lock for this form ID. Save
+                    # the pending forms so the form is found to be a duplicate.
+                    self._flush(pending, case_db, results)
+                    xforms = form_locks.enter_context(result.get_locked_forms(acquire_lock=False))
+                else:
+                    locked_form_ids.add(submitted_form.form_id)
+                    xforms = form_locks.enter_context(result.get_locked_forms())
+                if len(xforms) > 1:
+                    post.track_load(len(xforms) - 1)
+                case_db.cached_xforms.extend(xforms)
+
+                if self._can_batch(xforms):
+                    try:
+                        case_result = process_cases_with_casedb(xforms, case_db)
+                    except Exception:
+                        # processing may have left cached cases partially updated
+                        pending.append((index, post, xforms, []))
+                        self._process_pending_individually(pending, case_db, results)
+                    else:
+                        pending.append((index, post, xforms, case_result.cases))
+                else:
+                    self._flush(pending, case_db, results)
+                    results[index] = self._process_individually(post, xforms, case_db)
+
+            self._flush(pending, case_db, results)
+        return results
+
+    @staticmethod
+    def _can_batch(xforms):
+        from corehq.form_processor.parsers.ledgers.form import get_ledger_references_from_stock_transactions
+        instance = xforms[0]
+        return (
+            len(xforms) == 1
+            and not instance.is_duplicate
+            and not instance.is_error
+            and not get_ledger_references_from_stock_transactions(instance)
+        )
+
+    @staticmethod
+    def _process_special_form(post, submitted_form):
+        if submitted_form.xmlns == SYSTEM_ACTION_XMLNS:
+            logging.info('Processing form %s as a system action', submitted_form.form_id)
+            with post.timing_context("process_system_action"):
+                return post.handle_system_action(submitted_form)
+
+        logging.info('Processing form %s as a device log', submitted_form.form_id)
+        with post.timing_context("process_device_log"):
+            return post.process_device_log(submitted_form)
+
+    def _process_pending_individually(self, pending, case_db, results):
+        case_ids = {case.case_id for case in case_db.get_changed()}
+        for index, post, xforms, cases in pending:
+            case_ids.update(get_case_ids_from_form(xforms[0]))
+        case_db.reload(case_ids)
+        for index, post, xforms, cases in pending:
+            results[index] = self._process_individually(post, xforms, case_db)
+        del pending[:]
+
+    @staticmethod
+    def _process_individually(post, xforms, case_db):
+        processed = post._process_locked_xforms(xforms, case_db)
+        submission_type = processed[3]
+        if submission_type == 'error' or case_db.get_changed():
+            # don't let a failed form's changes leak into later forms in the batch
+            case_ids = {case.case_id for case in case_db.get_changed()}
+            case_db.reload(case_ids | get_case_ids_from_form(xforms[0]))
+        return post._get_processing_result(*processed)
+
+    @tracer.wrap(name='submission.save_batch')
+    def _flush(self, pending, case_db, results):
+        if not pending:
+            return
+
+        instances = [xforms[0] for index, post, xforms, cases in pending]
+        modified_on_date = max(instance.received_on for instance in instances)
+        cases = case_db.get_cases_for_saving(modified_on_date)
+        cases_by_id = {case.case_id: case for case in cases}
+        associated_form_ids = {}
+        for index, post, xforms, form_cases in pending:
+            for case in form_cases:
+                associated_form_ids[case.case_id] = xforms[0].form_id
+
+        for instance in instances:
+            instance.initial_processing_complete = True
+        report_case_usage(self.domain, len(cases))
+
+        error_message = None
+        try:
+            with unfinished_submissions(instances) as unfinished_submission_stubs:
+                try:
+                    self.interface.bulk_save_processed_models(instances, cases, associated_form_ids)
+                except PostSaveError:
+                    unfinished_submission_stubs.submission_saved()
+                    error_message = "Error performing post save operations"
+                else:
+                    unfinished_submission_stubs.submission_saved()
+                    try:
+                        self._do_post_save_actions(case_db, instances, cases, associated_form_ids)
+                    except PostSaveError:
+                        error_message = "Error performing post save operations"
+        except Exception as e:
+            self._fail_pending(pending, case_db, results, e)
+            return
+
+        for index, post, xforms, form_cases in pending:
+            instance = xforms[0]
+            form_cases = [cases_by_id.get(case.case_id, case) for case in form_cases]
+            openrosa_kwargs = {
+                'success_message': post._get_success_message(instance, cases=form_cases),
+                'error_message': error_message,
+            }
+            if error_message:
+                openrosa_kwargs['error_nature'] = ResponseNature.POST_PROCESSING_FAILURE
+            results[index] = post._get_processing_result(instance, form_cases, [], 'normal', openrosa_kwargs)
+        del pending[:]
+
+    def _fail_pending(self, pending, case_db, results, exception):
+        """Record the pending forms as errors after their save failed
+
+        As with single submissions the forms are saved as errors and the phone
+        is told to resubmit them, but only these forms fail: forms already
+        processed in the batch keep their responses.
+        """
+        case_ids = {case.case_id for case in case_db.get_changed()}
+        for index, post, xforms, cases in pending:
+            instance = xforms[0]
+            instance.initial_processing_complete = False
+            handle_unexpected_error(self.interface, instance, exception)
+            case_ids.update(get_case_ids_from_form(instance))
+            results[index] = post._get_processing_result(instance, [], [], 'error', {
+                'error_message': instance.problem,
+                'error_nature': ResponseNature.POST_PROCESSING_FAILURE,
+            })
+        # the cached cases include changes that were never saved
+        case_db.reload(case_ids)
+        del pending[:]
+
+    @staticmethod
+    @tracer.wrap(name='submission.batch_post_save_actions')
+    def _do_post_save_actions(case_db, instances, cases, associated_form_ids):
+        case_db.clear_changed()
+        last_instance = instances[-1]
+        try:
+            has_errors = False
+            for instance in instances:
+                # fire case signals once per case, along with the last form that touched it
+                instance_cases = [
+                    case for case in cases
+                    if associated_form_ids.get(case.case_id) == instance.form_id
+                ]
+                SubmissionPost.index_case_search(instance, instance_cases)
+                try:
+                    SubmissionPost._fire_post_save_signals(instance, instance_cases)
+                except PostSaveError:
+                    has_errors = True
+
+            close_extension_cases(
+                case_db,
+                cases,
+                "BatchSubmissionPost-%s-close_extensions" % last_instance.form_id,
+                last_instance.last_sync_token
+            )
+            if has_errors:
+                raise PostSaveError
+        except PostSaveError:
+            raise
+        except Exception:
+            notify_exception(get_request(), "Error performing post save actions during batch form processing", {
+                'domain': last_instance.domain,
+                'form_ids': [instance.form_id for instance in instances],
+            })
+            raise PostSaveError
+
+
 def _transform_instance_to_error(interface, exception, instance):
     error_message = '{}: {}'.format(type(exception).__name__, str(exception))
     return interface.xformerror_from_xform_instance(instance, error_message)
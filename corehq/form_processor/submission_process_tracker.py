@@ -18,6 +18,21 @@ class SubmissionProcessTracker(object):
             self.stub.delete()
 
 
+class BulkSubmissionProcessTracker(object):
+    def __init__(self, stub_ids):
+        self.stub_ids = stub_ids
+
+    def submission_saved(self):
+        from couchforms.models import UnfinishedSubmissionStub
+        if self.stub_ids:
+            UnfinishedSubmissionStub.objects.filter(id__in=self.stub_ids).update(saved=True)
+
+    def submission_fully_processed(self):
+        from couchforms.models import UnfinishedSubmissionStub
+        if self.stub_ids:
+            UnfinishedSubmissionStub.objects.filter(id__in=self.stub_ids).delete()
+
+
 class ArchiveProcessTracker(object):
     def __init__(self, stub=None):
         self.stub = stub
@@ -45,6 +60,25 @@ def unfinished_submission(instance):
     tracker.submission_fully_processed()
 
 
+@contextlib.contextmanager
+def unfinished_submissions(instances):
+    """Bulk version of ``unfinished_submission`` for a batch of new (non-edit) forms"""
+    from couchforms.models import UnfinishedSubmissionStub
+    now = datetime.datetime.utcnow()
+    stubs = UnfinishedSubmissionStub.objects.bulk_create([
+        UnfinishedSubmissionStub(
+            xform_id=instance.form_id,
+            timestamp=now,
+            saved=False,
+            domain=instance.domain,
+        )
+        for instance in instances
+    ])
+    tracker = BulkSubmissionProcessTracker([stub.id for stub in stubs])
+    yield tracker
+    tracker.submission_fully_processed()
+
+
 @contextlib.contextmanager
 def unfinished_archive(instance, user_id, archive):
     unfinished_archive_stub = _get_or_create_unfinished_archive_stub(
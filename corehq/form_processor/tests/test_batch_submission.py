@@ -0,0 +1,119 @@
+import uuid
+from datetime import datetime
+from unittest.mock import patch
+
+from django.db import DatabaseError
+from django.template.loader import render_to_string
+from django.test import TestCase
+
+from casexml.apps.case.mock import CaseBlock
+from dimagi.utils.parsing import json_format_datetime
+
+from corehq.apps.hqcase.utils import SYSTEM_FORM_XMLNS
+from corehq.form_processor.interfaces.processor import FormProcessorInterface
+from corehq.form_processor.models import CommCareCase, XFormInstance
+from corehq.form_processor.submission_post import BatchSubmissionPost
+from corehq.form_processor.tests.utils import FormProcessorTestUtils, sharded
+
+DOMAIN = 'batch-submission-test'
+
+
+def _form_xml(form_id, *case_blocks):
+    return render_to_string('hqcase/xml/case_block.xml', {
+        'xmlns': SYSTEM_FORM_XMLNS,
+        'case_block': ''.join(case_block.as_text() for case_block in case_blocks),
+        'time': json_format_datetime(datetime.utcnow()),
+        'uid': form_id,
+        'username': 'batch',
+        'user_id': 'batch-user',
+        'device_id': 'batch-device',
+    }).encode('utf-8')
+
+
+@sharded
+class BatchSubmissionPostTest(TestCase):
+
+    def tearDown(self):
+        FormProcessorTestUtils.delete_all_cases_forms_ledgers(DOMAIN)
+        super().tearDown()
+
+    def _run(self, *instances):
+        return BatchSubmissionPost([(instance, {}) for instance in instances], DOMAIN).run()
+
+    def test_empty_batch(self):
+        self.assertEqual(self._run(), [])
+
+    def test_forms_updating_same_case(self):
+        case_id = uuid.uuid4().hex
+        form_ids = [uuid.uuid4().hex for i in range(3)]
+        results = self._run(
+            _form_xml(form_ids[0], CaseBlock(case_id, create=True, case_type='person', case_name='A')),
+            _form_xml(form_ids[1], CaseBlock(case_id, update={'age': '10'})),
+            _form_xml(form_ids[2], CaseBlock(case_id, update={'age': '11'})),
+        )
+
+        self.assertEqual([result.xform.form_id for result in results], form_ids)
+        self.assertEqual([result.submission_type for result in results], ['normal'] * 3)
+        self.assertEqual([result.response.status_code for result in results], [201] * 3)
+        case = CommCareCase.objects.get_case(case_id, DOMAIN)
+        self.assertEqual(case.name, 'A')
+        self.assertEqual(case.get_case_property('age'), '11')
+        self.assertEqual(case.xform_ids, form_ids)
+
+    def test_duplicate_in_batch(self):
+        case_id = uuid.uuid4().hex
+        form_id = uuid.uuid4().hex
+        xml = _form_xml(form_id, CaseBlock(case_id, create=True, case_type='person'))
+        results = self._run(xml, xml)
+
+        self.assertEqual([result.submission_type for result in results], ['normal', 'duplicate'])
+        self.assertEqual(CommCareCase.objects.get_case(case_id, DOMAIN).xform_ids, [form_id])
+
+    def test_known_error_does_not_affect_other_forms(self):
+        case_id = uuid.uuid4().hex
+        bad_form_id = uuid.uuid4().hex
+        results = self._run(
+            _form_xml(uuid.uuid4().hex, CaseBlock(case_id, create=True, case_type='person')),
+            _form_xml(bad_form_id, CaseBlock(
+                case_id,
+                update={'age': '12'},
+                index={'parent': ('person', uuid.uuid4().hex)},
+            )),
+            _form_xml(uuid.uuid4().hex, CaseBlock(case_id, update={'height': '100'})),
+        )
+
+        self.assertEqual([result.submission_type for result in results], ['normal', 'error', 'normal'])
+        self.assertTrue(XFormInstance.objects.get_form(bad_form_id, DOMAIN).is_error)
+        case = CommCareCase.objects.get_case(case_id, DOMAIN)
+        self.assertEqual(case.get_case_property('age'), None)
+        self.assertEqual(case.get_case_property('height'), '100')
+        self.assertEqual(len(case.xform_ids), 2)
+
+    def test_failed_save_only_fails_its_own_forms(self):
+        case_id = uuid.uuid4().hex
+        form_id = uuid.uuid4().hex
+        failed_form_id = uuid.uuid4().hex
+        xml = _form_xml(form_id, CaseBlock(case_id, create=True, case_type='person'))
+        bulk_save = FormProcessorInterface.bulk_save_processed_models
+        saves = []
+
+        def fail_second_save(interface, *args, **kwargs):
+            saves.append(args)
+            if len(saves) > 1:
+                raise DatabaseError('save failed')
+            return bulk_save(interface, *args, **kwargs)
+
+        with patch.object(FormProcessorInterface, 'bulk_save_processed_models', fail_second_save):
+            # the duplicate saves the first form, the last form is saved on its own
+            results = self._run(
+                xml,
+                xml,
+                _form_xml(failed_form_id, CaseBlock(case_id, update={'age': '12'})),
+            )
+
+        self.assertEqual([result.submission_type for result in results], ['normal', 'duplicate', 'error'])
+        self.assertEqual(results[2].xform.form_id, failed_form_id)
+        self.assertTrue(XFormInstance.objects.get_form(failed_form_id, DOMAIN).is_error)
+        case = CommCareCase.objects.get_case(case_id, DOMAIN)
+        self.assertEqual(case.get_case_property('age'), None)
+        self.assertEqual(case.xform_ids, [form_id])
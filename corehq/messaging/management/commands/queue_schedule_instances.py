@@ -1,4 +1,8 @@
 from corehq.apps.domain_migration_flags.api import any_migrations_in_progress
+from corehq.messaging.scheduling.scheduling_partitioned.due_queue import (
+    SCHEDULE_INSTANCE_BATCH_SIZE,
+    pop_due_instances,
+)
 from corehq.messaging.scheduling.scheduling_partitioned.dbaccessors import (
     get_active_schedule_instance_ids,
     get_active_case_schedule_instance_ids,
@@ -14,13 +18,17 @@ from corehq.messaging.scheduling.tasks import (
     handle_timed_schedule_instance,
     handle_case_alert_schedule_instance,
     handle_case_timed_schedule_instance,
+    handle_schedule_instances,
 )
 from corehq.sql_db.util import handle_connection_failure, get_default_and_partitioned_db_aliases
-from datetime import datetime
+from datetime import datetime, timedelta
+from dimagi.utils.chunked import chunked
 from dimagi.utils.couch import get_redis_lock
 from dimagi.utils.logging import notify_exception
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from time import sleep
+import uuid
 
 
 def skip_domain(domain):
@@ -34,6 +42,11 @@ class Command(BaseCommand):
     consumes from the reminder_queue. This is ok because this process uses
     locks to ensure items are only enqueued once, and it's what is desired
     in order to more efficiently spawn the needed celery tasks.
+
+    When settings.SCHEDULE_DUE_QUEUE_ENABLED is True, due instances are
+    popped from the due queue and handled in batches per domain, and the
+    schedule instance tables are only scanned every
+    settings.SCHEDULE_INSTANCE_SCAN_INTERVAL minutes.
     """
     help = "Spawns tasks to process schedule instances"
 
@@ -88,10 +101,46 @@ class Command(BaseCommand):
                 if enqueue_lock.acquire(blocking=False):
                     self.get_task(cls).delay(case_id, schedule_instance_id.hex, domain)
 
+    def create_tasks_from_due_queue(self):
+        classes = {
+            cls.__name__: cls
+            for cls in (AlertScheduleInstance, TimedScheduleInstance,
+                        CaseAlertScheduleInstance, CaseTimedScheduleInstance)
+        }
+        for (class_name, domain), instances in pop_due_instances(datetime.utcnow()).items():
+            if skip_domain(domain):
+                # these are found by the next scan after the migration
+                continue
+
+            # The same locks as create_tasks() are used so that instances
+            # found by both are only enqueued once
+            to_enqueue = []
+            for case_id, schedule_instance_id, next_event_due in instances:
+                enqueue_lock = self.get_enqueue_lock(
+                    classes[class_name], uuid.UUID(schedule_instance_id), next_event_due)
+                if enqueue_lock.acquire(blocking=False):
+                    to_enqueue.append((case_id, schedule_instance_id))
+            for batch in chunked(to_enqueue, SCHEDULE_INSTANCE_BATCH_SIZE, list):
+                handle_schedule_instances.delay(class_name, domain, batch)
+
     def handle(self, **options):
+        scan_interval = timedelta(minutes=settings.SCHEDULE_INSTANCE_SCAN_INTERVAL)
+        last_scan = None
         while True:
-            try:
-                self.create_tasks()
-            except:
-                notify_exception(None, message="Could not fetch due reminders")
+            if settings.SCHEDULE_DUE_QUEUE_ENABLED:
+                try:
+                    self.create_tasks_from_due_queue()
+                except Exception:
+                    notify_exception(None, message="Could not pop due reminders")
+
+            if (
+                not settings.SCHEDULE_DUE_QUEUE_ENABLED
+                or last_scan is None
+                or datetime.utcnow() - last_scan >= scan_interval
+            ):
+                try:
+                    self.create_tasks()
+                    last_scan = datetime.utcnow()
+                except Exception:
+                    notify_exception(None, message="Could not fetch due reminders")
             sleep(10)
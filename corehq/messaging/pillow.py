@@ -35,6 +35,9 @@ class CaseMessagingSyncProcessor(BulkPillowProcessor):
       - PhoneNumber
       - Runs rules for SMS (can be many different things)
     """
+    # rules_by_domain is only a cache, so threads loading the same rules is harmless
+    thread_safe = True
+
     def __init__(self):
         self.rules_by_domain = {}
 
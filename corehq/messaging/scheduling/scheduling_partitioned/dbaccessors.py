@@ -2,6 +2,9 @@ from uuid import UUID
 
 from django.db.models import Q
 
+from corehq.messaging.scheduling.scheduling_partitioned.due_queue import (
+    add_to_due_queue,
+)
 from corehq.sql_db.util import (
     get_db_aliases_for_partitioned_query,
     paginate_query_across_partitioned_databases,
@@ -41,6 +44,7 @@ def save_alert_schedule_instance(instance):
     _validate_class(instance, AlertScheduleInstance)
     _validate_uuid(instance.schedule_instance_id)
     instance.save()
+    add_to_due_queue(instance)
 
 
 def save_timed_schedule_instance(instance):
@@ -49,6 +53,7 @@ def save_timed_schedule_instance(instance):
     _validate_class(instance, TimedScheduleInstance)
     _validate_uuid(instance.schedule_instance_id)
     instance.save()
+    add_to_due_queue(instance)
 
 
 def delete_alert_schedule_instance(instance):
@@ -296,6 +301,7 @@ def save_case_schedule_instance(instance):
     _validate_class(instance, (CaseAlertScheduleInstance, CaseTimedScheduleInstance))
     _validate_uuid(instance.schedule_instance_id)
     instance.save()
+    add_to_due_queue(instance)
 
 
 def delete_case_schedule_instance(instance):
@@ -0,0 +1,100 @@
+"""
+Time-bucketed queue of due schedule instances
+
+Finding due schedule instances by scanning the partitioned schedule instance
+tables gets expensive when there are millions of active instances. When
+``settings.SCHEDULE_DUE_QUEUE_ENABLED`` is True, saving an active schedule
+instance also adds it to a Redis set for the minute in which it is due, and
+the queue_schedule_instances command pops the sets of the minutes that have
+passed instead of scanning the tables every time.
+
+A bucket can hold instances that are no longer due, because they were
+rescheduled or deleted after they were added. The handlers check that an
+instance is due before processing it, so these are ignored. The tables are
+still scanned every ``settings.SCHEDULE_INSTANCE_SCAN_INTERVAL`` minutes to
+find instances whose buckets were lost.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from dimagi.utils.couch.cache.cache_core import get_redis_client
+
+DUE_QUEUE_BUCKET_KEY = 'schedule-instances-due-{:%Y-%m-%d-%H-%M}'
+# Buckets older than this are not popped; their instances are found by
+# scanning the schedule instance tables
+DUE_QUEUE_LOOKBACK = timedelta(hours=1)
+# A bucket is popped only after this much time has passed since the end of
+# its minute, to allow for instances that are saved as the minute ends
+DUE_QUEUE_GRACE_PERIOD = timedelta(seconds=5)
+# The number of schedule instances handled by one task
+SCHEDULE_INSTANCE_BATCH_SIZE = 100
+
+
+def add_to_due_queue(instance):
+    """Add ``instance`` to the bucket of the minute in which it is due
+
+    Instances that are already due are added to the bucket of the current
+    minute.
+    """
+    if not settings.SCHEDULE_DUE_QUEUE_ENABLED or not instance.active:
+        return
+
+    bucket = _get_bucket(max(instance.next_event_due, datetime.utcnow()))
+    key = DUE_QUEUE_BUCKET_KEY.format(bucket)
+    member = json.dumps([
+        type(instance).__name__,
+        instance.domain,
+        getattr(instance, 'case_id', None),
+        instance.schedule_instance_id.hex,
+        instance.next_event_due.isoformat(),
+    ])
+    pipe = _get_client().pipeline()
+    pipe.sadd(key, member)
+    pipe.expire(key, int((bucket - datetime.utcnow() + DUE_QUEUE_LOOKBACK).total_seconds()) + 60)
+    pipe.execute()
+
+
+def pop_due_instances(now):
+    """Remove the buckets of the minutes before ``now`` from the queue
+
+    :returns: a dict of ``{(class_name, domain): [instance, ...]}`` where
+        each instance is a ``(case_id, schedule_instance_id, next_event_due)``
+        tuple, and case_id is None for instances that are not case schedule
+        instances.
+    """
+    client = _get_client()
+    end = _get_bucket(now - DUE_QUEUE_GRACE_PERIOD)
+    buckets = []
+    bucket = _get_bucket(now - DUE_QUEUE_LOOKBACK)
+    while bucket < end:
+        buckets.append(bucket)
+        bucket += timedelta(minutes=1)
+
+    # reading and deleting each bucket in one transaction ensures that if
+    # more than one process pops the queue, only one of them gets each bucket
+    pipe = client.pipeline(transaction=True)
+    for bucket in buckets:
+        key = DUE_QUEUE_BUCKET_KEY.format(bucket)
+        pipe.smembers(key)
+        pipe.delete(key)
+    results = pipe.execute()
+
+    due = defaultdict(list)
+    for members in results[::2]:
+        for member in members:
+            class_name, domain, case_id, schedule_instance_id, next_event_due = json.loads(member)
+            due[(class_name, domain)].append(
+                (case_id, schedule_instance_id, datetime.fromisoformat(next_event_due))
+            )
+    return due
+
+
+def _get_bucket(when):
+    return when.replace(second=0, microsecond=0)
+
+
+def _get_client():
+    return get_redis_client().client.get_client()
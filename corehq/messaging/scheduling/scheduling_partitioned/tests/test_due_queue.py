@@ -0,0 +1,89 @@
+from corehq.messaging.scheduling.scheduling_partitioned.due_queue import (
+    add_to_due_queue,
+    pop_due_instances,
+)
+from corehq.messaging.scheduling.scheduling_partitioned.models import (
+    AlertScheduleInstance,
+    CaseScheduleInstanceMixin,
+    CaseTimedScheduleInstance,
+)
+from datetime import datetime, timedelta
+from django.test import SimpleTestCase, override_settings
+from freezegun import freeze_time
+import uuid
+
+
+@override_settings(SCHEDULE_DUE_QUEUE_ENABLED=True)
+class DueQueueTest(SimpleTestCase):
+
+    domain = 'scheduling-due-queue-test'
+    now = datetime(2023, 7, 1, 12, 0, 30)
+
+    def setUp(self):
+        # start from empty buckets around self.now
+        for hours in range(-2, 2):
+            pop_due_instances(self.now + timedelta(hours=hours))
+
+    def get_alert_schedule_instance(self, next_event_due, active=True):
+        return AlertScheduleInstance(
+            schedule_instance_id=uuid.uuid4(),
+            domain=self.domain,
+            next_event_due=next_event_due,
+            active=active,
+        )
+
+    def pop(self, when):
+        with freeze_time(when):
+            return pop_due_instances(when)
+
+    def test_popped_after_due_minute(self):
+        due = self.now + timedelta(minutes=5)
+        instance = self.get_alert_schedule_instance(due)
+        with freeze_time(self.now):
+            add_to_due_queue(instance)
+
+        self.assertEqual(self.pop(due), {})
+        self.assertEqual(self.pop(due + timedelta(minutes=1)), {
+            ('AlertScheduleInstance', self.domain): [(None, instance.schedule_instance_id.hex, due)],
+        })
+        self.assertEqual(self.pop(due + timedelta(minutes=2)), {})
+
+    def test_already_due(self):
+        due = self.now - timedelta(hours=2)
+        instance = self.get_alert_schedule_instance(due)
+        with freeze_time(self.now):
+            add_to_due_queue(instance)
+
+        self.assertEqual(self.pop(self.now), {})
+        self.assertEqual(self.pop(self.now + timedelta(minutes=1)), {
+            ('AlertScheduleInstance', self.domain): [(None, instance.schedule_instance_id.hex, due)],
+        })
+
+    def test_case_schedule_instance(self):
+        instance = CaseTimedScheduleInstance(
+            schedule_instance_id=uuid.uuid4(),
+            domain=self.domain,
+            recipient_type=CaseScheduleInstanceMixin.RECIPIENT_TYPE_SELF,
+            next_event_due=self.now,
+            active=True,
+            case_id='case-id',
+        )
+        with freeze_time(self.now):
+            add_to_due_queue(instance)
+
+        self.assertEqual(self.pop(self.now + timedelta(minutes=1)), {
+            ('CaseTimedScheduleInstance', self.domain): [('case-id', instance.schedule_instance_id.hex, self.now)],
+        })
+
+    def test_inactive(self):
+        with freeze_time(self.now):
+            add_to_due_queue(self.get_alert_schedule_instance(self.now, active=False))
+
+        self.assertEqual(self.pop(self.now + timedelta(minutes=1)), {})
+
+    @override_settings(SCHEDULE_DUE_QUEUE_ENABLED=False)
+    def test_disabled(self):
+        with freeze_time(self.now):
+            add_to_due_queue(self.get_alert_schedule_instance(self.now))
+
+        self.assertEqual(self.pop(self.now + timedelta(minutes=1)), {})
@@ -7,6 +7,7 @@ from bs4 import BeautifulSoup
 from celery.schedules import crontab
 
 from dimagi.utils.couch import CriticalSection
+from dimagi.utils.logging import notify_exception
 
 from corehq.apps.celery import task
 from corehq.apps.celery.periodic import periodic_task
@@ -535,6 +536,36 @@ def handle_case_timed_schedule_instance(case_id, schedule_instance_id, domain):
         _handle_schedule_instance(instance, save_case_schedule_instance)
 
 
+@no_result_task(queue='reminder_queue')
+def handle_schedule_instances(class_name, domain, instances):
+    """
+    Handles a batch of schedule instances of the same class and domain
+
+    :param class_name: the name of the schedule instance class
+    :param instances: a list of (case_id, schedule_instance_id) pairs; case_id
+    is None unless the instances are case schedule instances
+    """
+    handler = {
+        'AlertScheduleInstance': handle_alert_schedule_instance,
+        'TimedScheduleInstance': handle_timed_schedule_instance,
+        'CaseAlertScheduleInstance': handle_case_alert_schedule_instance,
+        'CaseTimedScheduleInstance': handle_case_timed_schedule_instance,
+    }[class_name]
+    for case_id, schedule_instance_id in instances:
+        try:
+            if case_id is None:
+                handler(schedule_instance_id, domain)
+            else:
+                handler(case_id, schedule_instance_id, domain)
+        except Exception:
+            # one failing instance shouldn't hold up the rest of the batch
+            notify_exception(None, message="Error handling schedule instance", details={
+                'domain': domain,
+                'class_name': class_name,
+                'schedule_instance_id': schedule_instance_id,
+            })
+
+
 @no_result_task(queue='background_queue', acks_late=True)
 def delete_schedule_instances_for_cases(domain, case_ids):
     for case_id in case_ids:
@@ -14,6 +14,16 @@ CHECK_REPEATERS_INTERVAL = timedelta(minutes=5)
 CHECK_REPEATERS_PARTITION_COUNT = settings.CHECK_REPEATERS_PARTITION_COUNT
 CHECK_REPEATERS_KEY = 'check-repeaters-key'
 ENDPOINT_TIMER = 'endpoint_timer'
+PROCESS_REPEATER_KEY = 'process-repeater-key'
+# Number of repeat records of a repeater that process_repeater claims at a time
+REPEATER_BATCH_SIZE = 100
+# Number of requests process_repeater sends to a repeater's endpoint at the same time
+REPEATER_CONCURRENCY = 4
+# Largest payload, in bytes or characters, that is cached for retries and
+# for other repeaters that forward the same document
+REPEATER_PAYLOAD_CACHE_MAX_SIZE = 1024 * 1024
+# Long enough for the first retry of a failed repeat record to use its cached payload
+REPEATER_PAYLOAD_CACHE_TIMEOUT = int(2 * MIN_RETRY_WAIT.total_seconds())
 # Number of attempts to an online endpoint before cancelling payload
 MAX_ATTEMPTS = 3
 # Number of exponential backoff attempts to an offline endpoint
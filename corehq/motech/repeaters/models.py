@@ -45,6 +45,13 @@ every ``CHECK_REPEATERS_INTERVAL`` (currently set to 5 minutes). Each
 ``RepeatRecord`` due to be processed will be added to the
 ``CELERY_REPEAT_RECORD_QUEUE``.
 
+In domains with the ``BATCH_REPEATER_DELIVERY`` toggle enabled,
+``process_repeaters()`` adds a task per repeater to the queue instead.
+It claims the repeater's due repeat records in batches, and sends
+``REPEATER_CONCURRENCY`` of them at a time, reusing connections to the
+remote API, until none are left, the repeater is rate limited, or all of
+the records in a batch fail.
+
 When it is pulled off the queue and processed, if its repeater is paused
 it will be postponed. If its repeater is deleted it will be deleted. And
 if it is waiting to be sent, or resent, its ``fire()`` method will be
@@ -73,7 +80,7 @@ from datetime import datetime, timedelta
 from http import HTTPStatus
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
-from django.db import models, router
+from django.db import models, router, transaction
 from django.db.models.base import Deferred
 from django.dispatch import receiver
 from django.utils import timezone
@@ -456,7 +463,7 @@ class Repeater(RepeaterSuperProxy):
 
     @memoized
     def get_payload(self, repeat_record):
-        return self.generator.get_payload(repeat_record, self.payload_doc(repeat_record))
+        return self.generator.get_cached_payload(repeat_record, self.payload_doc(repeat_record))
 
     def send_request(self, repeat_record, payload):
         url = self.get_url(repeat_record)
@@ -519,6 +526,15 @@ class Repeater(RepeaterSuperProxy):
     def payload_doc(self, repeat_record):
         raise NotImplementedError
 
+    @classmethod
+    def get_payload_docs(cls, domain, payload_ids):
+        """Load the payload documents of many repeat records at once
+
+        :returns: a dict of ``{payload_id: payload_doc}``, or None if
+            this repeater loads payload documents one at a time.
+        """
+        return None
+
     def allow_retries(self, response):
         """Whether to requeue the repeater when it fails
         """
@@ -557,8 +573,14 @@ class FormRepeater(Repeater):
 
     @memoized
     def payload_doc(self, repeat_record):
+        if repeat_record.prefetched_payload_doc is not None:
+            return repeat_record.prefetched_payload_doc
         return XFormInstance.objects.get_form(repeat_record.payload_id, repeat_record.domain)
 
+    @classmethod
+    def get_payload_docs(cls, domain, payload_ids):
+        return _get_forms_by_id(domain, payload_ids)
+
     @property
     def form_class_name(self):
         """
@@ -636,8 +658,18 @@ class CaseRepeater(Repeater):
 
     @memoized
     def payload_doc(self, repeat_record):
+        if repeat_record.prefetched_payload_doc is not None:
+            return repeat_record.prefetched_payload_doc
         return CommCareCase.objects.get_case(repeat_record.payload_id, repeat_record.domain)
 
+    @classmethod
+    def get_payload_docs(cls, domain, payload_ids):
+        return {
+            case.case_id: case
+            for case in CommCareCase.objects.get_cases(payload_ids, domain)
+            if case.domain == domain
+        }
+
     def get_headers(self, repeat_record):
         headers = super().get_headers(repeat_record)
         headers.update({
@@ -766,8 +798,14 @@ class ShortFormRepeater(Repeater):
 
     @memoized
     def payload_doc(self, repeat_record):
+        if repeat_record.prefetched_payload_doc is not None:
+            return repeat_record.prefetched_payload_doc
         return XFormInstance.objects.get_form(repeat_record.payload_id, repeat_record.domain)
 
+    @classmethod
+    def get_payload_docs(cls, domain, payload_ids):
+        return _get_forms_by_id(domain, payload_ids)
+
     def allowed_to_forward(self, payload):
         return payload.xmlns != DEVICE_LOG_XMLNS
 
@@ -846,6 +884,34 @@ def get_all_repeater_types():
     return dict(REPEATER_CLASS_MAP)
 
 
+def prefetch_payload_docs(repeat_records):
+    """Load the payload documents of ``repeat_records`` in bulk
+
+    Repeat records are grouped by repeater type and domain, and each
+    group's documents are loaded with one query. Repeat records whose
+    repeaters don't support loading payloads in bulk, or whose payloads
+    are not found, load their payload documents as usual.
+    """
+    groups = defaultdict(list)
+    for record in repeat_records:
+        groups[(type(record.repeater), record.domain)].append(record)
+    for (repeater_class, domain), records in groups.items():
+        payload_ids = list({record.payload_id for record in records})
+        docs = repeater_class.get_payload_docs(domain, payload_ids)
+        if docs is None:
+            continue
+        for record in records:
+            record.prefetched_payload_doc = docs.get(record.payload_id)
+
+
+def _get_forms_by_id(domain, form_ids):
+    return {
+        form.form_id: form
+        for form in XFormInstance.objects.get_forms(form_ids, domain)
+        if form.domain == domain
+    }
+
+
 class DataSourceRepeater(Repeater):
     """
     Forwards the UCR data source rows that are updated by a form
@@ -973,6 +1039,27 @@ class RepeatRecordManager(models.Manager):
                 "id__gt": result[-1].id,
             }
 
+    def claim_ready(self, repeater_id, limit):
+        """Claim up to ``limit`` of a repeater's records that are ready to send
+
+        Like ``RepeatRecord.attempt_forward_now()``, this sets the next
+        check of the records an arbitrarily long time from now, so that
+        they are not queued again while they are being sent. Records that
+        another process is claiming are skipped.
+        """
+        now = datetime.utcnow()
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            records = list(
+                self.select_for_update(skip_locked=True, of=('self',))
+                .filter(repeater_id=repeater_id, next_check__isnull=False, next_check__lt=now)
+                .select_related('repeater')
+                .order_by('next_check', 'id')[:limit]
+            )
+            self.filter(id__in=[record.id for record in records]).update(
+                next_check=now + timedelta(hours=48),
+            )
+        return records
+
     def get_domains_with_records(self):
         return self.order_by().values_list("domain", flat=True).distinct()
 
@@ -1002,6 +1089,10 @@ class RepeatRecord(models.Model):
 
     objects = RepeatRecordManager()
 
+    # set by prefetch_payload_docs() to save loading the payload document
+    # of each repeat record separately
+    prefetched_payload_doc = None
+
     class Meta:
         indexes = [
             models.Index(fields=['domain', 'registered_at']),
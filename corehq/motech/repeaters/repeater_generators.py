@@ -5,6 +5,7 @@ from datetime import datetime
 from uuid import uuid4
 
 import attr
+from django.core.cache import caches
 from django.core.serializers.json import DjangoJSONEncoder
 from django.template.loader import render_to_string
 from django.utils.translation import gettext_lazy as _
@@ -15,12 +16,18 @@ from casexml.apps.case.xml import V2
 from corehq.apps.receiverwrapper.exceptions import DuplicateFormatException
 from corehq.apps.registry.exceptions import RegistryAccessException
 from corehq.apps.registry.helper import DataRegistryHelper
+from corehq import toggles
 from corehq.apps.users.models import CouchUser
 from corehq.const import OPENROSA_VERSION_3
 from corehq.form_processor.exceptions import CaseNotFound
 from corehq.form_processor.models import CommCareCase
 from corehq.middleware import OPENROSA_VERSION_HEADER
+from corehq.motech.repeaters.const import (
+    REPEATER_PAYLOAD_CACHE_MAX_SIZE,
+    REPEATER_PAYLOAD_CACHE_TIMEOUT,
+)
 from corehq.motech.repeaters.exceptions import ReferralError, DataRegistryCaseUpdateError
+from corehq.util.metrics import metrics_counter
 from dimagi.utils.parsing import json_format_datetime
 from corehq.util.json import CommCareJSONEncoder
 
@@ -59,6 +66,48 @@ class BasePayloadGenerator(object):
     def get_payload(self, repeat_record, payload_doc):
         raise NotImplementedError()
 
+    def get_payload_cache_parts(self, payload_doc):
+        """
+        Return values that identify the payload of ``payload_doc``, or
+        None if the payload can't be cached.
+
+        The payload is cached if it depends only on the payload document
+        and these values, which should include the document's ID and
+        the time it was last modified, so that retries and repeaters
+        that forward the same document can share it.
+        """
+        return None
+
+    def get_cached_payload(self, repeat_record, payload_doc):
+        """
+        Return ``get_payload()``, from the cache if the payload of the
+        same version of ``payload_doc`` has been generated recently.
+        """
+        if not toggles.CACHE_REPEATER_PAYLOADS.enabled(self.repeater.domain):
+            return self.get_payload(repeat_record, payload_doc)
+        parts = self.get_payload_cache_parts(payload_doc)
+        if parts is None:
+            return self.get_payload(repeat_record, payload_doc)
+
+        cache = caches['redis']
+        key = 'repeater-payload:{}.{}:{}'.format(
+            type(self).__module__,
+            type(self).__name__,
+            ':'.join(str(part) for part in parts),
+        )
+        tags = {'generator': type(self).__name__}
+        payload = cache.get(key)
+        if payload is not None:
+            metrics_counter('commcare.repeaters.payload_cache', tags={**tags, 'result': 'hit'})
+            return payload
+
+        metrics_counter('commcare.repeaters.payload_cache', tags={**tags, 'result': 'miss'})
+        payload = self.get_payload(repeat_record, payload_doc)
+        # Large payloads are not cached, to bound the size of the cache
+        if isinstance(payload, (str, bytes)) and len(payload) <= REPEATER_PAYLOAD_CACHE_MAX_SIZE:
+            cache.set(key, payload, timeout=REPEATER_PAYLOAD_CACHE_TIMEOUT)
+        return payload
+
     def get_headers(self):
         return {'Content-Type': self.content_type}
 
@@ -204,6 +253,9 @@ class FormRepeaterXMLPayloadGenerator(BasePayloadGenerator):
     def get_payload(self, repeat_record, payload_doc):
         return payload_doc.get_xml()
 
+    def get_payload_cache_parts(self, payload_doc):
+        return payload_doc.form_id, payload_doc.server_modified_on
+
 
 class CaseRepeaterXMLPayloadGenerator(BasePayloadGenerator):
     format_name = 'case_xml'
@@ -212,6 +264,9 @@ class CaseRepeaterXMLPayloadGenerator(BasePayloadGenerator):
     def get_payload(self, repeat_record, payload_doc):
         return payload_doc.to_xml(self.repeater.version or V2, include_case_on_closed=True)
 
+    def get_payload_cache_parts(self, payload_doc):
+        return payload_doc.case_id, payload_doc.server_modified_on, self.repeater.version or V2
+
 
 class CaseRepeaterJsonPayloadGenerator(BasePayloadGenerator):
     format_name = 'case_json'
@@ -221,6 +276,9 @@ class CaseRepeaterJsonPayloadGenerator(BasePayloadGenerator):
         data = payload_doc.to_api_json(lite=True)
         return json.dumps(data, cls=DjangoJSONEncoder)
 
+    def get_payload_cache_parts(self, payload_doc):
+        return payload_doc.case_id, payload_doc.server_modified_on
+
     @property
     def content_type(self):
         return 'application/json'
@@ -685,6 +743,9 @@ class ShortFormRepeaterJsonPayloadGenerator(BasePayloadGenerator):
                            'received_on': json_format_datetime(form.received_on),
                            'case_ids': case_ids})
 
+    def get_payload_cache_parts(self, form):
+        return form.form_id, form.server_modified_on
+
     @property
     def content_type(self):
         return 'application/json'
@@ -702,6 +763,9 @@ class FormRepeaterJsonPayloadGenerator(BasePayloadGenerator):
         bundle = res.build_bundle(obj=form_to_es_form(form, include_attachments=True))
         return res.serialize(None, res.full_dehydrate(bundle), 'application/json')
 
+    def get_payload_cache_parts(self, form):
+        return form.form_id, form.server_modified_on
+
     @property
     def content_type(self):
         return 'application/json'
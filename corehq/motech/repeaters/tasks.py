@@ -1,7 +1,10 @@
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from django.conf import settings
+from django.db import connections
 
 from celery.schedules import crontab
 from celery.utils.log import get_task_logger
@@ -11,6 +14,7 @@ from dimagi.utils.couch import get_redis_lock
 from corehq import toggles
 from corehq.apps.celery import periodic_task, task
 from corehq.motech.models import RequestLog
+from corehq.motech.requests import reuse_session
 from corehq.util.metrics import (
     make_buckets_from_timedeltas,
     metrics_counter,
@@ -27,10 +31,18 @@ from .const import (
     CHECK_REPEATERS_PARTITION_COUNT,
     ENDPOINT_TIMER,
     MAX_RETRY_WAIT,
+    PROCESS_REPEATER_KEY,
     RATE_LIMITER_DELAY_RANGE,
+    REPEATER_BATCH_SIZE,
+    REPEATER_CONCURRENCY,
     State,
 )
-from .models import RepeatRecord, domain_can_forward
+from .models import (
+    Repeater,
+    RepeatRecord,
+    domain_can_forward,
+    prefetch_payload_docs,
+)
 
 from ..rate_limiter import (
     rate_limit_repeater,
@@ -113,12 +125,128 @@ def check_repeaters_in_partition(partition):
                 if datetime.utcnow() > twentythree_hours_later:
                     break
 
+                if toggles.BATCH_REPEATER_DELIVERY.enabled(record.domain):
+                    # sent by process_repeater()
+                    continue
+
                 metrics_counter("commcare.repeaters.check.attempt_forward")
                 record.attempt_forward_now(is_retry=True)
     finally:
         check_repeater_lock.release()
 
 
+@periodic_task(
+    run_every=CHECK_REPEATERS_INTERVAL,
+    queue=settings.CELERY_PERIODIC_QUEUE,
+)
+def process_repeaters():
+    """
+    Creates a task for each repeater with repeat records to send, in
+    domains with BATCH_REPEATER_DELIVERY enabled
+    """
+    domains = toggles.BATCH_REPEATER_DELIVERY.get_enabled_domains()
+    if not domains:
+        return
+    ready_repeaters = (
+        Repeater.objects.all_ready()
+        .filter(domain__in=domains)
+        .order_by()
+        .values_list('id', 'domain')
+        .distinct()
+    )
+    for repeater_id, domain in ready_repeaters:
+        process_repeater.delay(repeater_id.hex, domain)
+
+
+@task(queue=settings.CELERY_REPEAT_RECORD_QUEUE)
+def process_repeater(repeater_id, domain):
+    """
+    Sends the repeater's ready repeat records, REPEATER_CONCURRENCY at a
+    time, until there are none left or CHECK_REPEATERS_INTERVAL has
+    passed. Only one task sends the records of a repeater at a time.
+
+    Domain is present here for domain tagging in datadog
+    """
+    lock_key = f"{PROCESS_REPEATER_KEY}_{repeater_id}"
+    process_repeater_lock = get_redis_lock(
+        lock_key,
+        # allow for the requests that are being sent when time is up
+        timeout=int(2 * CHECK_REPEATERS_INTERVAL.total_seconds()),
+        name=lock_key,
+    )
+    if not process_repeater_lock.acquire(blocking=False):
+        metrics_counter("commcare.repeaters.process_repeater.locked_out", tags={'domain': domain})
+        return
+
+    try:
+        stop_at = datetime.utcnow() + CHECK_REPEATERS_INTERVAL
+        with ThreadPoolExecutor(REPEATER_CONCURRENCY) as executor:
+            while datetime.utcnow() < stop_at:
+                records = RepeatRecord.objects.claim_ready(repeater_id, REPEATER_BATCH_SIZE)
+                if not records or not _send_repeat_records(executor, records, domain):
+                    break
+    finally:
+        process_repeater_lock.release()
+
+
+def _send_repeat_records(executor, records, domain):
+    """
+    Sends ``records``, sharing them between the executor's threads
+
+    Records are no longer sent after the repeater is rate limited.
+    Records that were not sent are made ready to send again.
+
+    :returns: False if the repeater was rate limited or every record
+        that was sent failed, otherwise True.
+    """
+    try:
+        prefetch_payload_docs(records)
+    except Exception:
+        # records load their own payload documents instead
+        logging.exception("Failed to prefetch repeat record payloads")
+    stop = threading.Event()
+    shares = [records[i::REPEATER_CONCURRENCY] for i in range(REPEATER_CONCURRENCY)]
+    actions = {}
+    for share_actions in executor.map(_send_share, shares, [stop] * len(shares)):
+        actions.update(share_actions)
+
+    unsent = [record.id for record in records if record.id not in actions]
+    if unsent:
+        # A single delay for the batch, rather than one per record
+        delay = random.uniform(*RATE_LIMITER_DELAY_RANGE) if stop.is_set() else timedelta(0)
+        RepeatRecord.objects.filter(id__in=unsent).update(next_check=datetime.utcnow() + delay)
+
+    attempted = [record for record in records if actions.get(record.id) == 'attempted']
+    metrics_counter("commcare.repeaters.process_repeater.attempt_forward", len(attempted),
+                    tags={'domain': domain})
+    all_failed = bool(attempted) and all(record.state == State.Fail for record in attempted)
+    return not (stop.is_set() or all_failed)
+
+
+def _send_share(records, stop):
+    """
+    Sends ``records`` one after another over one session, until ``stop``
+    is set
+
+    :returns: a dict of ``{record.id: action}`` of the records that were
+        processed
+    """
+    actions = {}
+    try:
+        with reuse_session():
+            for record in records:
+                if stop.is_set():
+                    break
+                action = _process_repeat_record(record)
+                actions[record.id] = action
+                if action == 'rate_limited':
+                    stop.set()
+    finally:
+        # this thread's database connections are not reused by Django
+        connections.close_all()
+    return actions
+
+
 @task(queue=settings.CELERY_REPEAT_RECORD_QUEUE)
 def process_repeat_record(repeat_record_id, domain):
     """
@@ -213,6 +341,7 @@ def _process_repeat_record(repeat_record):
                 'action': action,
             },
         )
+    return action
 
 
 metrics_gauge_task(
@@ -30,6 +30,7 @@ from ..const import (
 )
 from ..models import (
     HTTP_STATUS_4XX_RETRY,
+    CaseRepeater,
     FormRepeater,
     Repeater,
     RepeatRecord,
@@ -37,6 +38,7 @@ from ..models import (
     get_all_repeater_types,
     is_response,
     is_success_response,
+    prefetch_payload_docs,
 )
 
 DOMAIN = 'test-domain'
@@ -197,6 +199,21 @@ class RepeaterManagerTests(RepeaterTestCase):
             self.assertEqual(repeaters[0].id, self.repeater.id)
 
 
+class RepeatRecordManagerClaimReadyTests(RepeaterTestCase):
+
+    def test_claim_ready(self):
+        with make_repeat_record(self.repeater, RECORD_PENDING_STATE) as ready, \
+                make_repeat_record(self.repeater, RECORD_PENDING_STATE) as not_ready:
+            ready.next_check = datetime.utcnow() - timedelta(minutes=5)
+            ready.save()
+            not_ready.next_check = datetime.utcnow() + timedelta(minutes=5)
+            not_ready.save()
+
+            records = RepeatRecord.objects.claim_ready(self.repeater.id, 10)
+            self.assertEqual([record.id for record in records], [ready.id])
+            self.assertEqual(RepeatRecord.objects.claim_ready(self.repeater.id, 10), [])
+
+
 @contextmanager
 def make_repeat_record(repeater, state):
     yield repeater.repeat_records.create(
@@ -935,6 +952,43 @@ class TestRepeatRecordMethodsNoDB(SimpleTestCase):
             self.assertFalse(repeat_record.exceeded_max_retries)
 
 
+class TestPrefetchPayloadDocs(SimpleTestCase):
+
+    def _get_records(self, repeater, payload_ids):
+        return [
+            RepeatRecord(domain=DOMAIN, payload_id=payload_id, repeater=repeater,
+                         registered_at=datetime.utcnow())
+            for payload_id in payload_ids
+        ]
+
+    def test_prefetch(self):
+        records = self._get_records(CaseRepeater(domain=DOMAIN), ['abc', 'def', 'abc'])
+        docs = {'abc': Mock(), 'def': Mock()}
+        with patch.object(CaseRepeater, 'get_payload_docs', return_value=docs) as get_payload_docs:
+            prefetch_payload_docs(records)
+        get_payload_docs.assert_called_once()
+        domain, payload_ids = get_payload_docs.call_args.args
+        self.assertEqual((domain, sorted(payload_ids)), (DOMAIN, ['abc', 'def']))
+        self.assertEqual(
+            [record.prefetched_payload_doc for record in records],
+            [docs['abc'], docs['def'], docs['abc']],
+        )
+
+    def test_payload_not_found(self):
+        repeater = CaseRepeater(domain=DOMAIN)
+        records = self._get_records(repeater, ['abc'])
+        with patch.object(CaseRepeater, 'get_payload_docs', return_value={}), \
+                patch('corehq.motech.repeaters.models.CommCareCase.objects.get_case') as get_case:
+            prefetch_payload_docs(records)
+            self.assertIsNone(records[0].prefetched_payload_doc)
+            self.assertEqual(repeater.payload_doc(records[0]), get_case.return_value)
+
+    def test_repeater_without_bulk_loading(self):
+        records = self._get_records(Repeater(domain=DOMAIN), ['abc'])
+        prefetch_payload_docs(records)
+        self.assertIsNone(records[0].prefetched_payload_doc)
+
+
 class TestIsSuccessResponse(SimpleTestCase):
 
     def test_true_response(self):
@@ -1,12 +1,14 @@
 """
 These tests were written to check that FormDictPayloadGenerator behaved
-like FormRepeaterJsonPayloadGenerator.
+like FormRepeaterJsonPayloadGenerator, and that payloads are cached.
 """
 import json
+from datetime import datetime, timedelta
 from typing import Tuple
+from unittest.mock import Mock, patch
 from uuid import uuid4
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
 from casexml.apps.case.mock import CaseBlock
 
@@ -20,6 +22,7 @@ from corehq.motech.repeater_helpers import (
 )
 from corehq.motech.repeaters.repeater_generators import (
     BasePayloadGenerator,
+    CaseRepeaterJsonPayloadGenerator,
     FormDictPayloadGenerator,
     FormRepeaterJsonPayloadGenerator,
 )
@@ -27,6 +30,7 @@ from corehq.motech.value_source import (
     CaseTriggerInfo,
     get_form_question_values,
 )
+from corehq.util.test_utils import flag_enabled
 
 SQL_DOMAIN = 'test-sql-domain'
 
@@ -142,6 +146,41 @@ class TestSqlDataTypes(TestCase):
             self.check_payload_info_type(payload, info, question, expected_type)
 
 
+@flag_enabled('CACHE_REPEATER_PAYLOADS')
+class TestCachedPayload(SimpleTestCase):
+
+    def setUp(self):
+        self.generator = CaseRepeaterJsonPayloadGenerator(Mock(domain=SQL_DOMAIN))
+        self.case = Mock(case_id=uuid4().hex, server_modified_on=datetime.utcnow())
+        patcher = patch.object(self.generator, 'get_payload', side_effect=lambda record, case: uuid4().hex)
+        self.get_payload = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached(self):
+        payload = self.generator.get_cached_payload(None, self.case)
+        self.assertEqual(self.generator.get_cached_payload(None, self.case), payload)
+        self.get_payload.assert_called_once()
+
+    def test_shared_by_repeaters(self):
+        payload = self.generator.get_cached_payload(None, self.case)
+        other_generator = CaseRepeaterJsonPayloadGenerator(Mock(domain=SQL_DOMAIN))
+        with patch.object(other_generator, 'get_payload') as get_payload:
+            self.assertEqual(other_generator.get_cached_payload(None, self.case), payload)
+        get_payload.assert_not_called()
+
+    def test_document_modified(self):
+        payload = self.generator.get_cached_payload(None, self.case)
+        self.case.server_modified_on += timedelta(seconds=1)
+        self.assertNotEqual(self.generator.get_cached_payload(None, self.case), payload)
+        self.assertEqual(self.get_payload.call_count, 2)
+
+    @patch('corehq.motech.repeaters.repeater_generators.REPEATER_PAYLOAD_CACHE_MAX_SIZE', 10)
+    def test_large_payload_not_cached(self):
+        self.generator.get_cached_payload(None, self.case)
+        self.generator.get_cached_payload(None, self.case)
+        self.assertEqual(self.get_payload.call_count, 2)
+
+
 def create_sql_domain(name):
     return Domain.get_or_create_with_name(
         name,
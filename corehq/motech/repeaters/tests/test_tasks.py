@@ -1,8 +1,9 @@
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timedelta
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
 from corehq.apps.receiverwrapper.util import submit_form_locally
 from corehq.form_processor.models import XFormInstance
@@ -14,6 +15,7 @@ from corehq.motech.models import ConnectionSettings, RequestLog
 from corehq.motech.repeaters.models import Repeater, RepeatRecord
 from corehq.motech.repeaters.tasks import (
     _process_repeat_record,
+    _send_repeat_records,
     delete_old_request_logs,
 )
 
@@ -241,3 +243,40 @@ class TestProcessRepeatRecord(TestCase):
         self.mock_domain_can_forward = patch_domain_can_forward.start()
         self.mock_domain_can_forward.return_value = True
         self.addCleanup(patch_domain_can_forward.stop)
+
+
+@patch('corehq.motech.repeaters.tasks.RepeatRecord.objects')
+class TestSendRepeatRecords(SimpleTestCase):
+
+    def setUp(self):
+        self.records = [Mock(id=i, state=State.Success) for i in range(10)]
+        self.executor = ThreadPoolExecutor(2)
+        self.addCleanup(self.executor.shutdown)
+
+    def _send(self, process_repeat_record):
+        with patch('corehq.motech.repeaters.tasks._process_repeat_record',
+                   side_effect=process_repeat_record) as mock_process, \
+                patch('corehq.motech.repeaters.tasks.REPEATER_CONCURRENCY', 2):
+            result = _send_repeat_records(self.executor, self.records, DOMAIN)
+        return result, mock_process
+
+    def test_sends_all_records(self, mock_objects):
+        result, mock_process = self._send(lambda record: 'attempted')
+        self.assertTrue(result)
+        self.assertEqual(mock_process.call_count, 10)
+        mock_objects.filter.assert_not_called()
+
+    def test_stops_when_rate_limited(self, mock_objects):
+        result, mock_process = self._send(
+            lambda record: 'rate_limited' if record.id == 0 else 'attempted')
+        self.assertFalse(result)
+        self.assertLess(mock_process.call_count, 10)
+        unsent = mock_objects.filter.call_args.kwargs['id__in']
+        self.assertEqual(len(unsent), 10 - mock_process.call_count)
+
+    def test_stops_when_all_fail(self, mock_objects):
+        for record in self.records:
+            record.state = State.Fail
+        result, mock_process = self._send(lambda record: 'attempted')
+        self.assertFalse(result)
+        self.assertEqual(mock_process.call_count, 10)
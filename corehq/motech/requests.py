@@ -1,4 +1,6 @@
 import logging
+import threading
+from contextlib import contextmanager
 from functools import wraps
 from typing import Callable, Optional
 
@@ -81,6 +83,34 @@ def log_request(self, func, logger):
     return request_wrapper
 
 
+_reused_session = threading.local()
+
+
+@contextmanager
+def reuse_session():
+    """
+    Send the requests made by this thread in this block with one session,
+    so that connections to the remote API are kept alive between them.
+
+    The session is created by the first request, so all of the requests
+    must use the same connection settings.
+    """
+    _reused_session.active = True
+    _reused_session.session = None
+    try:
+        yield
+    finally:
+        session = _reused_session.session
+        _reused_session.active = False
+        _reused_session.session = None
+        if session is not None:
+            session.close()
+
+
+def _is_reusing_session():
+    return getattr(_reused_session, 'active', False)
+
+
 class Requests(object):
     """
     Wraps the requests library to simplify use with JSON REST APIs.
@@ -129,11 +159,17 @@ class Requests(object):
         self._session = None
 
     def __enter__(self):
-        self._session = self.auth_manager.get_session(self.domain_name)
+        if not _is_reusing_session():
+            self._session = self.auth_manager.get_session(self.domain_name)
+        else:
+            if _reused_session.session is None:
+                _reused_session.session = self.auth_manager.get_session(self.domain_name)
+            self._session = _reused_session.session
         return self
 
     def __exit__(self, *args):
-        self._session.close()
+        if not _is_reusing_session():
+            self._session.close()
         self._session = None
 
     def send_request_unlogged(self, method, url, *args, **kwargs):
@@ -14,6 +14,8 @@ from pillowtop.reindexer.reindexer import (
     ResumableBulkElasticPillowReindexer,
 )
 
+from casexml.apps.phone.data_providers.case.livequery_cache import LiveCaseGraphProcessor
+
 from corehq.apps.change_feed.consumer.feed import (
     KafkaChangeFeed,
     KafkaCheckpointEventHandler,
@@ -77,6 +79,7 @@ def get_case_pillow(
     ucr_configs=None,
     skip_ucr=False,
     processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE,
+    processor_concurrency=1,
     topics=None,
     dedicated_migration_process=False,
     **kwargs,
@@ -88,6 +91,7 @@ def get_case_pillow(
       - :py:class:`pillowtop.processors.elastic.BulkElasticProcessor`
       - :py:func:`corehq.pillows.case_search.get_case_search_processor`
       - :py:class:`corehq.messaging.pillow.CaseMessagingSyncProcessor`
+      - :py:class:`casexml.apps.phone.data_providers.case.livequery_cache.LiveCaseGraphProcessor`
     """
     if topics:
         assert set(topics).issubset(CASE_TOPICS), "This is a pillow to process cases only"
@@ -125,7 +129,7 @@ def get_case_pillow(
         checkpoint=checkpoint, checkpoint_frequency=1000, change_feed=change_feed,
         checkpoint_callback=ucr_processor
     )
-    processors = [case_to_es_processor, CaseMessagingSyncProcessor()]
+    processors = [case_to_es_processor, CaseMessagingSyncProcessor(), LiveCaseGraphProcessor()]
     if settings.RUN_CASE_SEARCH_PILLOW:
         processors.append(case_search_processor)
     if settings.RUN_DEDUPLICATION_PILLOW:
@@ -140,6 +144,8 @@ def get_case_pillow(
         change_processed_event_handler=event_handler,
         processor=processors,
         processor_chunk_size=processor_chunk_size,
+        processor_concurrency=processor_concurrency,
+        prefetch_documents=True,
         process_num=process_num,
         is_dedicated_migration_process=dedicated_migration_process and run_migrations
     )
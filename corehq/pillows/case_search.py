@@ -1,3 +1,6 @@
+from collections import Counter, defaultdict
+from copy import copy
+
 from django.core.mail import mail_admins
 from django.db import ProgrammingError
 
@@ -6,6 +9,9 @@ from corehq.apps.accounting.utils import domain_has_privilege
 from corehq.apps.case_search.const import (
     GEOPOINT_VALUE,
     INDEXED_METADATA_BY_KEY,
+    INDICES_PATH,
+    REFERENCED_ID,
+    SUBCASE_COUNTS,
     VALUE,
 )
 from corehq.apps.case_search.exceptions import CaseSearchNotEnabledException
@@ -16,11 +22,17 @@ from corehq.apps.change_feed.consumer.feed import (
     KafkaCheckpointEventHandler,
 )
 from corehq.apps.data_dictionary.util import get_gps_properties
-from corehq.apps.es.case_search import CaseSearchES, case_search_adapter
-from corehq.apps.es.client import manager
+from corehq.apps.es.case_search import (
+    CaseSearchES,
+    case_search_adapter,
+    multiplex_to_adapter,
+    subcase_count_property,
+)
+from corehq.apps.es.client import BulkActionItem, manager
 from corehq.apps.geospatial.utils import get_geo_case_property
 from corehq.form_processor.backends.sql.dbaccessors import CaseReindexAccessor
 from corehq.pillows.base import is_couch_change_for_sql_domain
+from corehq.toggles import CASE_SEARCH_SUBCASE_COUNTS
 from corehq.util.doc_processor.sql import SqlDocumentProvider
 from corehq.util.log import get_traceback_string
 from corehq.util.quickcache import quickcache
@@ -30,10 +42,12 @@ from jsonobject.exceptions import BadValueError
 from pillowtop.checkpoints.manager import (
     get_checkpoint_for_elasticsearch_pillow,
 )
+from pillowtop.const import DEFAULT_PROCESSOR_CHUNK_SIZE
 from pillowtop.es_utils import initialize_index_and_mapping
+from pillowtop.exceptions import BulkDocException
 from pillowtop.feed.interface import Change
 from pillowtop.pillow.interface import ConstructedPillow
-from pillowtop.processors.elastic import ElasticProcessor
+from pillowtop.processors.elastic import BulkElasticProcessor
 from pillowtop.reindexer.change_providers.case import (
     get_domain_case_change_provider,
 )
@@ -42,6 +56,7 @@ from pillowtop.reindexer.reindexer import (
     ReindexerFactory,
     ResumableBulkElasticPillowReindexer,
 )
+from pillowtop.utils import get_errors_with_ids
 
 _assert_string_property = soft_assert(to='{}@{}.com'.format('cellowitz', 'dimagi'), notify_admins=True)
 
@@ -84,7 +99,12 @@ def _get_case_properties(doc_dict):
 
     _add_smart_types(dynamic_properties, domain, doc_dict['type'])
 
-    return base_case_properties + dynamic_properties
+    subcase_counts = [
+        {'key': subcase_count_property(identifier), VALUE: str(count)}
+        for identifier, count in doc_dict.get(SUBCASE_COUNTS, {}).items()
+    ]
+
+    return base_case_properties + dynamic_properties + subcase_counts
 
 
 def _add_smart_types(dynamic_properties, domain, case_type):
@@ -107,22 +127,172 @@ def _add_gps_smart_types(dynamic_properties, gps_props):
                 prop[GEOPOINT_VALUE] = None
 
 
-class CaseSearchPillowProcessor(ElasticProcessor):
+def get_subcase_counts(domain, case_ids):
+    """Count the subcases of each case by the identifiers of their indices
+
+    :returns: a dict of ``{case_id: {identifier: count}}`` with cases that
+    have subcases
+    """
+    from corehq.form_processor.models import CommCareCaseIndex
+
+    counts = defaultdict(Counter)
+    for index in CommCareCaseIndex.objects.get_all_reverse_indices_info(domain, list(case_ids)):
+        counts[index.referenced_id][index.identifier] += 1
+    return {case_id: dict(identifier_counts) for case_id, identifier_counts in counts.items()}
+
+
+def get_parents_with_subcase_counts(domain, adapter, docs_by_id):
+    """Get the cases whose subcase counts may change with the cases in ``docs_by_id``
+
+    These are the cases that the changed cases index, or indexed when they
+    were last written to ``adapter``, through indices that were added,
+    removed or changed, excluding the changed cases themselves. All the
+    indices of cases that were created or deleted count as changed.
+
+    :param docs_by_id: a dict of ``{case_id: doc}`` with the current
+        versions of the changed cases, or None for deleted cases
+    :returns: a list of ``(case_id, parent_doc)``, where ``parent_doc`` is
+        the parent case's ``to_json()`` with its subcase counts, and
+        ``case_id`` is one of the cases that indexes it
+    """
+    from corehq.form_processor.models import CommCareCase
+
+    indexed_docs = {doc['_id']: doc for doc in adapter.get_docs(list(docs_by_id))}
+    case_id_by_parent_id = {}
+    for case_id, doc in docs_by_id.items():
+        changed_indices = _get_subcase_indices(doc) ^ _get_subcase_indices(indexed_docs.get(case_id))
+        for identifier, parent_id in changed_indices:
+            if parent_id not in docs_by_id:
+                case_id_by_parent_id.setdefault(parent_id, case_id)
+    if not case_id_by_parent_id:
+        return []
+
+    subcase_counts = get_subcase_counts(domain, case_id_by_parent_id)
+    parents = []
+    for case in CommCareCase.objects.get_cases(list(case_id_by_parent_id), domain):
+        if not case.is_deleted:
+            parent_doc = {**case.to_json(), SUBCASE_COUNTS: subcase_counts.get(case.case_id, {})}
+            parents.append((case_id_by_parent_id[case.case_id], parent_doc))
+    return parents
+
+
+def _get_subcase_indices(doc):
+    """The ``(identifier, referenced_id)`` of each index that makes the case
+    a subcase of another"""
+    if not doc or doc.get('doc_type', '').endswith('-Deleted'):
+        return set()
+    return {
+        (index.get('identifier'), index[REFERENCED_ID])
+        for index in doc.get(INDICES_PATH) or []
+        if index.get(REFERENCED_ID)
+    }
+
+
+class CaseSearchPillowProcessor(BulkElasticProcessor):
+    """Writes the cases of domains that need a case search index
+
+    Cases in domains with ``CASE_SEARCH_SUBCASE_COUNTS`` enabled are indexed
+    with the number of subcases they have for each index identifier. When
+    the indices of a case change, the cases it indexes, or used to index, are
+    indexed again with their new counts, in the same bulk requests as the
+    changed cases.
+    """
 
     def process_change(self, change):
         assert isinstance(change, Change)
         if self.change_filter_fn and self.change_filter_fn(change):
             return
 
-        if change.metadata is not None:
-            # Comes from KafkaChangeFeed (i.e. running pillowtop)
-            domain = change.metadata.domain
-        else:
-            # comes from ChangeProvider (i.e reindexing)
-            domain = change.get_document()['domain']
+        domain = _get_change_domain(change)
+        if not (domain and domain_needs_search_index(domain)):
+            return
 
-        if domain and domain_needs_search_index(domain):
+        if not CASE_SEARCH_SUBCASE_COUNTS.enabled(domain):
             super(CaseSearchPillowProcessor, self).process_change(change)
+            return
+
+        doc = change.get_document()
+        if change.metadata is None:
+            # a reindex writes every case of the domain with its own counts,
+            # so the parents aren't written again for each of their subcases
+            parents = []
+        else:
+            parents = get_parents_with_subcase_counts(domain, self.adapter, {change.id: doc})
+        subcase_counts = get_subcase_counts(domain, [change.id])
+        if doc and change.id in subcase_counts:
+            # copy the change so other processors don't see the counts
+            change = copy(change)
+            change.set_document({**doc, SUBCASE_COUNTS: subcase_counts[change.id]})
+        super(CaseSearchPillowProcessor, self).process_change(change)
+        if parents:
+            self.adapter.bulk([BulkActionItem.index(parent_doc) for case_id, parent_doc in parents])
+
+    def process_changes_chunk(self, changes_chunk):
+        changes_chunk = [
+            change for change in changes_chunk
+            if change.metadata.domain and domain_needs_search_index(change.metadata.domain)
+        ]
+        return super().process_changes_chunk(changes_chunk)
+
+    def _build_bulk_actions(self, changes, error_collector):
+        changes = list(changes)
+        actions = super()._build_bulk_actions(changes, error_collector)
+        self._delete_from_sub_indices(actions, error_collector)
+
+        changes_by_domain = defaultdict(dict)
+        for change in changes:
+            changes_by_domain[change.metadata.domain][change.id] = change
+        subcase_counts = {}
+        parent_actions = []
+        for domain, domain_changes in changes_by_domain.items():
+            if not CASE_SEARCH_SUBCASE_COUNTS.enabled(domain):
+                continue
+            subcase_counts.update(get_subcase_counts(domain, domain_changes))
+            docs_by_id = {case_id: change.document for case_id, change in domain_changes.items()}
+            parent_actions.extend(
+                (domain_changes[case_id], BulkActionItem.index(parent_doc))
+                for case_id, parent_doc in get_parents_with_subcase_counts(domain, self.adapter, docs_by_id)
+            )
+        actions = [
+            (change, _with_subcase_counts(action, subcase_counts))
+            for change, action in actions
+        ]
+        return actions + parent_actions
+
+    def _delete_from_sub_indices(self, actions, error_collector):
+        """Delete the deleted cases of domains with a sub-index from it
+
+        The case search adapter writes the documents of these domains to
+        their sub-index too, but it can't tell the domain of a delete
+        action, which only has the document's ID.
+        """
+        changes_by_index = defaultdict(dict)
+        sub_index_adapters = {}
+        for change, action in actions:
+            if action.is_delete:
+                sub_index_adapter = multiplex_to_adapter(change.metadata.domain)
+                if sub_index_adapter:
+                    sub_index_adapters[sub_index_adapter.index_name] = sub_index_adapter
+                    changes_by_index[sub_index_adapter.index_name][change.id] = change
+        for index_name, changes_by_id in changes_by_index.items():
+            _, errors = sub_index_adapters[index_name].bulk_delete(list(changes_by_id), raise_errors=False)
+            for doc_id, error_msg in get_errors_with_ids(errors):
+                error_collector.add_error((changes_by_id[doc_id], BulkDocException(error_msg)))
+
+
+def _get_change_domain(change):
+    if change.metadata is not None:
+        # Comes from KafkaChangeFeed (i.e. running pillowtop)
+        return change.metadata.domain
+    # comes from ChangeProvider (i.e reindexing)
+    return change.get_document()['domain']
+
+
+def _with_subcase_counts(action, subcase_counts):
+    # the document is copied so other processors don't see the counts
+    if action.is_index and action.doc['_id'] in subcase_counts:
+        return BulkActionItem.index({**action.doc, SUBCASE_COUNTS: subcase_counts[action.doc['_id']]})
+    return action
 
 
 def get_case_search_processor():
@@ -199,9 +369,13 @@ class CaseSearchReindexerFactory(ReindexerFactory):
 
 
 def get_case_search_to_elasticsearch_pillow(pillow_id='CaseSearchToElasticsearchPillow', num_processes=1,
-                                            process_num=0, **kwargs):
+                                            process_num=0, processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE,
+                                            processor_concurrency=1, **kwargs):
     """Populates the `case search` Elasticsearch index.
 
+        Changes are processed in chunks of ``processor_chunk_size``, split by
+        case ID between ``processor_concurrency`` threads.
+
         Processors:
           - :py:class:`corehq.pillows.case_search.CaseSearchPillowProcessor`
     """
@@ -221,6 +395,8 @@ def get_case_search_to_elasticsearch_pillow(pillow_id='CaseSearchToElasticsearch
         change_processed_event_handler=KafkaCheckpointEventHandler(
             checkpoint=checkpoint, checkpoint_frequency=100, change_feed=change_feed,
         ),
+        processor_chunk_size=processor_chunk_size,
+        processor_concurrency=processor_concurrency,
     )
 
 
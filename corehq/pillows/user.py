@@ -65,6 +65,7 @@ class UnknownUsersProcessor(PillowProcessor):
     Writes to:
       - UserES index
     """
+    thread_safe = True
 
     def process_change(self, change):
         update_unknown_user_from_form_if_necessary(change.get_document())
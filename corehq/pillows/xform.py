@@ -94,6 +94,7 @@ def get_xform_pillow(
         ucr_configs=None,
         skip_ucr=False,
         processor_chunk_size=DEFAULT_PROCESSOR_CHUNK_SIZE,
+        processor_concurrency=1,
         topics=None,
         dedicated_migration_process=False,
         **kwargs,
@@ -159,6 +160,8 @@ def get_xform_pillow(
         change_processed_event_handler=event_handler,
         processor=processors,
         processor_chunk_size=processor_chunk_size,
+        processor_concurrency=processor_concurrency,
+        prefetch_documents=True,
         process_num=process_num,
         is_dedicated_migration_process=dedicated_migration_process and (process_num == 0)
     )
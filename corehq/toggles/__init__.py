@@ -1383,6 +1383,19 @@ FORM_SUBMISSION_BLACKLIST = StaticToggle(
                 "send forms. If that ever causes problems, we can use this to cut them off.",
 )
 
+BATCH_FORM_SUBMISSIONS = StaticToggle(
+    'batch_form_submissions',
+    'Accept the forms queued on a device in a single batch submission',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Enables the batch submission endpoint, which accepts many forms in one
+    request. Forms that only update cases are saved in bulk, with the case
+    locks taken once for the whole batch, and the response lists the
+    OpenRosa response for each form.
+    """
+)
+
 
 def _commtrackify(domain_name, toggle_is_enabled):
     from corehq.apps.domain.models import Domain
@@ -1716,6 +1729,119 @@ PAGINATED_EXPORTS = StaticToggle(
     [NAMESPACE_DOMAIN]
 )
 
+INCREMENTAL_DAILY_SAVED_EXPORTS = StaticToggle(
+    'incremental_daily_saved_exports',
+    'Rebuild daily saved form and case exports from the documents that changed since the last rebuild',
+    TAG_SOLUTIONS_LIMITED,
+    [NAMESPACE_DOMAIN]
+)
+
+PARALLEL_EXPORTS = StaticToggle(
+    'parallel_exports',
+    'Write large exports to zip files (e.g. CSV) with a pool of processes',
+    TAG_SOLUTIONS_LIMITED,
+    [NAMESPACE_DOMAIN]
+)
+
+SEARCH_AFTER_EXPORTS = StaticToggle(
+    'search_after_exports',
+    'Fetch the documents of exports with search_after instead of holding a scroll open',
+    TAG_SOLUTIONS_LIMITED,
+    [NAMESPACE_DOMAIN]
+)
+
+SLICED_SCROLL_EXPORTS = StaticToggle(
+    'sliced_scroll_exports',
+    'Fetch the documents of exports with a sliced scroll per index shard, read concurrently',
+    TAG_SOLUTIONS_LIMITED,
+    [NAMESPACE_DOMAIN]
+)
+
+ODATA_STREAMING_FEEDS = StaticToggle(
+    'odata_streaming_feeds',
+    'Stream OData feeds to BI tools, paging them with stable $skiptoken cursors',
+    TAG_SOLUTIONS_LIMITED,
+    [NAMESPACE_DOMAIN]
+)
+
+CASE_SEARCH_SUBCASE_COUNTS = StaticToggle(
+    'case_search_subcase_counts',
+    "Case Search: Index the number of subcases of each case for subcase-count filters",
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+    description="""
+    This is a performance optimization. The case search pillow indexes the
+    number of open and closed subcases of each case by index identifier, so
+    'subcase-exists' and 'subcase-count' filters without a subcase filter
+    are a single query rather than one to find the subcases and another to
+    filter their parents. The counts are used once
+    CASE_SEARCH_SUBCASE_COUNT_QUERIES is also enabled, which should be after
+    the domain's case search index has been rebuilt.
+    """
+)
+
+CASE_SEARCH_SUBCASE_COUNT_QUERIES = StaticToggle(
+    'case_search_subcase_count_queries',
+    "Case Search: Use the indexed number of subcases of each case for subcase-count filters",
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+    description="""
+    Only enable this for domains with CASE_SEARCH_SUBCASE_COUNTS enabled,
+    after their case search index has been rebuilt so that every case has
+    been indexed with its subcase counts.
+    """
+)
+
+BATCH_REPEATER_DELIVERY = StaticToggle(
+    'batch_repeater_delivery',
+    'Send repeat records in batches per repeater, several at a time over keep-alive connections',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Instead of queuing a task for each repeat record, a task per repeater
+    sends its ready repeat records, a few at a time, until there are none
+    left. Useful for draining a backlog after an integration has been down.
+    """
+)
+
+CACHE_REPEATER_PAYLOADS = StaticToggle(
+    'cache_repeater_payloads',
+    'Cache the payloads of forms and cases that are forwarded by repeaters',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Payloads are cached by document, the time it was last modified, and
+    payload format, so that retries and repeaters that forward the same
+    form or case don't generate the same payload again.
+    """
+)
+
+BULK_CASE_UPDATE_RULES = StaticToggle(
+    'bulk_case_update_rules',
+    'Run case update rules on batches of cases, skipping cases that no rule can match',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    The scheduled run of case update rules only loads cases that match the
+    criteria of at least one rule that can be checked in the database, and
+    applies rules that only update or close the matching case with one form
+    per batch of cases instead of one form per case.
+    """
+)
+
+CASE_DEDUPE_INDEX = StaticToggle(
+    'case_dedupe_index',
+    'Find duplicate cases for case deduplication rules with an index of their values instead of Elasticsearch',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    The values of the properties that deduplication rules match on are
+    stored in a database table as cases are processed, and duplicates are
+    looked up there. Rules need to be backfilled again after this is
+    enabled, so that cases that were processed before are indexed.
+    """,
+)
+
 CLEAR_MOBILE_WORKER_DATA = StaticToggle(
     'clear_mobile_worker_data',
     "Allows a web user to clear mobile workers' data",
@@ -2101,6 +2227,45 @@ LIVEQUERY_READ_FROM_STANDBYS = DynamicallyPredictablyRandomToggle(
     """
 )
 
+LIVEQUERY_CASE_SET_CACHE = StaticToggle(
+    'livequery_case_set_cache',
+    'Cache live case sets between livequery restores',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Reuse the live case set computed by a previous restore for the same
+    set of owners instead of walking the case index graph on every restore.
+    Cached sets are invalidated by the case pillow, so restores may be
+    stale by up to the case pillow's lag.
+    """
+)
+
+DELTA_RESTORE_ON_STATE_MISMATCH = StaticToggle(
+    'delta_restore_on_state_mismatch',
+    'Repair the phone case state with a restore when its hash does not match',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    When the case state hash sent by the phone does not match the last sync
+    log, re-send every live case and every case the phone may hold, instead
+    of forcing the phone to wipe its data and do a full restore. If the hash
+    still does not match on the following sync, the phone is asked to do a
+    full restore.
+    """
+)
+
+SHARDED_UCR_REBUILD = StaticToggle(
+    'sharded_ucr_rebuild',
+    'Rebuild case and form data sources in parallel shards',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Rebuilding a case or form data source from the UI runs one task for
+    each partition database instead of a single task. Each shard records
+    its progress, so an interrupted rebuild can be resumed.
+    """
+)
+
 ACCOUNTING_TESTING_TOOLS = StaticToggle(
     'accounting_testing_tools',
     'Enable Accounting Testing Tools',
@@ -2901,6 +3066,15 @@ SUPPORT_GEO_JSON_EXPORT = StaticToggle(
     description='The Case Export page now supports the exporting of GeoJSON data.',
 )
 
+COLUMNAR_EXPORT_FORMATS = StaticToggle(
+    slug='columnar_export_formats',
+    label='Support Parquet and Arrow exports',
+    tag=TAG_SOLUTIONS_LIMITED,
+    namespaces=[NAMESPACE_DOMAIN],
+    description='Form and case exports can be downloaded as zip files of Parquet or Arrow IPC stream files '
+                'with typed columns, for loading into data analysis tools.',
+)
+
 USE_PROMINENT_PROGRESS_BAR = StaticToggle(
     slug='use_prominent_progress_bar',
     label='Use more prominent progress bar in place of NProgress',
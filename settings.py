@@ -697,6 +697,15 @@ REMINDERS_QUEUE_MAX_PROCESSING_ATTEMPTS = 3
 # reminders will not be processed.
 REMINDERS_QUEUE_STALE_REMINDER_DURATION = 7 * 24
 
+# Setting this to True adds schedule instances to a per-minute due queue in
+# redis when they are saved, so that the queue_schedule_instances command
+# doesn't have to scan the schedule instance tables to find due instances.
+SCHEDULE_DUE_QUEUE_ENABLED = False
+
+# Number of minutes between scans of the schedule instance tables when the
+# due queue is enabled. The scans find instances that were not queued.
+SCHEDULE_INSTANCE_SCAN_INTERVAL = 15
+
 # Reminders rate limiting settings. A single project will only be allowed to
 # fire REMINDERS_RATE_LIMIT_COUNT reminders every REMINDERS_RATE_LIMIT_PERIOD
 # seconds.